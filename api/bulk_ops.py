@@ -0,0 +1,454 @@
+import re
+
+import numpy as np
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.cell import column_index_from_string, get_column_letter, range_boundaries
+
+from .expr_eval import compile_expression, evaluate, ExpressionError
+from .sheet_frame import Column, KIND_DATE, KIND_NUMBER
+from .style_registry import StyleError, check_style
+
+# 批量操作：一次作用于整个区域/整列，按列数组向量化计算，避免模型逐个单元格下发 update_cell
+BULK_OPERATIONS = ("update_range", "fill_column", "delete_rows", "sort", "filter", "format_range")
+
+# update_range/format_range 一次最多处理的单元格数（整列、整行区域按工作表的实际尺寸计算）
+MAX_RANGE_CELLS = 500000
+
+_COLUMN_LETTERS = re.compile(r'^[A-Za-z]{1,3}$')
+# 公式中单元格引用的一端（如 B2、$B$2、整行引用的 2），分组为 行前的$、行号
+_CELL_REF = re.compile(r'(?:\$?[A-Za-z]{1,3})?(\$?)(\d+)')
+
+
+class BulkOpError(ValueError):
+    """
+    批量操作的参数不合法
+    """
+    pass
+
+
+def _compile(expr, field):
+    try:
+        compile_expression(expr)
+    except ExpressionError as e:
+        raise BulkOpError(f"{field}: {e}") from e
+    return expr
+
+
+def _range(value, field="range"):
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(str(value).replace('$', '').strip())
+    except (TypeError, ValueError) as e:
+        raise BulkOpError(f"{field} 不是有效的区域: {value}") from e
+    return min_col, min_row, max_col, max_row
+
+
+def cell_value(value, field="value"):
+    """
+    把操作中的值转换为可以写入单元格的值：文本去掉Excel不允许的控制字符，
+    对象、数组等无法写入单元格的值抛出 BulkOpError
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    raise BulkOpError(f"{field} 不能写入单元格: {value!r}")
+
+
+def validate_style(spec, field="format"):
+    """
+    检查并规范化样式设置，无效时抛出 BulkOpError
+    """
+    if not isinstance(spec, dict):
+        raise BulkOpError(f"{field} 必须是对象")
+    try:
+        return check_style(spec)[0]
+    except StyleError as e:
+        raise BulkOpError(f"{field}: {e}") from e
+
+
+def validate_bulk_op(op):
+    """
+    校验批量操作的必填参数（表达式会预先编译），返回规范化后的操作
+    """
+    op = dict(op)
+    op_type = op["type"]
+    header_row = op.get("header_row", 1)
+    if not isinstance(header_row, int) or isinstance(header_row, bool) or header_row < 1:
+        raise BulkOpError(f"header_row 无效: {header_row}")
+    if op_type in ("update_range", "format_range"):
+        if not op.get("range"):
+            raise BulkOpError(f"{op_type} 需要 range，如 \"B2:D10\"")
+        _range(op["range"])
+    if op_type == "update_range":
+        if "values" in op:
+            values = op["values"]
+            if not isinstance(values, list) or not all(isinstance(row, list) for row in values):
+                raise BulkOpError("update_range 的 values 必须是二维数组")
+            op["values"] = [[cell_value(value, "values") for value in row] for row in values]
+        elif "value" in op:
+            op["value"] = cell_value(op["value"])
+        else:
+            raise BulkOpError("update_range 需要 values（二维数组）或 value（填充整个区域）")
+    elif op_type == "fill_column":
+        if op.get("column") in (None, ""):
+            raise BulkOpError("fill_column 需要 column（列字母、从1开始的列号或表头名称）")
+        _compile(op.get("expression"), "expression")
+        if op.get("where"):
+            _compile(op["where"], "where")
+    elif op_type == "delete_rows":
+        if op.get("where"):
+            _compile(op["where"], "where")
+        elif op.get("rows"):
+            if not isinstance(op["rows"], list) or not all(isinstance(r, int) and r >= 1 for r in op["rows"]):
+                raise BulkOpError("delete_rows 的 rows 必须是行号数组")
+        elif op.get("range"):
+            _range(op["range"])
+        else:
+            raise BulkOpError("delete_rows 需要 where（条件表达式）、rows（行号数组）或 range（如 \"5:10\"）")
+    elif op_type == "sort":
+        by = op.get("by")
+        if by in (None, "", []):
+            raise BulkOpError("sort 需要 by（排序列，或列的数组）")
+        op["by"] = by if isinstance(by, list) else [by]
+        ascending = op.get("ascending", True)
+        op["ascending"] = ascending if isinstance(ascending, list) else [ascending] * len(op["by"])
+        if len(op["ascending"]) != len(op["by"]):
+            raise BulkOpError("sort 的 ascending 数量与 by 不一致")
+    elif op_type == "filter":
+        _compile(op.get("where"), "where")
+        if op.get("mode", "hide") not in ("hide", "remove"):
+            raise BulkOpError("filter 的 mode 只能是 hide（隐藏不符合条件的行）或 remove（删除）")
+    elif op_type == "format_range":
+        if not isinstance(op.get("format"), dict):
+            raise BulkOpError("format_range 需要 format 对象")
+        op["format"] = validate_style(op["format"])
+    return op
+
+
+class SheetTable:
+    """
+    工作表数据区（表头行以下）的列视图：按需把列读取为数组，供表达式计算和排序使用
+    """
+    def __init__(self, ws, header_row=1):
+        self.ws = ws
+        self.header_row = header_row
+        self.first_row = header_row + 1
+        self.last_row = ws.max_row
+        self.n_rows = max(self.last_row - header_row, 0)
+        self.max_col = ws.max_column
+        self.headers = {}
+        for col in range(1, self.max_col + 1):
+            cell = ws._cells.get((header_row, col))
+            if cell is not None and cell.value not in (None, ''):
+                self.headers.setdefault(str(cell.value).strip(), col)
+        self._columns = {}
+
+    def column_index(self, ref, create=False):
+        """
+        把列引用解析为列号：表头名称优先，其次是列字母（如 F）和从1开始的列号；
+        create 为 True 时列字母和列号只在现有列的范围内有效，其余的引用（如 "X"、"SKU"）
+        作为表头名称在最后新增一列
+        """
+        if isinstance(ref, int) and not isinstance(ref, bool) and ref >= 1:
+            return ref
+        name = str(ref).strip()
+        if name in self.headers:
+            return self.headers[name]
+        col = None
+        if _COLUMN_LETTERS.match(name):
+            col = column_index_from_string(name.upper())
+        elif name.isdigit() and int(name) >= 1:
+            col = int(name)
+        if col is not None and (not create or col <= self.max_col):
+            return col
+        if create:
+            self.max_col += 1
+            self.ws.cell(row=self.header_row, column=self.max_col, value=name)
+            self.headers[name] = self.max_col
+            return self.max_col
+        raise BulkOpError(f"列不存在: {ref}（可用表头: {', '.join(self.headers)}）")
+
+    def cells(self, col):
+        get = self.ws._cells.get
+        values = []
+        for row in range(self.first_row, self.last_row + 1):
+            cell = get((row, col))
+            values.append(cell.value if cell is not None else None)
+        return values
+
+    def column(self, col):
+        """
+        按 SheetFrame 的规则推断列类型，构建列数组（同一列只读取一次）
+        """
+        if col not in self._columns:
+            self._columns[col] = Column.from_cells(get_column_letter(col), self.cells(col))
+        return self._columns[col]
+
+    def array(self, col):
+        """
+        表达式中使用的列数组：数值列为 float（空值为 NaN），日期列为 datetime64，其余为原值的 object 数组
+        """
+        column = self.column(col)
+        if column.kind in (KIND_NUMBER, KIND_DATE):
+            return column.values
+        values = np.empty(self.n_rows, dtype=object)
+        values[:] = [column.value(i) for i in range(self.n_rows)]
+        return values
+
+    def evaluate(self, expression):
+        tree, names = compile_expression(expression)
+        namespace = {}
+        for name in names:
+            try:
+                namespace[name] = self.array(self.column_index(name))
+            except BulkOpError as e:
+                raise ExpressionError(str(e)) from e
+        return evaluate(tree, namespace, self.n_rows)
+
+    def predicate(self, expression):
+        """
+        对每个数据行计算条件表达式，返回布尔数组（空值比较大小、类型不匹配的比较结果为 False）
+        """
+        result = self.evaluate(expression)
+        if result.dtype == object:
+            return np.array([bool(v) if v is not None else False for v in result.tolist()], dtype=bool)
+        if result.dtype.kind == 'f':
+            return np.nan_to_num(result, nan=0.0).astype(bool)
+        return result.astype(bool)
+
+    def sort_order(self, by, ascending):
+        """
+        多列排序后的数据行顺序（稳定排序，空值始终排在最后）
+        """
+        keys = []
+        for ref, asc in zip(by, ascending):
+            column = self.column(self.column_index(ref))
+            nulls = ~column.valid if column.kind == KIND_NUMBER else column.mask.copy()
+            if column.kind == KIND_NUMBER:
+                values = np.where(nulls, 0.0, column.values)
+            elif column.kind == KIND_DATE:
+                values = np.where(nulls, 0, column.values.astype(np.int64)).astype(np.float64)
+            else:
+                codes, keys_ = column.factorize()
+                texts = np.array([str(k) for k in keys_] or [''], dtype=object)
+                ranks = np.argsort(np.argsort(texts, kind='stable'), kind='stable').astype(np.float64)
+                values = np.where(nulls, 0.0, ranks[np.maximum(codes, 0)])
+            # lexsort 以最后一个键为主键，因此按优先级倒序加入
+            keys.append((values if asc else -values, nulls))
+        lex_keys = []
+        for values, nulls in reversed(keys):
+            lex_keys.extend([values, nulls])
+        order = np.lexsort(lex_keys) if lex_keys else np.arange(self.n_rows)
+        return order
+
+
+def _to_cells(values):
+    """
+    把计算结果转换为写入Excel的Python值（NaN/inf 视为空值）
+    """
+    cells = values.tolist()
+    if values.dtype.kind == 'f':
+        cells = [v if v == v and v not in (float('inf'), float('-inf')) else None for v in cells]
+    return cells
+
+
+def _formula_refs(formula, sheet_title):
+    """
+    公式中引用本工作表的区域，每个区域为 [(行号, 是否为绝对行引用)]（单个单元格一项，区域两项）；
+    整列引用、名称和其他工作表的引用不计
+    """
+    refs = []
+    for token in Tokenizer(formula).items:
+        if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+            continue
+        ref = token.value
+        if '!' in ref:
+            sheet, ref = ref.rsplit('!', 1)
+            if sheet.strip("'").replace("''", "'") != sheet_title:
+                continue
+        parts = [_CELL_REF.fullmatch(part) for part in ref.split(':')]
+        rows = [(int(match.group(2)), bool(match.group(1))) for match in parts if match]
+        if rows:
+            refs.append(rows)
+    return refs
+
+
+def _check_reorder(ws, first_row, last_row, permutation):
+    """
+    检查数据行（first_row 到 last_row）能否整体重排，会错位的情况抛出 BulkOpError：
+    与数据行相交的合并单元格、引用了其他数据行的公式（如合计行、累计值）、数组公式；
+    只引用本行（及表头上方的绝对行）的公式随行平移。permutation 为 True（排序）时，
+    数据区上方/左侧覆盖全部数据行的区域引用（如 SUM(B2:B100)）不受影响
+    """
+    for merged in ws.merged_cells.ranges:
+        if merged.max_row >= first_row:
+            raise BulkOpError(f"数据行中有合并单元格 {merged.coord}，不能排序或删除行，请先取消合并")
+    for (row, col), cell in ws._cells.items():
+        if cell.data_type != 'f':
+            continue
+        coordinate = f"{get_column_letter(col)}{row}"
+        if not isinstance(cell.value, str):
+            if row >= first_row:
+                raise BulkOpError(f"{coordinate} 是数组公式，不能排序或删除行")
+            continue
+        try:
+            refs = _formula_refs(cell.value, ws.title)
+        except Exception as e:
+            raise BulkOpError(f"无法解析 {coordinate} 的公式 {cell.value}，不能排序或删除行") from e
+        for ref in refs:
+            rows = [ref_row for ref_row, _ in ref]
+            if row >= first_row:
+                movable = all(ref_row == row or (absolute and ref_row < first_row) for ref_row, absolute in ref)
+            else:
+                movable = max(rows) < first_row or (
+                    permutation and len(ref) == 2 and min(rows) <= first_row and max(rows) >= last_row)
+            if not movable:
+                raise BulkOpError(f"{coordinate} 的公式 {cell.value} 引用了其他数据行，重排后引用会错位，"
+                                  f"请先把公式转换为数值")
+
+
+def reorder_rows(ws, first_row, order):
+    """
+    一次性重排数据行：order 为原始行号的新顺序，不在 order 中的数据行被删除
+    行高、隐藏等行属性随行移动，只引用本行的公式（如 =B2*C2）按新行号平移引用；
+    会导致公式或合并单元格错位时不做任何修改，抛出 BulkOpError
+    """
+    last_row = ws.max_row
+    mapping = {int(old): first_row + new for new, old in enumerate(order)}
+    _check_reorder(ws, first_row, last_row, permutation=len(mapping) == last_row - first_row + 1)
+    cells = {}
+    for (row, col), cell in ws._cells.items():
+        if row >= first_row:
+            new_row = mapping.get(row)
+            if new_row is None:
+                continue
+            if cell.data_type == 'f' and new_row != row:
+                letter = get_column_letter(col)
+                cell.value = Translator(cell.value, origin=f"{letter}{row}").translate_formula(f"{letter}{new_row}")
+            cell.row = row = new_row
+        cells[(row, col)] = cell
+    ws._cells = cells
+
+    dimensions = ws.row_dimensions
+    moved = {}
+    for row in [row for row in dimensions if row >= first_row]:
+        dimension = dimensions.pop(row)
+        new_row = mapping.get(row)
+        if new_row is not None:
+            dimension.index = new_row
+            moved[new_row] = dimension
+    dimensions.update(moved)
+
+
+def _check_range_size(min_col, min_row, max_col, max_row):
+    cells = (max_row - min_row + 1) * (max_col - min_col + 1)
+    if cells > MAX_RANGE_CELLS:
+        raise BulkOpError(f"区域包含{cells}个单元格，超过单次操作的上限{MAX_RANGE_CELLS}")
+
+
+def _update_range(ws, op):
+    min_col, min_row, max_col, max_row = _range(op["range"])
+    min_col, min_row = min_col or 1, min_row or 1
+    if "values" in op:
+        # 从区域左上角开始写入二维数组；指定了区域右下角时超出部分不写
+        for r_offset, row_values in enumerate(op["values"]):
+            row = min_row + r_offset
+            if max_row and row > max_row:
+                break
+            for c_offset, value in enumerate(row_values):
+                col = min_col + c_offset
+                if max_col and col > max_col:
+                    break
+                ws.cell(row=row, column=col, value=value)
+    else:
+        max_col, max_row = max_col or ws.max_column, max_row or ws.max_row
+        _check_range_size(min_col, min_row, max_col, max_row)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                ws.cell(row=row, column=col, value=op["value"])
+
+
+def _fill_column(ws, op):
+    table = SheetTable(ws, op.get("header_row", 1))
+    # 先完成计算再新增列，表达式出错时不改动工作表
+    values = _to_cells(table.evaluate(op["expression"]))
+    selected = table.predicate(op["where"]) if op.get("where") else np.ones(table.n_rows, dtype=bool)
+    col = table.column_index(op["column"], create=True)
+    for idx in np.flatnonzero(selected).tolist():
+        ws.cell(row=table.first_row + idx, column=col, value=values[idx])
+
+
+def _delete_rows(ws, op):
+    table = SheetTable(ws, op.get("header_row", 1))
+    rows = np.arange(table.first_row, table.last_row + 1)
+    if op.get("where"):
+        delete = table.predicate(op["where"])
+    elif op.get("rows"):
+        delete = np.isin(rows, op["rows"])
+    else:
+        _, min_row, _, max_row = _range(op["range"])
+        delete = (rows >= (min_row or 1)) & (rows <= (max_row or table.last_row))
+    if delete.any():
+        reorder_rows(ws, table.first_row, rows[~delete])
+
+
+def _sort(ws, op):
+    table = SheetTable(ws, op.get("header_row", 1))
+    if table.n_rows > 1:
+        order = table.sort_order(op["by"], op["ascending"])
+        reorder_rows(ws, table.first_row, table.first_row + order)
+
+
+def _filter(ws, op):
+    table = SheetTable(ws, op.get("header_row", 1))
+    keep = table.predicate(op["where"]) if table.n_rows else np.zeros(0, dtype=bool)
+    rows = np.arange(table.first_row, table.last_row + 1)
+    if op.get("mode", "hide") == "remove":
+        reorder_rows(ws, table.first_row, rows[keep])
+        return
+    # 与Excel的筛选一致：隐藏不符合条件的行，并在表头上设置自动筛选
+    for row, visible in zip(rows.tolist(), keep.tolist()):
+        ws.row_dimensions[row].hidden = not visible
+    ws.auto_filter.ref = f"A{table.header_row}:{get_column_letter(max(table.max_col, 1))}{max(table.last_row, table.header_row)}"
+
+
+def _format_range(ws, op, styles):
+    min_col, min_row, max_col, max_row = _range(op["range"])
+    _check_range_size(min_col or 1, min_row or 1, max_col or ws.max_column, max_row or ws.max_row)
+    try:
+        styles.apply_range(ws, op["range"], op["format"])
+    except StyleError as e:
+        raise BulkOpError(str(e)) from e
+
+
+def run_bulk_op(ws, op, styles):
+    """
+    在工作表上执行一个已校验的批量操作；styles 为工作簿的 StyleRegistry
+    引用了不存在的列、表达式无法在实际数据上计算等运行时错误都抛出 BulkOpError，只跳过这一个操作
+    """
+    try:
+        _run(ws, op, styles)
+    except BulkOpError:
+        raise
+    except ExpressionError as e:
+        raise BulkOpError(str(e)) from e
+    except Exception as e:
+        raise BulkOpError(f"{type(e).__name__}: {e}") from e
+
+
+def _run(ws, op, styles):
+    op_type = op["type"]
+    if op_type == "update_range":
+        _update_range(ws, op)
+    elif op_type == "fill_column":
+        _fill_column(ws, op)
+    elif op_type == "delete_rows":
+        _delete_rows(ws, op)
+    elif op_type == "sort":
+        _sort(ws, op)
+    elif op_type == "filter":
+        _filter(ws, op)
+    elif op_type == "format_range":
+        _format_range(ws, op, styles)
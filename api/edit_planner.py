@@ -0,0 +1,334 @@
+from bisect import bisect_right
+
+from .bulk_ops import BULK_OPERATIONS, BulkOpError, cell_value, run_bulk_op, validate_bulk_op, validate_style
+from .style_registry import StyleRegistry
+
+# 行来源：原始工作表中的行，或编辑时新插入（含写到表尾之后产生）的行
+ORIG = "orig"
+NEW = "new"
+
+POINT_OPERATIONS = ("add_row", "update_cell", "format_cell")
+SUPPORTED_OPERATIONS = POINT_OPERATIONS + BULK_OPERATIONS
+
+# 步骤类型：一批单元格级操作（合并为一个 EditPlan），或一个批量操作
+STEP_CELLS = "cells"
+STEP_BULK = "bulk"
+
+# 编辑提示词中对操作格式的说明
+EDIT_FORMAT_HINT = """操作列表为JSON数组，每个操作是一个对象，可选 sheet 字段指定工作表（名称或从0开始的序号）。
+单元格级操作（行号、列号从1开始）：
+- {"type": "add_row", "index": 5, "data": ["张三", 100]}  在第5行之前插入一行，省略 index 时追加到表尾
+- {"type": "update_cell", "row": 2, "col": 3, "value": 100}
+- {"type": "format_cell", "row": 1, "col": 1, "format": {"font": {"bold": true, "color": "FF0000"}}}
+  format 可包含 font、fill（背景色）、border（如 "thin"）、alignment（horizontal/vertical/wrap_text）、number_format
+批量操作（涉及多行或整列时必须使用批量操作，一个操作即可完成，不要逐个单元格修改）：
+- {"type": "update_range", "range": "B2:C3", "values": [[1, 2], [3, 4]]}  或用 "value" 把整个区域填成同一个值
+- {"type": "fill_column", "column": "金额", "expression": "单价 * 数量", "where": "数量 > 0"}  按表达式计算整列，列不存在时在最后新增
+- {"type": "delete_rows", "where": "销售额 < 1000"}  按条件删除数据行，也可用 "rows": [3, 5] 或 "range": "10:20"
+- {"type": "sort", "by": ["部门", "销售额"], "ascending": [true, false]}  表头保持不动，空值排在最后
+- {"type": "filter", "where": "部门 == '华东'"}  隐藏不符合条件的行并设置自动筛选；"mode": "remove" 时改为删除
+- {"type": "format_range", "range": "A1:F1", "format": {"font": {"bold": true}, "fill": "FFFF00", "border": "thin"}}  同一区域只需一个操作
+表达式中可直接使用表头名称或列字母（如 单价 * 数量、B * 2），包含空格的表头用 col("表头")；
+支持 + - * / 比较 and or not、x if 条件 else y，以及函数 round abs min max where concat text year month day。
+批量操作默认第1行为表头，数据从第2行开始，可用 "header_row" 指定表头所在行。"""
+
+
+def _to_index(value):
+    """
+    把行号/列号转换为正整数（兼容数字字符串），无效时返回 None
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value if isinstance(value, int) and value >= 1 else None
+
+
+class RowLayout:
+    """
+    编辑过程中的行布局：用分段列表表示 原始行区间 和 新插入的行，
+    插入只拆分分段而不移动单元格，最后一次性算出每一行的最终位置
+    """
+    def __init__(self, n_rows):
+        # 每个分段为 [来源, 起始编号, 行数]；原始行编号为Excel行号，新行编号从1开始递增
+        self.segments = [[ORIG, 1, n_rows]] if n_rows > 0 else []
+        self.length = max(n_rows, 0)
+        self.new_rows = 0
+
+    def _new_segment(self, count):
+        segment = [NEW, self.new_rows + 1, count]
+        self.new_rows += count
+        return segment
+
+    def _pad_to(self, row):
+        # 引用了表尾之后的行：补齐空行，与 openpyxl 直接写入更大行号的效果一致
+        if row > self.length:
+            self.segments.append(self._new_segment(row - self.length))
+            self.length = row
+
+    def _find(self, row):
+        """
+        返回 (分段下标, 行在分段内的偏移)
+        """
+        position = 0
+        for idx, segment in enumerate(self.segments):
+            if row <= position + segment[2]:
+                return idx, row - position - 1
+            position += segment[2]
+        raise IndexError(row)
+
+    def locate(self, row):
+        """
+        把编辑过程中的行号解析为行来源 (ORIG/NEW, 编号)，之后的插入不会改变该来源
+        """
+        self._pad_to(row)
+        idx, offset = self._find(row)
+        kind, start, _ = self.segments[idx]
+        return kind, start + offset
+
+    def insert(self, row, count=1):
+        """
+        在第 row 行之前插入 count 行（同 openpyxl 的 insert_rows），返回新行的来源列表
+        """
+        self._pad_to(row - 1)
+        inserted = self._new_segment(count)
+        if row > self.length:
+            self.segments.append(inserted)
+        else:
+            idx, offset = self._find(row)
+            kind, start, length = self.segments[idx]
+            pieces = [inserted]
+            if offset > 0:
+                pieces.insert(0, [kind, start, offset])
+            pieces.append([kind, start + offset, length - offset])
+            self.segments[idx:idx + 1] = pieces
+            self._merge_new(idx, len(pieces))
+        self.length += count
+        return [(NEW, inserted[1] + i) for i in range(count)]
+
+    def _merge_new(self, idx, span):
+        # 相邻且编号连续的新行分段合并为一段（如连续在同一位置插入多行）
+        lo, hi = max(idx - 1, 0), min(idx + span + 1, len(self.segments))
+        merged = []
+        for segment in self.segments[lo:hi]:
+            last = merged[-1] if merged else None
+            if last and last[0] == segment[0] and last[1] + last[2] == segment[1]:
+                last[2] += segment[2]
+            else:
+                merged.append(list(segment))
+        self.segments[lo:hi] = merged
+
+    def final_positions(self):
+        """
+        计算最终位置，返回 (原始行的偏移表, 新行编号 -> 最终行号 的函数)
+        偏移表为按原始起始行排序的 [(原始起始行, 行数, 偏移量)]
+        """
+        orig_shifts = []
+        new_starts = []
+        position = 1
+        for kind, start, count in self.segments:
+            if kind == ORIG:
+                orig_shifts.append((start, count, position - start))
+            else:
+                new_starts.append((start, count, position))
+            position += count
+        new_starts.sort()
+        keys = [item[0] for item in new_starts]
+
+        def new_row_position(row_id):
+            start, _, final = new_starts[bisect_right(keys, row_id) - 1]
+            return final + row_id - start
+
+        return orig_shifts, new_row_position
+
+
+class EditPlan:
+    """
+    一个工作表的编辑计划：行布局 + 按行来源记录的单元格写入和格式设置（后写的覆盖先写的）
+    """
+    def __init__(self, sheet_selector, n_rows):
+        self.sheet_selector = sheet_selector
+        self.layout = RowLayout(n_rows)
+        self.writes = {}    # (行来源, 列) -> 值
+        self.formats = {}   # (行来源, 列) -> 格式
+        self.operations = 0
+
+    def add_row(self, index, data):
+        source = self.layout.insert(index, 1)[0]
+        for col_idx, value in enumerate(data, 1):
+            self.writes[(source, col_idx)] = value
+
+    def update_cell(self, row, col, value):
+        self.writes[(self.layout.locate(row), col)] = value
+
+    def format_cell(self, row, col, format_data):
+        source = self.layout.locate(row)
+        merged = dict(self.formats.get((source, col), {}))
+        merged.update(format_data)
+        self.formats[(source, col)] = merged
+
+
+def build_plan(sheet_name, ops, n_rows):
+    """
+    把一批已校验的单元格级操作编译为 EditPlan；n_rows 为执行这批操作前工作表的行数
+    """
+    plan = EditPlan(sheet_name, n_rows)
+    for op in ops:
+        if op["type"] == "add_row":
+            index = op["index"] if op["index"] is not None else plan.layout.length + 1
+            plan.add_row(index, op["data"])
+        elif op["type"] == "update_cell":
+            plan.update_cell(op["row"], op["col"], op["value"])
+        else:
+            plan.format_cell(op["row"], op["col"], op["format"])
+        plan.operations += 1
+    return plan
+
+
+def compile_operations(operations, sheet_names, default_sheet=None, resolve=None):
+    """
+    校验并编译LLM返回的编辑操作列表
+    sheet_names: 工作簿中的工作表名称；操作中的 sheet 字段为空时使用 default_sheet，
+    否则用 resolve 把选择器（名称或序号）解析为工作表名称
+    返回 (工作表名称 -> 按顺序执行的步骤列表, 被跳过的操作说明列表)
+    连续的单元格级操作合并为一个步骤，批量操作各自为一个步骤；写入的值和样式在这里检查并规范化，
+    无效的操作逐个跳过并记录说明，不影响其他操作
+    """
+    programs = {}
+    problems = []
+    if isinstance(operations, dict):
+        operations = operations.get("operations") or operations.get("ops") or [operations]
+    if not isinstance(operations, list):
+        return programs, [f"操作列表格式不正确: {type(operations).__name__}"]
+
+    for position, op in enumerate(operations):
+        if not isinstance(op, dict):
+            problems.append(f"第{position + 1}个操作不是对象，已跳过")
+            continue
+        op_type = op.get("type")
+        if op_type not in SUPPORTED_OPERATIONS:
+            problems.append(f"第{position + 1}个操作类型不支持: {op_type}")
+            continue
+        selector = op.get("sheet") if op.get("sheet") not in (None, "") else default_sheet
+        try:
+            selector = resolve(selector) if resolve is not None else selector
+        except Exception:
+            pass
+        if selector not in sheet_names:
+            problems.append(f"第{position + 1}个操作的工作表不存在: {selector}")
+            continue
+        steps = programs.setdefault(selector, [])
+
+        if op_type in BULK_OPERATIONS:
+            try:
+                steps.append((STEP_BULK, validate_bulk_op(op)))
+            except BulkOpError as e:
+                problems.append(f"第{position + 1}个操作（{op_type}）参数无效: {e}")
+            continue
+
+        if op_type == "add_row":
+            data = op.get("data", [])
+            if not isinstance(data, (list, tuple)):
+                data = [data]
+            index = op.get("index")
+            if index is not None:
+                index = _to_index(index)
+                if index is None:
+                    problems.append(f"第{position + 1}个操作的插入行号无效: {op.get('index')}")
+                    continue
+            try:
+                data = [cell_value(value, "data") for value in data]
+            except BulkOpError as e:
+                problems.append(f"第{position + 1}个操作（{op_type}）参数无效: {e}")
+                continue
+            normalized = {"type": op_type, "index": index, "data": data}
+        else:
+            row, col = _to_index(op.get("row")), _to_index(op.get("col"))
+            if row is None or col is None:
+                problems.append(f"第{position + 1}个操作的单元格坐标无效: ({op.get('row')}, {op.get('col')})")
+                continue
+            try:
+                if op_type == "update_cell":
+                    normalized = {"type": op_type, "row": row, "col": col, "value": cell_value(op.get("value"))}
+                else:
+                    format_data = validate_style(op.get("format", {}))
+                    normalized = {"type": op_type, "row": row, "col": col, "format": format_data}
+            except BulkOpError as e:
+                problems.append(f"第{position + 1}个操作（{op_type}）参数无效: {e}")
+                continue
+        if steps and steps[-1][0] == STEP_CELLS:
+            steps[-1][1].append(normalized)
+        else:
+            steps.append((STEP_CELLS, [normalized]))
+    return programs, problems
+
+
+def _orig_row_mapper(orig_shifts):
+    """
+    原始行号 -> 最终行号（二分查找所在的原始行区间）
+    """
+    starts = [start for start, _, _ in orig_shifts]
+
+    def mapper(row):
+        idx = bisect_right(starts, row) - 1
+        if idx >= 0:
+            start, count, shift = orig_shifts[idx]
+            if row < start + count:
+                return row + shift
+        return row
+
+    return mapper
+
+
+def _shift_rows(ws, map_row):
+    """
+    一次性按最终行号重排工作表的单元格（代替逐次 insert_rows 带来的反复整体下移）
+    """
+    cells = {}
+    for (row, col), cell in ws._cells.items():
+        row = map_row(row)
+        cell.row = row
+        cells[(row, col)] = cell
+    ws._cells = cells
+
+
+def apply_plan(ws, plan, styles=None):
+    """
+    在一次遍历中把编辑计划应用到 openpyxl 工作表：先重排原有单元格，再按最终坐标写入值和格式
+    格式通过工作簿的 StyleRegistry 应用，相同的样式组合只登记一次
+    """
+    orig_shifts, new_row_position = plan.layout.final_positions()
+    map_row = _orig_row_mapper(orig_shifts)
+    if any(shift for _, _, shift in orig_shifts):
+        _shift_rows(ws, map_row)
+
+    def final_row(source):
+        kind, row_id = source
+        return new_row_position(row_id) if kind == NEW else map_row(row_id)
+
+    for (source, col), value in plan.writes.items():
+        ws.cell(row=final_row(source), column=col, value=value)
+
+    styles = StyleRegistry(ws.parent) if styles is None else styles
+    for (source, col), format_data in plan.formats.items():
+        styles.apply(ws.cell(row=final_row(source), column=col), format_data)
+
+
+def apply_program(ws, steps, styles=None):
+    """
+    按顺序执行一个工作表的步骤：单元格级操作批量编译为 EditPlan 一次应用，批量操作直接在列数组上执行
+    返回执行失败而被跳过的批量操作说明列表
+    """
+    styles = StyleRegistry(ws.parent) if styles is None else styles
+    problems = []
+    for kind, payload in steps:
+        if kind == STEP_CELLS:
+            apply_plan(ws, build_plan(ws.title, payload, ws.max_row), styles)
+        else:
+            try:
+                run_bulk_op(ws, payload, styles)
+            except BulkOpError as e:
+                problems.append(f"{payload['type']} 执行失败: {e}")
+    return problems
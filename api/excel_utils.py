@@ -1,10 +1,24 @@
 import os
+import bisect
 import random
 import time
 import os
+from itertools import chain
+import numpy as np
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.styles.numbers import BUILTIN_FORMATS
+from openpyxl.worksheet._reader import WorkSheetParser
+
+from .edit_planner import compile_operations, apply_program
+from .style_registry import StyleError, StyleRegistry
+from .sheet_frame import KIND_NUMBER, ROLE_CATEGORY, ROLE_MEASURE, ROLE_TIME, SheetFrame
+from .column_profile import profile_frame
+from .anomaly_detector import detect_anomalies
+from .trend_analyzer import analyze_trend, is_time_ordered
+from .sketches import SAMPLE_ROWS, SheetSketch
 
 # 如果安装了 pyexcelerate，可以用于高速导出，否则使用 openpyxl 作为回退
 try:
@@ -13,45 +27,230 @@ try:
 except:
     HAS_PYEXCEL = False
 
-def parse_excel_to_luckysheet(file_path):
-    """将 .xlsx 解析为 Luckysheet 可识别的 JSON（每行: {'cell': {col: value}}）"""
-    wb = load_workbook(file_path, data_only=False)  # data_only=False 保留公式
-    ws = wb.active
-    luckysheet_data = []
-    max_row = ws.max_row
-    max_col = ws.max_column
-    for r in range(1, max_row + 1):
-        cell_dict = {}
-        for c in range(1, max_col + 1):
-            cell = ws.cell(row=r, column=c)
-            v = cell.value
-            if v is not None:
-                # 将列索引转换为从0开始的字符串键
-                cell_dict[str(c - 1)] = v
-        luckysheet_data.append({"cell": cell_dict})
-    # TODO: 额外收集合并单元格、公式、样式等元数据（扩展字段）
+# Luckysheet 的对齐编码：ht 0居中 1左 2右；vt 0居中 1上 2下
+_LUCKY_HT = {"center": 0, "centerContinuous": 0, "left": 1, "right": 2}
+_LUCKY_VT = {"center": 0, "top": 1, "bottom": 2}
+
+
+def _hex_color(color):
+    """
+    openpyxl 颜色转换为 '#RRGGBB'（主题色、索引色等无法直接换算的返回 None）
+    """
+    rgb = getattr(color, "rgb", None) if color is not None else None
+    if isinstance(rgb, str) and len(rgb) in (6, 8):
+        return "#" + rgb[-6:]
+    return None
+
+
+def _lucky_style(wb, style_id):
+    """
+    把工作簿中的一个单元格样式（xf）转换为 Luckysheet 的精简样式字典，默认样式返回空字典
+    """
+    xf = wb._cell_styles[style_id]
+    style = {}
+    font, default_font = wb._fonts[xf.fontId], wb._fonts[0]
+    if font.b:
+        style["bl"] = 1
+    if font.i:
+        style["it"] = 1
+    if font.u:
+        style["un"] = 1
+    if font.strike:
+        style["cl"] = 1
+    if font.sz and font.sz != default_font.sz:
+        style["fs"] = font.sz
+    if font.name and font.name != default_font.name:
+        style["ff"] = font.name
+    font_color = _hex_color(font.color)
+    if font_color and font_color != "#000000":
+        style["fc"] = font_color
+    fill = wb._fills[xf.fillId]
+    if getattr(fill, "fill_type", None) == "solid" and _hex_color(fill.fgColor):
+        style["bg"] = _hex_color(fill.fgColor)
+    if xf.alignmentId:
+        alignment = wb._alignments[xf.alignmentId]
+        if alignment.horizontal in _LUCKY_HT:
+            style["ht"] = _LUCKY_HT[alignment.horizontal]
+        if alignment.vertical in _LUCKY_VT:
+            style["vt"] = _LUCKY_VT[alignment.vertical]
+        if alignment.wrap_text:
+            style["tb"] = 2
+    if xf.numFmtId:
+        number_format = BUILTIN_FORMATS.get(xf.numFmtId)
+        if number_format is None and xf.numFmtId - 164 < len(wb._number_formats):
+            number_format = wb._number_formats[xf.numFmtId - 164]
+        if number_format and number_format != "General":
+            style["ct"] = {"fa": number_format}
+    if xf.borderId:
+        border = wb._borders[xf.borderId]
+        sides = {side: getattr(border, side).style for side in ("left", "right", "top", "bottom")
+                 if getattr(border, side) is not None and getattr(border, side).style}
+        if sides:
+            style["bd"] = sides
+    return style
+
+
+class SparseSheetReader:
+    """
+    稀疏流式读取工作表：直接解析工作表XML，只产出有值或有样式的单元格，
+    不像 iter_rows 那样按 max_row x max_column 补齐空行空列（Z100000 处的一个单元格不会产生上百万次查找）
+    合并单元格在XML中位于单元格数据之后，读取结束后才能通过 merged_ranges 取得
+    """
+    def __init__(self, file_path, sheet_name=None):
+        self._wb = load_workbook(file_path, read_only=True)
+        try:
+            self._ws = self._wb[resolve_sheet(self._wb.sheetnames, sheet_name, _active_sheet_name(self._wb))]
+        except Exception:
+            self.close()
+            raise
+        self.sheet_name = self._ws.title
+        self.merged_ranges = []
+        self._styles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._wb.close()
+
+    def iter_rows(self):
+        """
+        逐行产出 (行号, 单元格列表)，行号从1开始；单元格为 {'row', 'column', 'value', 'data_type', 'style_id'}
+        公式单元格（data_type 为 'f'）的值为公式文本
+        """
+        wb = self._wb
+        with self._ws._get_source() as src:
+            parser = WorkSheetParser(src, self._ws._shared_strings, data_only=False, epoch=wb.epoch,
+                                     date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+            for row_idx, cells in parser.parse():
+                cells = [cell for cell in cells if cell["value"] is not None or cell["style_id"]]
+                if cells:
+                    yield row_idx, cells
+            if parser.merged_cells is not None:
+                self.merged_ranges = [merged.ref for merged in parser.merged_cells.mergeCell]
+
+    def style(self, style_id):
+        """
+        样式编号对应的 Luckysheet 精简样式（每个编号只转换一次）
+        """
+        if style_id not in self._styles:
+            self._styles[style_id] = _lucky_style(self._wb, style_id)
+        return self._styles[style_id]
+
+
+class LuckysheetStream:
+    """
+    把一个工作表转换为分页的 Luckysheet JSON：
+    每页最多 page_size 个有内容的行，行以 {'r': 行号(从0开始), 'cell': {列号(从0开始的字符串): 值}} 表示，只含有值的单元格；
+    公式、样式作为侧表随页给出：formulas / cell_styles 以 "行_列" 为键，styles 为本页首次出现的 样式编号 -> 样式；
+    合并单元格在全部分页产出后通过 merges 取得
+    """
+    def __init__(self, file_path, sheet_name=None, page_size=500):
+        # 工作表不存在时在这里抛出 SheetNotFoundError，而不是在开始输出之后
+        self._reader = SparseSheetReader(file_path, sheet_name)
+        self.sheet_name = self._reader.sheet_name
+        self.page_size = max(int(page_size), 1)
+        self.rows = 0
+        self.merges = []
+
+    @staticmethod
+    def _new_page():
+        return {"rows": [], "formulas": {}, "styles": {}, "cell_styles": {}}
+
+    def pages(self):
+        seen_styles = set()
+        page, page_rows = self._new_page(), 0
+        try:
+            for row_idx, cells in self._reader.iter_rows():
+                r = row_idx - 1
+                cell_dict = {}
+                for cell in cells:
+                    c = cell["column"] - 1
+                    value = cell["value"]
+                    if cell["data_type"] == "f":
+                        # 数组公式等为对象，取其公式文本
+                        page["formulas"][f"{r}_{c}"] = getattr(value, "text", value)
+                    elif value is not None:
+                        cell_dict[str(c)] = value
+                    style_id = cell["style_id"]
+                    if style_id and self._reader.style(style_id):
+                        page["cell_styles"][f"{r}_{c}"] = style_id
+                        if style_id not in seen_styles:
+                            seen_styles.add(style_id)
+                            page["styles"][style_id] = self._reader.style(style_id)
+                if cell_dict:
+                    page["rows"].append({"r": r, "cell": cell_dict})
+                    self.rows += 1
+                page_rows += 1
+                if page_rows >= self.page_size:
+                    yield page
+                    page, page_rows = self._new_page(), 0
+            if page_rows:
+                yield page
+            self.merges = []
+            for ref in self._reader.merged_ranges:
+                min_col, min_row, max_col, max_row = range_boundaries(ref)
+                self.merges.append({"r": min_row - 1, "c": min_col - 1,
+                                    "rs": max_row - min_row + 1, "cs": max_col - min_col + 1})
+        finally:
+            self._reader.close()
+
+
+def parse_excel_to_luckysheet(file_path, sheet_name=None, page_size=500):
+    """将 .xlsx 中的一个工作表解析为 Luckysheet 可识别的 JSON
+    sheet_name 为工作表选择器（名称或序号），为空时为活动工作表；其余工作表不会被解析
+    返回 {'sheet_name', 'data': 稀疏的行列表, 'formulas', 'styles', 'cell_styles', 'merges'}，格式见 LuckysheetStream"""
+    # 稀疏解析默认 data_only=False，保留公式
+    stream = LuckysheetStream(file_path, sheet_name, page_size)
+    luckysheet_data = {"sheet_name": stream.sheet_name, "data": [], "formulas": {}, "styles": {}, "cell_styles": {}}
+    for page in stream.pages():
+        luckysheet_data["data"].extend(page["rows"])
+        for key in ("formulas", "styles", "cell_styles"):
+            luckysheet_data[key].update(page[key])
+    luckysheet_data["merges"] = stream.merges
     return luckysheet_data
 
 def luckysheet_to_xlsx(luckysheet_data, file_name="edited.xlsx"):
     """
     将 Luckysheet JSON 转为 .xlsx 文件并保存到 config.TEMP_DIR
-    返回文件名（不含路径或含路径视实现）
+    luckysheet_data 为 parse_excel_to_luckysheet 的结果（兼容旧的行列表格式，行号为列表下标）
+    值、公式和合并单元格会写回；返回文件名（不含路径或含路径视实现）
     """
     output_file_name = file_name if file_name.endswith(".xlsx") else f"{file_name}.xlsx"
     output_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp", output_file_name)
+    if isinstance(luckysheet_data, dict):
+        rows = luckysheet_data.get("data") or []
+        formulas = luckysheet_data.get("formulas") or {}
+        merges = luckysheet_data.get("merges") or []
+    else:
+        rows, formulas, merges = luckysheet_data, {}, []
+
+    def iter_cells():
+        # 行列号均从1开始
+        for position, row in enumerate(rows):
+            r_idx = row.get("r", position) + 1
+            for c_str, val in row.get("cell", {}).items():
+                yield r_idx, int(c_str) + 1, val
+        for key, formula in formulas.items():
+            r, c = key.split("_")
+            yield int(r) + 1, int(c) + 1, formula
+
     # 如果使用 pyexcelerate，可以更快写入
     if HAS_PYEXCEL:
         wb = PyexcelWorkbook()
         sheet = wb.new_sheet("Sheet1", data=[[]])  # will set cells manually below
-        # pyexcelerate 行列起点为1
-        for r_idx, row in enumerate(luckysheet_data, start=1):
-            cell_map = row.get("cell", {})
-            for c_str, val in cell_map.items():
-                c_idx = int(c_str) + 1
-                try:
-                    sheet.set_cell(r_idx, c_idx, val)
-                except Exception:
-                    sheet.set_cell(r_idx, c_idx, str(val))
+        for r_idx, c_idx, val in iter_cells():
+            try:
+                sheet.set_cell_value(r_idx, c_idx, val)
+            except Exception:
+                sheet.set_cell_value(r_idx, c_idx, str(val))
+        for merge in merges:
+            sheet.range((merge["r"] + 1, merge["c"] + 1),
+                        (merge["r"] + merge["rs"], merge["c"] + merge["cs"])).merge()
         wb.save(output_path)
     else:
         # fallback to openpyxl
@@ -59,107 +258,535 @@ def luckysheet_to_xlsx(luckysheet_data, file_name="edited.xlsx"):
         wb = Workbook()
         ws = wb.active
         ws.title = "Sheet1"
-        for r_idx, row in enumerate(luckysheet_data, start=1):
-            cell_map = row.get("cell", {})
-            for c_str, val in cell_map.items():
-                c_idx = int(c_str) + 1
-                ws.cell(row=r_idx, column=c_idx, value=val)
+        for r_idx, c_idx, val in iter_cells():
+            ws.cell(row=r_idx, column=c_idx, value=val)
+        for merge in merges:
+            ws.merge_cells(start_row=merge["r"] + 1, start_column=merge["c"] + 1,
+                           end_row=merge["r"] + merge["rs"], end_column=merge["c"] + merge["cs"])
         wb.save(output_path)
     return os.path.basename(output_path)
 
+def apply_luckysheet_edit(luckysheet_data, op):
+    """
+    把前端的一个编辑事件（edit_cell / insert_row）应用到 parse_excel_to_luckysheet 格式的数据上（原地修改并返回）
+    行为按行号 r 升序排列的稀疏列表，编辑单元格时按 r 查找或插入行，插入行时把其后的行、公式、样式和合并单元格下移；
+    旧的行列表格式（行号为列表下标）会先转换为稀疏格式
+    """
+    if not isinstance(luckysheet_data, dict):
+        luckysheet_data = {"data": [{"r": r, "cell": row.get("cell", {})}
+                                    for r, row in enumerate(luckysheet_data or []) if row.get("cell")]}
+    rows = luckysheet_data.setdefault("data", [])
+    op_type = op.get("type")
+    payload = op.get("data") or {}
+    if op_type == "edit_cell":
+        r, c = int(payload["row"]), int(payload["col"])
+        position = bisect.bisect_left([row["r"] for row in rows], r)
+        if position == len(rows) or rows[position]["r"] != r:
+            rows.insert(position, {"r": r, "cell": {}})
+        rows[position].setdefault("cell", {})[str(c)] = payload["value"]
+        # 直接输入的值覆盖该单元格原有的公式
+        (luckysheet_data.get("formulas") or {}).pop(f"{r}_{c}", None)
+    elif op_type == "insert_row":
+        r, count = int(payload["row"]), int(payload.get("count", 1))
+        for row in rows:
+            if row["r"] >= r:
+                row["r"] += count
+        for key in ("formulas", "cell_styles"):
+            side = luckysheet_data.get(key)
+            if side:
+                shifted = {}
+                for position, value in side.items():
+                    row_idx, col_idx = (int(part) for part in position.split("_"))
+                    shifted[f"{row_idx + count if row_idx >= r else row_idx}_{col_idx}"] = value
+                luckysheet_data[key] = shifted
+        for merge in luckysheet_data.get("merges") or []:
+            if merge["r"] >= r:
+                merge["r"] += count
+            elif merge["r"] + merge["rs"] > r:
+                merge["rs"] += count
+    return luckysheet_data
+
+
+class StreamingExcelWriter:
+    """
+    逐行写入的Excel文件（openpyxl write-only 模式）
+    行数据到达一行就追加一行，内存占用不随行数增长
+    """
+    def __init__(self, file_path, sheet_name="Sheet1"):
+        self.file_path = file_path
+        self.rows_written = 0
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(title=sheet_name)
+
+    def set_sheet_name(self, sheet_name):
+        """
+        write-only 模式下工作表名称在保存时才写入，因此可以在追加行之后再设置
+        """
+        if sheet_name:
+            self._ws.title = sheet_name
+
+    def append(self, row):
+        self._ws.append(list(row))
+        self.rows_written += 1
+
+    def close(self):
+        """
+        保存文件（write-only 工作簿只能保存一次）
+        """
+        self._wb.save(self.file_path)
+        print(f"Excel文件已流式写入: {self.file_path}, 共{self.rows_written}行")
+
+# 写入后端：openpyxl 普通模式（逐个单元格，行数少时使用）、openpyxl write-only（逐行流式追加）、
+# pyexcelerate（整表 data= 批量写入，已知行数的大表最快）
+WRITER_BACKENDS = ("openpyxl", "write_only", "pyexcelerate")
+# pyexcelerate 保存前要在内存中持有全部行（峰值内存与行数成正比），超过该行数或行数未知时改用 write_only 流式写入
+PYEXCELERATE_MAX_ROWS = 200000
+
+
+def choose_writer_backend(row_count, backend="auto", threshold=1000):
+    """
+    选择写入后端：指定的后端不可用时回退到 write_only；
+    auto 时行数不超过 threshold 使用 openpyxl，行数未知（迭代器）使用 write_only，
+    其余优先使用 pyexcelerate；行数未知或超过 PYEXCELERATE_MAX_ROWS 时不使用 pyexcelerate（含显式指定时）
+    """
+    pyexcelerate_ok = HAS_PYEXCEL and row_count is not None and row_count <= PYEXCELERATE_MAX_ROWS
+    if backend and backend != "auto":
+        if backend not in WRITER_BACKENDS:
+            raise ValueError(f"未知的Excel写入后端: {backend}")
+        if backend == "pyexcelerate" and not pyexcelerate_ok:
+            return "write_only"
+        return backend
+    if row_count is None:
+        return "write_only"
+    if row_count <= threshold:
+        return "openpyxl"
+    return "pyexcelerate" if pyexcelerate_ok else "write_only"
+
+
+def _write_openpyxl(file_path, sheet_name, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    row_count = 0
+    for row_idx, row_data in enumerate(rows, 1):
+        for col_idx, cell_data in enumerate(row_data, 1):
+            ws.cell(row=row_idx, column=col_idx, value=cell_data)
+        row_count = row_idx
+    wb.save(file_path)
+    return row_count
+
+
+def _write_write_only(file_path, sheet_name, rows):
+    writer = StreamingExcelWriter(file_path, sheet_name)
+    for row in rows:
+        writer.append(row)
+    writer.close()
+    return writer.rows_written
+
+
+def _write_pyexcelerate(file_path, sheet_name, rows):
+    # 只用于已知行数且不超过 PYEXCELERATE_MAX_ROWS 的数据（见 choose_writer_backend）；传入的列表直接使用，不再复制
+    data = rows if isinstance(rows, list) else [list(row) for row in rows]
+    wb = PyexcelWorkbook()
+    wb.new_sheet(sheet_name, data=data)
+    wb.save(file_path)
+    return len(data)
+
+
+_WRITERS = {
+    "openpyxl": _write_openpyxl,
+    "write_only": _write_write_only,
+    "pyexcelerate": _write_pyexcelerate,
+}
+
+
+def write_rows(file_path, sheet_name, rows, backend="auto", threshold=1000):
+    """
+    用选定的后端一次写完所有行，rows 可以是列表或行迭代器；返回 (使用的后端, 写入的行数)
+    """
+    row_count = len(rows) if hasattr(rows, "__len__") else None
+    chosen = choose_writer_backend(row_count, backend, threshold)
+    return chosen, _WRITERS[chosen](file_path, sheet_name, rows)
+
+
+class SheetNotFoundError(ValueError):
+    """
+    工作表选择器（名称或序号）在工作簿中不存在
+    """
+    pass
+
+
+def resolve_sheet(sheet_names, selector=None, default=None):
+    """
+    把工作表选择器解析为工作表名称：为空时返回 default（通常为活动工作表），
+    字符串优先按名称匹配，其次按从0开始的序号（整数或数字字符串，支持负数）
+    """
+    if selector is None or selector == '':
+        return default if default is not None else sheet_names[0]
+    if isinstance(selector, str):
+        if selector in sheet_names:
+            return selector
+        if selector.strip() in sheet_names:
+            return selector.strip()
+        if selector.strip().lstrip('-').isdigit():
+            selector = int(selector.strip())
+    if isinstance(selector, int) and not isinstance(selector, bool) and -len(sheet_names) <= selector < len(sheet_names):
+        return sheet_names[selector]
+    raise SheetNotFoundError(f"工作表不存在: {selector}（可选: {', '.join(sheet_names)}）")
+
+
+def _active_sheet_name(wb):
+    active = wb.active
+    return active.title if active is not None else wb.sheetnames[0]
+
+
+class ExcelRowReader:
+    """
+    以只读模式（openpyxl read_only）流式读取工作表，逐行产出单元格的值，不构建单元格对象
+    超出 max_rows / max_cols 的部分不会读入内存，truncated 表示是否发生了截断
+    sheet_name 为工作表选择器（名称或序号）；传入 workbook 时复用已打开的只读工作簿，关闭时不关闭它
+    """
+    def __init__(self, file_path, sheet_name=None, max_rows=None, max_cols=None, workbook=None):
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self.rows_read = 0
+        self.truncated = False
+        self._owns_workbook = workbook is None
+        self._wb = workbook if workbook is not None else load_workbook(file_path, read_only=True)
+        try:
+            self._ws = self._wb[resolve_sheet(self._wb.sheetnames, sheet_name, _active_sheet_name(self._wb))]
+        except Exception:
+            self.close()
+            raise
+        self.sheet_name = self._ws.title
+        self._dimensions = None
+        self._exhausted = False
+        # 读取过程中顺带统计的行数（含截断时多读的一行）和最大列数，以及读取停下时的行迭代器（计算尺寸时从这里继续计数）
+        self._rows_seen = 0
+        self._cols_seen = 0
+        self._rest = None
+        self._peeked = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        if self._owns_workbook:
+            self._wb.close()
+
+    @property
+    def dimensions(self):
+        """
+        工作表的真实 (行数, 列数)：已读完整张表时直接使用读取过程中的计数；
+        否则使用文件中记录的 dimension，缺失时从读取停下的位置继续计数剩余的行（不从头重新扫描，也不保留数据）
+        """
+        if self._dimensions is None:
+            max_row, max_col = self.recorded_dimensions
+            if not self._exhausted and (not max_row or not max_col):
+                if self._rest is None:
+                    self._rest = self._ws.iter_rows(values_only=True)
+                for row in self._rest:
+                    self._rows_seen += 1
+                    self._cols_seen = max(self._cols_seen, len(row))
+                self._rest = None
+                self._exhausted = True
+            if self._exhausted or not max_row or not max_col:
+                max_row, max_col = self._rows_seen, self._cols_seen
+            self._dimensions = (max_row, max_col)
+        return self._dimensions
+
+    def iter_rows(self):
+        """
+        逐行产出单元格的值（列表），最多 max_rows 行、每行最多 max_cols 列
+        截断时行迭代器停在第 max_rows + 1 行，rows_read 只计产出的行
+        """
+        sized_cols = self._ws.max_column
+        if self.max_cols and sized_cols and sized_cols > self.max_cols:
+            self.truncated = True
+        rows = self._rest = self._ws.iter_rows(values_only=True)
+        for row in rows:
+            self._rows_seen += 1
+            self._cols_seen = max(self._cols_seen, len(row))
+            if self.max_rows and self.rows_read >= self.max_rows:
+                # 剩余的行留给 iter_remaining 或 dimensions
+                self.truncated = True
+                self._peeked = row
+                return
+            if self.max_cols and len(row) > self.max_cols:
+                self.truncated = True
+                row = row[:self.max_cols]
+            self.rows_read += 1
+            yield list(row)
+        self._rest = None
+        self._exhausted = True
+
+    @property
+    def recorded_dimensions(self):
+        """
+        文件中记录的 (行数, 列数)，未记录时为 (None, None)；第三方导出的文件可能与实际不符
+        """
+        return self._ws.max_row or None, self._ws.max_column or None
+
+    @property
+    def has_more_rows(self):
+        """
+        iter_rows 是否因 max_rows 提前停止（工作表还有未读的行）
+        """
+        return self._peeked is not None
+
+    def iter_remaining(self):
+        """
+        iter_rows 因 max_rows 停止后，从停下的位置继续逐行产出剩余的行（每行最多 max_cols 列），
+        用于在同一次读取中把整张表送入流式统计；读完后 dimensions 直接使用读取过程中的计数
+        """
+        if self._peeked is None:
+            return
+        row, self._peeked = self._peeked, None
+        yield list(row[:self.max_cols]) if self.max_cols else list(row)
+        for row in self._rest:
+            self._rows_seen += 1
+            self._cols_seen = max(self._cols_seen, len(row))
+            yield list(row[:self.max_cols]) if self.max_cols else list(row)
+        self._rest = None
+        self._exhausted = True
+
+
+class LazyWorkbook:
+    """
+    多工作表工作簿：打开时只读取工作簿元数据和各工作表记录的尺寸（sheet index），
+    每个工作表的单元格在首次访问时才解析，解析结果按工作表缓存
+    """
+    def __init__(self, file_path, max_rows=None, max_cols=None):
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self._wb = load_workbook(file_path, read_only=True)
+        self.sheet_names = list(self._wb.sheetnames)
+        self.active_sheet = _active_sheet_name(self._wb)
+        self._sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._wb.close()
+
+    def index(self):
+        """
+        工作表索引：序号、名称、记录的行列数（不解析单元格，文件未记录尺寸时为 None）和是否为活动工作表
+        """
+        sheets = []
+        for idx, name in enumerate(self.sheet_names):
+            ws = self._wb[name]
+            sheets.append({
+                "index": idx,
+                "name": name,
+                "rows": getattr(ws, "max_row", None),
+                "cols": getattr(ws, "max_column", None),
+                "active": name == self.active_sheet
+            })
+        return sheets
+
+    def resolve(self, selector=None):
+        return resolve_sheet(self.sheet_names, selector, self.active_sheet)
+
+    def reader(self, selector=None, max_rows=None, max_cols=None):
+        """
+        打开某个工作表的流式读取器（共用本工作簿）
+        """
+        return ExcelRowReader(
+            self.file_path,
+            sheet_name=self.resolve(selector),
+            max_rows=max_rows or self.max_rows,
+            max_cols=max_cols or self.max_cols,
+            workbook=self._wb
+        )
+
+    def sheet(self, selector=None, max_rows=None, max_cols=None):
+        """
+        读取某个工作表（首次访问时解析），返回与 read_excel 相同结构的内容
+        """
+        name = self.resolve(selector)
+        key = (name, max_rows or self.max_rows, max_cols or self.max_cols)
+        if key not in self._sheets:
+            with self.reader(name, max_rows, max_cols) as reader:
+                content = {'sheet_name': reader.sheet_name, 'data': list(reader.iter_rows())}
+                content['total_rows'], content['total_cols'] = reader.dimensions
+                content['truncated'] = reader.truncated
+            self._sheets[key] = content
+        return self._sheets[key]
+
+
 class ExcelUtils:
-    def __init__(self):
-        # 初始化Excel工具类
-        pass
+    def __init__(self, max_rows=None, max_cols=None, writer_backend="auto", write_only_threshold=1000, parse_cache=None):
+        # 初始化Excel工具类；max_rows / max_cols 为读取时的默认上限（通常为 EXCEL_MAX_ROWS / EXCEL_MAX_COLS）
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        # 写入后端（EXCEL_WRITER_BACKEND）及 auto 模式下改用流式/批量写入的行数阈值
+        self.writer_backend = writer_backend
+        self.write_only_threshold = write_only_threshold
+        # 已解析工作表的缓存（ParsedWorkbookCache），为空时不缓存
+        self.parse_cache = parse_cache
     
-    def create_excel(self, file_path, sheet_name, data):
+    def create_excel(self, file_path, sheet_name, data, backend=None):
         """
         创建一个新的Excel文件
+        data 可以是二维列表或行迭代器；backend 为空时使用实例的默认写入后端（通常为 auto，按行数自动选择）
         """
         try:
-            # 创建工作簿
-            wb = Workbook()
-            ws = wb.active
-            ws.title = sheet_name
-            
-            # 写入数据
-            for row_idx, row_data in enumerate(data, 1):
-                for col_idx, cell_data in enumerate(row_data, 1):
-                    ws.cell(row=row_idx, column=col_idx, value=cell_data)
-            
-            # 保存文件
-            wb.save(file_path)
-            print(f"Excel文件已创建: {file_path}")
+            chosen, row_count = write_rows(file_path, sheet_name, data, backend or self.writer_backend,
+                                           self.write_only_threshold)
+            print(f"Excel文件已创建: {file_path}（{chosen}，{row_count}行）")
             return True
         except Exception as e:
             print(f"创建Excel文件失败: {str(e)}")
             return False
     
-    def read_excel(self, file_path):
+    def open_stream_writer(self, file_path, sheet_name="Sheet1"):
+        """
+        打开一个逐行写入的Excel文件，用于流式生成
+        """
+        return StreamingExcelWriter(file_path, sheet_name)
+    
+    def open_workbook(self, file_path, max_rows=None, max_cols=None):
         """
-        读取Excel文件内容
+        打开一个按需解析的多工作表工作簿，未指定上限时使用默认上限
+        """
+        return LazyWorkbook(file_path, max_rows=max_rows or self.max_rows, max_cols=max_cols or self.max_cols)
+    
+    def list_sheets(self, file_path):
+        """
+        只读取工作表索引（名称、尺寸），不解析单元格
+        """
+        with LazyWorkbook(file_path) as book:
+            return book.index()
+    
+    def open_reader(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
+        """
+        打开一个流式只读的工作表读取器，未指定上限时使用默认上限
+        """
+        return ExcelRowReader(
+            file_path,
+            sheet_name=sheet_name,
+            max_rows=max_rows or self.max_rows,
+            max_cols=max_cols or self.max_cols
+        )
+    
+    def iter_excel_rows(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
+        """
+        惰性逐行读取Excel，调用方可以直接消费行迭代器而不是完整列表
+        """
+        with self.open_reader(file_path, sheet_name, max_rows, max_cols) as reader:
+            yield from reader.iter_rows()
+    
+    def read_excel(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
+        """
+        读取Excel文件中的一个工作表（只读流式读取，最多读取 max_rows 行、max_cols 列）
+        sheet_name 为工作表选择器（名称或从0开始的序号），为空时读取活动工作表；其余工作表不会被解析
+        total_rows / total_cols 为工作表的真实尺寸，truncated 表示 data 是否被截断，sheets 为工作表索引
         """
         try:
-            wb = load_workbook(file_path)
-            ws = wb.active
-            
-            content = {}
-            content['sheet_name'] = ws.title
-            content['data'] = []
-            
-            # 读取所有数据
-            for row in ws.iter_rows(values_only=True):
-                content['data'].append(list(row))
+            with self.open_workbook(file_path, max_rows, max_cols) as book:
+                content = dict(book.sheet(sheet_name))
+                content['sheets'] = book.index()
             
+            if content['truncated']:
+                print(f"Excel超出读取上限，已截断: {file_path}, 实际 {content['total_rows']}行 x {content['total_cols']}列")
             return content
         except Exception as e:
             print(f"读取Excel文件失败: {str(e)}")
             return {"error": str(e)}
     
-    def edit_excel(self, input_path, output_path, operations):
+    def load_sheet(self, file_path, sheet_name=None, digest=None):
+        """
+        读取工作表并按列解析，返回 (read_excel 的结果, SheetFrame)；读取失败时 SheetFrame 为 None
+        传入上传内容的 digest（SHA-256）时，相同内容、相同工作表的重复请求直接使用解析缓存
+        """
+        content, frame, _ = self.scan_sheet(file_path, sheet_name, digest)
+        return content, frame
+    
+    def scan_sheet(self, file_path, sheet_name=None, digest=None, approx_rows=None, sample_rows=SAMPLE_ROWS):
+        """
+        一次流式读取完成 load_sheet 和整表的近似统计摘要，返回 (read_excel 的结果, SheetFrame, SheetSketch 或 None)
+        前 max_rows 行读入内存构建 SheetFrame；数据行超过 approx_rows 时，已读入的行和同一个行迭代器中剩余的行
+        （不受 max_rows 限制，列数上限不变）一起逐块送入 SheetSketch，并按 report_groups 选出的列分组汇总，
+        工作簿只打开一次、工作表只扫描一遍，total_rows / total_cols 为这次读取的计数；approx_rows 为空时不构建摘要
+        读取失败时 SheetFrame 为 None；传入 digest 时使用解析缓存（缓存中的摘要由多个请求共用，不要在其上调用 merge / update）
+        """
+        key = None
+        if digest and self.parse_cache is not None and self.parse_cache.enabled:
+            kind = f"sheet~{approx_rows}~{sample_rows}" if approx_rows else "sheet"
+            key = self.parse_cache.make_key(digest, kind, sheet_name, self.max_rows, self.max_cols)
+            cached, _ = self.parse_cache.get(key)
+            if cached is not None:
+                content, frame, sketch = cached if approx_rows else (*cached, None)
+                return dict(content), frame, sketch
+        try:
+            with self.open_workbook(file_path) as book:
+                with book.reader(sheet_name) as reader:
+                    content = {'sheet_name': reader.sheet_name, 'data': list(reader.iter_rows())}
+                    # 未读完时按文件记录的行数判断，未记录行数时直接构建摘要（计数本身也要读完整张表）
+                    total_rows = reader.recorded_dimensions[0] if reader.has_more_rows else len(content['data'])
+                    frame = sketch = None
+                    if approx_rows and (total_rows is None or total_rows - 1 > approx_rows):
+                        # 先解析已读入的行，确定分析报告作图的列，再对整张表分组汇总这些列
+                        frame = SheetFrame.from_rows(content['data'], sheet_name=reader.sheet_name)
+                        groups = [pair for pair in report_groups(frame.without_summary_rows()).values() if pair]
+                        # 固定随机种子，同一份数据的抽样行（以及提示词）保持不变
+                        sketch = SheetSketch.from_rows(chain(content['data'], reader.iter_remaining()),
+                                                       sheet_name=reader.sheet_name, sample_rows=sample_rows, seed=0,
+                                                       groups=groups)
+                    content['total_rows'], content['total_cols'] = reader.dimensions
+                    content['truncated'] = reader.truncated
+                content['sheets'] = book.index()
+        except Exception as e:
+            print(f"读取Excel文件失败: {str(e)}")
+            return {"error": str(e)}, None, None
+        if content['truncated']:
+            print(f"Excel超出读取上限，已截断: {file_path}, 实际 {content['total_rows']}行 x {content['total_cols']}列")
+        if frame is None:
+            frame = SheetFrame.from_excel_content(content)
+        elif content['truncated']:
+            # 复用已解析的列，补上这次读取得到的真实尺寸（与 from_excel_content 相同）
+            frame = SheetFrame(frame.sheet_name, frame.columns, content['total_rows'] - 1, content['total_cols'],
+                               truncated=True)
+        if key is not None:
+            self.parse_cache.set(key, (content, frame, sketch) if approx_rows else (content, frame))
+        return dict(content), frame, sketch
+    
+    def edit_excel(self, input_path, output_path, operations, sheet_name=None):
         """
         根据操作列表编辑Excel文件
+        sheet_name 为默认操作的工作表（名称或序号，为空时为活动工作表），单个操作可以用 sheet 字段另行指定
+        单元格级操作先编译为编辑计划（合并插入、解析最终坐标）再一次性应用，避免每次插入行都整体下移其后的所有单元格；
+        区域/整列的批量操作（fill_column、sort、filter 等）在列数组上向量化执行
         """
         try:
-            # 加载现有工作簿
+            # 加载现有工作簿（编辑后需要完整保存，因此加载全部工作表）
             wb = load_workbook(input_path)
-            ws = wb.active
+            default_sheet = resolve_sheet(wb.sheetnames, sheet_name, _active_sheet_name(wb))
+            
+            # 校验并编译操作
+            programs, problems = compile_operations(
+                operations, wb.sheetnames, default_sheet,
+                resolve=lambda selector: resolve_sheet(wb.sheetnames, selector)
+            )
             
             # 执行操作
-            if isinstance(operations, list):
-                for op in operations:
-                    if op.get('type') == 'add_row':
-                        row_data = op.get('data', [])
-                        row_index = op.get('index', ws.max_row + 1)
-                        ws.insert_rows(row_index)
-                        for col_idx, value in enumerate(row_data, 1):
-                            ws.cell(row=row_index, column=col_idx, value=value)
-                    
-                    elif op.get('type') == 'update_cell':
-                        row = op.get('row')
-                        col = op.get('col')
-                        value = op.get('value')
-                        if row and col:
-                            ws.cell(row=row, column=col, value=value)
-                    
-                    elif op.get('type') == 'format_cell':
-                        row = op.get('row')
-                        col = op.get('col')
-                        format_data = op.get('format', {})
-                        if row and col:
-                            cell = ws.cell(row=row, column=col)
-                            # 应用格式
-                            if 'font' in format_data:
-                                font_data = format_data['font']
-                                font = Font(
-                                    name=font_data.get('name'),
-                                    size=font_data.get('size'),
-                                    bold=font_data.get('bold'),
-                                    italic=font_data.get('italic'),
-                                    color=font_data.get('color')
-                                )
-                                cell.font = font
-                            # 可以添加更多格式设置
+            styles = StyleRegistry(wb)
+            for name, steps in programs.items():
+                problems.extend(apply_program(wb[name], steps, styles))
+            for problem in problems:
+                print(f"跳过编辑操作: {problem}")
             
             # 保存修改后的文件
             wb.save(output_path)
@@ -169,18 +796,33 @@ class ExcelUtils:
             print(f"编辑Excel文件失败: {str(e)}")
             return False
     
-    def apply_style(self, file_path, sheet_name, style_data):
+    def apply_style(self, file_path, sheet_name, style_data, output_path=None):
         """
-        为Excel文件应用样式
+        为Excel文件按区域批量应用样式
+        style_data 为 [{"range": "A1:F1", "style": {"font": {...}, "fill": "FFFF00", "border": "thin", ...}}, ...]，
+        也可以是 {"A1:F1": {...}} 形式的字典；相同的样式组合只登记一次为命名样式，整个区域共用
+        output_path 为空时覆盖原文件
         """
         try:
             wb = load_workbook(file_path)
-            ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+            ws = wb[resolve_sheet(wb.sheetnames, sheet_name, _active_sheet_name(wb))]
             
             # 应用样式
-            # 这里可以添加更多样式设置逻辑
+            if isinstance(style_data, dict):
+                style_data = [{"range": cell_range, "style": style} for cell_range, style in style_data.items()]
+            styles = StyleRegistry(wb)
+            for rule in style_data or []:
+                if not isinstance(rule, dict) or not rule.get("range"):
+                    print(f"跳过样式设置: {rule}")
+                    continue
+                style = rule.get("style") or {k: v for k, v in rule.items() if k != "range"}
+                try:
+                    styles.apply_range(ws, rule["range"], style)
+                except StyleError as e:
+                    print(f"跳过样式设置: {rule['range']}, {e}")
             
-            wb.save(file_path)
+            wb.save(output_path or file_path)
+            print(f"样式已应用: {styles.applied}个单元格, {styles.style_count}种样式")
             return True
         except Exception as e:
             print(f"应用样式失败: {str(e)}")
@@ -294,67 +936,138 @@ def generate_mock_response(description):
 # 添加数据分析报告生成函数，用于在API不可用时提供模拟分析结果
 # 文件路径: backend/excel_utils.py
 
-def generate_analysis_report(excel_content):
+def report_groups(data_frame):
+    """
+    分析报告作图所用的列：{"time": (时间列, 数值列), "category": (类别列, 数值列)}，找不到时为 None
+    data_frame 为去掉合计行的数据；列先按表头名称查找，找不到时按推断的表头角色查找，
+    按角色推断的时间列必须按时间排列，按角色推断的数值列必须能按类别把多行归为一组（每行一个类别时只是逐行罗列）
+    scan_sheet 按这些列对整张工作表流式分组汇总（见 SheetSketch.group_frame）
+    """
+    def find_column(names, role, accept=None):
+        idx = data_frame.column_index(names)
+        if idx is None:
+            candidates = [i for i in data_frame.columns_with_role(role) if accept is None or accept(i)]
+            idx = candidates[0] if candidates else None
+        return idx
+
+    groups = {"time": None, "category": None}
+    time_col_idx = find_column(['月份', '日期', '时间', '季度', '年份'], ROLE_TIME,
+                               accept=lambda i: is_time_ordered(data_frame.columns[i]))
+    if time_col_idx is not None:
+        value_col_idx = find_column(["销售额", "收入", "利润", "数量", "库存", "价格"], ROLE_MEASURE)
+        if value_col_idx is not None:
+            groups["time"] = (time_col_idx, value_col_idx)
+    category_col_idx = find_column(["类别", "部门", "产品名称", "地区", "供应商"], ROLE_CATEGORY)
+    if category_col_idx is not None:
+        category_column = data_frame.columns[category_col_idx]
+        value_col_idx = find_column(["库存数量", "销售额", "数量", "人数"], ROLE_MEASURE,
+                                    accept=lambda i: category_column.distinct < category_column.non_null)
+        if value_col_idx is not None:
+            groups["category"] = (category_col_idx, value_col_idx)
+    return groups
+
+
+def generate_analysis_report(excel_content, frame=None, sketch=None):
     """
     【最终重构版】生成一个更智能、更专注、且总能包含图表的模拟分析报告。
+    frame 为同一份数据已构建好的 SheetFrame（未传入时按需构建），图表直接使用其列数组和表头角色，
+    列的类型、基数和统计量来自 profile_frame 的列概要（每列一次向量化统计），
+    anomalies 来自 detect_anomalies 的本地统计异常检测（anomaly_details 中带有单元格坐标）
+    合计行（总计、合计、Total 等）不参与列统计、图表和趋势，只参与异常检测；作图所用的列见 report_groups
+    sketch 为整张工作表的近似统计摘要（SheetSketch，超大工作表时传入）：记录数和列统计改用摘要，
+    图表和趋势改用摘要中的全表分组汇总（分组过多时退回已读入的行），均覆盖全表；
+    异常检测只基于已读入的行，摘要中会注明其行范围
     """
     try:
         data = excel_content.get('data', [])
         sheet_name = excel_content.get('sheet_name', 'Sheet1')
         
-        if not data or len(data) < 2:
+        if frame is None and data:
+            frame = SheetFrame.from_excel_content(excel_content)
+        if frame is None or frame.n_rows < 1:
             return {
                 "status": "success", "sheet_name": sheet_name,
                 "summary": "数据行数不足，无法进行有意义的分析。",
                 "insights": [], "trends": [], "anomalies": [], "visualization_data": []
             }
 
-        headers = data[0]
-        rows = data[1:]
+        headers = frame.headers
+        # 汇总统计使用去掉合计行的数据，避免与明细重复计算
+        data_frame = frame.without_summary_rows()
+        if sketch is not None:
+            summary_rows = sketch.summary_rows
+            row_count = sketch.n_rows - summary_rows
+        else:
+            summary_rows = frame.n_rows - data_frame.n_rows
+            row_count = data_frame.n_rows
+        profiles = sketch.profiles() if sketch is not None else profile_frame(data_frame)
+        anomalies = detect_anomalies(frame)
+        summary = f"该工作表包含{len(headers)}个字段和{row_count}条数据记录。"
+        if summary_rows:
+            summary += f"另有{summary_rows}行合计行，未计入统计。"
+        if sketch is not None:
+            summary += "数据量较大，各列统计为全表的流式近似估计。"
+        if frame.truncated or sketch is not None:
+            summary += f"异常检测基于前{frame.n_rows}行数据。"
         
         report = {
             "status": "success",
             "sheet_name": sheet_name,
-            "summary": f"该工作表包含{len(headers)}个字段和{len(rows)}条数据记录。",
+            "summary": summary,
             "insights": ["数据结构完整，适合进行初步分析。"],
             "trends": ["数据中未发现明显的时间或类别趋势。"],
-            "anomalies": ["未发现明显的数据异常。"],
+            "anomalies": [finding["message"] for finding in anomalies] or ["未发现明显的数据异常。"],
+            "anomaly_details": anomalies,
             "visualization_data": []
         }
 
         # --- 智能图表生成逻辑 (重构版) ---
         
-        # 辅助函数：尝试从行中安全地提取数值
-        def get_numeric_value(row, index):
-            try:
-                # 兼容带货币符号、百分号、逗号的字符串
-                val_str = str(row[index]).replace('%', '').replace('￥', '').replace('$', '').replace(',', '')
-                return float(val_str)
-            except (ValueError, IndexError, TypeError):
+        groups = report_groups(data_frame)
+
+        # 辅助函数：分组汇总的数据来源，优先使用摘要中的全表分组汇总（两列：分组列、数值列），
+        # 否则使用已读入的行；返回 (SheetFrame, 分组列下标, 数值列下标, 是否只覆盖已读入的行)
+        def group_source(key_idx, value_idx):
+            grouped = sketch.group_frame(key_idx, value_idx) if sketch is not None else None
+            if grouped is not None:
+                return grouped, 0, 1, False
+            return data_frame, key_idx, value_idx, frame.truncated or sketch is not None
+
+        def partial_note(partial):
+            if partial:
+                report["insights"].append(f"图表和趋势基于前{frame.n_rows}行数据。")
+
+        # 辅助函数：根据列概要生成数值列的统计洞察（近似模式下全表的类型可能与已读入的行不同）
+        def measure_insight(col_idx):
+            profile = profiles[col_idx]
+            if profile['kind'] != KIND_NUMBER:
                 return None
+            return (f"'{headers[col_idx]}'合计{profile['sum']:.2f}，平均{profile['mean']:.2f}，"
+                    f"范围{profile['min']:.2f} ~ {profile['max']:.2f}，中位数{profile['p50']:.2f}。")
+
+        def add_measure_insight(col_idx):
+            insight = measure_insight(col_idx)
+            if insight:
+                report["insights"].append(insight)
 
         # 1. 优先寻找时间序列数据来创建折线图
-        time_col_idx = -1
-        numeric_col_idx_for_time = -1
-        
-        for i, h in enumerate(headers):
-            if h in ['月份', '日期', '时间', '季度', '年份']:
-                time_col_idx = i
-                break
-        
-        if time_col_idx != -1:
-            for i, h in enumerate(headers):
-                if h in ["销售额", "收入", "利润", "数量", "库存", "价格"]:
-                    numeric_col_idx_for_time = i
-                    break
-        
-        if time_col_idx != -1 and numeric_col_idx_for_time != -1:
+        if groups["time"]:
+            time_col_idx, numeric_col_idx_for_time = groups["time"]
+            time_column = data_frame.columns[time_col_idx]
+            numeric_column = data_frame.columns[numeric_col_idx_for_time]
             chart_data = []
-            for row in rows:
-                time_val = row[time_col_idx]
-                numeric_val = get_numeric_value(row, numeric_col_idx_for_time)
-                if time_val is not None and numeric_val is not None:
-                    chart_data.append({"time": str(time_val), "value": numeric_val})
+            source, key_idx, value_idx, partial = group_source(time_col_idx, numeric_col_idx_for_time)
+            trend = analyze_trend(source, key_idx, value_idx)
+            if trend:
+                # 按时间排序、同一期汇总后的序列
+                chart_data = [{"time": label, "value": value} for label, value in trend["series"]]
+            elif numeric_column.kind == KIND_NUMBER:
+                partial = frame.truncated or sketch is not None
+                rows = np.flatnonzero(numeric_column.valid & ~time_column.mask)
+                chart_data = [
+                    {"time": label, "value": value}
+                    for label, value in zip(time_column.texts(rows), numeric_column.values[rows].tolist())
+                ]
             
             if chart_data:
                 report["visualization_data"].append({
@@ -363,32 +1076,27 @@ def generate_analysis_report(excel_content):
                     "data": chart_data,
                     "x_axis": "time", "y_axis": "value"
                 })
-                report["trends"] = [f"数据显示了'{headers[numeric_col_idx_for_time]}'随'{headers[time_col_idx]}'变化的明显趋势。"]
+                if trend:
+                    report["trends"] = trend["messages"]
+                    report["trend_details"] = trend
+                else:
+                    report["trends"] = [f"数据显示了'{headers[numeric_col_idx_for_time]}'随'{headers[time_col_idx]}'变化的明显趋势。"]
+                add_measure_insight(numeric_col_idx_for_time)
+                partial_note(partial)
                 # 成功生成图表后，直接返回报告
                 return report
 
         # 2. 如果没有时间序列，再寻找类别数据来创建饼图或柱状图
-        category_col_idx = -1
-        numeric_col_idx_for_cat = -1
-        
-        for i, h in enumerate(headers):
-            if h in ["类别", "部门", "产品名称", "地区", "供应商"]:
-                category_col_idx = i
-                break
-        
-        if category_col_idx != -1:
-            for i, h in enumerate(headers):
-                if h in ["库存数量", "销售额", "数量", "人数"]:
-                    numeric_col_idx_for_cat = i
-                    break
-        
-        if category_col_idx != -1 and numeric_col_idx_for_cat != -1:
-            chart_data_map = {}
-            for row in rows:
-                category = row[category_col_idx]
-                numeric_val = get_numeric_value(row, numeric_col_idx_for_cat)
-                if category is not None and numeric_val is not None:
-                    chart_data_map[str(category)] = chart_data_map.get(str(category), 0) + numeric_val
+        if groups["category"] and data_frame.columns[groups["category"][1]].kind == KIND_NUMBER:
+            category_col_idx, numeric_col_idx_for_cat = groups["category"]
+            # 按类别编码一次性汇总（类别按首次出现的顺序）
+            source, key_idx, value_idx, partial = group_source(category_col_idx, numeric_col_idx_for_cat)
+            codes, categories = source.columns[key_idx].factorize()
+            numeric_column = source.columns[value_idx]
+            selected = (codes >= 0) & numeric_column.valid
+            sums = np.bincount(codes[selected], weights=numeric_column.values[selected], minlength=len(categories))
+            present = np.bincount(codes[selected], minlength=len(categories)) > 0
+            chart_data_map = {str(categories[i]): float(sums[i]) for i in np.flatnonzero(present)}
             
             # 如果类别少于7个，用饼图更合适
             if 1 < len(chart_data_map) < 7:
@@ -408,6 +1116,8 @@ def generate_analysis_report(excel_content):
             
             if report["visualization_data"]:
                 report["insights"].append(f"数据中'{headers[category_col_idx]}'和'{headers[numeric_col_idx_for_cat]}'存在显著关联，建议关注其分布情况。")
+                add_measure_insight(numeric_col_idx_for_cat)
+                partial_note(partial)
                 return report
 
         # 3. 【备用方案】如果以上所有智能分析都失败了，生成一个最基础的概览图表
@@ -416,7 +1126,7 @@ def generate_analysis_report(excel_content):
             "title": "数据基础概览",
             "data": [
                 {"name": "总字段数 (列)", "value": len(headers)},
-                {"name": "总记录数 (行)", "value": len(rows)}
+                {"name": "总记录数 (行)", "value": row_count}
             ],
             "x_axis": "name",
             "y_axis": "value"
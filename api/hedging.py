@@ -0,0 +1,101 @@
+import asyncio
+from collections import deque
+
+from .llm_client import LLMError
+
+
+class DeadlineExceededError(LLMError):
+    """
+    LLM调用超出了接口的截止时间
+    """
+    pass
+
+
+class ClientDisconnectedError(Exception):
+    """
+    等待LLM结果期间客户端已断开连接
+    """
+    pass
+
+
+class LatencyTracker:
+    """
+    按接口记录最近的上游调用耗时，用于计算对冲请求的触发时间（如p95）
+    """
+
+    def __init__(self, window_size=200, min_samples=20):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._samples = {}
+
+    def record(self, key, seconds):
+        self._samples.setdefault(key, deque(maxlen=self.window_size)).append(seconds)
+
+    def quantile(self, key, q):
+        """
+        返回最近耗时的分位数；样本不足时返回 None
+        """
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def hedged_call(fn, hedge_delay):
+    """
+    对冲请求：先发出 fn()，若 hedge_delay 秒内未完成则再发一个相同的请求，
+    取先成功的结果并取消另一个。hedge_delay 为 None 时不对冲。
+    返回 (result, winner)，winner 为 "primary" 或 "hedge"
+    """
+    primary = asyncio.ensure_future(fn())
+    if hedge_delay is None:
+        return await primary, "primary"
+
+    tasks = {primary: "primary"}
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if not done:
+            tasks[asyncio.ensure_future(fn())] = "hedge"
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), tasks[task]
+        # 所有请求都失败，抛出首个请求的异常
+        raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # 标记异常已读取，避免未被选中的失败请求产生警告
+                task.exception()
+
+
+async def run_with_deadline(coro, deadline, http_request=None, poll_interval=0.5):
+    """
+    在截止时间（秒）内执行协程，超时取消并抛出 DeadlineExceededError
+    传入 http_request 时每隔 poll_interval 秒检查一次客户端是否已断开，
+    断开则取消调用并抛出 ClientDisconnectedError
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline if deadline else None
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            timeout = poll_interval if http_request is not None else None
+            if deadline_at is not None:
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"LLM调用超出截止时间 {deadline} 秒")
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if http_request is not None and await http_request.is_disconnected():
+                raise ClientDisconnectedError("客户端已断开连接")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from .logger_config import llm_logger
+
+# Redis 为可选依赖：未安装或未配置地址时只使用进程内缓存
+try:
+    from redis import asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+def make_cache_key(payload):
+    """
+    根据 model、messages、temperature、max_tokens 计算请求指纹
+    """
+    canonical = json.dumps(
+        {
+            "model": payload.get("model"),
+            "messages": payload.get("messages"),
+            "temperature": payload.get("temperature"),
+            "max_tokens": payload.get("max_tokens")
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级LLM响应缓存
+    - 第一级：进程内 LRU，按条目数限制大小
+    - 第二级：Redis，多个 worker 共享，按 TTL 过期
+    """
+
+    # Redis 出错后暂停访问的时间（秒），避免每个请求都等待一次连接失败
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, enabled=True, ttl=3600, max_entries=1024, redis_url="",
+                 key_prefix="excelgenius:llm:", on_evict=None):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_prefix = key_prefix
+        self.on_evict = on_evict
+        self._memory = OrderedDict()
+        self._redis = None
+        self._redis_disabled_until = 0.0
+        if enabled and redis_url:
+            if HAS_REDIS:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+            else:
+                llm_logger.warning("已配置CACHE_REDIS_URL，但未安装redis库，仅使用进程内缓存")
+
+    def _evicted(self, reason):
+        if self.on_evict:
+            self.on_evict(reason)
+
+    def _redis_available(self):
+        return self._redis is not None and time.time() >= self._redis_disabled_until
+
+    def _redis_failed(self, e):
+        llm_logger.warning(f"LLM缓存访问Redis失败，{self.REDIS_RETRY_INTERVAL}秒内跳过Redis: {e!r}")
+        self._redis_disabled_until = time.time() + self.REDIS_RETRY_INTERVAL
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._memory[key]
+            self._evicted("expired")
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key, value, ttl):
+        self._memory[key] = (time.time() + ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evicted("capacity")
+
+    async def get(self, key):
+        """
+        查询缓存，返回 (value, tier)；未命中时返回 (None, None)
+        """
+        if not self.enabled:
+            return None, None
+
+        value = self._memory_get(key)
+        if value is not None:
+            return value, "memory"
+
+        if self._redis_available():
+            try:
+                raw = await self._redis.get(self.key_prefix + key)
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw:
+                value = json.loads(raw)
+                # 回填进程内缓存，剩余有效期取 Redis 中的 TTL
+                try:
+                    remaining = await self._redis.ttl(self.key_prefix + key)
+                except Exception:
+                    remaining = self.ttl
+                self._memory_set(key, value, remaining if remaining and remaining > 0 else self.ttl)
+                return value, "redis"
+
+        return None, None
+
+    async def set(self, key, value):
+        """
+        写入两级缓存
+        """
+        if not self.enabled:
+            return
+        self._memory_set(key, value, self.ttl)
+        if self._redis_available():
+            try:
+                await self._redis.setex(self.key_prefix + key, self.ttl, json.dumps(value, ensure_ascii=False))
+            except Exception as e:
+                self._redis_failed(e)
+
+    def __len__(self):
+        return len(self._memory)
+
+    async def aclose(self):
+        if self._redis is not None:
+            # redis>=5 提供 aclose()，旧版本只有 close()
+            close = getattr(self._redis, "aclose", None) or self._redis.close
+            await close()
@@ -0,0 +1,218 @@
+import json
+
+import numpy as np
+
+from .anomaly_detector import anomalies_for_prompt, anomaly_rows, detect_anomalies
+from .column_profile import profile_frame
+from .sheet_frame import KIND_DATE, KIND_NUMBER, KIND_TEXT, SheetFrame
+from .token_estimator import estimate_tokens
+
+
+def _short(value, max_len=40):
+    """
+    截断过长的单元格文本，避免单个单元格占用大量token
+    """
+    if isinstance(value, str) and len(value) > max_len:
+        return value[:max_len] + '…'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def profile_columns(frame, top_k=5, column_profiles=None):
+    """
+    为每一列生成发送给大模型的类型和统计概要（由 column_profile 的列概要裁剪而来）
+    column_profiles 为已有的列概要（如 SheetSketch.profiles() 的近似概要），为空时使用 profile_frame(frame)
+    """
+    profiles = []
+    for column_profile in (column_profiles if column_profiles is not None else profile_frame(frame)):
+        profile = {
+            "name": column_profile["name"],
+            "non_null": column_profile["non_null"],
+            "nulls": column_profile["nulls"],
+            "distinct": column_profile["distinct"],
+            "type": column_profile["type"]
+        }
+        if column_profile["kind"] == KIND_NUMBER:
+            for key in ("min", "max", "mean", "std", "p25", "p50", "p75"):
+                profile[key] = round(column_profile[key], 4)
+        elif column_profile["kind"] == KIND_DATE:
+            profile.update({"min": column_profile["min"], "max": column_profile["max"]})
+        elif column_profile["kind"] == KIND_TEXT:
+            counts = {}
+            for value, count in column_profile["top"]:
+                key = _short(str(value))
+                counts[key] = counts.get(key, 0) + count
+            top = sorted(counts.items(), key=lambda item: -item[1])[:top_k]
+            profile["top"] = [[k, c] for k, c in top]
+        profiles.append(profile)
+    return profiles
+
+
+def _evenly_spaced(indices, k):
+    if k >= len(indices):
+        return list(indices)
+    if k <= 0:
+        return []
+    if k == 1:
+        return [indices[0]]
+    step = (len(indices) - 1) / (k - 1)
+    return [indices[int(round(i * step))] for i in range(k)]
+
+
+def stratified_sample(frame, profiles, k):
+    """
+    分层抽样：若存在低基数的类别列，则按类别分层、按占比分配名额（每层至少一行）；
+    否则在整个表中等间距抽样，保证开头、中间、结尾都有代表
+    """
+    n_rows = frame.n_rows
+    if k >= n_rows:
+        return list(range(n_rows))
+
+    strata_col = None
+    for col_idx, profile in enumerate(profiles):
+        if profile["type"] == "文本" and 2 <= profile["distinct"] <= min(20, k):
+            if strata_col is None or profile["distinct"] < profiles[strata_col]["distinct"]:
+                strata_col = col_idx
+
+    if strata_col is None:
+        return _evenly_spaced(list(range(n_rows)), k)
+
+    codes, _ = frame.columns[strata_col].factorize()
+    picked = []
+    for code in np.unique(codes):
+        indices = np.flatnonzero(codes == code).tolist()
+        quota = max(1, int(round(k * len(indices) / n_rows)))
+        picked.extend(_evenly_spaced(indices, quota))
+    return _evenly_spaced(sorted(picked), k)
+
+
+def find_outlier_rows(frame, profiles, k):
+    """
+    找出数值列中偏离最大的行（|z| > 3 或超出 1.5 倍四分位距），按偏离程度取前k行
+    """
+    scores = np.zeros(frame.n_rows)
+    flagged = np.zeros(frame.n_rows, dtype=bool)
+    for column, profile in zip(frame.columns, profiles):
+        if profile["type"] != "数值" or not profile["std"]:
+            continue
+        iqr = profile["p75"] - profile["p25"]
+        low, high = profile["p25"] - 1.5 * iqr, profile["p75"] + 1.5 * iqr
+        values = np.where(column.valid, column.values, profile["mean"])
+        z = np.abs(values - profile["mean"]) / profile["std"]
+        hit = column.valid & ((z > 3) | ((values < low) | (values > high) if iqr > 0 else False))
+        flagged |= hit
+        scores = np.where(hit, np.maximum(scores, z), scores)
+    candidates = np.flatnonzero(flagged)
+    ranked = candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+    return sorted(int(idx) for idx in ranked)
+
+
+def build_analysis_prompt(excel_content, token_budget=6000, sample_rows=40, outlier_rows=10, frame=None, anomalies=False,
+                          sketch=None):
+    """
+    构造发送给大模型的分析数据：表头 + 列统计概要 + 分层抽样行 + 异常值行，总量控制在token预算内
+    数据本身不超过预算时直接发送完整数据
+    frame 为同一份数据已构建好的 SheetFrame（未传入时按需构建）
+    anomalies 为 True 时附上本地异常检测的结果（detected_anomalies，含单元格坐标），
+    异常值行改为这些异常所在的行，大模型只需解释异常而不必自己查找
+    sketch 为整张工作表的近似统计摘要（SheetSketch）：总是发送压缩后的数据，列统计概要来自摘要（覆盖全表），
+    抽样行改为全表的均匀抽样行
+    返回 (prompt_text, stats)，stats 中包含原始/压缩后的token估算和压缩比
+    """
+    data = excel_content.get('data', []) or []
+    if not isinstance(data, list):
+        # 也接受行迭代器（如 ExcelUtils.iter_excel_rows 的结果）
+        data = list(data)
+    sheet_name = excel_content.get('sheet_name', 'Sheet1')
+    # 读取时被截断的表格，使用工作表的真实尺寸
+    truncated = bool(excel_content.get('truncated'))
+    total_rows = max(excel_content.get('total_rows', len(data)) - 1, 0) if truncated else max(len(data) - 1, 0)
+    if sketch is not None:
+        total_rows = sketch.n_rows
+    total_columns = excel_content.get('total_cols') if truncated else None
+    findings = []
+    if anomalies and len(data) >= 2:
+        if frame is None:
+            frame = SheetFrame.from_rows(data, sheet_name=sheet_name)
+        findings = detect_anomalies(frame)
+    detected = anomalies_for_prompt(findings)
+    full_payload = {"sheet_name": sheet_name, "data": data}
+    if truncated:
+        full_payload.update({
+            "total_rows": total_rows,
+            "total_columns": total_columns,
+            "note": f"表格共{total_rows}行数据，这里只包含前{max(len(data) - 1, 0)}行"
+        })
+    if detected:
+        full_payload["detected_anomalies"] = detected
+    full_text = json.dumps(full_payload, ensure_ascii=False, default=str)
+    original_tokens = estimate_tokens(full_text)
+
+    if (original_tokens <= token_budget or len(data) < 2) and sketch is None:
+        return full_text, {
+            "original_tokens": original_tokens,
+            "prompt_tokens": original_tokens,
+            "compression_ratio": 1.0,
+            "sampled_rows": max(len(data) - 1, 0),
+            "outlier_rows": 0
+        }
+
+    if frame is None:
+        frame = SheetFrame.from_rows(data, sheet_name=sheet_name)
+    headers = frame.headers
+    profiles = profile_columns(frame, column_profiles=sketch.profiles() if sketch is not None else None)
+    note = "数据量较大，仅提供列统计概要、分层抽样行和异常值行；每行第一个值为Excel行号"
+    if sketch is not None:
+        # 全表均匀抽样的行（按行号排序）
+        sketch_rows = list(zip(*sketch.sample.sorted_rows()))
+        note = ("数据量较大，列统计概要为全表的流式近似估计（分位数来自 t-digest，不同取值数来自 HyperLogLog），"
+                "抽样行为全表的均匀抽样，另附异常值行；每行第一个值为Excel行号")
+    if anomalies:
+        outlier_candidates = anomaly_rows(findings)[:outlier_rows]
+    else:
+        outlier_candidates = find_outlier_rows(frame, profiles, outlier_rows)
+
+    def render(sample_k, outlier_k):
+        # 行号使用Excel中的实际行号（表头为第1行）
+        if sketch is not None:
+            sample = [[int(number) + 2] + [_short(v) for v in row] for number, row in _evenly_spaced(sketch_rows, sample_k)]
+        else:
+            sample = [[idx + 2] + [_short(v) for v in frame.row(idx)] for idx in stratified_sample(frame, profiles, sample_k)]
+        if anomalies:
+            outlier_idx = sorted(outlier_candidates[:outlier_k])
+        else:
+            outlier_idx = outlier_candidates if outlier_k >= outlier_rows else find_outlier_rows(frame, profiles, outlier_k)
+        outliers = [[idx + 2] + [_short(v) for v in frame.row(idx)] for idx in outlier_idx]
+        payload = {
+            "sheet_name": sheet_name,
+            "total_rows": total_rows,
+            "total_columns": total_columns or len(headers),
+            "headers": headers,
+            "column_profiles": profiles,
+            "sample_rows": sample,
+            "outlier_rows": outliers,
+            "note": note
+        }
+        if detected:
+            payload["detected_anomalies"] = detected
+        return json.dumps(payload, ensure_ascii=False, default=str), len(sample), len(outliers)
+
+    # 逐步减少样本和异常行数量，直到满足预算
+    sample_k, outlier_k = sample_rows, outlier_rows
+    prompt_text, sampled, outliers = render(sample_k, outlier_k)
+    while estimate_tokens(prompt_text) > token_budget and (sample_k > 0 or outlier_k > 0):
+        if sample_k > 0:
+            sample_k //= 2
+        else:
+            outlier_k //= 2
+        prompt_text, sampled, outliers = render(sample_k, outlier_k)
+
+    prompt_tokens = estimate_tokens(prompt_text)
+    return prompt_text, {
+        "original_tokens": original_tokens,
+        "prompt_tokens": prompt_tokens,
+        "compression_ratio": round(original_tokens / max(prompt_tokens, 1), 2),
+        "sampled_rows": sampled,
+        "outlier_rows": outliers
+    }
@@ -0,0 +1,224 @@
+import asyncio
+import time
+from collections import deque
+
+from .llm_client import LLMError
+
+
+class CircuitOpenError(LLMError):
+    """
+    熔断器处于打开状态，请求未发送到上游
+    """
+    pass
+
+
+class LLMOverloadedError(LLMError):
+    """
+    上游并发已达到自适应上限，且在排队时间内没有空出名额
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    基于滑动窗口的熔断器：同时统计错误率和慢调用率
+
+    - closed：正常放行，窗口内调用数达到 min_calls 且错误率或慢调用率超过阈值时打开
+    - open：直接拒绝，open_seconds 秒后进入 half_open
+    - half_open：只放行少量探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    # 导出为 Prometheus 指标时使用的数值
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, window_size=20, min_calls=10, failure_rate_threshold=0.5,
+                 slow_call_seconds=20.0, slow_call_rate_threshold=0.8,
+                 open_seconds=30.0, half_open_max_calls=1):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._window = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    @property
+    def state_value(self):
+        return self.STATE_VALUES[self.state]
+
+    def allow_request(self):
+        """
+        判断是否放行本次请求；half_open 状态下会占用一个探测名额
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        return False
+
+    def cancel(self):
+        """
+        调用方取消了请求：归还 half_open 状态下占用的探测名额
+        """
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._window.clear()
+
+    def record(self, success, latency):
+        """
+        记录一次上游调用的结果和耗时
+        """
+        if self._state == self.HALF_OPEN:
+            if success and latency < self.slow_call_seconds:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self._window.append((success, latency >= self.slow_call_seconds))
+        if len(self._window) < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self._window if not ok)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        if (failures / len(self._window) >= self.failure_rate_threshold
+                or slow / len(self._window) >= self.slow_call_rate_threshold):
+            self._open()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发上限
+    - 调用成功且耗时低于目标：上限加性增长（每累计约 limit 次成功 +1）
+    - 调用失败或超出目标耗时：上限乘性减小
+    名额不足时最多排队 queue_timeout 秒，超时则拒绝
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=200,
+                 latency_target=15.0, backoff_ratio=0.5, queue_timeout=2.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._condition = None
+
+    def _get_condition(self):
+        # 延迟创建，保证绑定到运行中的事件循环
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    async def acquire(self):
+        """
+        获取一个并发名额，返回是否成功
+        """
+        if self.in_flight < self.current_limit:
+            self.in_flight += 1
+            return True
+        condition = self._get_condition()
+        async with condition:
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.in_flight < self.current_limit),
+                    timeout=self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                return False
+            self.in_flight += 1
+            return True
+
+    async def release(self, success, latency, adjust=True):
+        """
+        释放名额，并根据本次调用结果调整上限（adjust=False 时只释放不调整）
+        """
+        self.in_flight -= 1
+        if adjust:
+            if success and latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            else:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+
+class UpstreamGuard:
+    """
+    把熔断器和自适应并发上限组合在一起，包住每一次上游调用
+
+        async with guard.call():
+            ...  # 调用DeepSeek，异常视为失败
+    """
+
+    def __init__(self, breaker, limiter):
+        self.breaker = breaker
+        self.limiter = limiter
+
+    def call(self):
+        return _GuardedCall(self)
+
+
+class _GuardedCall:
+    def __init__(self, guard):
+        self.guard = guard
+        self.start = 0.0
+        self.first_byte = None
+
+    def mark_first_byte(self):
+        """
+        流式调用收到首个数据块时调用，之后以首包耗时作为本次调用的延迟
+        """
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+
+    async def __aenter__(self):
+        if not self.guard.breaker.allow_request():
+            raise CircuitOpenError("DeepSeek熔断器已打开，直接使用降级结果")
+        if not await self.guard.limiter.acquire():
+            self.guard.breaker.cancel()
+            raise LLMOverloadedError("DeepSeek并发已达到自适应上限，直接使用降级结果")
+        self.start = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        latency = (self.first_byte or time.monotonic()) - self.start
+        # 调用方主动取消（例如客户端断开）不算上游失败，也不调整上限
+        if exc_type is not None and issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            self.guard.breaker.cancel()
+            await self.guard.limiter.release(False, latency, adjust=False)
+            return False
+        success = exc_type is None
+        self.guard.breaker.record(success, latency)
+        await self.guard.limiter.release(success, latency)
+        return False
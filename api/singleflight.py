@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    合并相同的在途请求：同一个 key 同时只执行一次，其余调用方等待同一个结果
+
+    实际工作在独立的 Task 中执行，并通过 asyncio.shield 等待，
+    因此某个调用方被取消（例如客户端断开）不会影响其他等待同一结果的请求；
+    所有调用方都取消后，实际工作也随之取消，不再占用上游资源。
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 标记异常已被读取，避免所有调用方都已取消时出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, fn):
+        """
+        执行 fn()（返回协程的函数），返回 (result, shared)
+        shared 为 True 表示本次调用复用了其他请求的结果
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # 最后一个调用方也已取消
+                    task.cancel()
+
+    def __len__(self):
+        return len(self._inflight)
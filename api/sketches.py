@@ -0,0 +1,596 @@
+import hashlib
+from itertools import zip_longest
+
+import numpy as np
+
+from .column_profile import DEFAULT_TOP_K, QUANTILES, TYPE_LABELS, _plain
+from .sheet_frame import KIND_DATE, KIND_EMPTY, KIND_NUMBER, KIND_TEXT, Column, SheetFrame, infer_role, summary_flags
+
+# t-digest 的压缩参数：越大越精确，质心数约为 compression / 2
+TDIGEST_COMPRESSION = 200
+# HyperLogLog 的寄存器数为 2 ** HLL_PRECISION（每列 16KB），相对误差约 1.04 / sqrt(2 ** p)（p=14 时约 0.8%）
+HLL_PRECISION = 14
+# 不同取值不超过该数量时保留精确的哈希集合，低基数列（部门、性别等）的计数是精确的
+HLL_EXACT_LIMIT = 1024
+# 每列保留的高频取值计数器个数，不少于报告中展示的 top_k
+TOP_CAPACITY = 64
+# 均匀抽样保留的行数（用于构造提示词）
+SAMPLE_ROWS = 500
+# 流式读取时每次按列解析的行数
+CHUNK_ROWS = 50000
+# 分组汇总保留的最大分组数，超过后放弃该分组（图表和趋势退回到已读入的行）
+GROUP_CAPACITY = 20000
+
+_DATE_SALT = np.uint64(0x5DEECE66D)
+
+
+def _mix64(x):
+    """
+    把 64 位整数打散为均匀分布的哈希值（两轮 splitmix64 混合；
+    保留两位小数的金额等浮点数的位模式很有规律，只混合一轮时 HyperLogLog 会偏高约 2%）
+    """
+    x = x.astype(np.uint64)
+    for _ in range(2):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return x
+
+
+def hash_numbers(values):
+    # 加 0.0 把 -0.0 变为 0.0，两者哈希相同
+    return _mix64((np.asarray(values, dtype=float) + 0.0).view(np.uint64))
+
+
+def hash_dates(values):
+    return _mix64(np.asarray(values).astype('datetime64[s]').astype(np.int64).view(np.uint64) ^ _DATE_SALT)
+
+
+def hash_texts(values):
+    """
+    文本的 64 位哈希（blake2b，与进程无关，缓存到磁盘的摘要在重启后仍能合并）
+    """
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(v).encode('utf-8'), digest_size=8).digest(), 'little') for v in values),
+        dtype=np.uint64, count=len(values)
+    )
+
+
+class TDigest:
+    """
+    合并式 t-digest：用少量带权质心近似数值分布，估计分位数和累计分布
+    质心按 k1 尺度函数合并（两端的质心更小，尾部更精确）；整块数据一次性并入，两个 t-digest 可以直接合并
+    """
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(values.size)]))
+        return self
+
+    def merge(self, other):
+        if other.weights.size:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means, weights):
+        # 质心中心所在的分位数映射到 k 尺度，同一个整数区间内的质心合并为一个
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        centers = (np.cumsum(weights) - weights / 2) / weights.sum()
+        scale = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * centers - 1))
+        _, groups = np.unique(scale, return_inverse=True)
+        self.weights = np.bincount(groups, weights=weights)
+        self.means = np.bincount(groups, weights=means * weights) / self.weights
+
+    def quantile(self, qs):
+        """
+        分位数（质心之间线性插值；所有质心都是单个值时与 np.quantile 的默认方法一致）
+        """
+        qs = np.asarray(qs, dtype=float)
+        if not self.weights.size:
+            return np.full(qs.shape, np.nan)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # 最小值和最大值分别固定在第一个和最后一个值的位置上，q=0 和 q=1 时恰好取到
+        positions = np.concatenate([[0.5], centers, [total - 0.5]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(qs * (total - 1) + 0.5, positions, values)
+
+    def rank(self, x):
+        """
+        小于等于 x 的值的个数的估计
+        """
+        x = np.asarray(x, dtype=float)
+        if not self.weights.size:
+            return np.zeros(x.shape)
+        # 质心均值处约有一半权重小于等于它；另加 0.5 使单个值的质心恰好计入自身
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2 + 0.5
+        points = np.concatenate([[self.min], self.means, [self.max]])
+        ranks = np.interp(x, points, np.concatenate([[1.0], centers, [total]]))
+        return np.where(x < self.min, 0.0, np.where(x >= self.max, total, ranks))
+
+
+class HyperLogLog:
+    """
+    不同取值个数的 HyperLogLog 估计，输入为 64 位哈希值；
+    不同取值较少时同时保留精确的哈希集合，超过 HLL_EXACT_LIMIT 后只保留寄存器
+    """
+    def __init__(self, precision=HLL_PRECISION):
+        # 余下的 64 - precision 位要能精确转为浮点数，precision 至少为 11
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        self.exact = np.empty(0, dtype=np.uint64)
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not hashes.size:
+            return self
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, hashes)
+            if self.exact.size > HLL_EXACT_LIMIT:
+                self.exact = None
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # 余下位中第一个 1 的位置（从高位数起，全 0 时为 bits + 1）
+        _, bit_length = np.frexp(rest.astype(float))
+        np.maximum.at(self.registers, index, (bits + 1 - bit_length).astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self.exact is not None and other.exact is not None:
+            self.exact = np.union1d(self.exact, other.exact)
+            if self.exact.size > HLL_EXACT_LIMIT:
+                self.exact = None
+        else:
+            self.exact = None
+        return self
+
+    def count(self):
+        if self.exact is not None:
+            return int(self.exact.size)
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # 小基数时改用线性计数
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """
+    高频取值摘要（可合并的 Misra-Gries / Space-Saving 计数器）：最多保留 capacity 个计数器，
+    出现次数超过 总数 / (capacity + 1) 的取值一定会保留，每个计数的低估量不超过 error
+    不同取值不超过 capacity 时计数是精确的
+    """
+    def __init__(self, capacity=TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+
+    def _threshold(self, counts):
+        # 第 capacity + 1 大的计数，所有计数器都减去它后最多剩下 capacity 个
+        if counts.size <= self.capacity:
+            return 0
+        return int(np.partition(counts, -(self.capacity + 1))[-(self.capacity + 1)])
+
+    def update(self, keys, counts):
+        """
+        并入一块数据的 (取值, 次数)：先把这一块裁剪为 capacity 个计数器，再与已有的计数器合并
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        threshold = self._threshold(counts)
+        kept = np.flatnonzero(counts > threshold)
+        self.error += threshold
+        for i, count in zip(kept.tolist(), (counts[kept] - threshold).tolist()):
+            key = keys[i]
+            self.counts[key] = self.counts.get(key, 0) + count
+        self._prune()
+        return self
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.error += other.error
+        self._prune()
+        return self
+
+    def _prune(self):
+        threshold = self._threshold(np.fromiter(self.counts.values(), dtype=np.int64, count=len(self.counts)))
+        if threshold:
+            self.counts = {key: count - threshold for key, count in self.counts.items() if count > threshold}
+            self.error += threshold
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+
+
+class RowSample:
+    """
+    行的均匀抽样：每行分配一个随机优先级，保留优先级最小的 size 行（与逐行的蓄水池抽样等价），
+    可以整块更新；两个样本合并后仍是合并后数据的均匀样本
+    """
+    def __init__(self, size=SAMPLE_ROWS, seed=None):
+        self.size = size
+        self.keys = np.empty(0)
+        self.row_numbers = np.empty(0, dtype=np.int64)
+        self.rows = []
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, rows, row_numbers):
+        keys = self._rng.random(len(rows))
+        picked = np.arange(len(rows))
+        if self.keys.size >= self.size:
+            picked = picked[keys < self.keys.max()]
+        if picked.size > self.size:
+            picked = picked[np.argpartition(keys[picked], self.size - 1)[:self.size]]
+        row_numbers = np.asarray(row_numbers, dtype=np.int64)
+        return self._add(keys[picked], row_numbers[picked], [list(rows[i]) for i in picked.tolist()])
+
+    def merge(self, other, row_offset=0, remap=None):
+        """
+        并入另一个样本；row_offset 加到对方的行号上，remap 为把对方的行重排为本样本列顺序的函数
+        """
+        rows = other.rows if remap is None else [remap(row) for row in other.rows]
+        return self._add(other.keys, other.row_numbers + row_offset, rows)
+
+    def _add(self, keys, row_numbers, rows):
+        keys = np.concatenate([self.keys, keys])
+        row_numbers = np.concatenate([self.row_numbers, row_numbers])
+        rows = self.rows + rows
+        if keys.size > self.size:
+            kept = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, row_numbers, rows = keys[kept], row_numbers[kept], [rows[i] for i in kept.tolist()]
+        self.keys, self.row_numbers, self.rows = keys, row_numbers, rows
+        return self
+
+    def sorted_rows(self):
+        """
+        按行号排序的 (行号数组, 行列表)
+        """
+        order = np.argsort(self.row_numbers, kind='stable')
+        return self.row_numbers[order], [self.rows[i] for i in order.tolist()]
+
+
+class GroupSums:
+    """
+    按一列（key_idx，时间或类别）的取值对另一列（value_idx）的数值流式求和，分组按首次出现的顺序保存
+    日期按天分组；不同取值超过 capacity 时不再累计（overflow 为 True）
+    """
+    def __init__(self, key_idx, value_idx, capacity=GROUP_CAPACITY):
+        self.key_idx = key_idx
+        self.value_idx = value_idx
+        self.capacity = capacity
+        self.sums = {}
+        self.overflow = False
+
+    def update(self, key_column, value_column):
+        if self.overflow or value_column.kind != KIND_NUMBER:
+            return
+        rows = np.flatnonzero(value_column.valid & ~key_column.mask)
+        if key_column.kind == KIND_TEXT:
+            codes, keys = key_column.codes[rows], key_column.categories.tolist()
+        elif key_column.kind in (KIND_DATE, KIND_NUMBER):
+            if key_column.kind == KIND_NUMBER:
+                rows = rows[key_column.valid[rows]]
+            keyed = key_column.values[rows]
+            if key_column.kind == KIND_DATE:
+                keyed = keyed.astype('datetime64[D]')
+            unique, codes = np.unique(keyed, return_inverse=True)
+            keys = unique.tolist()
+        else:
+            return
+        codes = codes.reshape(-1)
+        sums = np.bincount(codes, weights=value_column.values[rows], minlength=len(keys))
+        for code in np.flatnonzero(np.bincount(codes, minlength=len(keys))):
+            key = keys[code]
+            self.sums[key] = self.sums.get(key, 0.0) + float(sums[code])
+        self._check()
+
+    def merge(self, other):
+        if other.overflow:
+            self.overflow = True
+        if not self.overflow:
+            for key, total in other.sums.items():
+                self.sums[key] = self.sums.get(key, 0.0) + total
+        self._check()
+
+    def _check(self):
+        if len(self.sums) > self.capacity:
+            self.overflow = True
+        if self.overflow:
+            self.sums = {}
+
+
+class ColumnSketch:
+    """
+    一列的流式统计摘要：计数、数值的和/均值/方差（可合并的矩）、t-digest 分位数、
+    HyperLogLog 不同取值数和高频取值；每块数据先按 Column.from_cells 的规则解析，再并入摘要
+    各块推断的类型可能不同（如前几块全是数值），最终类型取非空单元格最多的类型，统计量只来自该类型的块
+    """
+    def __init__(self, name, length=0):
+        self.name = name
+        self.length = length
+        self.non_null = 0
+        self.kind_counts = {}
+        self.tops = {}
+        self.digest = TDigest()
+        self.distinct_sketch = HyperLogLog()
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.date_min = None
+        self.date_max = None
+        self.role = None
+
+    @property
+    def kind(self):
+        if not self.kind_counts:
+            return KIND_EMPTY
+        return max(self.kind_counts, key=self.kind_counts.get)
+
+    @property
+    def distinct(self):
+        return self.distinct_sketch.count()
+
+    def _top(self, kind):
+        return self.tops.setdefault(kind, TopK())
+
+    def _add_moments(self, count, total, mean, m2):
+        # 并行方差公式（Chan 等），两组的均值和二阶中心矩合并
+        if not count:
+            return
+        combined = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / combined
+        self.mean += delta * count / combined
+        self.count = combined
+        self.sum += total
+
+    def update(self, column):
+        """
+        并入一块已按列解析的数据（Column）
+        """
+        self.length += column.length
+        non_null = column.non_null
+        self.non_null += non_null
+        if column.kind == KIND_EMPTY:
+            return self
+        self.kind_counts[column.kind] = self.kind_counts.get(column.kind, 0) + non_null
+        if column.kind == KIND_NUMBER:
+            numbers = column.values[column.valid]
+            if numbers.size:
+                mean = float(numbers.mean())
+                self._add_moments(numbers.size, float(numbers.sum()), mean, float(((numbers - mean) ** 2).sum()))
+                self.digest.update(numbers)
+                uniques, counts = np.unique(numbers, return_counts=True)
+                self.distinct_sketch.update(hash_numbers(uniques))
+                self._top(KIND_NUMBER).update(uniques.tolist(), counts)
+            if column.labels is not None:
+                # 无法解析的值（如 '暂无'）计入不同取值数，不计入高频取值
+                unparsed = column.labels[~column.mask & ~column.valid]
+                if unparsed.size:
+                    self.distinct_sketch.update(hash_texts(sorted(set(map(str, unparsed)))))
+        elif column.kind == KIND_DATE:
+            uniques, counts = np.unique(column.values[~column.mask], return_counts=True)
+            self.date_min = uniques[0] if self.date_min is None else min(self.date_min, uniques[0])
+            self.date_max = uniques[-1] if self.date_max is None else max(self.date_max, uniques[-1])
+            self.distinct_sketch.update(hash_dates(uniques))
+            self._top(KIND_DATE).update(uniques.astype(np.int64).tolist(), counts)
+        elif column.kind == KIND_TEXT:
+            counts = np.bincount(column.codes[column.codes >= 0], minlength=len(column.categories))
+            present = np.flatnonzero(counts)
+            self.distinct_sketch.update(hash_texts(column.categories[present]))
+            self._top(KIND_TEXT).update(column.categories[present], counts[present])
+        return self
+
+    def merge(self, other):
+        self.length += other.length
+        self.non_null += other.non_null
+        for kind, count in other.kind_counts.items():
+            self.kind_counts[kind] = self.kind_counts.get(kind, 0) + count
+        for kind, top in other.tops.items():
+            self._top(kind).merge(top)
+        self.digest.merge(other.digest)
+        self.distinct_sketch.merge(other.distinct_sketch)
+        self._add_moments(other.count, other.sum, other.mean, other.m2)
+        if other.date_min is not None:
+            self.date_min = other.date_min if self.date_min is None else min(self.date_min, other.date_min)
+            self.date_max = other.date_max if self.date_max is None else max(self.date_max, other.date_max)
+        return self
+
+    def profile(self, top_k=DEFAULT_TOP_K):
+        """
+        与 column_profile.profile_column 结构相同的列概要（approximate 为 True）：
+        分位数来自 t-digest，不同取值数来自 HyperLogLog，top 为高频取值计数器（计数可能略低于实际）
+        """
+        kind = self.kind
+        profile = {
+            "name": self.name,
+            "kind": kind,
+            "role": self.role,
+            "type": TYPE_LABELS.get(kind, "空"),
+            "non_null": self.non_null,
+            "nulls": self.length - self.non_null,
+            "distinct": self.distinct if kind != KIND_EMPTY else 0,
+            "top": [],
+            "other": 0,
+            "approximate": True
+        }
+        if kind == KIND_EMPTY:
+            return profile
+        top = self._top(kind).top(top_k)
+        other = self.kind_counts[kind] - sum(count for _, count in top)
+        if kind == KIND_NUMBER:
+            p25, p50, p75 = self.digest.quantile(QUANTILES)
+            profile.update({
+                "min": self.digest.min,
+                "max": self.digest.max,
+                "sum": self.sum,
+                "mean": self.mean,
+                "std": float(np.sqrt(self.m2 / self.count)) if self.count else 0.0,
+                "p25": float(p25),
+                "p50": float(p50),
+                "p75": float(p75),
+                "top": [[_plain(float(key)), count] for key, count in top],
+                "other": other
+            })
+        elif kind == KIND_DATE:
+            labels = np.datetime_as_string(np.array([key for key, _ in top], dtype='datetime64[s]'), unit='s')
+            profile.update({
+                "min": str(np.datetime_as_string(self.date_min, unit='s')),
+                "max": str(np.datetime_as_string(self.date_max, unit='s')),
+                "top": [[str(label), count] for label, (_, count) in zip(labels, top)],
+                "other": other
+            })
+        else:
+            profile.update({"top": [[key, count] for key, count in top], "other": other})
+        return profile
+
+
+class SheetSketch:
+    """
+    整张工作表的流式统计摘要：逐块读入数据行，按列并入各列的摘要后即丢弃原始单元格，
+    内存只与列数和抽样行数有关；同一工作表的多个分块、不同工作表（按表头名称对齐）的摘要都可以合并
+    合计行（见 summary_flags）计入 n_rows 和抽样，但不并入各列的统计，summary_rows 为其行数
+    groups 为需要对全表分组汇总的 (分组列, 数值列) 下标对（见 GroupSums、group_frame），
+    分析报告的图表和趋势由此覆盖整张表，而不只是读入内存的前若干行
+    """
+    def __init__(self, sheet_name, headers, sample_rows=SAMPLE_ROWS, seed=None, groups=()):
+        self.sheet_name = sheet_name
+        self.headers = list(headers)
+        self.columns = [ColumnSketch(name) for name in self.headers]
+        self.n_rows = 0
+        self.summary_rows = 0
+        self.sample = RowSample(sample_rows, seed)
+        self.groups = {(key_idx, value_idx): GroupSums(key_idx, value_idx) for key_idx, value_idx in groups}
+
+    @classmethod
+    def from_rows(cls, rows, sheet_name="Sheet1", chunk_rows=CHUNK_ROWS, sample_rows=SAMPLE_ROWS, seed=None,
+                  groups=()):
+        """
+        从行迭代器构建（第一行为表头，与 SheetFrame.from_rows 相同），内存中最多保留 chunk_rows 行
+        """
+        iterator = iter(rows)
+        header = next(iterator, None)
+        header = list(header) if header is not None else []
+        names = [str(h) if h is not None and h != '' else f"列{i + 1}" for i, h in enumerate(header)]
+        sketch = cls(sheet_name, names, sample_rows, seed, groups)
+        chunk = []
+        for row in iterator:
+            chunk.append(row if row is not None else ())
+            if len(chunk) >= chunk_rows:
+                sketch.update(chunk)
+                chunk = []
+        if chunk:
+            sketch.update(chunk)
+        return sketch
+
+    def update(self, rows):
+        """
+        并入一块数据行（不含表头）
+        """
+        if not rows:
+            return self
+        cells = list(zip_longest(*rows))
+        # 比表头更宽的行：补充列，之前的行在这些列上视为空
+        for col_idx in range(len(self.columns), len(cells)):
+            self.headers.append(f"列{col_idx + 1}")
+            self.columns.append(ColumnSketch(self.headers[-1], length=self.n_rows - self.summary_rows))
+        columns = []
+        for col_idx, column_sketch in enumerate(self.columns):
+            column_cells = cells[col_idx] if col_idx < len(cells) else [None] * len(rows)
+            columns.append(Column.from_cells(column_sketch.name, column_cells))
+            if col_idx < len(cells):
+                cells[col_idx] = None
+        flags = summary_flags(columns, len(rows))
+        keep = np.flatnonzero(~flags) if flags.any() else None
+        self.summary_rows += int(flags.sum())
+        if keep is not None:
+            columns = [column.take(keep) for column in columns]
+        for column_sketch, column in zip(self.columns, columns):
+            column_sketch.update(column)
+        for group in self.groups.values():
+            group.update(columns[group.key_idx], columns[group.value_idx])
+        self.sample.update(rows, np.arange(self.n_rows, self.n_rows + len(rows)))
+        self.n_rows += len(rows)
+        return self
+
+    def merge(self, other):
+        """
+        并入另一个摘要，相当于把对方的数据行接在本表后面（列按表头名称对齐，缺少的列视为空）
+        """
+        positions = {name: idx for idx, name in enumerate(self.headers)}
+        for column in other.columns:
+            if column.name not in positions:
+                positions[column.name] = len(self.headers)
+                self.headers.append(column.name)
+                self.columns.append(ColumnSketch(column.name, length=self.n_rows - self.summary_rows))
+        order = [None] * len(self.headers)
+        for idx, column in enumerate(other.columns):
+            self.columns[positions[column.name]].merge(column)
+            order[positions[column.name]] = idx
+        for idx, column in enumerate(self.columns):
+            if order[idx] is None:
+                column.length += other.n_rows - other.summary_rows
+
+        def remap(row):
+            return [row[j] if j is not None and j < len(row) else None for j in order]
+
+        # 分组汇总按表头名称对齐，只合并双方都有的分组
+        names = other.headers
+        other_groups = {(names[key_idx], names[value_idx]): group
+                        for (key_idx, value_idx), group in other.groups.items()}
+        for (key_idx, value_idx), group in self.groups.items():
+            matched = other_groups.get((self.headers[key_idx], self.headers[value_idx]))
+            if matched is not None:
+                group.merge(matched)
+            else:
+                group.overflow, group.sums = True, {}
+
+        identical = order == list(range(len(order)))
+        self.sample.merge(other.sample, row_offset=self.n_rows, remap=None if identical else remap)
+        self.n_rows += other.n_rows
+        self.summary_rows += other.summary_rows
+        return self
+
+    def profiles(self, top_k=DEFAULT_TOP_K):
+        """
+        各列的近似列概要（与 profile_frame 的结构相同），表头角色按与 SheetFrame 相同的规则推断
+        """
+        for column in self.columns:
+            column.role = infer_role(column, self.n_rows)
+        return [column.profile(top_k) for column in self.columns]
+
+    def group_frame(self, key_idx, value_idx):
+        """
+        全表按 key_idx 列分组汇总 value_idx 列得到的两列 SheetFrame（每个取值一行），
+        可直接交给 analyze_trend(frame, 0, 1) 或按类别作图；未跟踪该分组或分组数超出上限时返回 None
+        """
+        group = self.groups.get((key_idx, value_idx))
+        if group is None or group.overflow or not group.sums:
+            return None
+        rows = [[self.headers[key_idx], self.headers[value_idx]]]
+        rows += [[key, total] for key, total in group.sums.items()]
+        return SheetFrame.from_rows(rows, sheet_name=self.sheet_name)
@@ -0,0 +1,332 @@
+import datetime
+import re
+
+import numpy as np
+
+from .expr_eval import compile_expression, evaluate, ExpressionError
+
+
+class TableSpecError(ValueError):
+    """
+    表格规格不合法（缺少字段、类型未知、公式引用了不存在的列等）
+    """
+    pass
+
+
+COLUMN_TYPES = ("sequence", "integer", "number", "date", "category", "boolean", "constant", "formula")
+
+# 模型常用的同义类型
+TYPE_ALIASES = {"text": "category", "enum": "category", "id": "sequence", "int": "integer",
+                "float": "number", "decimal": "number", "bool": "boolean", "derived": "formula"}
+
+DISTRIBUTIONS = ("uniform", "normal", "lognormal", "exponential", "poisson")
+
+# 提示词中给模型的规格说明
+SPEC_FORMAT_HINT = """{
+  "sheet_name": "工作表名称",
+  "row_count": 数据行数,
+  "columns": [
+    {"name": "订单号", "type": "sequence", "prefix": "SO", "start": 1, "width": 6},
+    {"name": "下单日期", "type": "date", "start": "2024-01-01", "end": "2024-12-31"},
+    {"name": "区域", "type": "category", "values": ["华东", "华南", "华北"], "weights": [0.5, 0.3, 0.2]},
+    {"name": "单价", "type": "number", "distribution": "normal", "mean": 120, "std": 30, "min": 1, "decimals": 2},
+    {"name": "数量", "type": "integer", "distribution": "uniform", "min": 1, "max": 50},
+    {"name": "销售额", "type": "formula", "expr": "round(单价 * 数量, 2)"},
+    {"name": "是否回款", "type": "boolean", "probability": 0.8}
+  ]
+}
+列类型：sequence（编号，可带 prefix/width/step）、integer、number（distribution 可为 uniform/normal/lognormal/exponential/poisson，
+参数 min/max/mean/std/lam/decimals）、date（start/end，mode 为 random 或 sequential 配合 step_days）、category（values + 可选 weights）、
+boolean（probability）、constant（value）、formula（expr 只能引用前面的列，支持 + - * / // % ** 比较、x if 条件 else y、
+round/abs/min/max/clip/where/sqrt/log/exp/floor/ceil/text/concat/year/month/day）。任意列可设置 null_rate 表示空值比例。"""
+
+_ROW_COUNT_PATTERN = re.compile(r'(\d[\d,，]*(?:\.\d+)?)\s*(万|千|k|K)?\s*(?:行|条|笔|个|rows?|records?|entries)')
+
+
+def detect_row_count(description):
+    """
+    从描述中识别期望的行数，如 "10,000 rows"、"1万行"、"5000条"，识别不到返回 None
+    """
+    if not description:
+        return None
+    match = _ROW_COUNT_PATTERN.search(description)
+    if not match:
+        return None
+    number = float(match.group(1).replace(',', '').replace('，', ''))
+    unit = match.group(2)
+    if unit == '万':
+        number *= 10000
+    elif unit in ('千', 'k', 'K'):
+        number *= 1000
+    return int(number) if number >= 1 else None
+
+
+def _parse_date(value, field):
+    try:
+        return np.datetime64(datetime.date.fromisoformat(str(value)[:10]), 'D')
+    except ValueError as e:
+        raise TableSpecError(f"{field} 不是有效日期（YYYY-MM-DD）: {value}") from e
+
+
+def _number(column, key, default=None):
+    value = column.get(key, default)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError) as e:
+        raise TableSpecError(f"列 {column['name']} 的 {key} 必须是数值") from e
+
+
+def validate_spec(spec, max_rows, row_count=None, default_rows=100):
+    """
+    校验并规范化表格规格，返回新的规格字典
+    行数优先使用 row_count 参数，其次是规格中的 row_count，均不超过 max_rows
+    """
+    if not isinstance(spec, dict):
+        raise TableSpecError("表格规格必须是JSON对象")
+    columns = spec.get("columns")
+    if not isinstance(columns, list) or not columns:
+        raise TableSpecError("表格规格缺少 columns")
+
+    rows = row_count or spec.get("row_count") or default_rows
+    try:
+        rows = int(rows)
+    except (TypeError, ValueError) as e:
+        raise TableSpecError(f"row_count 必须是整数: {rows}") from e
+    rows = max(1, min(rows, max_rows))
+
+    normalized = []
+    seen = set()
+    for raw in columns:
+        if not isinstance(raw, dict) or not str(raw.get("name") or "").strip():
+            raise TableSpecError("每一列都必须包含 name")
+        column = dict(raw, name=str(raw["name"]).strip())
+        name = column["name"]
+        if name in seen:
+            raise TableSpecError(f"列名重复: {name}")
+        col_type = str(column.get("type", "category")).lower()
+        col_type = TYPE_ALIASES.get(col_type, col_type)
+        if col_type not in COLUMN_TYPES:
+            raise TableSpecError(f"列 {name} 的类型不支持: {col_type}")
+        column["type"] = col_type
+
+        if col_type == "category":
+            values = column.get("values", column.get("pool"))
+            if not isinstance(values, list) or not values:
+                raise TableSpecError(f"列 {name} 缺少 values")
+            column["values"] = values
+            weights = column.get("weights")
+            if weights is not None:
+                if not isinstance(weights, list) or len(weights) != len(values):
+                    raise TableSpecError(f"列 {name} 的 weights 数量必须与 values 一致")
+                weights = np.asarray(weights, dtype=float)
+                if np.any(weights < 0) or weights.sum() <= 0:
+                    raise TableSpecError(f"列 {name} 的 weights 必须为非负数且不全为0")
+                column["weights"] = (weights / weights.sum()).tolist()
+        elif col_type in ("integer", "number"):
+            distribution = str(column.get("distribution", "uniform")).lower()
+            if distribution not in DISTRIBUTIONS:
+                raise TableSpecError(f"列 {name} 的分布不支持: {distribution}")
+            column["distribution"] = distribution
+            low, high = _number(column, "min"), _number(column, "max")
+            if distribution == "uniform" and (low is None or high is None):
+                low = 0.0 if low is None else low
+                high = low + 100.0 if high is None else high
+            if low is not None and high is not None and low > high:
+                raise TableSpecError(f"列 {name} 的 min 不能大于 max")
+            column["min"], column["max"] = low, high
+            for key in ("mean", "std", "lam"):
+                column[key] = _number(column, key)
+        elif col_type == "date":
+            start = _parse_date(column.get("start", "2024-01-01"), f"列 {name} 的 start")
+            end = _parse_date(column.get("end", column.get("start", "2024-12-31")), f"列 {name} 的 end")
+            if end < start:
+                raise TableSpecError(f"列 {name} 的 end 不能早于 start")
+            column["start"], column["end"] = str(start), str(end)
+        elif col_type == "formula":
+            try:
+                _, names = compile_expression(column.get("expr"))
+            except ExpressionError as e:
+                raise TableSpecError(f"列 {name} 的公式不合法: {e}") from e
+            missing = names - seen
+            if missing:
+                raise TableSpecError(f"列 {name} 的公式引用了不存在或在其后的列: {', '.join(sorted(missing))}")
+
+        null_rate = _number(column, "null_rate", 0.0)
+        if not 0 <= null_rate < 1:
+            raise TableSpecError(f"列 {name} 的 null_rate 必须在 [0, 1) 之间")
+        column["null_rate"] = null_rate
+        seen.add(name)
+        normalized.append(column)
+
+    seed = spec.get("seed")
+    normalized_spec = {
+        "sheet_name": str(spec.get("sheet_name") or "Sheet1")[:31],
+        "row_count": rows,
+        "seed": int(seed) if isinstance(seed, (int, float)) else int(np.random.SeedSequence().entropy % (2 ** 32)),
+        "columns": normalized
+    }
+    # 先试生成几行，提前发现公式在运行时的类型错误（如日期乘以数值）
+    try:
+        next(synthesize_chunks(dict(normalized_spec, row_count=min(rows, 8))))
+    except (TypeError, ValueError, ExpressionError) as e:
+        raise TableSpecError(f"按规格生成数据失败: {e}") from e
+    return normalized_spec
+
+
+def _numeric_column(column, rng, size):
+    distribution = column["distribution"]
+    low, high = column["min"], column["max"]
+    mean, std = column["mean"], column["std"]
+    if distribution == "uniform":
+        if column["type"] == "integer":
+            values = rng.integers(int(low), int(high) + 1, size)
+        else:
+            values = rng.uniform(low, high, size)
+    elif distribution == "normal":
+        center = mean if mean is not None else ((low + high) / 2 if low is not None and high is not None else 0.0)
+        spread = std if std is not None else ((high - low) / 6 if low is not None and high is not None else 1.0)
+        values = rng.normal(center, max(spread, 0.0), size)
+    elif distribution == "lognormal":
+        center = mean if mean is not None and mean > 0 else 100.0
+        sigma = std / center if std is not None and std > 0 else 0.5
+        values = rng.lognormal(np.log(center) - sigma * sigma / 2, sigma, size)
+    elif distribution == "exponential":
+        values = rng.exponential(mean if mean is not None and mean > 0 else 1.0, size)
+    else:
+        lam = column["lam"] if column["lam"] is not None else (mean if mean is not None else 5.0)
+        values = rng.poisson(max(lam, 0.0), size)
+    if low is not None or high is not None:
+        values = np.clip(values, low, high)
+    if column["type"] == "integer":
+        return np.rint(values).astype(np.int64)
+    return np.round(values, int(column.get("decimals", 2)))
+
+
+def _generate_column(column, rng, offset, size, namespace, tree_cache):
+    col_type = column["type"]
+    if col_type == "sequence":
+        start, step = int(column.get("start", 1)), int(column.get("step", 1))
+        numbers = start + (np.arange(offset, offset + size, dtype=np.int64) * step)
+        prefix, width = str(column.get("prefix", "")), int(column.get("width", 0))
+        if not prefix and not width:
+            return numbers
+        return np.array([f"{prefix}{n:0{width}d}" for n in numbers.tolist()], dtype=object)
+    if col_type in ("integer", "number"):
+        return _numeric_column(column, rng, size)
+    if col_type == "date":
+        start, end = np.datetime64(column["start"], 'D'), np.datetime64(column["end"], 'D')
+        span = int((end - start).astype(np.int64))
+        if column.get("mode") == "sequential":
+            days = (np.arange(offset, offset + size, dtype=np.int64) * int(column.get("step_days", 1))) % (span + 1)
+        else:
+            days = rng.integers(0, span + 1, size)
+        return start + days.astype('timedelta64[D]')
+    if col_type == "category":
+        values = np.empty(len(column["values"]), dtype=object)
+        values[:] = column["values"]
+        return values[rng.choice(len(values), size, p=column.get("weights"))]
+    if col_type == "boolean":
+        return rng.random(size) < float(column.get("probability", 0.5))
+    if col_type == "constant":
+        values = np.empty(size, dtype=object)
+        values[:] = [column.get("value")] * size
+        return values
+    tree = tree_cache.get(column["name"])
+    if tree is None:
+        tree, _ = compile_expression(column["expr"])
+        tree_cache[column["name"]] = tree
+    values = evaluate(tree, namespace, size)
+    if values.dtype.kind == 'f' and "decimals" in column:
+        values = np.round(values, int(column["decimals"]))
+    return values
+
+
+def _to_cells(values, null_mask):
+    """
+    把列数组转换为写入Excel的Python值（NaN/inf 视为空值）
+    """
+    cells = values.tolist()
+    if values.dtype.kind == 'f':
+        cells = [v if v == v and v not in (float('inf'), float('-inf')) else None for v in cells]
+    if null_mask is not None:
+        for idx in np.flatnonzero(null_mask).tolist():
+            cells[idx] = None
+    return cells
+
+
+def synthesize_chunks(spec, chunk_rows=5000):
+    """
+    按规格分块生成数据，逐块产出行列表（不含表头）；每块内按列向量化生成
+    相同的规格和 seed 总是产生相同的数据
+    """
+    rng = np.random.default_rng(spec["seed"])
+    tree_cache = {}
+    total = spec["row_count"]
+    for offset in range(0, total, chunk_rows):
+        size = min(chunk_rows, total - offset)
+        namespace = {}
+        columns = []
+        for column in spec["columns"]:
+            values = _generate_column(column, rng, offset, size, namespace, tree_cache)
+            namespace[column["name"]] = values
+            null_mask = rng.random(size) < column["null_rate"] if column["null_rate"] else None
+            columns.append(_to_cells(values, null_mask))
+        yield [list(row) for row in zip(*columns)]
+
+
+def synthesize_rows(spec, chunk_rows=5000):
+    """
+    逐行产出表格数据：第一行为表头
+    """
+    yield [column["name"] for column in spec["columns"]]
+    for chunk in synthesize_chunks(spec, chunk_rows):
+        yield from chunk
+
+
+def generate_mock_table_spec(description, row_count=None):
+    """
+    生成模拟的表格规格，用于在API不可用时提供模拟响应
+    """
+    description = description or ""
+    if "员工" in description or "人事" in description:
+        spec = {
+            "sheet_name": "员工信息",
+            "columns": [
+                {"name": "员工ID", "type": "sequence", "prefix": "EMP", "width": 5},
+                {"name": "姓名", "type": "category", "values": ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨磊", "赵敏", "黄强"]},
+                {"name": "部门", "type": "category", "values": ["技术部", "市场部", "财务部", "人力资源部", "销售部"],
+                 "weights": [0.35, 0.2, 0.1, 0.1, 0.25]},
+                {"name": "入职日期", "type": "date", "start": "2015-01-01", "end": "2024-12-31"},
+                {"name": "薪资", "type": "integer", "distribution": "lognormal", "mean": 12000, "std": 5000, "min": 4000, "max": 60000},
+                {"name": "年薪", "type": "formula", "expr": "薪资 * 12"}
+            ]
+        }
+    elif "产品" in description or "库存" in description:
+        spec = {
+            "sheet_name": "产品库存",
+            "columns": [
+                {"name": "产品ID", "type": "sequence", "prefix": "P", "width": 5},
+                {"name": "类别", "type": "category", "values": ["电子产品", "办公用品", "日用品", "食品"]},
+                {"name": "单价", "type": "number", "distribution": "lognormal", "mean": 300, "std": 400, "min": 1, "decimals": 2},
+                {"name": "库存数量", "type": "integer", "distribution": "poisson", "lam": 200},
+                {"name": "库存金额", "type": "formula", "expr": "round(单价 * 库存数量, 2)"},
+                {"name": "需补货", "type": "formula", "expr": "库存数量 < 180"}
+            ]
+        }
+    else:
+        spec = {
+            "sheet_name": "销售数据",
+            "columns": [
+                {"name": "订单号", "type": "sequence", "prefix": "SO", "width": 6},
+                {"name": "日期", "type": "date", "start": "2024-01-01", "end": "2024-12-31", "mode": "sequential"},
+                {"name": "区域", "type": "category", "values": ["华东", "华南", "华北", "西南", "东北"],
+                 "weights": [0.3, 0.25, 0.2, 0.15, 0.1]},
+                {"name": "单价", "type": "number", "distribution": "normal", "mean": 120, "std": 30, "min": 1, "decimals": 2},
+                {"name": "数量", "type": "integer", "distribution": "uniform", "min": 1, "max": 50},
+                {"name": "销售额", "type": "formula", "expr": "round(单价 * 数量, 2)"}
+            ]
+        }
+    spec["row_count"] = row_count or detect_row_count(description) or 100
+    return spec
@@ -0,0 +1,334 @@
+import numpy as np
+from openpyxl.utils import get_column_letter
+
+from .sheet_frame import KIND_DATE, KIND_NUMBER, KIND_TEXT, ROLE_ID, ROLE_TIME, SUMMARY_LABELS, to_datetime64
+
+# 离群值检验的阈值：|z| > 3、超出 1.5 倍四分位距、修正 Z 分数（基于 MAD）> 3.5，至少两种检验一致才算离群
+Z_THRESHOLD = 3.0
+IQR_FACTOR = 1.5
+MAD_THRESHOLD = 3.5
+# 突变：相邻两行差值的修正 Z 分数超过该阈值（差值大多相同时改用 Z 分数和 Z_THRESHOLD）
+JUMP_THRESHOLD = 6.0
+# 文本列中能解析为日期的值达到该比例时，其余的值视为类型不一致
+MISMATCH_RATIO = 0.8
+
+# 少于该行数时不做 Z 分数检验和突变检验（n 行数据的 |z| 不超过 (n-1)/sqrt(n)，n<11 时 Z 分数检验不可能触发）
+MIN_ROWS = 8
+# 行数在 SMALL_MIN_ROWS 和 MIN_ROWS 之间时只用四分位距和 MAD 检验，两者一致才算离群；更少时不做离群值检验
+SMALL_MIN_ROWS = 4
+# 每条检测结果最多列出的单元格
+MAX_CELLS = 10
+MAX_FINDINGS = 20
+
+METHOD_LABELS = {"zscore": "Z分数", "iqr": "四分位距", "mad": "MAD"}
+
+
+def _cell(col_idx, row_idx):
+    # 第1行为表头，数据从第2行开始
+    return f"{get_column_letter(col_idx + 1)}{row_idx + 2}"
+
+
+def _robust_scores(x):
+    """
+    修正 Z 分数 0.6745 * |x - 中位数| / MAD；MAD 为 0 时返回 None
+    """
+    median = np.median(x)
+    mad = np.median(np.abs(x - median))
+    if mad == 0:
+        return None
+    return 0.6745 * np.abs(x - median) / mad
+
+
+def _outliers(frame, col_idx, exclude):
+    """
+    数值列/日期列的离群值：Z 分数、四分位距、MAD 三种检验中至少两种（只有一种可用时为该种）判定离群
+    行数少于 MIN_ROWS 时只用四分位距和 MAD，两者都判定离群才算；exclude 为不参与检验的行（合计行）
+    """
+    column = frame.columns[col_idx]
+    if column.kind == KIND_NUMBER:
+        rows = np.flatnonzero(column.valid & ~exclude)
+        x = column.values[rows]
+    else:
+        rows = np.flatnonzero(~column.mask & ~exclude)
+        x = column.values[rows].astype(np.int64).astype(float)
+    if rows.size < SMALL_MIN_ROWS:
+        return None
+    small = rows.size < MIN_ROWS
+
+    hits = {}
+    std = x.std()
+    if std == 0:
+        return None
+    z = np.abs(x - x.mean()) / std
+    if not small:
+        hits["zscore"] = z > Z_THRESHOLD
+    q1, q3 = np.quantile(x, [0.25, 0.75])
+    iqr = q3 - q1
+    if iqr > 0:
+        hits["iqr"] = (x < q1 - IQR_FACTOR * iqr) | (x > q3 + IQR_FACTOR * iqr)
+    robust = _robust_scores(x)
+    if robust is not None:
+        hits["mad"] = robust > MAD_THRESHOLD
+
+    if small and len(hits) < 2:
+        return None
+    votes = np.sum(list(hits.values()), axis=0)
+    flagged = np.flatnonzero(votes >= min(2, len(hits)))
+    if not flagged.size:
+        return None
+    scores = robust if robust is not None else z
+    ranked = flagged[np.argsort(-scores[flagged], kind='stable')][:MAX_CELLS]
+    cells = [{
+        "cell": _cell(col_idx, int(rows[i])),
+        "row": int(rows[i]) + 2,
+        "value": column.value(int(rows[i])),
+        "score": round(float(scores[i]), 2),
+        "methods": [method for method, hit in hits.items() if hit[i]]
+    } for i in ranked]
+    method_counts = {method: int(np.count_nonzero(hit[flagged])) for method, hit in hits.items()}
+    top = cells[0]
+    scale = f"偏离中位数{top['score']}个稳健标准差" if robust is not None else f"偏离均值{top['score']}个标准差"
+    methods = "、".join(METHOD_LABELS[method] for method in top["methods"])
+    return {
+        "type": "outlier",
+        "column": column.name,
+        "count": int(flagged.size),
+        "methods": method_counts,
+        "cells": cells,
+        "message": f"'{column.name}'列发现{flagged.size}个离群值，最明显的是{top['cell']}={top['value']}（{methods}检验，{scale}）。"
+    }
+
+
+def _time_order(frame, rows):
+    """
+    按时间列排序的行号：有日期类型的时间列时按日期排序，否则保持表格中的顺序
+    """
+    for col_idx in frame.columns_with_role(ROLE_TIME):
+        column = frame.columns[col_idx]
+        if column.kind == KIND_DATE:
+            rows = rows[~column.mask[rows]]
+            return rows[np.argsort(column.values[rows], kind='stable')]
+    return rows
+
+
+def _jumps(frame, col_idx, exclude):
+    """
+    时间序列中的突变：按时间顺序相邻两行的差值明显偏离其他差值（exclude 为不参与检验的行）
+    """
+    column = frame.columns[col_idx]
+    rows = _time_order(frame, np.flatnonzero(column.valid & ~exclude))
+    if rows.size < MIN_ROWS:
+        return None
+    diffs = np.diff(column.values[rows])
+    scores = _robust_scores(diffs)
+    threshold = JUMP_THRESHOLD
+    if scores is None:
+        # 大部分差值相同（如等差序列）时按标准差衡量偏离
+        std = diffs.std()
+        if std == 0:
+            return None
+        scores = np.abs(diffs - np.median(diffs)) / std
+        threshold = Z_THRESHOLD
+    flagged = np.flatnonzero(scores > threshold)
+    if not flagged.size:
+        return None
+    ranked = flagged[np.argsort(-scores[flagged], kind='stable')][:MAX_CELLS]
+    cells = [{
+        "cell": _cell(col_idx, int(rows[i + 1])),
+        "row": int(rows[i + 1]) + 2,
+        "value": column.value(int(rows[i + 1])),
+        "previous": column.value(int(rows[i])),
+        "previous_cell": _cell(col_idx, int(rows[i])),
+        "score": round(float(scores[i]), 2)
+    } for i in ranked]
+    top = cells[0]
+    return {
+        "type": "jump",
+        "column": column.name,
+        "count": int(flagged.size),
+        "cells": cells,
+        "message": f"'{column.name}'在{top['cell']}处出现突变：由{top['previous']}（{top['previous_cell']}）变为{top['value']}。"
+    }
+
+
+def _type_mismatches(frame, col_idx):
+    """
+    类型不一致：数值列中无法解析为数值的值，以及大部分为日期的文本列中不是日期的值
+    """
+    column = frame.columns[col_idx]
+    if column.kind == KIND_NUMBER:
+        bad = np.flatnonzero(~column.mask & ~column.valid)
+        expected = "数值"
+    elif column.kind == KIND_TEXT and column.role != ROLE_ID:
+        counts = np.bincount(column.codes[column.codes >= 0], minlength=len(column.categories))
+        non_null = int(counts.sum())
+        failures = 0
+        is_date = np.zeros(len(column.categories), dtype=bool)
+        for code in np.argsort(-counts, kind='stable'):
+            if failures > (1 - MISMATCH_RATIO) * non_null:
+                return None
+            value = column.categories[code]
+            if isinstance(value, str) and to_datetime64(value) is not None:
+                is_date[code] = True
+            else:
+                failures += int(counts[code])
+        if not failures or failures > (1 - MISMATCH_RATIO) * non_null:
+            return None
+        bad = np.flatnonzero((column.codes >= 0) & ~is_date[np.maximum(column.codes, 0)])
+        expected = "日期"
+    else:
+        return None
+    if not bad.size:
+        return None
+    cells = [{"cell": _cell(col_idx, int(i)), "row": int(i) + 2, "value": column.value(int(i))}
+             for i in bad[:MAX_CELLS]]
+    top = cells[0]
+    return {
+        "type": "type_mismatch",
+        "column": column.name,
+        "count": int(bad.size),
+        "expected": expected,
+        "cells": cells,
+        "message": f"'{column.name}'列应为{expected}，但有{bad.size}个单元格不是{expected}，如{top['cell']}='{top['value']}'。"
+    }
+
+
+def _column_codes(column):
+    """
+    把一列编码为整数（相同取值编码相同，空值为 -1），用于整行比较
+    """
+    if column.kind == KIND_TEXT:
+        return column.codes.astype(np.int64), len(column.categories)
+    codes = np.full(column.length, -1, dtype=np.int64)
+    if column.kind == KIND_NUMBER:
+        present = np.flatnonzero(column.valid)
+        _, inverse = np.unique(column.values[present], return_inverse=True)
+        codes[present] = inverse
+        cardinality = int(inverse.max()) + 1 if present.size else 0
+        unparsed = np.flatnonzero(~column.mask & ~column.valid)
+        if unparsed.size:
+            _, extra = np.unique(column.labels[unparsed].astype(str), return_inverse=True)
+            codes[unparsed] = cardinality + extra
+            cardinality += int(extra.max()) + 1
+        return codes, cardinality
+    if column.kind == KIND_DATE:
+        present = np.flatnonzero(~column.mask)
+        _, inverse = np.unique(column.values[present], return_inverse=True)
+        codes[present] = inverse
+        return codes, int(inverse.max()) + 1 if present.size else 0
+    return codes, 0
+
+
+def _duplicate_rows(frame):
+    """
+    完全重复的数据行（空行除外）：逐列合并编码得到每行的键，与第一次出现的行比较
+    """
+    if frame.n_cols < 2 or frame.n_rows < 2:
+        return None
+    keys = np.zeros(frame.n_rows, dtype=np.int64)
+    empty = np.ones(frame.n_rows, dtype=bool)
+    for column in frame.columns:
+        codes, cardinality = _column_codes(column)
+        empty &= codes < 0
+        # 合并后重新编号，键的取值始终小于行数，不会溢出
+        _, keys = np.unique(keys * (cardinality + 1) + codes + 1, return_inverse=True)
+        keys = keys.reshape(-1)
+    _, first = np.unique(keys, return_index=True)
+    first_row = first[keys]
+    duplicated = np.flatnonzero((first_row != np.arange(frame.n_rows)) & ~empty)
+    if not duplicated.size:
+        return None
+    last_col = get_column_letter(frame.n_cols)
+    cells = [{
+        "cell": f"A{i + 2}:{last_col}{i + 2}",
+        "row": int(i) + 2,
+        "duplicate_of": int(first_row[i]) + 2
+    } for i in duplicated[:MAX_CELLS]]
+    top = cells[0]
+    return {
+        "type": "duplicate_row",
+        "column": None,
+        "count": int(duplicated.size),
+        "cells": cells,
+        "message": f"发现{duplicated.size}行与前面的行完全重复，如第{top['row']}行与第{top['duplicate_of']}行。"
+    }
+
+
+def _summary_rows(frame, flags):
+    """
+    合计行（总计、合计、Total 等）：单独列出，不作为离群值或突变报告
+    """
+    rows = np.flatnonzero(flags)
+    if not rows.size:
+        return None
+    cells = []
+    for i in rows[:MAX_CELLS]:
+        col_idx = next(col_idx for col_idx, column in enumerate(frame.columns)
+                       if column.kind == KIND_TEXT and column.text(int(i)) is not None
+                       and column.text(int(i)).strip().lower() in SUMMARY_LABELS)
+        cells.append({"cell": _cell(col_idx, int(i)), "row": int(i) + 2, "value": frame.columns[col_idx].value(int(i))})
+    top = cells[0]
+    return {
+        "type": "summary_row",
+        "column": None,
+        "count": int(rows.size),
+        "cells": cells,
+        "message": f"发现{rows.size}行合计行，如{top['cell']}='{top['value']}'，已从离群值和突变检验中排除。"
+    }
+
+
+def _detect(frame):
+    findings = []
+    summary = frame.summary_rows()
+    for col_idx, column in enumerate(frame.columns):
+        if column.role == ROLE_ID:
+            continue
+        if column.kind in (KIND_NUMBER, KIND_DATE):
+            findings.append(_outliers(frame, col_idx, summary))
+        if column.kind == KIND_NUMBER and column.role != ROLE_TIME and frame.columns_with_role(ROLE_TIME):
+            findings.append(_jumps(frame, col_idx, summary))
+        findings.append(_type_mismatches(frame, col_idx))
+    findings.append(_summary_rows(frame, summary))
+    findings.append(_duplicate_rows(frame))
+    return [finding for finding in findings if finding][:MAX_FINDINGS]
+
+
+def detect_anomalies(frame):
+    """
+    本地统计异常检测，返回检测结果列表（按列的顺序，合计行和重复行在最后），每项包含：
+    type（outlier 离群值 / jump 突变 / type_mismatch 类型不一致 / summary_row 合计行 / duplicate_row 重复行）、column、count、
+    cells（最多 MAX_CELLS 个单元格坐标及其取值）和 message（可直接放入报告的中文描述）
+    所有检验都在列数组上向量化完成，结果缓存在 frame 上
+    """
+    if frame is None or frame.n_rows < 1:
+        return []
+    return frame.cached_result(("anomalies",), lambda: _detect(frame))
+
+
+def anomalies_for_prompt(findings, max_cells=5):
+    """
+    压缩后的检测结果，放入发送给大模型的数据中：描述 + 单元格坐标和取值
+    """
+    return [{
+        "message": finding["message"],
+        "count": finding["count"],
+        "cells": [
+            f"{cell['cell']}={cell['value']}" if "value" in cell else f"{cell['cell']}（与第{cell['duplicate_of']}行重复）"
+            for cell in finding["cells"][:max_cells]
+        ]
+    } for finding in findings]
+
+
+def anomaly_rows(findings):
+    """
+    检测结果涉及的数据行（0 起始的行号），按检测结果的顺序去重
+    """
+    rows = []
+    seen = set()
+    for finding in findings:
+        for cell in finding["cells"]:
+            row = cell["row"] - 2
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+    return rows
@@ -0,0 +1,134 @@
+import numpy as np
+
+# 折线图默认保留的点数，以及柱状图/饼图最多保留的类别数（其余合并为"其他"）
+DEFAULT_MAX_POINTS = 500
+DEFAULT_MAX_CATEGORIES = 20
+OTHER_LABEL = "其他"
+
+LINE_TYPES = ("line_chart", "multi_line_chart")
+CATEGORY_TYPES = ("bar_chart", "pie_chart")
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").replace("%", "").strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _values(rows, key):
+    """
+    各数据点 key 对应的数值数组，无法转换为数值的记为 0
+    """
+    values = np.fromiter((_number(row.get(key)) for row in rows), dtype=float, count=len(rows))
+    return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def lttb(y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留的下标（升序，包含首尾两点）
+    横坐标取数据点的序号；中间的点均分为 threshold - 2 个桶，每个桶保留与上一个保留点、
+    下一个桶的均值点构成的三角形面积最大的点。各桶的均值由前缀和一次算出，循环次数只与 threshold 有关
+    """
+    y = np.asarray(y, dtype=float)
+    n = y.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    x = np.arange(n, dtype=float)
+    y_sums = np.concatenate([[0.0], np.cumsum(y)])
+    sizes = np.diff(edges)
+    # 第 i 个桶之后那个桶的均值点（最后一个桶之后为最后一个点）
+    avg_x = np.append((edges[1:] + edges[:-1] - 1) / 2.0, n - 1.0)[1:]
+    avg_y = np.append((y_sums[edges[1:]] - y_sums[edges[:-1]]) / sizes, y[-1])[1:]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        areas = np.abs((ax - avg_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y[i] - ay))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def _axes(chart, rows):
+    keys = list(rows[0].keys())
+    x_key = chart.get("x_axis") or (keys[0] if keys else None)
+    y_key = chart.get("y_axis") or (keys[1] if len(keys) > 1 else None)
+    return x_key, y_key
+
+
+def downsample_line(chart, max_points):
+    """
+    折线图/多线图按 LTTB 降采样；多线图每条线分到相同的点数，保留各线选中点的并集
+    """
+    rows = chart["data"]
+    x_key, y_key = _axes(chart, rows)
+    if chart.get("type") == "multi_line_chart":
+        y_keys = [key for key in rows[0] if key != x_key]
+    else:
+        y_keys = [y_key] if y_key is not None else []
+    if not y_keys:
+        return chart
+    budget = max(3, max_points // len(y_keys))
+    keep = np.unique(np.concatenate([lttb(_values(rows, key), budget) for key in y_keys]))
+    chart["data"] = [rows[i] for i in keep.tolist()]
+    return chart
+
+
+def fold_categories(chart, max_categories):
+    """
+    柱状图/饼图只保留数值最大的 max_categories - 1 个类别（保持原有顺序），其余合并为一项"其他"
+    """
+    rows = chart["data"]
+    if chart.get("type") == "pie_chart":
+        label_key, value_key = "name", "value"
+    else:
+        label_key, value_key = _axes(chart, rows)
+    if value_key is None:
+        return chart
+    values = _values(rows, value_key)
+    # 原有的"其他"不参与排序，直接并入合并项
+    is_other = np.fromiter((row.get(label_key) == OTHER_LABEL for row in rows), dtype=bool, count=len(rows))
+    candidates = np.flatnonzero(~is_other)
+    keep = np.sort(candidates[np.argsort(-values[candidates], kind='stable')[:max(1, max_categories - 1)]])
+    rest = np.ones(len(rows), dtype=bool)
+    rest[keep] = False
+    other = float(values[rest].sum())
+    chart["data"] = [rows[i] for i in keep.tolist()] + [{label_key: OTHER_LABEL, value_key: other}]
+    return chart
+
+
+def downsample_visualization(report, max_points=DEFAULT_MAX_POINTS, max_categories=DEFAULT_MAX_CATEGORIES):
+    """
+    把报告中 visualization_data 的图表数据压缩到点数预算内（原地修改并返回报告）：
+    折线图按 LTTB 保留 max_points 个点，柱状图/饼图保留 max_categories 个类别（含"其他"）；
+    发生了压缩的图表带有 original_points（原始的数据点数）
+    """
+    charts = report.get("visualization_data") if isinstance(report, dict) else None
+    if not isinstance(charts, list):
+        return report
+    for chart in charts:
+        if not isinstance(chart, dict) or not isinstance(chart.get("data"), list) or not chart["data"]:
+            continue
+        rows = chart["data"]
+        if not all(isinstance(row, dict) for row in rows):
+            continue
+        chart_type = chart.get("type")
+        if chart_type in LINE_TYPES and len(rows) > max_points:
+            downsample_line(chart, max_points)
+        elif chart_type in CATEGORY_TYPES and len(rows) > max_categories:
+            fold_categories(chart, max_categories)
+        else:
+            continue
+        chart["original_points"] = len(rows)
+    return report
@@ -0,0 +1,104 @@
+import numpy as np
+
+from .sheet_frame import KIND_DATE, KIND_NUMBER, KIND_TEXT
+
+# 列类型在分析报告和提示词中的名称
+TYPE_LABELS = {KIND_NUMBER: "数值", KIND_DATE: "日期", KIND_TEXT: "文本"}
+
+# 每列直方图保留的最常见取值个数
+DEFAULT_TOP_K = 10
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _plain(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+def _top(keys, counts, top_k):
+    """
+    按出现次数从多到少取前 top_k 个取值（次数相同时保持 keys 的顺序），返回 ([[取值, 次数], ...], 其余取值的总次数)
+    """
+    order = np.argsort(-counts, kind='stable')[:top_k]
+    top = [[_plain(keys[i]), int(counts[i])] for i in order.tolist()]
+    return top, int(counts.sum()) - sum(count for _, count in top)
+
+
+def _sorted_quantiles(uniques, counts, qs):
+    """
+    由排序后的去重取值和各自的次数计算分位数（线性插值，与 np.quantile 默认方法一致），不再重新排序
+    """
+    n = int(counts.sum())
+    ends = np.cumsum(counts)
+    positions = np.asarray(qs) * (n - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    low_values = uniques[np.searchsorted(ends, lower, side='right')]
+    high_values = uniques[np.searchsorted(ends, upper, side='right')]
+    return low_values + (positions - lower) * (high_values - low_values)
+
+
+def profile_column(column, top_k=DEFAULT_TOP_K):
+    """
+    对一列做一次向量化统计，返回列概要：
+    推断的类型、空值数、不同取值数、数值列的 min/max/sum/mean/std/四分位数、日期列的起止日期，
+    以及最常见的 top_k 个取值及其次数（top）和其余取值的总次数（other）
+    数值列和日期列只排序一次（np.unique），文本列直接对类别编码计数
+    """
+    profile = {
+        "name": column.name,
+        "kind": column.kind,
+        "role": column.role,
+        "type": TYPE_LABELS.get(column.kind, "空"),
+        "non_null": column.non_null,
+        "nulls": column.length - column.non_null,
+        "distinct": 0,
+        "top": [],
+        "other": 0
+    }
+    if column.kind == KIND_NUMBER:
+        numbers = column.numbers()
+        uniques, counts = np.unique(numbers, return_counts=True)
+        unparsed = column.labels[~column.mask & ~column.valid] if column.labels is not None else []
+        p25, p50, p75 = _sorted_quantiles(uniques, counts, QUANTILES)
+        top, other = _top(uniques.tolist(), counts, top_k)
+        profile.update({
+            "distinct": int(uniques.size) + len(set(map(str, unparsed))),
+            "min": float(uniques[0]),
+            "max": float(uniques[-1]),
+            "sum": float(numbers.sum()),
+            "mean": float(numbers.mean()),
+            "std": float(numbers.std()),
+            "p25": float(p25),
+            "p50": float(p50),
+            "p75": float(p75),
+            "top": top,
+            "other": other + len(unparsed)
+        })
+    elif column.kind == KIND_DATE:
+        uniques, counts = np.unique(column.values[~column.mask], return_counts=True)
+        labels = np.datetime_as_string(uniques, unit='s')
+        top, other = _top(labels.tolist(), counts, top_k)
+        profile.update({
+            "distinct": int(uniques.size),
+            "min": str(labels[0]),
+            "max": str(labels[-1]),
+            "top": top,
+            "other": other
+        })
+    elif column.kind == KIND_TEXT:
+        codes = column.codes[column.codes >= 0]
+        counts = np.bincount(codes, minlength=len(column.categories))
+        top, other = _top(column.categories, counts, top_k)
+        profile.update({"distinct": len(column.categories), "top": top, "other": other})
+    return profile
+
+
+def profile_frame(frame, top_k=DEFAULT_TOP_K):
+    """
+    整个 SheetFrame 的列概要（与 frame.columns 一一对应），按 top_k 缓存在 frame 上，
+    分析报告、提示词压缩等对同一份数据只统计一次
+    """
+    return frame.cached_result(("profiles", top_k), lambda: [profile_column(column, top_k) for column in frame.columns])
@@ -33,6 +33,44 @@ class Config:
         self.DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
         self.DEEPSEEK_MAX_TOKENS = int(os.getenv("DEEPSEEK_MAX_TOKENS", "2000"))
         self.DEEPSEEK_TEMPERATURE = float(os.getenv("DEEPSEEK_TEMPERATURE", "0.7"))
+        self.DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
+        self.DEEPSEEK_CONTEXT_WINDOW = int(os.getenv("DEEPSEEK_CONTEXT_WINDOW", "65536"))  # 上下文窗口（prompt + 回复）
+        self.LLM_MIN_COMPLETION_TOKENS = int(os.getenv("LLM_MIN_COMPLETION_TOKENS", "256"))  # 至少为回复保留的token数
+        self.LLM_TOKENIZER_ENCODING = os.getenv("LLM_TOKENIZER_ENCODING", "cl100k_base")  # tiktoken编码，留空则使用启发式估算
+        
+        # LLM客户端配置（连接池、超时、并发上限）
+        self.LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # 秒
+        self.LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))  # 秒
+        self.LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+        self.LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "200"))
+        
+        # DeepSeek熔断器配置：窗口内错误率或慢调用率过高时打开，打开期间直接走降级逻辑
+        self.LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+        self.LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+        self.LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+        self.LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "20"))
+        self.LLM_BREAKER_SLOW_CALL_RATE = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8"))
+        self.LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+        
+        # 自适应并发上限（AIMD），上限不超过 LLM_MAX_CONCURRENCY
+        self.LLM_ADAPTIVE_INITIAL_LIMIT = int(os.getenv("LLM_ADAPTIVE_INITIAL_LIMIT", "20"))
+        self.LLM_ADAPTIVE_MIN_LIMIT = int(os.getenv("LLM_ADAPTIVE_MIN_LIMIT", "1"))
+        self.LLM_ADAPTIVE_LATENCY_TARGET = float(os.getenv("LLM_ADAPTIVE_LATENCY_TARGET", "15"))  # 秒
+        self.LLM_ADAPTIVE_QUEUE_TIMEOUT = float(os.getenv("LLM_ADAPTIVE_QUEUE_TIMEOUT", "2"))  # 秒
+
+        # 各接口等待LLM结果的截止时间（秒），超时后走降级逻辑
+        self.LLM_DEADLINES = {
+            "/generate_excel": float(os.getenv("LLM_DEADLINE_GENERATE", "45")),
+            "/generate_excel/stream": float(os.getenv("LLM_DEADLINE_GENERATE_STREAM", "120")),
+            "/edit_excel": float(os.getenv("LLM_DEADLINE_EDIT", "60")),
+            "/analyze_excel": float(os.getenv("LLM_DEADLINE_ANALYZE", "60")),
+        }
+
+        # 对冲请求：上游调用超过最近耗时的分位数（默认p95）仍未返回时，再发一个相同请求，取先返回者
+        self.LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "False").lower() == "true"
+        self.LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+        self.LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
         
         # 应用配置
         self.APP_NAME = "ExcelGenius"
@@ -50,6 +88,31 @@ class Config:
         self.EXCEL_DEFAULT_SHEET = "Sheet1"
         self.EXCEL_MAX_ROWS = int(os.getenv("EXCEL_MAX_ROWS", "1000"))
         self.EXCEL_MAX_COLS = int(os.getenv("EXCEL_MAX_COLS", "100"))
+        # 写入后端：auto（按行数自动选择）、openpyxl、write_only、pyexcelerate
+        self.EXCEL_WRITER_BACKEND = os.getenv("EXCEL_WRITER_BACKEND", "auto")
+        self.EXCEL_WRITE_ONLY_THRESHOLD = int(os.getenv("EXCEL_WRITE_ONLY_THRESHOLD", "1000"))
+        
+        # 数据分析提示词配置（超出预算时发送列统计概要+抽样行，而不是全部数据）
+        self.ANALYZE_PROMPT_TOKEN_BUDGET = int(os.getenv("ANALYZE_PROMPT_TOKEN_BUDGET", "6000"))
+        self.ANALYZE_SAMPLE_ROWS = int(os.getenv("ANALYZE_SAMPLE_ROWS", "40"))
+        self.ANALYZE_OUTLIER_ROWS = int(os.getenv("ANALYZE_OUTLIER_ROWS", "10"))
+        # 近似统计模式：数据行数超过该值的工作表流式读取整张表，更新可合并的统计摘要（t-digest、HyperLogLog 等），
+        # 报告和提示词中的列统计覆盖全表，内存只与列数有关；0 表示不启用
+        self.ANALYZE_APPROX_ROWS = int(os.getenv("ANALYZE_APPROX_ROWS", "1000"))
+        self.ANALYZE_SKETCH_SAMPLE_ROWS = int(os.getenv("ANALYZE_SKETCH_SAMPLE_ROWS", "500"))  # 全表均匀抽样的行数
+        # 分析报告图表的数据点预算：折线图按 LTTB 降采样到 VIZ_MAX_POINTS 个点（请求中的 max_points 可以调整，
+        # 不超过 VIZ_MAX_POINTS_LIMIT），柱状图/饼图最多保留 VIZ_MAX_CATEGORIES 个类别（其余合并为"其他"）
+        self.VIZ_MAX_POINTS = int(os.getenv("VIZ_MAX_POINTS", "500"))
+        self.VIZ_MAX_POINTS_LIMIT = int(os.getenv("VIZ_MAX_POINTS_LIMIT", "5000"))
+        self.VIZ_MAX_CATEGORIES = int(os.getenv("VIZ_MAX_CATEGORIES", "20"))
+        # 编辑接口发送表格内容的token预算（超出时只发送列统计概要和抽样行）
+        self.EDIT_PROMPT_TOKEN_BUDGET = int(os.getenv("EDIT_PROMPT_TOKEN_BUDGET", "12000"))
+        
+        # 规格生成模式：模型只返回列定义和分布，由本地按规格批量生成数据行
+        self.SYNTH_AUTO_THRESHOLD = int(os.getenv("SYNTH_AUTO_THRESHOLD", "200"))  # 期望行数超过该值时自动使用规格模式
+        self.SYNTH_MAX_ROWS = int(os.getenv("SYNTH_MAX_ROWS", "1000000"))
+        self.SYNTH_CHUNK_ROWS = int(os.getenv("SYNTH_CHUNK_ROWS", "5000"))
+        self.SYNTH_PREVIEW_ROWS = int(os.getenv("SYNTH_PREVIEW_ROWS", "500"))  # 接口响应中附带的预览行数
         
         # 日志配置
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -63,8 +126,16 @@ class Config:
         # 安全配置
         self.API_KEY_REQUIRED = os.getenv("API_KEY_REQUIRED", "False").lower() == "true"
         self.UPLOAD_MAX_SIZE_MB = int(os.getenv("UPLOAD_MAX_SIZE_MB", "10"))
-        self.ALLOWED_FILE_TYPES = ["xlsx", "xls"]
+        self.ALLOWED_FILE_TYPES = ["xlsx"]
         
         # 缓存配置
         self.CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() == "true"
-        self.CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # 秒
\ No newline at end of file
+        self.CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # 秒
+        self.CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))  # 进程内LRU最大条目数
+        self.CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")  # 为空时不启用Redis二级缓存
+        
+        # 已解析工作表的缓存（按上传内容的SHA-256 + 工作表），同一文件重复上传时跳过解析
+        self.PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "True").lower() == "true"
+        self.PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "256"))  # 进程内缓存的字节预算
+        self.PARSE_CACHE_SPILL_DIR = os.getenv("PARSE_CACHE_SPILL_DIR", "")  # 为空时不写入磁盘
+        self.PARSE_CACHE_SPILL_MAX_MB = int(os.getenv("PARSE_CACHE_SPILL_MAX_MB", "1024"))
@@ -1,103 +1,507 @@
 import os
 import random
 import time
+from itertools import chain
+import numpy as np
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from .edit_planner import compile_operations, apply_program
+from .style_registry import StyleError, StyleRegistry
+from .sheet_frame import KIND_NUMBER, SheetFrame
+from .column_profile import profile_frame
+from .anomaly_detector import detect_anomalies
+from .trend_analyzer import analyze_trend
+from .sketches import SAMPLE_ROWS, SheetSketch
+
+# 如果安装了 pyexcelerate，可以用于高速导出，否则使用 openpyxl 作为回退
+try:
+    from pyexcelerate import Workbook as PyexcelWorkbook
+    HAS_PYEXCEL = True
+except:
+    HAS_PYEXCEL = False
+
+class StreamingExcelWriter:
+    """
+    逐行写入的Excel文件（openpyxl write-only 模式）
+    行数据到达一行就追加一行，内存占用不随行数增长
+    """
+    def __init__(self, file_path, sheet_name="Sheet1"):
+        self.file_path = file_path
+        self.rows_written = 0
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(title=sheet_name)
+
+    def set_sheet_name(self, sheet_name):
+        """
+        write-only 模式下工作表名称在保存时才写入，因此可以在追加行之后再设置
+        """
+        if sheet_name:
+            self._ws.title = sheet_name
+
+    def append(self, row):
+        self._ws.append(list(row))
+        self.rows_written += 1
+
+    def close(self):
+        """
+        保存文件（write-only 工作簿只能保存一次）
+        """
+        self._wb.save(self.file_path)
+        print(f"Excel文件已流式写入: {self.file_path}, 共{self.rows_written}行")
+
+# 写入后端：openpyxl 普通模式（逐个单元格，行数少时使用）、openpyxl write-only（逐行流式追加）、
+# pyexcelerate（整表 data= 批量写入，已知行数的大表最快）
+WRITER_BACKENDS = ("openpyxl", "write_only", "pyexcelerate")
+# pyexcelerate 保存前要在内存中持有全部行（峰值内存与行数成正比），超过该行数或行数未知时改用 write_only 流式写入
+PYEXCELERATE_MAX_ROWS = 200000
+
+
+def choose_writer_backend(row_count, backend="auto", threshold=1000):
+    """
+    选择写入后端：指定的后端不可用时回退到 write_only；
+    auto 时行数不超过 threshold 使用 openpyxl，行数未知（迭代器）使用 write_only，
+    其余优先使用 pyexcelerate；行数未知或超过 PYEXCELERATE_MAX_ROWS 时不使用 pyexcelerate（含显式指定时）
+    """
+    pyexcelerate_ok = HAS_PYEXCEL and row_count is not None and row_count <= PYEXCELERATE_MAX_ROWS
+    if backend and backend != "auto":
+        if backend not in WRITER_BACKENDS:
+            raise ValueError(f"未知的Excel写入后端: {backend}")
+        if backend == "pyexcelerate" and not pyexcelerate_ok:
+            return "write_only"
+        return backend
+    if row_count is None:
+        return "write_only"
+    if row_count <= threshold:
+        return "openpyxl"
+    return "pyexcelerate" if pyexcelerate_ok else "write_only"
+
+
+def _write_openpyxl(file_path, sheet_name, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    row_count = 0
+    for row_idx, row_data in enumerate(rows, 1):
+        for col_idx, cell_data in enumerate(row_data, 1):
+            ws.cell(row=row_idx, column=col_idx, value=cell_data)
+        row_count = row_idx
+    wb.save(file_path)
+    return row_count
+
+
+def _write_write_only(file_path, sheet_name, rows):
+    writer = StreamingExcelWriter(file_path, sheet_name)
+    for row in rows:
+        writer.append(row)
+    writer.close()
+    return writer.rows_written
+
+
+def _write_pyexcelerate(file_path, sheet_name, rows):
+    # 只用于已知行数且不超过 PYEXCELERATE_MAX_ROWS 的数据（见 choose_writer_backend）；传入的列表直接使用，不再复制
+    data = rows if isinstance(rows, list) else [list(row) for row in rows]
+    wb = PyexcelWorkbook()
+    wb.new_sheet(sheet_name, data=data)
+    wb.save(file_path)
+    return len(data)
+
+
+_WRITERS = {
+    "openpyxl": _write_openpyxl,
+    "write_only": _write_write_only,
+    "pyexcelerate": _write_pyexcelerate,
+}
+
+
+def write_rows(file_path, sheet_name, rows, backend="auto", threshold=1000):
+    """
+    用选定的后端一次写完所有行，rows 可以是列表或行迭代器；返回 (使用的后端, 写入的行数)
+    """
+    row_count = len(rows) if hasattr(rows, "__len__") else None
+    chosen = choose_writer_backend(row_count, backend, threshold)
+    return chosen, _WRITERS[chosen](file_path, sheet_name, rows)
+
+
+class SheetNotFoundError(ValueError):
+    """
+    工作表选择器（名称或序号）在工作簿中不存在
+    """
+    pass
+
+
+def resolve_sheet(sheet_names, selector=None, default=None):
+    """
+    把工作表选择器解析为工作表名称：为空时返回 default（通常为活动工作表），
+    字符串优先按名称匹配，其次按从0开始的序号（整数或数字字符串，支持负数）
+    """
+    if selector is None or selector == '':
+        return default if default is not None else sheet_names[0]
+    if isinstance(selector, str):
+        if selector in sheet_names:
+            return selector
+        if selector.strip() in sheet_names:
+            return selector.strip()
+        if selector.strip().lstrip('-').isdigit():
+            selector = int(selector.strip())
+    if isinstance(selector, int) and not isinstance(selector, bool) and -len(sheet_names) <= selector < len(sheet_names):
+        return sheet_names[selector]
+    raise SheetNotFoundError(f"工作表不存在: {selector}（可选: {', '.join(sheet_names)}）")
+
+
+def _active_sheet_name(wb):
+    active = wb.active
+    return active.title if active is not None else wb.sheetnames[0]
+
+
+class ExcelRowReader:
+    """
+    以只读模式（openpyxl read_only）流式读取工作表，逐行产出单元格的值，不构建单元格对象
+    超出 max_rows / max_cols 的部分不会读入内存，truncated 表示是否发生了截断
+    sheet_name 为工作表选择器（名称或序号）；传入 workbook 时复用已打开的只读工作簿，关闭时不关闭它
+    """
+    def __init__(self, file_path, sheet_name=None, max_rows=None, max_cols=None, workbook=None):
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self.rows_read = 0
+        self.truncated = False
+        self._owns_workbook = workbook is None
+        self._wb = workbook if workbook is not None else load_workbook(file_path, read_only=True)
+        try:
+            self._ws = self._wb[resolve_sheet(self._wb.sheetnames, sheet_name, _active_sheet_name(self._wb))]
+        except Exception:
+            self.close()
+            raise
+        self.sheet_name = self._ws.title
+        self._dimensions = None
+        self._exhausted = False
+        # 读取过程中顺带统计的行数（含截断时多读的一行）和最大列数，以及读取停下时的行迭代器（计算尺寸时从这里继续计数）
+        self._rows_seen = 0
+        self._cols_seen = 0
+        self._rest = None
+        self._peeked = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        if self._owns_workbook:
+            self._wb.close()
+
+    @property
+    def dimensions(self):
+        """
+        工作表的真实 (行数, 列数)：已读完整张表时直接使用读取过程中的计数；
+        否则使用文件中记录的 dimension，缺失时从读取停下的位置继续计数剩余的行（不从头重新扫描，也不保留数据）
+        """
+        if self._dimensions is None:
+            max_row, max_col = self.recorded_dimensions
+            if not self._exhausted and (not max_row or not max_col):
+                if self._rest is None:
+                    self._rest = self._ws.iter_rows(values_only=True)
+                for row in self._rest:
+                    self._rows_seen += 1
+                    self._cols_seen = max(self._cols_seen, len(row))
+                self._rest = None
+                self._exhausted = True
+            if self._exhausted or not max_row or not max_col:
+                max_row, max_col = self._rows_seen, self._cols_seen
+            self._dimensions = (max_row, max_col)
+        return self._dimensions
+
+    def iter_rows(self):
+        """
+        逐行产出单元格的值（列表），最多 max_rows 行、每行最多 max_cols 列
+        截断时行迭代器停在第 max_rows + 1 行，rows_read 只计产出的行
+        """
+        sized_cols = self._ws.max_column
+        if self.max_cols and sized_cols and sized_cols > self.max_cols:
+            self.truncated = True
+        rows = self._rest = self._ws.iter_rows(values_only=True)
+        for row in rows:
+            self._rows_seen += 1
+            self._cols_seen = max(self._cols_seen, len(row))
+            if self.max_rows and self.rows_read >= self.max_rows:
+                # 剩余的行留给 iter_remaining 或 dimensions
+                self.truncated = True
+                self._peeked = row
+                return
+            if self.max_cols and len(row) > self.max_cols:
+                self.truncated = True
+                row = row[:self.max_cols]
+            self.rows_read += 1
+            yield list(row)
+        self._rest = None
+        self._exhausted = True
+
+    @property
+    def recorded_dimensions(self):
+        """
+        文件中记录的 (行数, 列数)，未记录时为 (None, None)；第三方导出的文件可能与实际不符
+        """
+        return self._ws.max_row or None, self._ws.max_column or None
+
+    @property
+    def has_more_rows(self):
+        """
+        iter_rows 是否因 max_rows 提前停止（工作表还有未读的行）
+        """
+        return self._peeked is not None
+
+    def iter_remaining(self):
+        """
+        iter_rows 因 max_rows 停止后，从停下的位置继续逐行产出剩余的行（每行最多 max_cols 列），
+        用于在同一次读取中把整张表送入流式统计；读完后 dimensions 直接使用读取过程中的计数
+        """
+        if self._peeked is None:
+            return
+        row, self._peeked = self._peeked, None
+        yield list(row[:self.max_cols]) if self.max_cols else list(row)
+        for row in self._rest:
+            self._rows_seen += 1
+            self._cols_seen = max(self._cols_seen, len(row))
+            yield list(row[:self.max_cols]) if self.max_cols else list(row)
+        self._rest = None
+        self._exhausted = True
+
+
+class LazyWorkbook:
+    """
+    多工作表工作簿：打开时只读取工作簿元数据和各工作表记录的尺寸（sheet index），
+    每个工作表的单元格在首次访问时才解析，解析结果按工作表缓存
+    """
+    def __init__(self, file_path, max_rows=None, max_cols=None):
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self._wb = load_workbook(file_path, read_only=True)
+        self.sheet_names = list(self._wb.sheetnames)
+        self.active_sheet = _active_sheet_name(self._wb)
+        self._sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._wb.close()
+
+    def index(self):
+        """
+        工作表索引：序号、名称、记录的行列数（不解析单元格，文件未记录尺寸时为 None）和是否为活动工作表
+        """
+        sheets = []
+        for idx, name in enumerate(self.sheet_names):
+            ws = self._wb[name]
+            sheets.append({
+                "index": idx,
+                "name": name,
+                "rows": getattr(ws, "max_row", None),
+                "cols": getattr(ws, "max_column", None),
+                "active": name == self.active_sheet
+            })
+        return sheets
+
+    def resolve(self, selector=None):
+        return resolve_sheet(self.sheet_names, selector, self.active_sheet)
+
+    def reader(self, selector=None, max_rows=None, max_cols=None):
+        """
+        打开某个工作表的流式读取器（共用本工作簿）
+        """
+        return ExcelRowReader(
+            self.file_path,
+            sheet_name=self.resolve(selector),
+            max_rows=max_rows or self.max_rows,
+            max_cols=max_cols or self.max_cols,
+            workbook=self._wb
+        )
+
+    def sheet(self, selector=None, max_rows=None, max_cols=None):
+        """
+        读取某个工作表（首次访问时解析），返回与 read_excel 相同结构的内容
+        """
+        name = self.resolve(selector)
+        key = (name, max_rows or self.max_rows, max_cols or self.max_cols)
+        if key not in self._sheets:
+            with self.reader(name, max_rows, max_cols) as reader:
+                content = {'sheet_name': reader.sheet_name, 'data': list(reader.iter_rows())}
+                content['total_rows'], content['total_cols'] = reader.dimensions
+                content['truncated'] = reader.truncated
+            self._sheets[key] = content
+        return self._sheets[key]
+
+
 class ExcelUtils:
-    def __init__(self):
-        # 初始化Excel工具类
-        pass
+    def __init__(self, max_rows=None, max_cols=None, writer_backend="auto", write_only_threshold=1000, parse_cache=None):
+        # 初始化Excel工具类；max_rows / max_cols 为读取时的默认上限（通常为 EXCEL_MAX_ROWS / EXCEL_MAX_COLS）
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        # 写入后端（EXCEL_WRITER_BACKEND）及 auto 模式下改用流式/批量写入的行数阈值
+        self.writer_backend = writer_backend
+        self.write_only_threshold = write_only_threshold
+        # 已解析工作表的缓存（ParsedWorkbookCache），为空时不缓存
+        self.parse_cache = parse_cache
     
-    def create_excel(self, file_path, sheet_name, data):
+    def create_excel(self, file_path, sheet_name, data, backend=None):
         """
         创建一个新的Excel文件
+        data 可以是二维列表或行迭代器；backend 为空时使用实例的默认写入后端（通常为 auto，按行数自动选择）
         """
         try:
-            # 创建工作簿
-            wb = Workbook()
-            ws = wb.active
-            ws.title = sheet_name
-            
-            # 写入数据
-            for row_idx, row_data in enumerate(data, 1):
-                for col_idx, cell_data in enumerate(row_data, 1):
-                    ws.cell(row=row_idx, column=col_idx, value=cell_data)
-            
-            # 保存文件
-            wb.save(file_path)
-            print(f"Excel文件已创建: {file_path}")
+            chosen, row_count = write_rows(file_path, sheet_name, data, backend or self.writer_backend,
+                                           self.write_only_threshold)
+            print(f"Excel文件已创建: {file_path}（{chosen}，{row_count}行）")
             return True
         except Exception as e:
             print(f"创建Excel文件失败: {str(e)}")
             return False
     
-    def read_excel(self, file_path):
+    def open_stream_writer(self, file_path, sheet_name="Sheet1"):
+        """
+        打开一个逐行写入的Excel文件，用于流式生成
+        """
+        return StreamingExcelWriter(file_path, sheet_name)
+    
+    def open_workbook(self, file_path, max_rows=None, max_cols=None):
+        """
+        打开一个按需解析的多工作表工作簿，未指定上限时使用默认上限
+        """
+        return LazyWorkbook(file_path, max_rows=max_rows or self.max_rows, max_cols=max_cols or self.max_cols)
+    
+    def list_sheets(self, file_path):
+        """
+        只读取工作表索引（名称、尺寸），不解析单元格
+        """
+        with LazyWorkbook(file_path) as book:
+            return book.index()
+    
+    def open_reader(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
+        """
+        打开一个流式只读的工作表读取器，未指定上限时使用默认上限
+        """
+        return ExcelRowReader(
+            file_path,
+            sheet_name=sheet_name,
+            max_rows=max_rows or self.max_rows,
+            max_cols=max_cols or self.max_cols
+        )
+    
+    def iter_excel_rows(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
         """
-        读取Excel文件内容
+        惰性逐行读取Excel，调用方可以直接消费行迭代器而不是完整列表
+        """
+        with self.open_reader(file_path, sheet_name, max_rows, max_cols) as reader:
+            yield from reader.iter_rows()
+    
+    def read_excel(self, file_path, sheet_name=None, max_rows=None, max_cols=None):
+        """
+        读取Excel文件中的一个工作表（只读流式读取，最多读取 max_rows 行、max_cols 列）
+        sheet_name 为工作表选择器（名称或从0开始的序号），为空时读取活动工作表；其余工作表不会被解析
+        total_rows / total_cols 为工作表的真实尺寸，truncated 表示 data 是否被截断，sheets 为工作表索引
         """
         try:
-            wb = load_workbook(file_path)
-            ws = wb.active
-            
-            content = {}
-            content['sheet_name'] = ws.title
-            content['data'] = []
-            
-            # 读取所有数据
-            for row in ws.iter_rows(values_only=True):
-                content['data'].append(list(row))
+            with self.open_workbook(file_path, max_rows, max_cols) as book:
+                content = dict(book.sheet(sheet_name))
+                content['sheets'] = book.index()
             
+            if content['truncated']:
+                print(f"Excel超出读取上限，已截断: {file_path}, 实际 {content['total_rows']}行 x {content['total_cols']}列")
             return content
         except Exception as e:
             print(f"读取Excel文件失败: {str(e)}")
             return {"error": str(e)}
     
-    def edit_excel(self, input_path, output_path, operations):
+    def load_sheet(self, file_path, sheet_name=None, digest=None):
+        """
+        读取工作表并按列解析，返回 (read_excel 的结果, SheetFrame)；读取失败时 SheetFrame 为 None
+        传入上传内容的 digest（SHA-256）时，相同内容、相同工作表的重复请求直接使用解析缓存
+        """
+        content, frame, _ = self.scan_sheet(file_path, sheet_name, digest)
+        return content, frame
+    
+    def scan_sheet(self, file_path, sheet_name=None, digest=None, approx_rows=None, sample_rows=SAMPLE_ROWS):
+        """
+        一次流式读取完成 load_sheet 和整表的近似统计摘要，返回 (read_excel 的结果, SheetFrame, SheetSketch 或 None)
+        前 max_rows 行读入内存构建 SheetFrame；数据行超过 approx_rows 时，已读入的行和同一个行迭代器中剩余的行
+        （不受 max_rows 限制，列数上限不变）一起逐块送入 SheetSketch，并按 report_groups 选出的列分组汇总，
+        工作簿只打开一次、工作表只扫描一遍，total_rows / total_cols 为这次读取的计数；approx_rows 为空时不构建摘要
+        读取失败时 SheetFrame 为 None；传入 digest 时使用解析缓存（缓存中的摘要由多个请求共用，不要在其上调用 merge / update）
+        """
+        key = None
+        if digest and self.parse_cache is not None and self.parse_cache.enabled:
+            kind = f"sheet~{approx_rows}~{sample_rows}" if approx_rows else "sheet"
+            key = self.parse_cache.make_key(digest, kind, sheet_name, self.max_rows, self.max_cols)
+            cached, _ = self.parse_cache.get(key)
+            if cached is not None:
+                content, frame, sketch = cached if approx_rows else (*cached, None)
+                return dict(content), frame, sketch
+        try:
+            with self.open_workbook(file_path) as book:
+                with book.reader(sheet_name) as reader:
+                    content = {'sheet_name': reader.sheet_name, 'data': list(reader.iter_rows())}
+                    # 未读完时按文件记录的行数判断，未记录行数时直接构建摘要（计数本身也要读完整张表）
+                    total_rows = reader.recorded_dimensions[0] if reader.has_more_rows else len(content['data'])
+                    frame = sketch = None
+                    if approx_rows and (total_rows is None or total_rows - 1 > approx_rows):
+                        # 先解析已读入的行，确定分析报告作图的列，再对整张表分组汇总这些列
+                        frame = SheetFrame.from_rows(content['data'], sheet_name=reader.sheet_name)
+                        groups = [pair for pair in report_groups(frame.without_summary_rows()).values() if pair]
+                        # 固定随机种子，同一份数据的抽样行（以及提示词）保持不变
+                        sketch = SheetSketch.from_rows(chain(content['data'], reader.iter_remaining()),
+                                                       sheet_name=reader.sheet_name, sample_rows=sample_rows, seed=0,
+                                                       groups=groups)
+                    content['total_rows'], content['total_cols'] = reader.dimensions
+                    content['truncated'] = reader.truncated
+                content['sheets'] = book.index()
+        except Exception as e:
+            print(f"读取Excel文件失败: {str(e)}")
+            return {"error": str(e)}, None, None
+        if content['truncated']:
+            print(f"Excel超出读取上限，已截断: {file_path}, 实际 {content['total_rows']}行 x {content['total_cols']}列")
+        if frame is None:
+            frame = SheetFrame.from_excel_content(content)
+        elif content['truncated']:
+            # 复用已解析的列，补上这次读取得到的真实尺寸（与 from_excel_content 相同）
+            frame = SheetFrame(frame.sheet_name, frame.columns, content['total_rows'] - 1, content['total_cols'],
+                               truncated=True)
+        if key is not None:
+            self.parse_cache.set(key, (content, frame, sketch) if approx_rows else (content, frame))
+        return dict(content), frame, sketch
+    
+    def edit_excel(self, input_path, output_path, operations, sheet_name=None):
         """
         根据操作列表编辑Excel文件
+        sheet_name 为默认操作的工作表（名称或序号，为空时为活动工作表），单个操作可以用 sheet 字段另行指定
+        单元格级操作先编译为编辑计划（合并插入、解析最终坐标）再一次性应用，避免每次插入行都整体下移其后的所有单元格；
+        区域/整列的批量操作（fill_column、sort、filter 等）在列数组上向量化执行
         """
         try:
-            # 加载现有工作簿
+            # 加载现有工作簿（编辑后需要完整保存，因此加载全部工作表）
             wb = load_workbook(input_path)
-            ws = wb.active
+            default_sheet = resolve_sheet(wb.sheetnames, sheet_name, _active_sheet_name(wb))
+            
+            # 校验并编译操作
+            programs, problems = compile_operations(
+                operations, wb.sheetnames, default_sheet,
+                resolve=lambda selector: resolve_sheet(wb.sheetnames, selector)
+            )
             
             # 执行操作
-            if isinstance(operations, list):
-                for op in operations:
-                    if op.get('type') == 'add_row':
-                        row_data = op.get('data', [])
-                        row_index = op.get('index', ws.max_row + 1)
-                        ws.insert_rows(row_index)
-                        for col_idx, value in enumerate(row_data, 1):
-                            ws.cell(row=row_index, column=col_idx, value=value)
-                    
-                    elif op.get('type') == 'update_cell':
-                        row = op.get('row')
-                        col = op.get('col')
-                        value = op.get('value')
-                        if row and col:
-                            ws.cell(row=row, column=col, value=value)
-                    
-                    elif op.get('type') == 'format_cell':
-                        row = op.get('row')
-                        col = op.get('col')
-                        format_data = op.get('format', {})
-                        if row and col:
-                            cell = ws.cell(row=row, column=col)
-                            # 应用格式
-                            if 'font' in format_data:
-                                font_data = format_data['font']
-                                font = Font(
-                                    name=font_data.get('name'),
-                                    size=font_data.get('size'),
-                                    bold=font_data.get('bold'),
-                                    italic=font_data.get('italic'),
-                                    color=font_data.get('color')
-                                )
-                                cell.font = font
-                            # 可以添加更多格式设置
+            styles = StyleRegistry(wb)
+            for name, steps in programs.items():
+                problems.extend(apply_program(wb[name], steps, styles))
+            for problem in problems:
+                print(f"跳过编辑操作: {problem}")
             
             # 保存修改后的文件
             wb.save(output_path)
@@ -107,18 +511,33 @@ class ExcelUtils:
             print(f"编辑Excel文件失败: {str(e)}")
             return False
     
-    def apply_style(self, file_path, sheet_name, style_data):
+    def apply_style(self, file_path, sheet_name, style_data, output_path=None):
         """
-        为Excel文件应用样式
+        为Excel文件按区域批量应用样式
+        style_data 为 [{"range": "A1:F1", "style": {"font": {...}, "fill": "FFFF00", "border": "thin", ...}}, ...]，
+        也可以是 {"A1:F1": {...}} 形式的字典；相同的样式组合只登记一次为命名样式，整个区域共用
+        output_path 为空时覆盖原文件
         """
         try:
             wb = load_workbook(file_path)
-            ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+            ws = wb[resolve_sheet(wb.sheetnames, sheet_name, _active_sheet_name(wb))]
             
             # 应用样式
-            # 这里可以添加更多样式设置逻辑
+            if isinstance(style_data, dict):
+                style_data = [{"range": cell_range, "style": style} for cell_range, style in style_data.items()]
+            styles = StyleRegistry(wb)
+            for rule in style_data or []:
+                if not isinstance(rule, dict) or not rule.get("range"):
+                    print(f"跳过样式设置: {rule}")
+                    continue
+                style = rule.get("style") or {k: v for k, v in rule.items() if k != "range"}
+                try:
+                    styles.apply_range(ws, rule["range"], style)
+                except StyleError as e:
+                    print(f"跳过样式设置: {rule['range']}, {e}")
             
-            wb.save(file_path)
+            wb.save(output_path or file_path)
+            print(f"样式已应用: {styles.applied}个单元格, {styles.style_count}种样式")
             return True
         except Exception as e:
             print(f"应用样式失败: {str(e)}")
@@ -230,17 +649,40 @@ def generate_mock_response(description):
 
 
 # 添加数据分析报告生成函数，用于在API不可用时提供模拟分析结果
-def generate_analysis_report(excel_content):
+def report_groups(data_frame):
+    """
+    分析报告作图所用的列：{"time": (时间列, 销售额列)}，表头中没有销售和时间相关的列时为 None
+    data_frame 为去掉合计行的数据；scan_sheet 按这些列对整张工作表流式分组汇总（见 SheetSketch.group_frame）
+    """
+    time_col_idx = data_frame.column_index(['月份', '日期', '时间', 'month', 'date', 'time'])
+    sales_col_idx = data_frame.column_index(['销售额', '销量', '业绩', 'revenue', 'sales'])
+    if time_col_idx is None or sales_col_idx is None:
+        return {"time": None}
+    return {"time": (time_col_idx, sales_col_idx)}
+
+
+def generate_analysis_report(excel_content, frame=None, sketch=None):
     """
     生成模拟的Excel数据分析报告
+    frame 为同一份数据已构建好的 SheetFrame（未传入时按需构建）；统计类洞察和图表都来自
+    profile_frame 的列概要（每列一次向量化统计），不再逐行解析单元格；
+    anomalies 来自 detect_anomalies 的本地统计异常检测，anomaly_details 中带有对应的单元格坐标
+    合计行（总计、合计、Total 等）不参与列统计、图表和趋势，只参与异常检测
+    sketch 为整张工作表的近似统计摘要（SheetSketch，超大工作表时传入）：记录数、列统计和年龄分布改用摘要，
+    趋势改用摘要中的全表分组汇总（见 report_groups，分组过多时退回已读入的行），均覆盖全表；
+    异常检测只基于已读入的行，摘要中会注明其行范围
     """
     try:
         # 解析Excel内容
         data = excel_content.get('data', [])
         sheet_name = excel_content.get('sheet_name', '未知工作表')
         
+        # 按列解析数据（调用方已构建 SheetFrame 时直接复用）
+        if frame is None and data:
+            frame = SheetFrame.from_excel_content(excel_content)
+        
         # 如果数据为空，返回基本报告
-        if not data or len(data) < 2:
+        if frame is None or frame.n_rows < 1:
             return {
                 "status": "success",
                 "sheet_name": sheet_name,
@@ -251,18 +693,36 @@ def generate_analysis_report(excel_content):
                 "visualization_data": []
             }
         
-        # 提取表头和数据
-        headers = data[0]
-        rows = data[1:]
+        # 提取表头和列概要
+        headers = frame.headers
+        header_set = set(headers)
+        # 汇总统计使用去掉合计行的数据，避免与明细重复计算
+        data_frame = frame.without_summary_rows()
+        if sketch is not None:
+            summary_rows = sketch.summary_rows
+            row_count = sketch.n_rows - summary_rows
+        else:
+            summary_rows = frame.n_rows - data_frame.n_rows
+            row_count = data_frame.n_rows
+        profiles = sketch.profiles() if sketch is not None else profile_frame(data_frame)
+        anomalies = detect_anomalies(frame)
+        summary = f"该工作表包含{len(headers)}个字段和{row_count}条数据记录。"
+        if summary_rows:
+            summary += f"另有{summary_rows}行合计行，未计入统计。"
+        if sketch is not None:
+            summary += "数据量较大，各列统计为全表的流式近似估计。"
+        if frame.truncated or sketch is not None:
+            summary += f"异常检测基于前{frame.n_rows}行数据。"
         
         # 分析报告模板，确保即使没有特定数据也至少返回一些可视化数据
         report = {
             "status": "success",
             "sheet_name": sheet_name,
-            "summary": f"该工作表包含{len(headers)}个字段和{len(rows)}条数据记录。",
+            "summary": summary,
             "insights": [],
             "trends": [],
-            "anomalies": [],
+            "anomalies": [finding["message"] for finding in anomalies],
+            "anomaly_details": anomalies,
             "visualization_data": []
         }
         
@@ -272,7 +732,7 @@ def generate_analysis_report(excel_content):
             "title": "数据分布概览",
             "data": [
                 {"field": "表头数量", "value": len(headers)},
-                {"field": "数据行数", "value": len(rows)}
+                {"field": "数据行数", "value": row_count}
             ],
             "x_axis": "field",
             "y_axis": "value"
@@ -280,37 +740,26 @@ def generate_analysis_report(excel_content):
         
         # 根据不同的数据类型生成不同的分析
         # 检查是否包含销售相关数据
-        sales_related = any(h in ['销售额', '销量', '业绩', '销售', 'revenue', 'sales'] for h in headers)
-        time_related = any(h in ['月份', '日期', '时间', 'month', 'date', 'time'] for h in headers)
+        sales_related = not header_set.isdisjoint(['销售额', '销量', '业绩', '销售', 'revenue', 'sales'])
+        time_related = not header_set.isdisjoint(['月份', '日期', '时间', 'month', 'date', 'time'])
         
         if sales_related:
             # 生成销售数据相关的分析
             report['insights'].append("数据包含销售相关信息，显示了业务运营情况。")
             
             # 查找销售额列
-            sales_col_idx = None
-            for i, header in enumerate(headers):
-                if header in ['销售额', '销量', '业绩', 'revenue', 'sales']:
-                    sales_col_idx = i
-                    break
+            sales_col_idx = frame.column_index(['销售额', '销量', '业绩', 'revenue', 'sales'])
             
             # 如果找到销售额列，生成更多分析
             if sales_col_idx is not None:
                 try:
-                    # 提取销售额数据（尝试转换为数字）
-                    sales_values = []
-                    for row in rows:
-                        if len(row) > sales_col_idx and row[sales_col_idx]:
-                            try:
-                                # 处理可能包含百分号或货币符号的值
-                                val = str(row[sales_col_idx]).replace('%', '').replace('￥', '').replace('$', '').replace(',', '')
-                                sales_values.append(float(val))
-                            except:
-                                pass
+                    # 销售额数据（货币符号、百分号等在构建 SheetFrame 时已解析）
+                    sales_column = data_frame.columns[sales_col_idx]
+                    sales_profile = profiles[sales_col_idx]
                     
-                    if sales_values:
-                        total_sales = sum(sales_values)
-                        avg_sales = total_sales / len(sales_values)
+                    if sales_profile['kind'] == KIND_NUMBER:
+                        total_sales = sales_profile['sum']
+                        avg_sales = sales_profile['mean']
                         
                         report['insights'].append(f"总销售额/销量: {total_sales:.2f}")
                         report['insights'].append(f"平均销售额/销量: {avg_sales:.2f}")
@@ -318,24 +767,26 @@ def generate_analysis_report(excel_content):
                         # 生成可视化数据
                         if time_related:
                             # 查找时间列
-                            time_col_idx = None
-                            for i, header in enumerate(headers):
-                                if header in ['月份', '日期', '时间', 'month', 'date', 'time']:
-                                    time_col_idx = i
-                                    break
+                            time_col_idx = frame.column_index(['月份', '日期', '时间', 'month', 'date', 'time'])
                             
-                            if time_col_idx is not None and len(rows) > 0:
-                                # 生成时间序列可视化数据
-                                time_data = []
-                                for row in rows:
-                                    if len(row) > time_col_idx and len(row) > sales_col_idx:
-                                        try:
-                                            time_data.append({
-                                                "time": str(row[time_col_idx]),
-                                                "value": float(str(row[sales_col_idx]).replace('%', '').replace('￥', '').replace('$', '').replace(',', ''))
-                                            })
-                                        except:
-                                            continue
+                            if time_col_idx is not None:
+                                # 生成时间序列可视化数据：按时间排序、同一期汇总后的序列，
+                                # 优先使用摘要中的全表分组汇总（两列：时间列、销售额列）
+                                grouped = sketch.group_frame(time_col_idx, sales_col_idx) if sketch is not None else None
+                                if grouped is not None:
+                                    trend = analyze_trend(grouped, 0, 1)
+                                else:
+                                    trend = analyze_trend(data_frame, time_col_idx, sales_col_idx)
+                                partial = grouped is None and (frame.truncated or sketch is not None)
+                                if trend:
+                                    time_data = [{"time": label, "value": value} for label, value in trend['series']]
+                                else:
+                                    time_column = data_frame.columns[time_col_idx]
+                                    rows = np.flatnonzero(sales_column.valid & ~time_column.mask)
+                                    time_data = [
+                                        {"time": label, "value": value}
+                                        for label, value in zip(time_column.texts(rows), sales_column.values[rows].tolist())
+                                    ]
                                 
                                 if time_data:
                                     report['visualization_data'].append({
@@ -345,57 +796,54 @@ def generate_analysis_report(excel_content):
                                         "x_axis": "time",
                                         "y_axis": "value"
                                     })
-                                    report['trends'].append("数据显示了明显的时间趋势，可以进行季节性分析。")
+                                    if trend:
+                                        report['trends'].extend(trend['messages'])
+                                        report['trend_details'] = trend
+                                    else:
+                                        report['trends'].append("数据显示了明显的时间趋势，可以进行季节性分析。")
+                                    if partial:
+                                        report['trends'].append(f"趋势基于前{frame.n_rows}行数据。")
                 except Exception as e:
                     print(f"生成销售分析时出错: {str(e)}")
         
         # 检查是否包含人员相关数据
-        if any(h in ['员工', '姓名', '部门', '职位', 'employee', 'name', 'department', 'position'] for h in headers):
+        if not header_set.isdisjoint(['员工', '姓名', '部门', '职位', 'employee', 'name', 'department', 'position']):
             report['insights'].append("数据包含人员相关信息，可以进行人力资源分析。")
             
             # 生成部门分布可视化数据
-            dept_col_idx = None
-            for i, header in enumerate(headers):
-                if header in ['部门', 'department']:
-                    dept_col_idx = i
-                    break
+            dept_col_idx = frame.column_index(['部门', 'department'])
             
             if dept_col_idx is not None:
-                dept_count = {}
-                for row in rows:
-                    if len(row) > dept_col_idx and row[dept_col_idx]:
-                        dept = row[dept_col_idx]
-                        dept_count[dept] = dept_count.get(dept, 0) + 1
+                # 人数最多的部门单独显示，其余合并为"其他"
+                dept_profile = profiles[dept_col_idx]
+                dept_count = list(dept_profile['top'])
+                if dept_profile['other']:
+                    dept_count.append(['其他', dept_profile['other']])
                 
                 if dept_count:
                     report['visualization_data'].append({
                         "type": "pie_chart",
                         "title": "部门人员分布",
                         "data": [
-                            {"name": dept, "value": count} for dept, count in dept_count.items()
+                            {"name": dept, "value": count} for dept, count in dept_count
                         ]
                     })
-                    report['insights'].append(f"部门数量: {len(dept_count)}")
+                    report['insights'].append(f"部门数量: {dept_profile['distinct']}")
         
         # 检查是否包含性别相关数据
-        gender_col_idx = None
-        for i, header in enumerate(headers):
-            if header in ['性别', '男/女', 'gender', 'sex']:
-                gender_col_idx = i
-                break
+        gender_col_idx = frame.column_index(['性别', '男/女', 'gender', 'sex'])
         
         if gender_col_idx is not None:
             # 统计性别分布
             gender_count = {}
-            for row in rows:
-                if len(row) > gender_col_idx and row[gender_col_idx]:
-                    gender = str(row[gender_col_idx]).strip()
-                    # 标准化性别表示
-                    if gender in ['男', 'male', 'Male', 'M', 'm']:
-                        gender = '男'
-                    elif gender in ['女', 'female', 'Female', 'F', 'f']:
-                        gender = '女'
-                    gender_count[gender] = gender_count.get(gender, 0) + 1
+            for value, count in profiles[gender_col_idx]['top']:
+                gender = str(value).strip()
+                # 标准化性别表示
+                if gender in ['男', 'male', 'Male', 'M', 'm']:
+                    gender = '男'
+                elif gender in ['女', 'female', 'Female', 'F', 'f']:
+                    gender = '女'
+                gender_count[gender] = gender_count.get(gender, 0) + count
             
             if gender_count:
                 report['insights'].append("数据包含性别信息，已生成性别分布分析。")
@@ -432,54 +880,45 @@ def generate_analysis_report(excel_content):
                 })
         
         # 检查是否包含产品相关数据
-        if any(h in ['产品', '库存', '单价', 'product', 'inventory', 'price'] for h in headers):
+        if not header_set.isdisjoint(['产品', '库存', '单价', 'product', 'inventory', 'price']):
             report['insights'].append("数据包含产品和库存相关信息，有助于供应链管理分析。")
         
         # 检查是否包含年龄相关数据
-        age_col_idx = None
-        for i, header in enumerate(headers):
-            if header in ['年龄', '岁数', 'age']:
-                age_col_idx = i
-                break
+        age_col_idx = frame.column_index(['年龄', '岁数', 'age'])
         
         if age_col_idx is not None:
-            # 统计年龄分布
-            age_values = []
-            for row in rows:
-                if len(row) > age_col_idx and row[age_col_idx]:
-                    try:
-                        age = float(row[age_col_idx])
-                        if age > 0 and age < 150:  # 合理的年龄范围
-                            age_values.append(age)
-                    except:
-                        pass
+            # 年龄分布按年龄段分组（右闭区间，超过100岁计入最后一段）
+            bins = [0, 18, 30, 40, 50, 60, 100]
+            labels = ['0-18岁', '19-30岁', '31-40岁', '41-50岁', '51-60岁', '60岁以上']
+            age_stats = None
+            
+            if sketch is not None:
+                # 近似模式：统计信息来自列概要，各年龄段人数由全表的 t-digest 估计（合理的年龄范围）
+                age_profile = profiles[age_col_idx]
+                if age_profile['kind'] == KIND_NUMBER:
+                    ranks = sketch.columns[age_col_idx].digest.rank(bins[:-1] + [np.nextafter(150, 0)])
+                    group_counts = np.rint(np.diff(ranks)).astype(np.int64)
+                    if group_counts.sum() > 0:
+                        age_stats = (age_profile['min'], age_profile['max'], age_profile['mean'])
+            else:
+                # 统计年龄分布（合理的年龄范围）
+                age_values = data_frame.columns[age_col_idx].numbers()
+                age_values = age_values[(age_values > 0) & (age_values < 150)]
+                if age_values.size:
+                    age_stats = (float(age_values.min()), float(age_values.max()), float(age_values.mean()))
+                    group_idx = np.minimum(np.searchsorted(bins, age_values, side='left') - 1, len(labels) - 1)
+                    group_counts = np.bincount(group_idx, minlength=len(labels))
             
-            if age_values:
+            if age_stats:
                 # 计算年龄统计信息
-                min_age = min(age_values)
-                max_age = max(age_values)
-                avg_age = sum(age_values) / len(age_values)
+                min_age, max_age, avg_age = age_stats
                 
                 report['insights'].append("数据包含年龄信息，已生成年龄统计分析。")
                 report['insights'].append(f"年龄范围: {min_age:.0f} - {max_age:.0f}岁")
                 report['insights'].append(f"平均年龄: {avg_age:.1f}岁")
                 
-                # 生成年龄分布可视化数据（按年龄段分组）
-                # 定义年龄段
-                bins = [0, 18, 30, 40, 50, 60, 100]
-                labels = ['0-18岁', '19-30岁', '31-40岁', '41-50岁', '51-60岁', '60岁以上']
-                age_groups = {label: 0 for label in labels}
-                
-                for age in age_values:
-                    for i in range(len(bins)-1):
-                        if bins[i] < age <= bins[i+1]:
-                            age_groups[labels[i]] += 1
-                            break
-                    if age > bins[-1]:
-                        age_groups[labels[-1]] += 1
-                
                 # 过滤掉数量为0的年龄段
-                age_data = [{'name': label, 'value': count} for label, count in age_groups.items() if count > 0]
+                age_data = [{'name': label, 'value': int(count)} for label, count in zip(labels, group_counts) if count > 0]
                 
                 if age_data:
                     report['visualization_data'].append({
@@ -496,34 +935,20 @@ def generate_analysis_report(excel_content):
                 numeric_headers.append((i, header))
         
         for col_idx, header in numeric_headers:
-            # 尝试提取数值数据
-            numeric_values = []
-            for row in rows:
-                if len(row) > col_idx and row[col_idx]:
-                    try:
-                        # 处理可能包含百分号或货币符号的值
-                        val = str(row[col_idx]).replace('%', '').replace('￥', '').replace('$', '').replace(',', '')
-                        numeric_values.append(float(val))
-                    except:
-                        continue
+            profile = profiles[col_idx]
             
-            if len(numeric_values) > 0:
-                # 计算统计信息
-                min_val = min(numeric_values)
-                max_val = max(numeric_values)
-                avg_val = sum(numeric_values) / len(numeric_values)
-                
-                report['insights'].append(f"{header}统计: 最小值={min_val:.2f}, 最大值={max_val:.2f}, 平均值={avg_val:.2f}")
+            if profile['kind'] == KIND_NUMBER:
+                report['insights'].append(f"{header}统计: 最小值={profile['min']:.2f}, 最大值={profile['max']:.2f}, 平均值={profile['mean']:.2f}")
         
         # 添加一些通用的洞察
-        if len(rows) > 100:
+        if row_count > 100:
             report['insights'].append("数据量较大（超过100条记录），建议使用数据透视表进行深入分析。")
-        elif len(rows) < 10:
+        elif row_count < 10:
             report['anomalies'].append("数据量较少，可能影响分析结果的可靠性。")
         
         # 添加一些基本统计信息
         report['insights'].append(f"数据字段数量: {len(headers)}")
-        report['insights'].append(f"数据记录数量: {len(rows)}")
+        report['insights'].append(f"数据记录数量: {row_count}")
         
         # 如果没有具体的洞察，添加一些通用信息
         if not report['insights']:
@@ -0,0 +1,312 @@
+import ast
+import math
+import operator
+
+import numpy as np
+
+
+class ExpressionError(ValueError):
+    """
+    表达式不合法（语法错误、使用了不允许的语法或引用了不存在的列）
+    """
+    pass
+
+
+MAX_EXPRESSION_LENGTH = 500
+MAX_EXPRESSION_NODES = 200
+# 文本重复（如 "ab" * 3）结果的最大长度，与Excel单元格的字符数上限相同
+MAX_TEXT_LENGTH = 32767
+
+def _power(base, exponent):
+    """
+    乘方按 float64 计算：整数乘方会静默溢出（如 9 ** 9 ** 9 得到负数），浮点数溢出时为 inf（写入时视为空值，与除以零相同）
+    """
+    return np.power(np.asarray(base, dtype=np.float64), exponent)
+
+
+_BIN_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: _power,
+}
+
+def _py_power(base, exponent):
+    if not isinstance(base, (int, float)) or not isinstance(exponent, (int, float)):
+        raise TypeError(f"不能对 {base!r} 和 {exponent!r} 做乘方")
+    try:
+        return math.pow(base, exponent)
+    except ValueError:
+        return None
+
+
+def _py_multiply(left, right):
+    # 文本乘以整数为重复，先检查结果长度，避免构造超长字符串
+    text, times = (left, right) if isinstance(left, str) else (right, left)
+    if isinstance(text, str) and isinstance(times, int) and len(text) * times > MAX_TEXT_LENGTH:
+        raise ExpressionError(f"文本重复后超过{MAX_TEXT_LENGTH}个字符")
+    return left * right
+
+
+# 含文本、空值的 object 数组逐个元素计算时使用的运算
+_PY_BIN_OPS = {
+    ast.Sub: operator.sub,
+    ast.Mult: _py_multiply,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _py_power,
+}
+
+_CMP_OPS = {
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+}
+
+_PY_CMP_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+_UNARY_OPS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+    ast.Not: np.logical_not,
+}
+
+
+def _is_text(value):
+    if isinstance(value, str):
+        return True
+    return isinstance(value, np.ndarray) and value.dtype.kind in ('U', 'O')
+
+
+def _elementwise(func, left, right, skip_nulls=True):
+    """
+    逐个元素计算（用于文本列、含空值或混合类型的列），返回 object 数组
+    skip_nulls 为 True 时有空值参与的结果为空值；除以零、溢出的结果为空值，与数值列的 NaN/inf 一致
+    """
+    left, right = np.broadcast_arrays(np.asarray(left, dtype=object), np.asarray(right, dtype=object))
+    result = np.empty(left.shape, dtype=object)
+    flat = result.reshape(-1)
+    for i, (a, b) in enumerate(zip(left.reshape(-1).tolist(), right.reshape(-1).tolist())):
+        if skip_nulls and (a is None or b is None):
+            flat[i] = None
+            continue
+        try:
+            flat[i] = func(a, b)
+        except (ZeroDivisionError, OverflowError):
+            flat[i] = None
+    return result
+
+
+def _safe_compare(func):
+    def compare(a, b):
+        try:
+            return bool(func(a, b))
+        except TypeError:
+            # 类型不匹配（如文本与数值比较大小）视为不满足条件
+            return False
+    return compare
+
+
+def _compare(op_type, left, right):
+    """
+    比较运算：数值、日期列按 numpy 向量化比较；涉及文本、空值或类型不匹配时逐个元素比较，
+    空值比较大小的结果为 False（== None 可判断空值），类型不匹配（如文本与数值比较大小）也为 False
+    """
+    for this, other in ((left, right), (right, left)):
+        if isinstance(this, np.ndarray) and this.dtype.kind == 'M' and isinstance(other, str):
+            # 日期列与日期文本比较（如 日期 >= "2024-01-01"）
+            try:
+                converted = np.datetime64(other.strip())
+            except ValueError:
+                continue
+            left, right = (this, converted) if this is left else (converted, this)
+            break
+        if other is None and isinstance(this, np.ndarray) and this.dtype.kind in ('f', 'M'):
+            # 数值、日期列的空值为 NaN/NaT
+            nulls = np.isnan(this) if this.dtype.kind == 'f' else np.isnat(this)
+            if op_type is ast.Eq:
+                return nulls
+            return ~nulls if op_type is ast.NotEq else np.zeros(this.shape, dtype=bool)
+    if not _is_text(left) and not _is_text(right):
+        try:
+            return _CMP_OPS[op_type](left, right)
+        except TypeError:
+            pass
+    func = _safe_compare(_PY_CMP_OPS[op_type])
+    return _elementwise(func, left, right, skip_nulls=False).astype(bool)
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return '' if value is None else str(value)
+
+
+def to_text(value):
+    """
+    把数值/日期/文本转换为文本数组（整数值的浮点数不带小数点）
+    """
+    if isinstance(value, np.ndarray):
+        return np.array([_format_value(v) for v in value.tolist()], dtype=object)
+    return _format_value(value.item() if isinstance(value, np.generic) else value)
+
+
+def _concat(*parts):
+    result = to_text(parts[0])
+    for part in parts[1:]:
+        result = np.add(result, to_text(part)) if isinstance(result, np.ndarray) or isinstance(part, np.ndarray) \
+            else result + to_text(part)
+    return result
+
+
+def _year(value):
+    return np.asarray(value, dtype='datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def _month(value):
+    return np.asarray(value, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+def _day(value):
+    days = np.asarray(value, dtype='datetime64[D]')
+    return (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+
+
+# 允许在表达式中调用的函数（全部按元素计算）
+FUNCTIONS = {
+    "round": lambda x, n=0: np.round(x, int(n)),
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "exp": np.exp,
+    "floor": np.floor,
+    "ceil": np.ceil,
+    "min": np.minimum,
+    "max": np.maximum,
+    "clip": np.clip,
+    "where": np.where,
+    "text": to_text,
+    "concat": _concat,
+    "year": _year,
+    "month": _month,
+    "day": _day,
+}
+
+
+def compile_expression(expr):
+    """
+    解析并校验表达式，返回 (语法树, 引用的列名集合)
+    列名可以直接作为变量使用（如 单价 * 数量），包含空格等字符的列名使用 col("列名")
+    """
+    if not isinstance(expr, str) or not expr.strip():
+        raise ExpressionError("表达式不能为空")
+    if len(expr) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"表达式过长（超过{MAX_EXPRESSION_LENGTH}个字符）")
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"表达式语法错误: {expr}") from e
+
+    names = set()
+    nodes = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+                             ast.Load, ast.And, ast.Or)) or type(node) in _BIN_OPS \
+                or type(node) in _CMP_OPS or type(node) in _UNARY_OPS:
+            continue
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, str, bool)) and node.value is not None:
+                raise ExpressionError(f"不支持的常量: {node.value!r}")
+        elif isinstance(node, ast.Name):
+            if node.id not in FUNCTIONS and node.id != "col":
+                names.add(node.id)
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                raise ExpressionError("只能调用内置函数，且不支持关键字参数")
+            if node.func.id == "col":
+                if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant) or not isinstance(node.args[0].value, str):
+                    raise ExpressionError('col() 的参数必须是列名字符串，如 col("销售 额")')
+                names.add(node.args[0].value)
+            elif node.func.id not in FUNCTIONS:
+                raise ExpressionError(f"不支持的函数: {node.func.id}")
+        else:
+            raise ExpressionError(f"表达式中不允许使用 {type(node).__name__}")
+    if nodes > MAX_EXPRESSION_NODES:
+        raise ExpressionError("表达式过于复杂")
+    return tree, names
+
+
+def evaluate(tree, namespace, length):
+    """
+    在列数组上对表达式求值，返回长度为 length 的 numpy 数组
+    namespace: 列名 -> numpy 数组
+    运算的类型不匹配（如日期乘以数值、文本列取整）时抛出 ExpressionError
+    """
+    try:
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = _eval(tree.body, namespace)
+    except ExpressionError:
+        raise
+    except (TypeError, ValueError, ArithmeticError, AttributeError) as e:
+        raise ExpressionError(f"表达式无法计算: {e}") from e
+    if not isinstance(result, np.ndarray) or result.shape != (length,):
+        result = np.broadcast_to(np.asarray(result, dtype=object if _is_text(result) else None), (length,)).copy()
+    return result
+
+
+def _lookup(name, namespace):
+    if name not in namespace:
+        raise ExpressionError(f"表达式引用了不存在的列: {name}")
+    return namespace[name]
+
+
+def _eval(node, namespace):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return _lookup(node.id, namespace)
+    if isinstance(node, ast.BinOp):
+        left, right = _eval(node.left, namespace), _eval(node.right, namespace)
+        if _is_text(left) or _is_text(right):
+            if isinstance(node.op, ast.Add):
+                return _concat(left, right)
+            return _elementwise(_PY_BIN_OPS[type(node.op)], left, right)
+        return _BIN_OPS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPS[type(node.op)](_eval(node.operand, namespace))
+    if isinstance(node, ast.BoolOp):
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        result = _eval(node.values[0], namespace)
+        for value in node.values[1:]:
+            result = combine(result, _eval(value, namespace))
+        return result
+    if isinstance(node, ast.Compare):
+        result, left = None, _eval(node.left, namespace)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _eval(comparator, namespace)
+            current = _compare(type(op), left, right)
+            result = current if result is None else np.logical_and(result, current)
+            left = right
+        return result
+    if isinstance(node, ast.IfExp):
+        return np.where(_eval(node.test, namespace), _eval(node.body, namespace), _eval(node.orelse, namespace))
+    if isinstance(node, ast.Call):
+        if node.func.id == "col":
+            return _lookup(node.args[0].value, namespace)
+        return FUNCTIONS[node.func.id](*[_eval(arg, namespace) for arg in node.args])
+    raise ExpressionError(f"表达式中不允许使用 {type(node).__name__}")
@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import json
+
+import httpx
+
+from .logger_config import llm_logger
+
+
+class LLMError(Exception):
+    """
+    调用大模型接口失败（网络错误、超时、返回了非2xx状态码或无法解析的响应）
+    """
+    pass
+
+
+class DeepSeekClient:
+    """
+    DeepSeek Chat Completions 的异步客户端
+
+    进程内所有接口共享同一个实例：
+    - 底层 httpx.AsyncClient 复用 keep-alive 连接池，避免每次调用都重新握手
+    - 每次调用都有超时时间，不会无限挂起
+    - 通过信号量限制同时在途的上游请求数量
+    """
+
+    def __init__(self, api_key, base_url, model, max_tokens, temperature,
+                 timeout=60.0, connect_timeout=10.0, max_connections=100,
+                 max_keepalive_connections=20, max_concurrency=200, guard=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        # 可选的熔断器/自适应并发上限（resilience.UpstreamGuard），在信号量之前检查以便快速失败
+        self.guard = guard
+
+    def _get_client(self):
+        """
+        延迟创建 httpx.AsyncClient，保证它绑定在运行中的事件循环上
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.api_key}"
+                },
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                )
+            )
+        return self._client
+
+    def build_payload(self, messages, max_tokens=None, temperature=None, **extra):
+        """
+        构造 chat/completions 请求体，未指定的参数使用配置中的默认值
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
+            "temperature": temperature if temperature is not None else self.temperature
+        }
+        payload.update(extra)
+        return payload
+
+    def _guarded(self):
+        return self.guard.call() if self.guard is not None else contextlib.nullcontext()
+
+    async def complete(self, payload, timeout=None):
+        """
+        发送一次 chat/completions 请求并返回解析后的 JSON
+        """
+        request_timeout = httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+        async with self._guarded(), self._semaphore:
+            try:
+                response = await self._get_client().post("/chat/completions", json=payload, timeout=request_timeout)
+                response.raise_for_status()
+                return response.json()
+            except json.JSONDecodeError as e:
+                llm_logger.warning(f"DeepSeek返回的响应不是有效的JSON: {e}")
+                raise LLMError(f"DeepSeek返回的响应不是有效的JSON: {e}") from e
+            except httpx.TimeoutException as e:
+                llm_logger.warning(f"DeepSeek请求超时: {e!r}")
+                raise LLMError(f"DeepSeek请求超时: {e!r}") from e
+            except httpx.HTTPStatusError as e:
+                llm_logger.warning(f"DeepSeek返回错误状态码: {e.response.status_code}")
+                raise LLMError(f"DeepSeek返回错误状态码: {e.response.status_code}") from e
+            except httpx.HTTPError as e:
+                llm_logger.warning(f"DeepSeek请求失败: {e!r}")
+                raise LLMError(f"DeepSeek请求失败: {e!r}") from e
+
+    async def stream(self, payload, timeout=None):
+        """
+        以流式方式发送 chat/completions 请求（stream: true），逐个产出解析后的SSE数据块
+        最后一个数据块中带有 usage（通过 stream_options.include_usage 请求）
+        """
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        request_timeout = httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+        async with self._guarded() as guarded_call, self._semaphore:
+            try:
+                async with self._get_client().stream("POST", "/chat/completions", json=payload, timeout=request_timeout) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if guarded_call is not None:
+                            guarded_call.mark_first_byte()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        if data:
+                            try:
+                                chunk = json.loads(data)
+                            except json.JSONDecodeError as e:
+                                llm_logger.warning(f"DeepSeek流式响应中的数据块不是有效的JSON: {data[:200]!r}")
+                                raise LLMError(f"DeepSeek流式响应中的数据块不是有效的JSON: {e}") from e
+                            yield chunk
+            except httpx.TimeoutException as e:
+                llm_logger.warning(f"DeepSeek流式请求超时: {e!r}")
+                raise LLMError(f"DeepSeek流式请求超时: {e!r}") from e
+            except httpx.HTTPStatusError as e:
+                llm_logger.warning(f"DeepSeek流式请求返回错误状态码: {e.response.status_code}")
+                raise LLMError(f"DeepSeek返回错误状态码: {e.response.status_code}") from e
+            except httpx.HTTPError as e:
+                llm_logger.warning(f"DeepSeek流式请求失败: {e!r}")
+                raise LLMError(f"DeepSeek流式请求失败: {e!r}") from e
+
+    async def chat(self, messages, max_tokens=None, temperature=None, timeout=None):
+        """
+        便捷方法：根据消息列表构造请求体并发送
+        """
+        payload = self.build_payload(messages, max_tokens=max_tokens, temperature=temperature)
+        return await self.complete(payload, timeout=timeout)
+
+    @property
+    def in_flight(self):
+        """
+        当前占用信号量的在途请求数
+        """
+        return self.max_concurrency - self._semaphore._value
+
+    async def aclose(self):
+        """
+        关闭连接池（应用关闭时调用）
+        """
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def get_message_content(response_json):
+    """
+    从 chat/completions 响应中取出模型回复的文本
+    """
+    return response_json.get('choices', [{}])[0].get('message', {}).get('content', '') or ''
+
+
+def get_delta_content(chunk):
+    """
+    从流式响应的数据块中取出本次新增的文本
+    """
+    choices = chunk.get('choices') or [{}]
+    return (choices[0].get('delta') or {}).get('content') or ''
+
+
+def parse_json_content(response_json):
+    """
+    解析模型回复中的 JSON，兼容被 ```json ... ``` 包裹的情况
+    """
+    content = get_message_content(response_json).strip()
+    if content.startswith('```'):
+        content = content.split('\n', 1)[1] if '\n' in content else ''
+        if content.rstrip().endswith('```'):
+            content = content.rstrip()[:-3]
+    return json.loads(content)
@@ -48,4 +48,5 @@ global_logger = LoggerConfig.setup_logger()
 # 为不同模块创建专用logger
 excel_logger = logging.getLogger('app.excel')
 api_logger = logging.getLogger('app.api')
-utils_logger = logging.getLogger('app.utils')
\ No newline at end of file
+utils_logger = logging.getLogger('app.utils')
+llm_logger = logging.getLogger('app.llm')
\ No newline at end of file
@@ -2,13 +2,13 @@ import os
 import re
 import json
 import time
+import asyncio
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Header, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
-import requests
 import logging
 
 # 导入Prometheus监控库
@@ -18,6 +18,20 @@ from fastapi import Response
 from .config import Config
 from .excel_utils import ExcelUtils
 from .logger_config import api_logger, excel_logger
+from .llm_client import DeepSeekClient, LLMError, parse_json_content, get_delta_content
+from .llm_cache import LLMResponseCache, make_cache_key
+from .parse_cache import ParsedWorkbookCache
+from .uploads import save_upload, declared_size_exceeds, UploadRejectedError
+from .stream_parser import IncrementalTableParser
+from .prompt_builder import build_analysis_prompt
+from .anomaly_detector import detect_anomalies
+from .chart_downsample import downsample_visualization
+from .edit_planner import EDIT_FORMAT_HINT
+from .singleflight import SingleFlight
+from .resilience import CircuitBreaker, AdaptiveConcurrencyLimiter, UpstreamGuard
+from .hedging import LatencyTracker, hedged_call, run_with_deadline, DeadlineExceededError, ClientDisconnectedError
+from .token_estimator import set_encoding, estimate_messages_tokens, estimate_usage, clamp_max_tokens, PromptTooLargeError
+from .table_synth import validate_spec, synthesize_rows, synthesize_chunks, detect_row_count, generate_mock_table_spec, SPEC_FORMAT_HINT
 
 # 初始化FastAPI应用
 app = FastAPI(title="ExcelGenius API", description="自然语言生成和编辑Excel文件")
@@ -37,6 +51,117 @@ token_consumed_current = Gauge(
     ['api_endpoint']
 )
 
+# 按类型拆分的token指标（prompt / completion / 命中上游上下文缓存的prompt）
+token_prompt = Counter(
+    'excelgenius_token_prompt_total',
+    'Total prompt tokens reported by the LLM (estimated in mock mode)',
+    ['api_endpoint']
+)
+
+token_completion = Counter(
+    'excelgenius_token_completion_total',
+    'Total completion tokens reported by the LLM (estimated in mock mode)',
+    ['api_endpoint']
+)
+
+token_cached_prompt = Counter(
+    'excelgenius_token_cached_prompt_total',
+    'Total prompt tokens served from the upstream context cache',
+    ['api_endpoint']
+)
+
+prompt_tokens_estimated = Histogram(
+    'excelgenius_prompt_tokens_estimated',
+    'Locally estimated prompt tokens before each LLM call',
+    ['api_endpoint'],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, float("inf"))
+)
+
+llm_prompt_rejected = Counter(
+    'excelgenius_llm_prompt_rejected_total',
+    'Total number of LLM calls rejected before sending because the prompt exceeded the context window',
+    ['api_endpoint']
+)
+
+# LLM响应缓存相关指标
+llm_cache_hits = Counter(
+    'excelgenius_llm_cache_hits_total',
+    'Total number of LLM response cache hits',
+    ['api_endpoint', 'tier']  # memory, redis
+)
+
+llm_cache_misses = Counter(
+    'excelgenius_llm_cache_misses_total',
+    'Total number of LLM response cache misses',
+    ['api_endpoint']
+)
+
+llm_cache_evictions = Counter(
+    'excelgenius_llm_cache_evictions_total',
+    'Total number of entries evicted from the in-process LLM response cache',
+    ['reason']  # capacity, expired
+)
+
+parse_cache_lookups = Counter(
+    'excelgenius_parse_cache_lookups_total',
+    'Total number of parsed-workbook cache lookups',
+    ['result']  # memory, disk, miss
+)
+
+parse_cache_evictions = Counter(
+    'excelgenius_parse_cache_evictions_total',
+    'Total number of entries evicted from the parsed-workbook cache',
+    ['reason']  # capacity, disk_capacity
+)
+
+llm_coalesced = Counter(
+    'excelgenius_llm_coalesced_total',
+    'Total number of LLM calls served by an identical in-flight request',
+    ['api_endpoint']
+)
+
+# DeepSeek熔断器与自适应并发上限指标
+llm_circuit_state = Gauge(
+    'excelgenius_llm_circuit_state',
+    'DeepSeek circuit breaker state (0=closed, 1=half_open, 2=open)'
+)
+
+llm_concurrency_limit = Gauge(
+    'excelgenius_llm_concurrency_limit',
+    'Current adaptive limit on concurrent DeepSeek calls'
+)
+
+llm_in_flight = Gauge(
+    'excelgenius_llm_in_flight',
+    'Number of DeepSeek calls currently in flight'
+)
+
+# 截止时间、对冲请求与客户端断开相关指标
+llm_upstream_latency_seconds = Histogram(
+    'excelgenius_llm_upstream_latency_seconds',
+    'Latency of individual DeepSeek calls in seconds',
+    ['api_endpoint'],
+    buckets=(0.5, 1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, float("inf"))
+)
+
+llm_deadline_exceeded = Counter(
+    'excelgenius_llm_deadline_exceeded_total',
+    'Total number of LLM calls abandoned because the endpoint deadline passed',
+    ['api_endpoint']
+)
+
+llm_hedged_requests = Counter(
+    'excelgenius_llm_hedged_requests_total',
+    'Total number of hedged LLM calls by which request answered first',
+    ['api_endpoint', 'winner']  # primary, hedge
+)
+
+client_disconnects = Counter(
+    'excelgenius_client_disconnects_total',
+    'Total number of requests whose client disconnected while waiting for the LLM',
+    ['api_endpoint']
+)
+
 # API请求相关指标
 api_requests_total = Counter(
     'excelgenius_api_requests_total',
@@ -50,6 +175,19 @@ api_request_duration_seconds = Histogram(
     ['api_endpoint']
 )
 
+generate_first_row_seconds = Histogram(
+    'excelgenius_generate_first_row_seconds',
+    'Time from request start to the first streamed row in seconds',
+    ['api_endpoint']
+)
+
+prompt_compression_ratio = Histogram(
+    'excelgenius_prompt_compression_ratio',
+    'Ratio of estimated raw-data tokens to tokens actually sent in the prompt',
+    ['api_endpoint'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+)
+
 # Excel处理相关指标
 excel_files_processed = Counter(
     'excelgenius_excel_files_processed_total',
@@ -93,7 +231,42 @@ app.add_middleware(
 
 # 初始化配置和工具类
 config = Config()
-excel_utils = ExcelUtils()
+parse_cache = ParsedWorkbookCache(
+    enabled=config.PARSE_CACHE_ENABLED,
+    max_bytes=config.PARSE_CACHE_MAX_MB * 1024 * 1024,
+    spill_dir=config.PARSE_CACHE_SPILL_DIR,
+    spill_max_bytes=config.PARSE_CACHE_SPILL_MAX_MB * 1024 * 1024,
+    on_evict=lambda reason: parse_cache_evictions.labels(reason=reason).inc(),
+    on_lookup=lambda tier: parse_cache_lookups.labels(result=tier or "miss").inc()
+)
+excel_utils = ExcelUtils(
+    max_rows=config.EXCEL_MAX_ROWS,
+    max_cols=config.EXCEL_MAX_COLS,
+    writer_backend=config.EXCEL_WRITER_BACKEND,
+    write_only_threshold=config.EXCEL_WRITE_ONLY_THRESHOLD,
+    parse_cache=parse_cache
+)
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    上传请求在解析表单之前按 Content-Length 检查大小，超出 UPLOAD_MAX_SIZE_MB 时直接返回413，不读取请求体
+    """
+    if request.method == "POST" and request.headers.get("content-type", "").startswith("multipart/form-data") \
+            and declared_size_exceeds(request.headers, config.UPLOAD_MAX_SIZE_MB * 1024 * 1024):
+        return JSONResponse(status_code=413, content={"detail": f"文件大小超过上限 {config.UPLOAD_MAX_SIZE_MB}MB"})
+    return await call_next(request)
+
+async def receive_upload(file, dest_path):
+    """
+    把上传文件分块保存到 dest_path（内存占用与文件大小无关），返回内容的 SHA-256
+    文件过大、类型不符或为空时抛出对应状态码的 HTTPException
+    """
+    try:
+        _, digest = await save_upload(file, dest_path, config.UPLOAD_MAX_SIZE_MB * 1024 * 1024, config.ALLOWED_FILE_TYPES)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return digest
 
 # 设置DeepSeek API密钥
 api_logger.info(f"config.DEEPSEEK_API_KEY存在: {bool(config.DEEPSEEK_API_KEY)}")
@@ -106,16 +279,277 @@ else:
     use_mock = True
     api_logger.warning("使用模拟数据模式：未配置有效的DeepSeek API密钥")
 
+# 本地token估算：优先使用tiktoken，不可用时退回启发式估算
+if set_encoding(config.LLM_TOKENIZER_ENCODING):
+    api_logger.info(f"使用tiktoken估算token数: {config.LLM_TOKENIZER_ENCODING}")
+else:
+    api_logger.info("tiktoken不可用，使用启发式方法估算token数")
+
+# 熔断器 + AIMD自适应并发上限：上游异常时快速失败，直接走模拟/启发式降级逻辑
+llm_breaker = CircuitBreaker(
+    window_size=config.LLM_BREAKER_WINDOW,
+    min_calls=config.LLM_BREAKER_MIN_CALLS,
+    failure_rate_threshold=config.LLM_BREAKER_FAILURE_RATE,
+    slow_call_seconds=config.LLM_BREAKER_SLOW_CALL_SECONDS,
+    slow_call_rate_threshold=config.LLM_BREAKER_SLOW_CALL_RATE,
+    open_seconds=config.LLM_BREAKER_OPEN_SECONDS
+)
+llm_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=config.LLM_ADAPTIVE_INITIAL_LIMIT,
+    min_limit=config.LLM_ADAPTIVE_MIN_LIMIT,
+    max_limit=config.LLM_MAX_CONCURRENCY,
+    latency_target=config.LLM_ADAPTIVE_LATENCY_TARGET,
+    queue_timeout=config.LLM_ADAPTIVE_QUEUE_TIMEOUT
+)
+llm_circuit_state.set_function(lambda: llm_breaker.state_value)
+llm_concurrency_limit.set_function(lambda: llm_limiter.current_limit)
+llm_in_flight.set_function(lambda: llm_limiter.in_flight)
+
+# 所有接口共享的异步DeepSeek客户端（连接池 + 超时 + 并发上限）
+llm_client = DeepSeekClient(
+    api_key=config.DEEPSEEK_API_KEY,
+    base_url=config.DEEPSEEK_API_BASE,
+    model=config.DEEPSEEK_MODEL,
+    max_tokens=config.DEEPSEEK_MAX_TOKENS,
+    temperature=config.DEEPSEEK_TEMPERATURE,
+    timeout=config.LLM_TIMEOUT,
+    connect_timeout=config.LLM_CONNECT_TIMEOUT,
+    max_connections=config.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+    max_concurrency=config.LLM_MAX_CONCURRENCY,
+    guard=UpstreamGuard(llm_breaker, llm_limiter)
+)
+
+# LLM响应缓存：进程内LRU + 可选的Redis二级缓存
+llm_cache = LLMResponseCache(
+    enabled=config.CACHE_ENABLED,
+    ttl=config.CACHE_TTL,
+    max_entries=config.CACHE_MAX_ENTRIES,
+    redis_url=config.CACHE_REDIS_URL,
+    on_evict=lambda reason: llm_cache_evictions.labels(reason=reason).inc()
+)
+
+# 合并相同的在途LLM请求（按请求指纹）
+llm_singleflight = SingleFlight()
+
+# 记录各接口最近的上游耗时，用于计算对冲请求的触发时间
+llm_latency = LatencyTracker(min_samples=config.LLM_HEDGE_MIN_SAMPLES)
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """
+    应用关闭时释放DeepSeek连接池和缓存连接
+    """
+    await llm_client.aclose()
+    await llm_cache.aclose()
+
+def should_bypass_cache(cache_control, x_cache_bypass):
+    """
+    请求头带 X-Cache-Bypass: 1 或 Cache-Control: no-cache 时跳过缓存读取（结果仍会回写，用于强制刷新）
+    """
+    if x_cache_bypass and x_cache_bypass.strip().lower() in ("1", "true", "yes"):
+        return True
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+def get_llm_deadline(endpoint):
+    """
+    返回接口等待LLM结果的截止时间（秒），未单独配置时使用 LLM_TIMEOUT
+    """
+    return config.LLM_DEADLINES.get(endpoint, config.LLM_TIMEOUT)
+
+def get_hedge_delay(endpoint):
+    """
+    返回发送对冲请求前的等待时间；未启用、样本不足或熔断器非关闭状态时返回 None（不对冲）
+    """
+    if not config.LLM_HEDGE_ENABLED or llm_breaker.state != CircuitBreaker.CLOSED:
+        return None
+    return llm_latency.quantile(endpoint, config.LLM_HEDGE_QUANTILE)
+
+def build_llm_payload(endpoint, messages):
+    """
+    发送前估算prompt的token数，并把 max_tokens 限制在上下文窗口的剩余空间内
+    超出上下文窗口时直接抛出 PromptTooLargeError，不再请求上游
+    """
+    prompt_tokens = estimate_messages_tokens(messages)
+    prompt_tokens_estimated.labels(api_endpoint=endpoint).observe(prompt_tokens)
+    try:
+        max_tokens = clamp_max_tokens(
+            prompt_tokens,
+            config.DEEPSEEK_CONTEXT_WINDOW,
+            config.DEEPSEEK_MAX_TOKENS,
+            config.LLM_MIN_COMPLETION_TOKENS
+        )
+    except PromptTooLargeError:
+        llm_prompt_rejected.labels(api_endpoint=endpoint).inc()
+        raise
+    return llm_client.build_payload(messages, max_tokens=max_tokens)
+
+async def call_llm(endpoint, messages, bypass_cache=False, http_request=None):
+    """
+    统一的LLM调用入口：先查缓存，未命中再请求DeepSeek，解析成功后回写缓存并记录token消耗
+    相同指纹的并发请求只会向DeepSeek发送一次，结果分发给所有等待方
+    等待时间不超过接口的截止时间；传入 http_request 时客户端断开会取消调用
+    返回模型回复解析后的JSON
+    """
+    payload = build_llm_payload(endpoint, messages)
+    cache_key = make_cache_key(payload)
+    
+    if llm_cache.enabled and not bypass_cache:
+        cached, tier = await llm_cache.get(cache_key)
+        if cached is not None:
+            llm_cache_hits.labels(api_endpoint=endpoint, tier=tier).inc()
+            return parse_json_content(cached)
+        llm_cache_misses.labels(api_endpoint=endpoint).inc()
+    
+    deadline = get_llm_deadline(endpoint)
+    
+    async def attempt():
+        attempt_start = time.time()
+        response_json = await llm_client.complete(payload, timeout=deadline)
+        latency = time.time() - attempt_start
+        llm_latency.record(endpoint, latency)
+        llm_upstream_latency_seconds.labels(api_endpoint=endpoint).observe(latency)
+        return response_json
+    
+    async def fetch():
+        # 超过最近p95耗时仍未返回时再发一个相同请求，取先返回者
+        hedge_delay = get_hedge_delay(endpoint)
+        response_json, winner = await hedged_call(attempt, hedge_delay)
+        if hedge_delay is not None:
+            llm_hedged_requests.labels(api_endpoint=endpoint, winner=winner).inc()
+        # 先解析再缓存，避免把无法解析的回复写入缓存
+        parse_json_content(response_json)
+        await llm_cache.set(cache_key, response_json)
+        
+        # 记录token消耗（合并的请求只记录一次）
+        if 'usage' in response_json:
+            record_token_usage(endpoint, response_json['usage'])
+        return response_json
+    
+    try:
+        response_json, shared = await run_with_deadline(
+            llm_singleflight.do(cache_key, fetch), deadline, http_request=http_request
+        )
+    except DeadlineExceededError:
+        llm_deadline_exceeded.labels(api_endpoint=endpoint).inc()
+        raise
+    except ClientDisconnectedError:
+        client_disconnects.labels(api_endpoint=endpoint).inc()
+        raise
+    if shared:
+        llm_coalesced.labels(api_endpoint=endpoint).inc()
+    
+    # 每个调用方各自解析一份，互不影响后续的修改
+    return parse_json_content(response_json)
+
+def record_token_usage(endpoint, usage):
+    """
+    根据DeepSeek返回的usage记录token消耗（模拟模式下传入 estimate_usage 的估算值）
+    """
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    completion_tokens = usage.get('completion_tokens', 0)
+    tokens_used = usage.get('total_tokens', prompt_tokens + completion_tokens)
+    # DeepSeek返回 prompt_cache_hit_tokens，OpenAI格式为 prompt_tokens_details.cached_tokens
+    cached_tokens = usage.get('prompt_cache_hit_tokens')
+    if cached_tokens is None:
+        cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+    token_consumed.labels(api_endpoint=endpoint).inc(tokens_used)
+    token_consumed_current.labels(api_endpoint=endpoint).set(tokens_used)
+    token_prompt.labels(api_endpoint=endpoint).inc(prompt_tokens)
+    token_completion.labels(api_endpoint=endpoint).inc(completion_tokens)
+    token_cached_prompt.labels(api_endpoint=endpoint).inc(cached_tokens or 0)
+
+async def stream_llm_table(endpoint, messages, bypass_cache=False):
+    """
+    以流式方式请求DeepSeek并增量解析表格JSON
+    依次产出 ("sheet_name", 名称) 和 ("row", 行数据)；完整回复解析成功后写入缓存，与非流式接口共用
+    整个流超过接口截止时间时抛出 DeadlineExceededError（客户端断开时由StreamingResponse取消生成器）
+    """
+    payload = build_llm_payload(endpoint, messages)
+    cache_key = make_cache_key(payload)
+    
+    if llm_cache.enabled and not bypass_cache:
+        cached, tier = await llm_cache.get(cache_key)
+        if cached is not None:
+            llm_cache_hits.labels(api_endpoint=endpoint, tier=tier).inc()
+            result = parse_json_content(cached)
+            yield "sheet_name", result.get('sheet_name', 'Sheet1')
+            for row in result.get('data', []):
+                yield "row", row
+            return
+        llm_cache_misses.labels(api_endpoint=endpoint).inc()
+    
+    parser = IncrementalTableParser()
+    usage = None
+    sheet_name_sent = False
+    deadline = get_llm_deadline(endpoint)
+    deadline_at = time.time() + deadline
+    async for chunk in llm_client.stream(payload, timeout=deadline):
+        if time.time() > deadline_at:
+            llm_deadline_exceeded.labels(api_endpoint=endpoint).inc()
+            raise DeadlineExceededError(f"LLM流式调用超出截止时间 {deadline} 秒")
+        if chunk.get('usage'):
+            usage = chunk['usage']
+        rows = parser.feed(get_delta_content(chunk))
+        if parser.sheet_name and not sheet_name_sent:
+            sheet_name_sent = True
+            yield "sheet_name", parser.sheet_name
+        for row in rows:
+            yield "row", row
+    
+    # 校验完整回复，并以非流式响应的格式写入缓存
+    response_json = {"choices": [{"message": {"role": "assistant", "content": parser.text}}]}
+    result = parse_json_content(response_json)
+    if not sheet_name_sent:
+        yield "sheet_name", result.get('sheet_name', 'Sheet1')
+    if parser.rows_parsed == 0:
+        # 增量解析没有拿到任何行（例如模型没有按预期的键名输出），退回到整体解析结果
+        for row in result.get('data', []):
+            yield "row", row
+    await llm_cache.set(cache_key, response_json)
+    
+    if usage:
+        record_token_usage(endpoint, usage)
+
+async def mock_table_source(description):
+    """
+    以与 stream_llm_table 相同的形式产出模拟数据
+    """
+    result = generate_mock_response(description)
+    yield "sheet_name", result.get('sheet_name', 'Sheet1')
+    for row in result.get('data', []):
+        yield "row", row
+
+def sse_event(event, data):
+    """
+    按 Server-Sent Events 格式编码一条事件
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
 # 从excel_utils导入模拟响应生成函数
 from .excel_utils import generate_mock_response, generate_analysis_report
 
 class GenerateExcelRequest(BaseModel):
     description: str
     file_name: str = None
+    mode: str = "auto"  # auto, rows（模型逐行输出数据）, spec（模型输出表格规格，本地批量生成）
+    row_count: int = None  # 规格模式下生成的数据行数，不指定时从描述中识别
+
+def build_generate_messages(description):
+    """
+    构造生成Excel的提示词（流式与非流式接口共用）
+    """
+    return [
+        {"role": "system", "content": "你是一个Excel生成专家，需要根据用户描述创建Excel表格数据。"},
+        {"role": "user", "content": f"请根据以下描述生成Excel数据：{description}\n返回格式应为JSON，包含'sheet_name'和'data'字段，其中data是二维数组。"}
+    ]
 
 @app.post("/generate_excel")
 async def generate_excel(
-    request: GenerateExcelRequest
+    request: GenerateExcelRequest,
+    http_request: Request,
+    cache_control: str = Header(None),
+    x_cache_bypass: str = Header(None)
 ):
     """
     根据自然语言描述生成Excel文件
@@ -128,6 +562,17 @@ async def generate_excel(
         # 记录API请求
         api_requests_total.labels(api_endpoint=endpoint, status_code="200").inc()
         
+        if resolve_generate_mode(request) == "spec":
+            # 大表：模型只生成表格规格，由本地批量生成数据
+            response = await generate_excel_from_spec(
+                endpoint, request,
+                bypass_cache=should_bypass_cache(cache_control, x_cache_bypass),
+                http_request=http_request
+            )
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            return response
+        
         if use_mock:
             # 使用模拟数据
             api_logger.info("使用模拟数据生成Excel")
@@ -135,41 +580,20 @@ async def generate_excel(
             sheet_name = result.get('sheet_name', 'Sheet1')
             data = result.get('data', [])
             
-            # 模拟token消耗 - 实际项目中应根据API响应获取真实token消耗
-            mock_tokens_used = 50 + len(request.description) // 10
-            token_consumed.labels(api_endpoint=endpoint).inc(mock_tokens_used)
-            token_consumed_current.labels(api_endpoint=endpoint).set(mock_tokens_used)
+            # 模拟模式下按与真实调用相同的口径估算token消耗
+            record_token_usage(endpoint, estimate_usage(build_generate_messages(request.description), result))
         else:
             # 使用DeepSeek API解析自然语言描述
-            url = "https://api.deepseek.com/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
-            }
-            data = {
-                "model": config.DEEPSEEK_MODEL,
-                "messages": [
-                    {"role": "system", "content": "你是一个Excel生成专家，需要根据用户描述创建Excel表格数据。"},
-                    {"role": "user", "content": f"请根据以下描述生成Excel数据：{request.description}\n返回格式应为JSON，包含'sheet_name'和'data'字段，其中data是二维数组。"}
-                ],
-                "max_tokens": config.DEEPSEEK_MAX_TOKENS,
-                "temperature": config.DEEPSEEK_TEMPERATURE
-            }
-            
-            # 发送请求到DeepSeek API
-            response = requests.post(url, headers=headers, json=data)
-            response_json = response.json()
+            messages = build_generate_messages(request.description)
             
-            # 解析DeepSeek响应
-            result = json.loads(response_json['choices'][0]['message']['content'])
+            # 发送请求到DeepSeek API（异步，不阻塞事件循环，优先命中缓存）
+            result = await call_llm(
+                endpoint, messages,
+                bypass_cache=should_bypass_cache(cache_control, x_cache_bypass),
+                http_request=http_request
+            )
             sheet_name = result.get('sheet_name', 'Sheet1')
             data = result.get('data', [])
-            
-            # 记录token消耗
-            if 'usage' in response_json:
-                tokens_used = response_json['usage']['total_tokens']
-                token_consumed.labels(api_endpoint=endpoint).inc(tokens_used)
-                token_consumed_current.labels(api_endpoint=endpoint).set(tokens_used)
         
         print(f"收到生成Excel请求: description={request.description}, file_name={request.file_name}")
         
@@ -216,6 +640,12 @@ async def generate_excel(
         
     except Exception as e:
         print(f"生成Excel时出错：{str(e)}")
+        if isinstance(e, ClientDisconnectedError):
+            # 客户端已断开，不再回退生成结果
+            api_requests_total.labels(api_endpoint=endpoint, status_code="499").inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            raise HTTPException(status_code=499, detail="客户端已断开连接")
         api_requests_total.labels(api_endpoint=endpoint, status_code="500").inc()
         api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
         active_requests.dec()
@@ -228,8 +658,10 @@ async def generate_excel(
                 sheet_name = result.get('sheet_name', 'Sheet1')
                 data = result.get('data', [])
                 
-                if not file_name:
-                    file_name = f"generated_{int(time.time())}.xlsx"
+                # 上游调用失败时 file_name 尚未赋值，这里按请求重新确定文件名
+                file_name = request.file_name or f"generated_{int(time.time())}.xlsx"
+                if not file_name.lower().endswith('.xlsx'):
+                    file_name += '.xlsx'
                 
                 file_path = os.path.join(config.TEMP_DIR, file_name)
                 excel_utils.create_excel(file_path, sheet_name, data)
@@ -249,10 +681,242 @@ async def generate_excel(
         
         raise HTTPException(status_code=500, detail=str(e))
 
+def resolve_generate_mode(request):
+    """
+    确定生成模式：rows 由模型逐行输出数据，spec 由模型输出表格规格、本地批量生成
+    auto 时按期望行数（请求参数或描述中的"1万行"等）是否超过 SYNTH_AUTO_THRESHOLD 决定
+    """
+    mode = (request.mode or "auto").lower()
+    if mode in ("rows", "spec"):
+        return mode
+    row_count = request.row_count or detect_row_count(request.description)
+    return "spec" if row_count and row_count > config.SYNTH_AUTO_THRESHOLD else "rows"
+
+def build_spec_messages(description, row_count=None):
+    """
+    构造生成表格规格的提示词：只需要列定义和分布，回复只有几百个token
+    """
+    rows_hint = f"数据行数：{row_count}。\n" if row_count else ""
+    return [
+        {"role": "system", "content": "你是一个Excel数据建模专家，需要根据用户描述设计表格的列定义和数据分布，而不是逐行输出数据。"},
+        {"role": "user", "content": f"请根据以下描述设计Excel表格规格：{description}\n{rows_hint}只返回JSON，格式如下：\n{SPEC_FORMAT_HINT}"}
+    ]
+
+async def get_table_spec(endpoint, request, bypass_cache=False, http_request=None):
+    """
+    获取并校验表格规格，返回 (spec, fallback_message)
+    模型调用失败或返回的规格不合法时退回模拟规格（保持请求的行数）
+    """
+    row_count = request.row_count or detect_row_count(request.description)
+    messages = build_spec_messages(request.description, row_count)
+    if use_mock:
+        spec = generate_mock_table_spec(request.description, row_count)
+        record_token_usage(endpoint, estimate_usage(messages, spec))
+        return validate_spec(spec, config.SYNTH_MAX_ROWS, row_count), None
+    try:
+        spec = await call_llm(endpoint, messages, bypass_cache=bypass_cache, http_request=http_request)
+        return validate_spec(spec, config.SYNTH_MAX_ROWS, row_count), None
+    except (LLMError, ValueError) as e:
+        api_logger.warning(f"获取表格规格失败，回退到模拟规格: {str(e)}")
+        spec = generate_mock_table_spec(request.description, row_count)
+        return validate_spec(spec, config.SYNTH_MAX_ROWS, row_count), "使用模拟数据生成的Excel文件"
+
+def write_spec_excel(file_path, spec, preview_rows=0):
+    """
+    按规格分块生成数据并写入 write-only 工作簿，返回 (写入的行数, 预览行)
+    """
+    writer = excel_utils.open_stream_writer(file_path, spec["sheet_name"])
+    preview = []
+    for row in synthesize_rows(spec, config.SYNTH_CHUNK_ROWS):
+        writer.append(row)
+        if len(preview) < preview_rows:
+            preview.append(row)
+    writer.close()
+    return writer.rows_written, preview
+
+async def generate_excel_from_spec(endpoint, request, bypass_cache=False, http_request=None):
+    """
+    规格模式生成Excel：模型只返回表格规格，本地向量化生成任意行数并写入文件
+    """
+    spec, fallback_message = await get_table_spec(endpoint, request, bypass_cache, http_request)
+    
+    file_name = request.file_name or f"generated_{int(time.time())}.xlsx"
+    if not file_name.lower().endswith('.xlsx'):
+        file_name += '.xlsx'
+    file_path = os.path.join(config.TEMP_DIR, file_name)
+    
+    # 生成和写入在线程池中执行，不阻塞事件循环
+    excel_process_start = time.time()
+    rows_written, preview = await asyncio.to_thread(write_spec_excel, file_path, spec, 0)
+    excel_processing_time_seconds.labels(operation_type="generate").observe(time.time() - excel_process_start)
+    excel_files_processed.labels(operation_type="generate").inc()
+    excel_rows_processed.labels(operation_type="generate").inc(rows_written)
+    
+    response = {
+        "status": "success",
+        "file_name": file_name,
+        "download_url": f"/download/{file_name}",
+        "mode": "spec",
+        "rows": rows_written - 1,  # 不含表头
+        "spec": spec
+    }
+    if fallback_message:
+        response["message"] = fallback_message
+    return response
+
+def write_next_chunk(chunks, writer):
+    """
+    生成下一块数据并写入 writer（在线程池中执行），返回该块的行；已生成完时返回 None
+    """
+    chunk = next(chunks, None)
+    if chunk is not None:
+        for row in chunk:
+            writer.append(row)
+    return chunk
+
+async def spec_table_source(spec, writer):
+    """
+    以与 stream_llm_table 相同的形式产出按规格生成的数据；数据按块在线程池中生成并写入 writer，
+    产出的 ("rows", 一块数据行) 已经写入，不需要再写
+    """
+    yield "sheet_name", spec["sheet_name"]
+    yield "row", [column["name"] for column in spec["columns"]]
+    chunks = synthesize_chunks(spec, config.SYNTH_CHUNK_ROWS)
+    while True:
+        chunk = await asyncio.to_thread(write_next_chunk, chunks, writer)
+        if chunk is None:
+            return
+        yield "rows", chunk
+
+@app.post("/generate_excel/stream")
+async def generate_excel_stream(
+    request: GenerateExcelRequest,
+    cache_control: str = Header(None),
+    x_cache_bypass: str = Header(None)
+):
+    """
+    流式生成Excel文件：模型每输出完一行，就通过SSE推送给客户端并写入Excel
+    规格模式下模型只返回表格规格，数据行由本地生成后同样逐行推送
+    事件依次为 meta（工作表名称）、row（每行数据）、done（下载地址）；出错时为 error
+    """
+    endpoint = "/generate_excel/stream"
+    bypass_cache = should_bypass_cache(cache_control, x_cache_bypass)
+    generate_mode = resolve_generate_mode(request)
+    
+    if not request.file_name:
+        file_name = f"generated_{int(time.time())}.xlsx"
+    else:
+        file_name = request.file_name
+        # 确保文件名包含.xlsx扩展名
+        if not file_name.lower().endswith('.xlsx'):
+            file_name += '.xlsx'
+    file_path = os.path.join(config.TEMP_DIR, file_name)
+    
+    async def event_stream():
+        active_requests.inc()
+        start_time = time.time()
+        writer = excel_utils.open_stream_writer(file_path)
+        fallback_message = None
+        
+        async def table_source():
+            nonlocal fallback_message
+            if generate_mode == "spec":
+                spec, fallback_message = await get_table_spec(endpoint, request, bypass_cache)
+                async for item in spec_table_source(spec, writer):
+                    yield item
+                return
+            if use_mock:
+                api_logger.info("使用模拟数据流式生成Excel")
+                async for item in mock_table_source(request.description):
+                    yield item
+                return
+            emitted = False
+            try:
+                async for item in stream_llm_table(endpoint, build_generate_messages(request.description), bypass_cache):
+                    emitted = emitted or item[0] == "row"
+                    yield item
+            except Exception as e:
+                # 已经推送过数据行时无法再回退，直接报错
+                if emitted:
+                    raise
+                print(f"流式API调用失败，回退到模拟数据：{str(e)}")
+                fallback_message = "使用模拟数据生成的Excel文件"
+                async for item in mock_table_source(request.description):
+                    yield item
+        
+        try:
+            api_requests_total.labels(api_endpoint=endpoint, status_code="200").inc()
+            async for kind, value in table_source():
+                if kind == "sheet_name":
+                    writer.set_sheet_name(value)
+                    yield sse_event("meta", {"sheet_name": value})
+                elif kind == "rows":
+                    # 规格模式：整块数据已在线程池中写入
+                    first_index = writer.rows_written - len(value)
+                    for offset, row in enumerate(value):
+                        yield sse_event("row", {"index": first_index + offset, "row": row})
+                else:
+                    if writer.rows_written == 0:
+                        generate_first_row_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+                    writer.append(value)
+                    yield sse_event("row", {"index": writer.rows_written - 1, "row": value})
+            
+            # 保存整个工作簿，在线程池中执行
+            excel_process_start = time.time()
+            await asyncio.to_thread(writer.close)
+            excel_processing_time_seconds.labels(operation_type="generate").observe(time.time() - excel_process_start)
+            excel_files_processed.labels(operation_type="generate").inc()
+            excel_rows_processed.labels(operation_type="generate").inc(writer.rows_written)
+            
+            done = {
+                "status": "success",
+                "file_name": file_name,
+                "download_url": f"/download/{file_name}",
+                "rows": writer.rows_written
+            }
+            if fallback_message:
+                done["message"] = fallback_message
+            yield sse_event("done", done)
+        except Exception as e:
+            print(f"流式生成Excel时出错：{str(e)}")
+            api_requests_total.labels(api_endpoint=endpoint, status_code="500").inc()
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_edit_messages(endpoint, excel_content, instructions, frame=None):
+    """
+    构造编辑Excel的提示词；表格内容超出 EDIT_PROMPT_TOKEN_BUDGET 时只发送列统计概要和抽样行
+    """
+    content_text, prompt_stats = build_analysis_prompt(excel_content, token_budget=config.EDIT_PROMPT_TOKEN_BUDGET, frame=frame)
+    if prompt_stats["compression_ratio"] > 1:
+        prompt_compression_ratio.labels(api_endpoint=endpoint).observe(prompt_stats["compression_ratio"])
+        api_logger.info(f"编辑提示词压缩: {prompt_stats}")
+    sheets = excel_content.get("sheets") or []
+    sheet_note = ""
+    if len(sheets) > 1:
+        # 多工作表：只发送当前工作表的内容，其余工作表只列出名称
+        sheet_note = f"\n工作簿包含工作表：{[s['name'] for s in sheets]}，当前工作表为'{excel_content.get('sheet_name')}'；操作默认作用于当前工作表，如需修改其他工作表请在操作中加上 sheet 字段。"
+    return [
+        {"role": "system", "content": "你是一个Excel编辑专家，需要根据用户指令修改现有的Excel表格。"},
+        {"role": "user", "content": f"现有Excel内容：{content_text}{sheet_note}\n编辑指令：{instructions}\n只返回JSON格式的操作列表。{EDIT_FORMAT_HINT}"}
+    ]
+
 @app.post("/edit_excel")
 async def edit_excel(
+    http_request: Request,
     file: UploadFile = File(...),
-    instructions: str = Form(...)
+    instructions: str = Form(...),
+    sheet: str = Form(None),
+    cache_control: str = Header(None),
+    x_cache_bypass: str = Header(None)
 ):
     """
     根据自然语言指令编辑已有的Excel文件
@@ -267,11 +931,25 @@ async def edit_excel(
         
         # 保存上传的文件
         temp_input_path = os.path.join(config.TEMP_DIR, f"temp_{int(time.time())}_{file.filename}")
-        with open(temp_input_path, "wb") as buffer:
-            buffer.write(await file.read())
+        try:
+            upload_digest = await receive_upload(file, temp_input_path)
+        except HTTPException as e:
+            api_requests_total.labels(api_endpoint=endpoint, status_code=str(e.status_code)).inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            raise
         
-        # 读取Excel内容
-        excel_content = excel_utils.read_excel(temp_input_path)
+        # 读取要编辑的工作表（sheet 为名称或从0开始的序号，为空时为活动工作表）；同一文件重复上传时使用解析缓存
+        # 解析在线程池中执行，不阻塞事件循环
+        excel_content, frame = await asyncio.to_thread(excel_utils.load_sheet, temp_input_path, sheet, upload_digest)
+        if "error" in excel_content:
+            os.remove(temp_input_path)
+            api_requests_total.labels(api_endpoint=endpoint, status_code="400").inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            raise HTTPException(status_code=400, detail=excel_content["error"])
+        
+        messages = build_edit_messages(endpoint, excel_content, instructions, frame)
         
         if use_mock:
             # 使用模拟数据进行编辑
@@ -285,46 +963,26 @@ async def edit_excel(
                 }
             ]
             
-            # 模拟token消耗
-            mock_tokens_used = 80 + len(instructions) // 10
-            token_consumed.labels(api_endpoint=endpoint).inc(mock_tokens_used)
-            token_consumed_current.labels(api_endpoint=endpoint).set(mock_tokens_used)
+            # 模拟模式下按与真实调用相同的口径估算token消耗
+            record_token_usage(endpoint, estimate_usage(messages, edit_operations))
         else:
             # 使用DeepSeek API解析编辑指令
-            url = "https://api.deepseek.com/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
-            }
-            data = {
-                "model": config.DEEPSEEK_MODEL,
-                "messages": [
-                    {"role": "system", "content": "你是一个Excel编辑专家，需要根据用户指令修改现有的Excel表格。"},
-                    {"role": "user", "content": f"现有Excel内容：{excel_content}\n编辑指令：{instructions}\n返回格式应为JSON，包含需要执行的操作列表，如添加行、修改单元格等。"}
-                ],
-                "max_tokens": config.DEEPSEEK_MAX_TOKENS,
-                "temperature": config.DEEPSEEK_TEMPERATURE
-            }
-            
-            # 发送请求到DeepSeek API
-            response = requests.post(url, headers=headers, json=data)
-            response_json = response.json()
-            
-            # 解析编辑操作
-            edit_operations = json.loads(response_json['choices'][0]['message']['content'])
-            
-            # 记录token消耗
-            if 'usage' in response_json:
-                tokens_used = response_json['usage']['total_tokens']
-                token_consumed.labels(api_endpoint=endpoint).inc(tokens_used)
-                token_consumed_current.labels(api_endpoint=endpoint).set(tokens_used)
+            # 发送请求到DeepSeek API（异步，不阻塞事件循环，优先命中缓存）
+            edit_operations = await call_llm(
+                endpoint, messages,
+                bypass_cache=should_bypass_cache(cache_control, x_cache_bypass),
+                http_request=http_request
+            )
         
         # 记录Excel处理开始时间
         excel_process_start = time.time()
         # 执行编辑操作
         output_file_name = f"edited_{int(time.time())}_{file.filename}"
         output_path = os.path.join(config.TEMP_DIR, output_file_name)
-        success = excel_utils.edit_excel(temp_input_path, output_path, edit_operations)
+        # 编辑在线程池中执行，不阻塞事件循环
+        success = await asyncio.to_thread(
+            excel_utils.edit_excel, temp_input_path, output_path, edit_operations, excel_content["sheet_name"]
+        )
         # 记录Excel处理时间
         excel_processing_time_seconds.labels(operation_type="edit").observe(time.time() - excel_process_start)
         
@@ -347,6 +1005,16 @@ async def edit_excel(
         
     except Exception as e:
         print(f"编辑Excel时出错：{str(e)}")
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, ClientDisconnectedError):
+            # 客户端已断开，不再回退生成结果
+            api_requests_total.labels(api_endpoint=endpoint, status_code="499").inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            if os.path.exists(temp_input_path):
+                os.remove(temp_input_path)
+            raise HTTPException(status_code=499, detail="客户端已断开连接")
         api_requests_total.labels(api_endpoint=endpoint, status_code="500").inc()
         api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
         active_requests.dec()
@@ -446,12 +1114,26 @@ async def log_batch(request: BatchLogRequest):
         print(f"批量记录日志时出错：{str(e)}")
         return {"status": "error"}
 
+def chart_point_budget(max_points=None):
+    """
+    图表的 (数据点预算, 类别数上限)：请求未指定时使用 VIZ_MAX_POINTS，最少 3 个点、最多 VIZ_MAX_POINTS_LIMIT 个点
+    """
+    points = min(max(max_points or config.VIZ_MAX_POINTS, 3), config.VIZ_MAX_POINTS_LIMIT)
+    return points, min(points, config.VIZ_MAX_CATEGORIES)
+
+
 @app.post("/analyze_excel")
 async def analyze_excel(
-    file: UploadFile = File(...)
+    http_request: Request,
+    file: UploadFile = File(...),
+    sheet: str = Form(None),
+    max_points: int = Form(None),
+    cache_control: str = Header(None),
+    x_cache_bypass: str = Header(None)
 ):
     """
     分析Excel文件数据，生成关键洞察、趋势分析和数据异常检测结果
+    max_points 为本次请求的图表数据点预算（未指定时为 VIZ_MAX_POINTS），折线图按 LTTB 降采样，柱状图/饼图合并小类别
     """
     endpoint = "/analyze_excel"
     active_requests.inc()
@@ -463,11 +1145,21 @@ async def analyze_excel(
         
         # 保存上传的文件
         temp_input_path = os.path.join(config.TEMP_DIR, f"temp_analyze_{int(time.time())}_{file.filename}")
-        with open(temp_input_path, "wb") as buffer:
-            buffer.write(await file.read())
+        try:
+            upload_digest = await receive_upload(file, temp_input_path)
+        except HTTPException as e:
+            api_requests_total.labels(api_endpoint=endpoint, status_code=str(e.status_code)).inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            raise
         
-        # 读取Excel内容
-        excel_content = excel_utils.read_excel(temp_input_path)
+        # 读取Excel内容并按列解析一次，分析报告和提示词压缩共用；同一文件重复上传时使用解析缓存
+        # 超大工作表在同一次读取中继续流式读完整张表，更新近似统计摘要（内存只与列数有关），报告和提示词中的列统计覆盖全表
+        # 解析在线程池中执行，不阻塞事件循环
+        excel_content, frame, sketch = await asyncio.to_thread(
+            excel_utils.scan_sheet, temp_input_path, sheet, upload_digest,
+            config.ANALYZE_APPROX_ROWS, config.ANALYZE_SKETCH_SAMPLE_ROWS
+        )
         
         # 检查是否读取成功
         if "error" in excel_content:
@@ -482,21 +1174,16 @@ async def analyze_excel(
         if use_mock:
             # 使用模拟函数生成分析报告
             api_logger.info("使用模拟函数生成Excel分析报告")
-            report = generate_analysis_report(excel_content)
+            report = await asyncio.to_thread(generate_analysis_report, excel_content, frame, sketch)
             
-            # 模拟token消耗
-            data_rows = len(excel_content.get('data', [])) - 1  # 减去表头
-            mock_tokens_used = 100 + data_rows * 2
-            token_consumed.labels(api_endpoint=endpoint).inc(mock_tokens_used)
-            token_consumed_current.labels(api_endpoint=endpoint).set(mock_tokens_used)
+            # 模拟模式下按与真实调用相同的口径估算token消耗
+            prompt_text, _ = await asyncio.to_thread(
+                build_analysis_prompt, excel_content, token_budget=config.ANALYZE_PROMPT_TOKEN_BUDGET, frame=frame,
+                anomalies=True, sketch=sketch
+            )
+            record_token_usage(endpoint, estimate_usage([{"role": "user", "content": prompt_text}], report))
         else:
             # 使用DeepSeek API进行数据分析
-            url = "https://api.deepseek.com/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
-            }
-            
             # 准备请求数据
             system_prompt = """
             你是一个数据分析师，需要分析Excel表格数据并生成详细的分析报告。
@@ -506,32 +1193,43 @@ async def analyze_excel(
             - summary: 数据摘要
             - insights: 关键洞察（字符串数组）
             - trends: 趋势分析（字符串数组）
-            - anomalies: 数据异常（字符串数组）
+            - anomalies: 数据异常（字符串数组）。数据中的 detected_anomalies 是本地统计检测出的异常（含单元格坐标），
+              请逐条解释其可能的原因，不需要自己再查找异常
             - visualization_data: 可视化数据（数组，每项包含type、title和data等字段）
             """
             
-            data = {
-                "model": config.DEEPSEEK_MODEL,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请分析以下Excel数据：{excel_content}"}
-                ],
-                "max_tokens": config.DEEPSEEK_MAX_TOKENS,
-                "temperature": config.DEEPSEEK_TEMPERATURE
-            }
+            # 按token预算压缩数据：表头 + 列统计 + 分层抽样 + 异常值行（整表统计与异常检测在线程池中执行）
+            prompt_text, prompt_stats = await asyncio.to_thread(
+                build_analysis_prompt,
+                excel_content,
+                token_budget=config.ANALYZE_PROMPT_TOKEN_BUDGET,
+                sample_rows=config.ANALYZE_SAMPLE_ROWS,
+                outlier_rows=config.ANALYZE_OUTLIER_ROWS,
+                frame=frame,
+                anomalies=True,
+                sketch=sketch
+            )
+            prompt_compression_ratio.labels(api_endpoint=endpoint).observe(prompt_stats["compression_ratio"])
+            api_logger.info(f"分析提示词压缩: {prompt_stats}")
             
-            # 发送请求到DeepSeek API
-            response = requests.post(url, headers=headers, json=data)
-            response_json = response.json()
-            
-            # 解析API响应
-            report = json.loads(response_json['choices'][0]['message']['content'])
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"请分析以下Excel数据：{prompt_text}"}
+            ]
             
-            # 记录token消耗
-            if 'usage' in response_json:
-                tokens_used = response_json['usage']['total_tokens']
-                token_consumed.labels(api_endpoint=endpoint).inc(tokens_used)
-                token_consumed_current.labels(api_endpoint=endpoint).set(tokens_used)
+            # 发送请求到DeepSeek API（异步，不阻塞事件循环，优先命中缓存）
+            report = await call_llm(
+                endpoint, messages,
+                bypass_cache=should_bypass_cache(cache_control, x_cache_bypass),
+                http_request=http_request
+            )
+            if isinstance(report, dict) and "anomaly_details" not in report:
+                # 附上本地检测到的异常及其单元格坐标
+                report["anomaly_details"] = await asyncio.to_thread(detect_anomalies, frame)
+        
+        # 图表数据按点数预算降采样，响应大小与工作表的行数无关
+        if isinstance(report, dict):
+            downsample_visualization(report, *chart_point_budget(max_points))
         
         # 记录Excel处理时间
         excel_processing_time_seconds.labels(operation_type="analyze").observe(time.time() - excel_process_start)
@@ -565,6 +1263,19 @@ async def analyze_excel(
         
     except Exception as e:
         print(f"分析Excel时出错：{str(e)}")
+        if isinstance(e, HTTPException) and e.status_code in (400, 413, 415):
+            # 上传被拒绝、文件无法读取或工作表不存在（计数已在抛出前记录）
+            if os.path.exists(temp_input_path):
+                os.remove(temp_input_path)
+            raise
+        if isinstance(e, ClientDisconnectedError):
+            # 客户端已断开，不再回退生成结果
+            api_requests_total.labels(api_endpoint=endpoint, status_code="499").inc()
+            api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
+            active_requests.dec()
+            if os.path.exists(temp_input_path):
+                os.remove(temp_input_path)
+            raise HTTPException(status_code=499, detail="客户端已断开连接")
         api_requests_total.labels(api_endpoint=endpoint, status_code="500").inc()
         api_request_duration_seconds.labels(api_endpoint=endpoint).observe(time.time() - start_time)
         active_requests.dec()
@@ -579,8 +1290,10 @@ async def analyze_excel(
         # 如果API调用失败，尝试使用模拟函数作为回退
         if not use_mock:
             try:
-                if "excel_content" in locals() and not isinstance(excel_content, dict) or "error" not in excel_content:
-                    report = generate_analysis_report(excel_content)
+                if isinstance(locals().get("excel_content"), dict) and "error" not in excel_content:
+                    # 复用已解析的列和全表摘要，不重新解析文件
+                    report = await asyncio.to_thread(generate_analysis_report, excel_content, frame, sketch)
+                    downsample_visualization(report, *chart_point_budget(max_points))
                     
                     # 记录处理的Excel文件和行数（回退模式）
                     excel_files_processed.labels(operation_type="analyze").inc()
@@ -612,6 +1325,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             {"path": "/generate_excel", "method": "POST", "description": "根据自然语言描述生成Excel文件"},
+            {"path": "/generate_excel/stream", "method": "POST", "description": "流式生成Excel文件（SSE逐行推送）"},
             {"path": "/edit_excel", "method": "POST", "description": "根据自然语言指令编辑Excel文件"},
             {"path": "/analyze_excel", "method": "POST", "description": "分析Excel文件数据并生成洞察"},
             {"path": "/download/{file_name}", "method": "GET", "description": "下载Excel文件"},
@@ -0,0 +1,226 @@
+import hashlib
+import os
+import pickle
+import stat
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .logger_config import excel_logger
+
+# 估算条目大小时，长列表和 object 数组最多抽样的元素个数
+SIZE_SAMPLE = 256
+
+
+def estimate_nbytes(value, _seen=None):
+    """
+    估算缓存条目占用的内存字节数，不做序列化：numpy 数组按 nbytes 计算，
+    列表、字典和普通对象（SheetFrame、Column 等）递归累加，长列表和 object 数组按等间距抽样的元素估算
+    """
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        size = value.nbytes
+        if value.dtype == object and value.size:
+            flat = value.reshape(-1)
+            step = max(1, flat.size // SIZE_SAMPLE)
+            sample = flat[::step]
+            size += sum(estimate_nbytes(item, seen) for item in sample.tolist()) * flat.size // sample.size
+        return size
+    if isinstance(value, (str, bytes, int, float, bool, np.generic)) or value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+    elif hasattr(value, "__dict__"):
+        items = list(vars(value).values())
+    else:
+        return sys.getsizeof(value)
+    size = sys.getsizeof(value)
+    if items:
+        step = max(1, len(items) // SIZE_SAMPLE)
+        sample = items[::step]
+        size += sum(estimate_nbytes(item, seen) for item in sample) * len(items) // len(sample)
+    return size
+
+
+def _private_dir(path):
+    """
+    创建（或检查）只有当前用户可以访问的目录（0700），目录不属于当前用户或是符号链接时返回 False
+    磁盘缓存用 pickle 读回，其他用户能写入该目录时就能让本进程执行任意代码
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or (hasattr(os, "getuid") and info.st_uid != os.getuid()):
+        return False
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return True
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """
+    分块计算文件的 SHA-256，不把整个文件读入内存
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParsedWorkbookCache:
+    """
+    已解析工作表的缓存，以 上传内容的SHA-256 + 解析类型 + 工作表 + 读取上限 为键
+    - 第一级：进程内 LRU，按条目估算的内存字节数（见 estimate_nbytes）限制总大小
+    - 第二级（可选）：从内存淘汰的条目写入 spill_dir（pickle 二进制格式，numpy 数组按原始缓冲区写入），
+      命中后读回内存；磁盘上的文件按修改时间淘汰。spill_dir 必须是当前用户私有的目录（创建为 0700，
+      已存在时收紧权限），属于其他用户时不写入磁盘，缓存文件的权限为 0600
+    同一文件先后用于分析、编辑、在线编辑时跳过 load_workbook 和逐列解析
+    缓存的值在多个请求间共享，调用方不能修改
+    """
+
+    def __init__(self, enabled=True, max_bytes=256 * 1024 * 1024, spill_dir="",
+                 spill_max_bytes=1024 * 1024 * 1024, on_evict=None, on_lookup=None):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.on_evict = on_evict
+        self.on_lookup = on_lookup
+        self.nbytes = 0
+        self._memory = OrderedDict()   # 键 -> (字节数, 值)
+        self._lock = threading.Lock()
+        if enabled and spill_dir and not _private_dir(spill_dir):
+            excel_logger.warning(f"解析缓存目录不属于当前用户，不写入磁盘: {spill_dir}")
+            self.spill_dir = ""
+
+    @staticmethod
+    def make_key(digest, kind, sheet=None, max_rows=None, max_cols=None):
+        sheet = "" if sheet is None else str(sheet).strip()
+        return f"{digest}:{kind}:{sheet}:{max_rows or ''}:{max_cols or ''}"
+
+    def _evicted(self, reason):
+        if self.on_evict:
+            self.on_evict(reason)
+
+    def _looked_up(self, tier):
+        if self.on_lookup:
+            self.on_lookup(tier)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, key):
+        """
+        查询缓存，返回 (value, tier)；未命中时返回 (None, None)
+        """
+        if not self.enabled:
+            return None, None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            self._looked_up("memory")
+            return entry[1], "memory"
+
+        if self.spill_dir:
+            path = self._spill_path(key)
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+                value = pickle.loads(payload)
+            except FileNotFoundError:
+                value = None
+            except Exception as e:
+                excel_logger.warning(f"读取解析缓存文件失败，已删除: {path}, {e!r}")
+                self._remove(path)
+                value = None
+            if value is not None:
+                self._remove(path)
+                self._memory_set(key, value, estimate_nbytes(value))
+                self._looked_up("disk")
+                return value, "disk"
+
+        self._looked_up(None)
+        return None, None
+
+    def set(self, key, value):
+        """
+        写入进程内缓存；条目的大小按 estimate_nbytes 估算，超出预算的单个条目不缓存
+        """
+        if not self.enabled:
+            return
+        size = estimate_nbytes(value)
+        if size > self.max_bytes:
+            excel_logger.info(f"解析结果过大（约{size}字节），不缓存")
+            return
+        self._memory_set(key, value, size)
+
+    def _memory_set(self, key, value, size):
+        spilled = []
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[0]
+            self._memory[key] = (size, value)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._memory) > 1:
+                evicted_key, (evicted_size, evicted_value) = self._memory.popitem(last=False)
+                self.nbytes -= evicted_size
+                spilled.append((evicted_key, evicted_value))
+        for evicted_key, evicted_value in spilled:
+            self._evicted("capacity")
+            if self.spill_dir:
+                self._spill(evicted_key, evicted_value)
+
+    def _spill(self, key, value):
+        """
+        把淘汰的条目写入磁盘（先写临时文件再改名，避免其他 worker 读到不完整的文件）
+        """
+        path = self._spill_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            excel_logger.warning(f"写入解析缓存文件失败: {e!r}")
+            self._remove(tmp_path)
+            return
+        self._prune_spill_dir()
+
+    def _prune_spill_dir(self):
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.spill_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self._evicted("disk_capacity")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._memory)
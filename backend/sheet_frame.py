@@ -0,0 +1,527 @@
+import math
+import re
+import sys
+from datetime import date, datetime, timedelta
+from itertools import zip_longest
+
+import numpy as np
+
+# 列类型
+KIND_NUMBER = "number"
+KIND_DATE = "date"
+KIND_TEXT = "text"
+KIND_EMPTY = "empty"
+
+# 表头角色（根据列类型、表头名称和基数推断）
+ROLE_TIME = "time"          # 时间/日期维度，如 月份、日期
+ROLE_MEASURE = "measure"    # 可汇总的数值，如 销售额、数量
+ROLE_CATEGORY = "category"  # 低基数的类别，如 部门、地区
+ROLE_ID = "id"              # 标识列，如 编号、员工ID
+ROLE_TEXT = "text"          # 其他自由文本
+ROLE_EMPTY = "empty"
+
+TIME_KEYWORDS = ('日期', '时间', '月份', '季度', '年份', 'date', 'time', 'month', 'year', 'quarter')
+TIME_EXACT = ('年', '月', '日', '周')
+ID_KEYWORDS = ('编号', '序号', '工号', '代码', '单号', 'id', 'code', 'no.')
+
+# 类别列的最大基数
+CATEGORY_MAX_DISTINCT = 50
+
+# 合计行的标签（不区分大小写）：汇总统计时排除这些行，避免与明细重复计算
+SUMMARY_LABELS = frozenset(('总计', '合计', '总和', '小计', '累计', 'total', 'totals', 'grand total', 'subtotal', 'sum'))
+
+_NONE_TYPE = type(None)
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+_CURRENCY_CHARS = ('%', '￥', '¥', '$', ',')
+_ISO_DATE = re.compile(r'^\d{4}-\d{1,2}(-\d{1,2})?([ T]\d{1,2}:\d{2}(:\d{2})?)?$')
+
+
+def to_number(value):
+    """
+    尝试把单元格的值转换为数值，兼容带货币符号、百分号、逗号的字符串
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    try:
+        val_str = str(value)
+        for ch in _CURRENCY_CHARS:
+            val_str = val_str.replace(ch, '')
+        val_str = val_str.strip()
+        number = float(val_str) if val_str else None
+    except ValueError:
+        return None
+    return number if number is None or math.isfinite(number) else None
+
+
+def to_datetime64(value):
+    """
+    把 datetime/date 或 ISO 格式的日期字符串转换为 numpy.datetime64（秒精度），无法识别时返回 None
+    """
+    if isinstance(value, datetime):
+        return np.datetime64(value.replace(tzinfo=None), 's')
+    if isinstance(value, date):
+        return np.datetime64(value, 's')
+    if isinstance(value, str) and _ISO_DATE.match(value.strip()):
+        try:
+            return np.datetime64(value.strip().replace(' ', 'T'), 's')
+        except ValueError:
+            return None
+    return None
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _unique_dates(values):
+    """
+    把去重后的 str/datetime/date 取值转换为 datetime64[s] 数组，有任一取值无法识别时返回 None
+    不带时区的 datetime 按与 1970-01-01 的差值批量换算，其余取值逐个转换
+    """
+    dates = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[s]')
+    types = np.fromiter(map(type, values), dtype=object, count=len(values))
+    pending = np.flatnonzero(types != datetime)
+    naive = np.flatnonzero(types == datetime)
+    if naive.size:
+        try:
+            seconds = np.fromiter(((v - _EPOCH) // _SECOND for v in values[naive]), dtype=np.int64, count=naive.size)
+            dates[naive] = seconds.astype('datetime64[s]')
+        except TypeError:
+            # 含带时区的 datetime
+            pending = np.arange(len(values))
+    for i in pending:
+        parsed_date = to_datetime64(values[i])
+        if parsed_date is None:
+            return None
+        dates[i] = parsed_date
+    return dates
+
+
+class Column:
+    """
+    一列数据：数值列和日期列保存为 numpy 数组，文本列保存为 类别编码 + 去重后的取值
+    mask 为 True 的位置是空单元格；labels 保存从字符串解析出的数值/日期的原始文本（如 '104%'、'2024-01'）
+    """
+    def __init__(self, name, kind, length, mask, values=None, valid=None, labels=None, codes=None, categories=None):
+        self.name = name
+        self.kind = kind
+        self.length = length
+        self.mask = mask
+        self.values = values
+        self.valid = valid if valid is not None else ~mask
+        self.labels = labels
+        self.codes = codes
+        self.categories = categories
+        self.role = ROLE_EMPTY if kind == KIND_EMPTY else ROLE_TEXT
+        self._counts = None
+
+    @classmethod
+    def from_cells(cls, name, cells):
+        """
+        推断列类型并构建列数组：80%以上的非空值能解析为数值时为数值列，
+        全部非空值都是日期（或 ISO 日期字符串）时为日期列，否则为文本列
+        int/float 单元格整列批量转换；字符串和日期先去重编码，每个不同的取值只解析一次，
+        一旦无法解析的值超过 20% 就不再尝试数值解析
+        """
+        cells = cells if isinstance(cells, list) else list(cells)
+        length = len(cells)
+        objects = np.empty(length, dtype=object)
+        objects[:] = cells
+        types = np.fromiter(map(type, cells), dtype=object, count=length)
+        mask = types == _NONE_TYPE
+        is_str = types == str
+        native = (types == float) | (types == int)
+        keyed = is_str | (types == datetime) | (types == date)
+        # 其他类型（布尔值、numpy 标量等）很少见，逐个处理
+        other_idx = np.flatnonzero(~mask & ~native & ~keyed)
+        for i in other_idx:
+            if cells[i] == '':
+                mask[i] = True
+        other_idx = other_idx[~mask[other_idx]]
+
+        # 字符串和日期按首次出现的顺序编码，相同的取值只保存和解析一次
+        keyed_idx = np.flatnonzero(keyed)
+        index = {}
+        key_codes = np.fromiter((index.setdefault(v, len(index)) for v in objects[keyed_idx]),
+                                dtype=np.int64, count=keyed_idx.size)
+        uniques = np.empty(len(index), dtype=object)
+        uniques[:] = [_intern(v) for v in index]
+        key_counts = np.bincount(key_codes, minlength=len(uniques))
+        blank = index.get('')
+        if blank is not None:
+            is_blank = key_codes == blank
+            mask[keyed_idx[is_blank]] = True
+            keyed_idx, key_codes = keyed_idx[~is_blank], key_codes[~is_blank]
+            key_counts[blank] = 0
+
+        non_null = length - int(mask.sum())
+        if non_null == 0:
+            return cls(name, KIND_EMPTY, length, mask)
+
+        numbers = np.full(length, np.nan)
+        if native.any():
+            numbers[native] = objects[native].astype(float)
+            numbers[~np.isfinite(numbers)] = np.nan
+        threshold = 0.8 * non_null
+        # 日期和 NaN/inf 一定无法解析为数值
+        unique_is_str = np.fromiter(map(type, uniques), dtype=object, count=len(uniques)) == str
+        failures = int(np.count_nonzero(native & np.isnan(numbers))) + int(key_counts[~unique_is_str].sum())
+        for i in other_idx:
+            if non_null - failures < threshold:
+                break
+            number = to_number(cells[i])
+            if number is None:
+                failures += 1
+            else:
+                numbers[i] = number
+        if keyed_idx.size and non_null - failures >= threshold:
+            parsed = np.full(len(uniques), np.nan)
+            for code in np.flatnonzero((key_counts > 0) & unique_is_str):
+                if non_null - failures < threshold:
+                    break
+                number = to_number(uniques[code])
+                if number is None:
+                    failures += int(key_counts[code])
+                else:
+                    parsed[code] = number
+            numbers[keyed_idx] = parsed[key_codes]
+        if non_null - failures >= threshold:
+            valid = ~np.isnan(numbers)
+            # 字符串保留原始文本（如 '104%'），无法解析的少量值保留原值（如 '暂无'）
+            unparsed = np.flatnonzero(~mask & ~valid & ~keyed)
+            labels = None
+            if keyed_idx.size or unparsed.size:
+                labels = np.empty(length, dtype=object)
+                labels[keyed_idx] = uniques[key_codes]
+                labels[unparsed] = objects[unparsed]
+            return cls(name, KIND_NUMBER, length, mask, values=numbers, valid=valid, labels=labels)
+
+        present = np.flatnonzero(key_counts)
+        if not native.any():
+            unique_dates = _unique_dates(uniques[present])
+            dates = np.full(length, np.datetime64('NaT'), dtype='datetime64[s]')
+            for i in other_idx:
+                parsed_date = to_datetime64(cells[i]) if unique_dates is not None else None
+                if parsed_date is None:
+                    unique_dates = None
+                    break
+                dates[i] = parsed_date
+            if unique_dates is not None:
+                parsed = np.full(len(uniques), np.datetime64('NaT'), dtype='datetime64[s]')
+                parsed[present] = unique_dates
+                dates[keyed_idx] = parsed[key_codes]
+                labels = None
+                str_pos = unique_is_str[key_codes]
+                if str_pos.any():
+                    labels = np.empty(length, dtype=object)
+                    labels[keyed_idx[str_pos]] = uniques[key_codes[str_pos]]
+                return cls(name, KIND_DATE, length, mask, values=dates, labels=labels)
+
+        # 文本列：按首次出现的顺序编码，相同的字符串只保存一份
+        codes = np.full(length, -1, dtype=np.int32)
+        if native.any() or other_idx.size:
+            rows = np.flatnonzero(~mask)
+            index = {}
+            codes[rows] = np.fromiter((index.setdefault(v, len(index)) for v in objects[rows]),
+                                      dtype=np.int32, count=rows.size)
+            categories = [_intern(v) for v in index]
+        else:
+            # 全部是字符串/日期时直接复用上面的编码（去掉空字符串）
+            remap = np.full(len(uniques), -1, dtype=np.int32)
+            remap[present] = np.arange(present.size, dtype=np.int32)
+            codes[keyed_idx] = remap[key_codes]
+            categories = uniques[present]
+        category_array = np.empty(len(categories), dtype=object)
+        category_array[:] = categories
+        return cls(name, KIND_TEXT, length, mask, codes=codes, categories=category_array)
+
+    @property
+    def non_null(self):
+        return self.length - int(self.mask.sum())
+
+    @property
+    def is_numeric(self):
+        return self.kind == KIND_NUMBER
+
+    def numbers(self):
+        """
+        数值列中所有可解析的值（已去掉空值和无法解析的值）
+        """
+        if self.kind != KIND_NUMBER:
+            return np.empty(0)
+        return self.values[self.valid]
+
+    def value(self, i):
+        """
+        第 i 行的值：数值列返回数字（整数值返回 int），日期列返回 ISO 字符串，解析自字符串的值返回原始文本
+        """
+        if self.mask[i]:
+            return None
+        if self.labels is not None and self.labels[i] is not None:
+            return self.labels[i]
+        if self.kind == KIND_TEXT:
+            return self.categories[self.codes[i]]
+        if self.kind == KIND_NUMBER:
+            number = float(self.values[i])
+            return int(number) if number.is_integer() and abs(number) < 2 ** 53 else number
+        if self.kind == KIND_DATE:
+            return _format_datetime(self.values[i])
+        return None
+
+    def text(self, i):
+        value = self.value(i)
+        return None if value is None else str(value)
+
+    def texts(self, indices):
+        """
+        批量取多行的文本（与逐行调用 text 的结果一致），用于构建图表的坐标轴标签
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.kind == KIND_TEXT:
+            result = [str(v) for v in self.categories[self.codes[indices]]]
+        elif self.kind == KIND_NUMBER:
+            result = [str(int(v)) if v.is_integer() and abs(v) < 2 ** 53 else str(v)
+                      for v in self.values[indices].tolist()]
+        elif self.kind == KIND_DATE:
+            result = np.datetime_as_string(self.values[indices], unit='s').tolist()
+        else:
+            result = [None] * indices.size
+        if self.labels is not None:
+            for pos, label in enumerate(self.labels[indices]):
+                if label is not None:
+                    result[pos] = str(label)
+        masked = self.mask[indices]
+        if masked.any():
+            for pos in np.flatnonzero(masked):
+                result[pos] = None
+        return result
+
+    def take(self, indices):
+        """
+        按行号取出子列（类型不变；文本列只保留子列中出现过的取值，顺序仍为首次出现的顺序）
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        codes = categories = None
+        if self.kind == KIND_TEXT:
+            codes = self.codes[indices]
+            present = np.unique(codes[codes >= 0])
+            remap = np.full(len(self.categories), -1, dtype=np.int32)
+            remap[present] = np.arange(present.size, dtype=np.int32)
+            codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1).astype(np.int32)
+            categories = self.categories[present]
+        return Column(
+            self.name, self.kind, int(indices.size), self.mask[indices],
+            values=self.values[indices] if self.values is not None else None,
+            valid=self.valid[indices],
+            labels=self.labels[indices] if self.labels is not None else None,
+            codes=codes, categories=categories
+        )
+
+    def factorize(self):
+        """
+        返回 (编码数组, 取值列表)：取值按首次出现的顺序排列，空值编码为 -1
+        """
+        if self.kind == KIND_TEXT:
+            return self.codes, list(self.categories)
+        if self.kind == KIND_EMPTY:
+            return np.full(self.length, -1, dtype=np.int32), []
+        index = {}
+        codes = np.full(self.length, -1, dtype=np.int32)
+        keys = []
+        for i in np.flatnonzero(~self.mask):
+            key = self.value(i)
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(keys)
+                keys.append(key)
+            codes[i] = code
+        return codes, keys
+
+    def value_counts(self):
+        """
+        各取值出现的次数，按首次出现的顺序返回 [(取值, 次数), ...]
+        """
+        if self._counts is None:
+            codes, keys = self.factorize()
+            counts = np.bincount(codes[codes >= 0], minlength=len(keys)) if keys else np.empty(0, dtype=np.int64)
+            self._counts = [(key, int(count)) for key, count in zip(keys, counts)]
+        return self._counts
+
+    @property
+    def distinct(self):
+        if self.kind == KIND_NUMBER:
+            unparsed = self.labels[~self.mask & ~self.valid] if self.labels is not None else []
+            extra = len(set(map(str, unparsed)))
+            return int(np.unique(self.values[self.valid]).size) + extra
+        if self.kind == KIND_DATE:
+            return int(np.unique(self.values[~self.mask]).size)
+        if self.kind == KIND_TEXT:
+            return len(self.categories)
+        return 0
+
+
+def _format_datetime(value):
+    moment = value.astype('datetime64[s]').item()
+    return moment.isoformat() if moment is not None else None
+
+
+def summary_flags(columns, n_rows):
+    """
+    合计行的布尔掩码：任一文本列的取值（去掉首尾空白、不区分大小写）为 SUMMARY_LABELS 中的标签
+    每列只检查去重后的取值
+    """
+    flags = np.zeros(n_rows, dtype=bool)
+    for column in columns:
+        if column.kind != KIND_TEXT or not len(column.categories):
+            continue
+        hits = np.fromiter((str(value).strip().lower() in SUMMARY_LABELS for value in column.categories),
+                           dtype=bool, count=len(column.categories))
+        if hits.any():
+            flags |= (column.codes >= 0) & hits[np.maximum(column.codes, 0)]
+    return flags
+
+
+def infer_role(column, n_rows):
+    """
+    根据列类型、表头关键词和基数推断表头角色
+    """
+    name = column.name.strip().lower()
+    if column.kind == KIND_EMPTY:
+        return ROLE_EMPTY
+    if column.kind == KIND_DATE or name in TIME_EXACT or any(k in name for k in TIME_KEYWORDS):
+        return ROLE_TIME
+    is_id = any(k in name for k in ID_KEYWORDS)
+    if column.kind == KIND_NUMBER:
+        return ROLE_ID if is_id else ROLE_MEASURE
+    distinct = column.distinct
+    if is_id and distinct >= 0.9 * column.non_null:
+        return ROLE_ID
+    if distinct <= CATEGORY_MAX_DISTINCT and (distinct < column.non_null or n_rows <= 1):
+        return ROLE_CATEGORY
+    return ROLE_TEXT
+
+
+class SheetFrame:
+    """
+    按列存储的带类型工作表：每次上传只构建一次，分析报告、图表生成和提示词压缩共用，
+    避免对每个单元格反复解析 '104%'、'￥1,000' 之类的字符串
+    """
+    def __init__(self, sheet_name, columns, total_rows=None, total_cols=None, truncated=False):
+        self.sheet_name = sheet_name
+        self.columns = columns
+        self.n_rows = columns[0].length if columns else 0
+        self.n_cols = len(columns)
+        # 工作表的真实尺寸（读取时被截断的表格大于 n_rows / n_cols），均不含表头
+        self.total_rows = total_rows if total_rows is not None else self.n_rows
+        self.total_cols = total_cols if total_cols is not None else self.n_cols
+        self.truncated = truncated
+        self._cache = {}   # 派生结果的缓存（列概要、异常检测结果），见 cached_result
+        for column in columns:
+            column.role = infer_role(column, self.n_rows)
+
+    @classmethod
+    def from_rows(cls, rows, sheet_name="Sheet1", total_rows=None, total_cols=None, truncated=False):
+        """
+        从二维列表或行迭代器构建，第一行为表头；total_rows 为包含表头的真实行数（与 read_excel 一致）
+        """
+        iterator = iter(rows)
+        header = next(iterator, None)
+        if header is None:
+            return cls(sheet_name, [], 0, 0, truncated)
+        header = list(header)
+        body = [row if row is not None else () for row in iterator]
+        n_rows = len(body)
+        # 一次性按列转置（长短不一的行用 None 补齐）
+        cells = list(zip_longest(*body)) if body else []
+        del body
+        n_cols = max(len(header), len(cells))
+
+        names = [str(h) if h is not None and h != '' else f"列{i + 1}" for i, h in enumerate(header)]
+        names += [f"列{i + 1}" for i in range(len(names), n_cols)]
+        columns = []
+        for col_idx in range(n_cols):
+            column_cells = cells[col_idx] if col_idx < len(cells) else [None] * n_rows
+            columns.append(Column.from_cells(names[col_idx], column_cells))
+            if col_idx < len(cells):
+                cells[col_idx] = None  # 逐列释放原始单元格
+        data_rows = max(total_rows - 1, 0) if total_rows is not None else None
+        return cls(sheet_name, columns, data_rows, total_cols, truncated)
+
+    @classmethod
+    def from_excel_content(cls, excel_content):
+        """
+        从 read_excel 的结果构建
+        """
+        truncated = bool(excel_content.get('truncated'))
+        return cls.from_rows(
+            excel_content.get('data') or [],
+            sheet_name=excel_content.get('sheet_name', 'Sheet1'),
+            total_rows=excel_content.get('total_rows') if truncated else None,
+            total_cols=excel_content.get('total_cols') if truncated else None,
+            truncated=truncated
+        )
+
+    def cached_result(self, key, compute):
+        """
+        按 key 缓存由本表派生的只读结果（如列概要），同一份数据只计算一次
+        """
+        cache = self.__dict__.setdefault('_cache', {})
+        if key not in cache:
+            cache[key] = compute()
+        return cache[key]
+
+    @property
+    def headers(self):
+        return [column.name for column in self.columns]
+
+    def take(self, rows):
+        """
+        按行号取出部分行构成新的 SheetFrame（表头角色按子表重新推断）
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return SheetFrame(self.sheet_name, [column.take(rows) for column in self.columns],
+                          total_rows=self.total_rows - (self.n_rows - int(rows.size)), total_cols=self.total_cols,
+                          truncated=self.truncated)
+
+    def summary_rows(self):
+        """
+        合计行（总计、合计、Total 等）的布尔掩码，见 summary_flags
+        """
+        return self.cached_result("summary_rows", lambda: summary_flags(self.columns, self.n_rows))
+
+    def without_summary_rows(self):
+        """
+        去掉合计行后的 SheetFrame，用于求和、均值、图表等汇总统计；没有合计行时返回自身
+        """
+        flags = self.summary_rows()
+        if not flags.any():
+            return self
+        return self.cached_result("without_summary_rows", lambda: self.take(np.flatnonzero(~flags)))
+
+    def column_index(self, names):
+        """
+        第一个表头在 names 中的列号，没有时返回 None
+        """
+        for idx, column in enumerate(self.columns):
+            if column.name in names:
+                return idx
+        return None
+
+    def columns_with_role(self, role):
+        return [idx for idx, column in enumerate(self.columns) if column.role == role]
+
+    def row(self, i):
+        return [column.value(i) for column in self.columns]
+
+    def iter_rows(self, indices=None):
+        for i in (range(self.n_rows) if indices is None else indices):
+            yield self.row(i)
+
+    def to_rows(self):
+        """
+        还原为二维列表（第一行为表头）
+        """
+        return [self.headers] + list(self.iter_rows())
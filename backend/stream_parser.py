@@ -0,0 +1,96 @@
+import json
+
+
+class IncrementalTableParser:
+    """
+    增量解析模型流式输出的表格JSON：{"sheet_name": "...", "data": [[...], [...], ...]}
+
+    每次 feed() 传入新到达的文本片段，返回其中新完成的行（已 json.loads 的列表）。
+    解析器只跟踪字符串/转义状态和括号深度，不需要等待整个JSON结束，
+    因此第一行在模型输出完第一行时即可拿到。
+    """
+
+    def __init__(self):
+        self.sheet_name = None
+        self.rows_parsed = 0
+        self._chunks = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_buf = []
+        self._expect_key = False
+        self._last_key = None
+        self._in_data = False
+        self._row_buf = None
+
+    @property
+    def text(self):
+        """
+        目前为止收到的完整文本
+        """
+        return ''.join(self._chunks)
+
+    def _string_finished(self, value):
+        # 只关心顶层对象（深度1）中的键和值
+        if self._depth != 1:
+            return
+        if self._expect_key:
+            self._last_key = value
+            self._expect_key = False
+        elif self._last_key == 'sheet_name' and self.sheet_name is None:
+            self.sheet_name = value
+
+    def feed(self, chunk):
+        """
+        输入新的文本片段，返回新完成的行列表
+        """
+        self._chunks.append(chunk)
+        rows = []
+        for ch in chunk:
+            if self._row_buf is not None:
+                self._row_buf.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    if self._depth == 1:
+                        self._string_buf.append('\\' + ch)
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._string_finished(json.loads('"' + ''.join(self._string_buf) + '"'))
+                elif self._depth == 1:
+                    self._string_buf.append(ch)
+                continue
+
+            if not self._started:
+                # 跳过 ```json 等前缀，直到顶层对象开始
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_buf = []
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._last_key == 'data':
+                    self._in_data = True
+                elif ch == '[' and self._depth == 3 and self._in_data:
+                    self._row_buf = ['[']
+            elif ch in '}]':
+                if self._depth == 3 and self._row_buf is not None:
+                    rows.append(json.loads(''.join(self._row_buf)))
+                    self._row_buf = None
+                    self.rows_parsed += 1
+                elif self._depth == 2 and self._in_data:
+                    self._in_data = False
+                self._depth -= 1
+            elif ch == ',' and self._depth == 1:
+                self._expect_key = True
+        return rows
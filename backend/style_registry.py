@@ -0,0 +1,226 @@
+import hashlib
+import json
+import re
+from copy import copy
+
+from openpyxl.cell.cell import MergedCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils.cell import range_boundaries
+
+# 样式设置中支持的部分
+STYLE_PARTS = ("font", "fill", "border", "alignment", "number_format")
+
+_FONT_KEYS = ("name", "size", "bold", "italic", "underline", "strike", "color")
+_ALIGNMENT_KEYS = ("horizontal", "vertical", "wrap_text", "shrink_to_fit", "indent", "text_rotation")
+_BORDER_SIDES = ("left", "right", "top", "bottom")
+
+# 常用的颜色名称（模型经常直接给出 "red" 这样的名称）
+_COLOR_NAMES = {
+    "black": "000000", "white": "FFFFFF", "red": "FF0000", "green": "00B050", "blue": "0070C0",
+    "yellow": "FFFF00", "orange": "FFC000", "purple": "7030A0", "gray": "808080", "grey": "808080",
+    "lightgray": "D9D9D9", "lightgrey": "D9D9D9", "lightblue": "DDEBF7", "lightgreen": "E2EFDA",
+    "lightyellow": "FFF2CC", "darkblue": "002060", "darkred": "C00000", "pink": "FFC0CB",
+}
+_SHORT_HEX = re.compile(r'^[0-9A-Fa-f]{3}$')
+
+
+class StyleError(ValueError):
+    """
+    样式设置无效（如无法识别的颜色、线型或对齐方式）
+    """
+    pass
+
+
+def _color(value):
+    """
+    颜色统一为不带 # 的大写十六进制（如 FF0000）；支持常用颜色名称和三位简写（如 F00）
+    """
+    if isinstance(value, dict):
+        value = value.get("color") or value.get("rgb")
+    if not isinstance(value, str) or not value.strip():
+        return None
+    color = value.strip().lstrip('#')
+    color = _COLOR_NAMES.get(color.lower().replace(' ', ''), color)
+    if _SHORT_HEX.match(color):
+        color = ''.join(ch * 2 for ch in color)
+    return color.upper()
+
+
+def _side(value):
+    if isinstance(value, str):
+        return {"style": value}
+    if isinstance(value, dict) and value.get("style"):
+        side = {"style": value["style"]}
+        if _color(value.get("color")):
+            side["color"] = _color(value.get("color"))
+        return side
+    return None
+
+
+def normalize_style(spec):
+    """
+    把LLM/前端传入的样式设置规范化为只含支持字段的字典，相同效果的设置得到相同的结果
+    fill 可以是颜色字符串或 {"color": ..., "pattern": ...}；border 可以是线型字符串、
+    {"style": "thin", "color": ...}（四边相同）或按 left/right/top/bottom 分别设置
+    """
+    if not isinstance(spec, dict):
+        return {}
+    style = {}
+    font = spec.get("font")
+    if isinstance(font, dict):
+        font = {k: font[k] for k in _FONT_KEYS if font.get(k) is not None}
+        if "color" in font:
+            font["color"] = _color(font["color"])
+        if font.get("underline") is True:
+            font["underline"] = "single"
+        elif font.get("underline") is False:
+            del font["underline"]
+        if font:
+            style["font"] = font
+    fill = spec.get("fill")
+    if fill:
+        color = _color(fill)
+        if color:
+            pattern = fill.get("pattern", "solid") if isinstance(fill, dict) else "solid"
+            style["fill"] = {"color": color, "pattern": pattern}
+    border = spec.get("border")
+    if border:
+        if isinstance(border, dict) and any(side in border for side in _BORDER_SIDES):
+            sides = {side: _side(border.get(side)) for side in _BORDER_SIDES}
+        else:
+            sides = {side: _side(border) for side in _BORDER_SIDES}
+        sides = {side: value for side, value in sides.items() if value}
+        if sides:
+            style["border"] = sides
+    alignment = spec.get("alignment")
+    if isinstance(alignment, dict):
+        alignment = {k: alignment[k] for k in _ALIGNMENT_KEYS if alignment.get(k) is not None}
+        if alignment:
+            style["alignment"] = alignment
+    if isinstance(spec.get("number_format"), str) and spec["number_format"]:
+        style["number_format"] = spec["number_format"]
+    return style
+
+
+def build_style_parts(style):
+    """
+    由规范化的样式设置创建 openpyxl 样式对象，返回 {部分: 对象}
+    """
+    parts = {}
+    if "font" in style:
+        parts["font"] = Font(**style["font"])
+    if "fill" in style:
+        fill = style["fill"]
+        parts["fill"] = PatternFill(fill_type=fill["pattern"], start_color=fill["color"], end_color=fill["color"])
+    if "border" in style:
+        parts["border"] = Border(**{side: Side(**value) for side, value in style["border"].items()})
+    if "alignment" in style:
+        parts["alignment"] = Alignment(**style["alignment"])
+    if "number_format" in style:
+        parts["number_format"] = style["number_format"]
+    return parts
+
+
+def check_style(spec):
+    """
+    规范化样式设置并检查能否创建对应的 openpyxl 样式对象，返回 (规范化的样式, 样式对象)
+    样式无效（如颜色不是十六进制、线型不存在）时抛出 StyleError
+    """
+    style = normalize_style(spec)
+    try:
+        return style, build_style_parts(style)
+    except (TypeError, ValueError) as e:
+        raise StyleError(f"样式设置无效: {e}") from e
+
+
+class StyleRegistry:
+    """
+    工作簿级的样式登记表：相同的 字体/填充/边框/对齐/数字格式 组合只登记一次为命名样式，
+    之后按整个区域复用样式索引，而不是为每个单元格创建新的样式对象
+    已有样式的单元格只覆盖设置中给出的部分，合并结果按 (原样式, 新样式) 缓存
+    单个单元格和区域都先经过 resolve 检查样式，无效的样式抛出 StyleError，不修改任何单元格
+    """
+    def __init__(self, wb, prefix="style"):
+        self.wb = wb
+        self.prefix = prefix
+        self._named = {}    # 样式键 -> NamedStyle
+        self._merged = {}   # (原样式索引, 样式键) -> 合并后的样式索引
+        self._parts = {}    # 样式键 -> 已检查的样式对象
+        self.applied = 0
+
+    @property
+    def style_count(self):
+        return len(self._named)
+
+    @staticmethod
+    def key(style):
+        return json.dumps(style, sort_keys=True, ensure_ascii=False, default=str)
+
+    def resolve(self, spec):
+        """
+        规范化并检查样式设置（相同的设置只检查一次），返回 (规范化的样式, 样式键)
+        """
+        style = normalize_style(spec)
+        key = self.key(style)
+        if key not in self._parts:
+            self._parts[key] = check_style(style)[1]
+        return style, key
+
+    def named_style(self, spec):
+        """
+        返回样式设置对应的命名样式（相同设置只创建、登记一次；再次编辑同一文件时复用已有的同名样式）
+        """
+        style, key = self.resolve(spec)
+        named = self._named.get(key)
+        if named is None:
+            name = f"{self.prefix}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]}"
+            existing = {s.name: s for s in self.wb._named_styles}
+            named = existing.get(name)
+            if named is None:
+                named = NamedStyle(name=name, **self._parts[key])
+                self.wb.add_named_style(named)
+            self._named[key] = named
+        return named
+
+    def apply(self, cell, spec):
+        """
+        为单个单元格应用样式
+        """
+        style, key = self.resolve(spec)
+        if style and not isinstance(cell, MergedCell):
+            self._apply(cell, style, key)
+
+    def apply_range(self, ws, cell_range, spec):
+        """
+        为区域（如 "A1:F1"、"B:B"、"2:2"）内的所有单元格应用同一样式，返回应用的单元格数
+        """
+        style, key = self.resolve(spec)
+        if not style:
+            return 0
+        min_col, min_row, max_col, max_row = range_boundaries(str(cell_range).replace('$', '').strip())
+        min_col, min_row = min_col or 1, min_row or 1
+        max_col, max_row = max_col or ws.max_column, max_row or ws.max_row
+        count = 0
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                cell = ws.cell(row=row, column=col)
+                if not isinstance(cell, MergedCell):
+                    self._apply(cell, style, key)
+                    count += 1
+        return count
+
+    def _apply(self, cell, style, key):
+        base = cell._style
+        if base is None or not any(base):
+            # 默认样式的单元格直接使用命名样式
+            cell._style = copy(self.named_style(style).as_tuple())
+        else:
+            cache_key = (tuple(base), key)
+            merged = self._merged.get(cache_key)
+            if merged is None:
+                for part, value in self._parts[key].items():
+                    setattr(cell, part, value)
+                merged = self._merged[cache_key] = copy(cell._style)
+            else:
+                cell._style = copy(merged)
+        self.applied += 1
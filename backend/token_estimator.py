@@ -0,0 +1,103 @@
+import json
+import math
+
+from .llm_client import LLMError
+
+# 如果安装了 tiktoken，使用BPE分词器估算token数（离线可用，需预先缓存编码文件），否则使用字符启发式估算
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# 每条消息的固定开销（角色标记、分隔符）和回复的引导token，参照OpenAI的chat格式计数方式
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_encoding = None
+
+
+class PromptTooLargeError(LLMError):
+    """
+    提示词估算的token数超出了上下文窗口，请求未发送到上游
+    """
+    pass
+
+
+def set_encoding(name):
+    """
+    在启动时指定 tiktoken 编码名称（如 cl100k_base），返回是否加载成功
+    未安装 tiktoken、名称为空或加载失败时使用启发式估算
+    """
+    global _encoding
+    _encoding = None
+    if not HAS_TIKTOKEN or not name:
+        return False
+    try:
+        _encoding = tiktoken.get_encoding(name)
+    except Exception:
+        # 离线环境下编码文件未缓存（见 TIKTOKEN_CACHE_DIR）时无法加载
+        return False
+    return True
+
+
+def heuristic_tokens(text):
+    """
+    粗略估算文本的token数：中文等宽字符约0.6个token，其余字符约0.3个token
+    """
+    wide = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return int(math.ceil(wide * 0.6 + (len(text) - wide) * 0.3))
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数，优先使用 tiktoken
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return heuristic_tokens(text)
+
+
+def estimate_messages_tokens(messages):
+    """
+    估算 chat/completions 消息列表的prompt token数
+    """
+    total = REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS
+        total += estimate_tokens(message.get("role", ""))
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        total += estimate_tokens(content)
+    return total
+
+
+def clamp_max_tokens(prompt_tokens, context_window, max_tokens, min_completion_tokens=256):
+    """
+    把 max_tokens 限制在上下文窗口的剩余空间内
+    剩余空间不足 min_completion_tokens 时抛出 PromptTooLargeError
+    """
+    remaining = context_window - prompt_tokens
+    if remaining < min_completion_tokens:
+        raise PromptTooLargeError(
+            f"提示词约 {prompt_tokens} tokens，超出上下文窗口 {context_window}（至少需要为回复保留 {min_completion_tokens}）"
+        )
+    return min(max_tokens, remaining)
+
+
+def estimate_usage(messages, completion):
+    """
+    在模拟模式下按与真实调用相同的口径估算 usage
+    """
+    if not isinstance(completion, str):
+        completion = json.dumps(completion, ensure_ascii=False, default=str)
+    prompt_tokens = estimate_messages_tokens(messages)
+    completion_tokens = estimate_tokens(completion)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
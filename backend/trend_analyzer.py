@@ -0,0 +1,435 @@
+import re
+
+import numpy as np
+
+from .sheet_frame import KIND_DATE, KIND_NUMBER, KIND_TEXT
+
+# 时间粒度：(名称, 显示名称, 单位, 相邻两期的最大中位间隔天数)
+GRANULARITIES = (
+    ("day", "日", "天", 1.5),
+    ("week", "周", "周", 10),
+    ("month", "月", "个月", 45),
+    ("quarter", "季度", "个季度", 120),
+    ("year", "年", "年", None),
+)
+
+# 各粒度下尝试的季节周期（以期数计）
+SEASON_LAGS = {"day": (7, 365), "week": (52,), "month": (12,), "quarter": (4,), "year": ()}
+# 自相关系数达到该值才认为存在季节性
+SEASON_MIN_ACF = 0.3
+# 累计变化小于起点（拟合线在第一期的值）的该比例时视为平稳
+FLAT_RATIO = 0.05
+MAX_CHANGEPOINTS = 3
+# Theil-Sen 斜率最多使用的点数（两两配对，约 MAX_THEIL_SEN_POINTS² / 2 对）
+MAX_THEIL_SEN_POINTS = 1000
+# 没有年份的标签（如 '3月'、'Q2'）统一放在该年，只用于排序
+_PLACEHOLDER_YEAR = 2000
+
+_WEEKDAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+_CN_NUMBERS = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10,
+               "十一": 11, "十二": 12}
+_EN_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+
+_YMD = re.compile(r'^(\d{4})\s*[年/.\-]\s*(\d{1,2})\s*(?:月)?\s*(?:[/.\-]?\s*(\d{1,2})\s*[日号]?)?$')
+_YEAR_QUARTER = re.compile(r'^(\d{4})\s*年?\s*[-/ ]?\s*(?:[Qq]\s*([1-4])|第?\s*([1-4一二三四])\s*季度?)$')
+_QUARTER = re.compile(r'^(?:[Qq]\s*([1-4])|第?\s*([1-4一二三四])\s*季度)$')
+_MONTH = re.compile(r'^(\d{1,2}|[一二三四五六七八九十]{1,3})\s*月份?$')
+_YEAR = re.compile(r'^(\d{4})\s*年?$')
+
+
+def _cn_number(text):
+    return int(text) if text.isdigit() else _CN_NUMBERS.get(text)
+
+
+def _day(year, month, day=1):
+    try:
+        return np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", 'D')
+    except ValueError:
+        return None
+
+
+def parse_period_label(text):
+    """
+    把时间标签解析为 (该期第一天的 datetime64[D], 是否带年份)，无法识别时返回 (None, False)
+    支持 '2024年3月'、'2024/3/5'、'2024.03'、'2024Q1'、'2024年第一季度'、'Q2'、'3月'、'三月'、'Mar'、'2024年' 等
+    """
+    text = str(text).strip()
+    match = _YMD.match(text)
+    if match:
+        day = _day(int(match.group(1)), int(match.group(2)), int(match.group(3) or 1))
+        return day, day is not None
+    match = _YEAR_QUARTER.match(text)
+    if match:
+        quarter = _cn_number(match.group(2) or match.group(3))
+        return _day(int(match.group(1)), quarter * 3 - 2), True
+    match = _QUARTER.match(text)
+    if match:
+        quarter = _cn_number(match.group(1) or match.group(2))
+        return _day(_PLACEHOLDER_YEAR, quarter * 3 - 2), False
+    match = _MONTH.match(text)
+    if match:
+        month = _cn_number(match.group(1))
+        if month and 1 <= month <= 12:
+            return _day(_PLACEHOLDER_YEAR, month), False
+        return None, False
+    match = _YEAR.match(text)
+    if match:
+        return _day(int(match.group(1)), 1), True
+    lowered = text.lower()
+    for i, name in enumerate(_EN_MONTHS):
+        if lowered[:3] == name and lowered.isalpha():
+            return _day(_PLACEHOLDER_YEAR, i + 1), False
+    return None, False
+
+
+def time_index(column):
+    """
+    把时间列转换为每行的 datetime64[D]（无法识别或为空的行为 NaT），返回 (数组, 是否带年份)
+    日期列直接取整到天；文本列只解析去重后的取值；数值列按年份（1900-2100）或月份（1-12）解释
+    """
+    days = np.full(column.length, np.datetime64('NaT'), dtype='datetime64[D]')
+    if column.kind == KIND_DATE:
+        return column.values.astype('datetime64[D]'), True
+    if column.kind == KIND_TEXT:
+        parsed = np.full(len(column.categories), np.datetime64('NaT'), dtype='datetime64[D]')
+        has_year = []
+        for code, label in enumerate(column.categories):
+            day, with_year = parse_period_label(label)
+            if day is not None:
+                parsed[code] = day
+                has_year.append(with_year)
+        present = column.codes >= 0
+        days[present] = parsed[column.codes[present]]
+        return days, bool(has_year) and all(has_year)
+    if column.kind == KIND_NUMBER:
+        numbers = column.values[column.valid]
+        if not numbers.size or not np.all(numbers == np.round(numbers)):
+            return days, False
+        if np.all((numbers >= 1900) & (numbers <= 2100)):
+            years = column.values[column.valid].astype(np.int64) - 1970
+            days[column.valid] = years.astype('datetime64[Y]').astype('datetime64[D]')
+            return days, True
+        if np.all((numbers >= 1) & (numbers <= 12)):
+            months = (_PLACEHOLDER_YEAR - 1970) * 12 + column.values[column.valid].astype(np.int64) - 1
+            days[column.valid] = months.astype('datetime64[M]').astype('datetime64[D]')
+            return days, False
+    return days, False
+
+
+def is_time_ordered(column, min_points=3):
+    """
+    时间列是否按时间排列（可识别的时间至少 min_points 个，整体升序或整体降序，允许同一期多行），
+    用于判断按角色推断出的日期列（如 入职日期）是否构成时间序列
+    """
+    days, _ = time_index(column)
+    steps = np.diff(days[~np.isnat(days)].astype(np.int64))
+    return steps.size >= min_points - 1 and bool(np.all(steps >= 0) or np.all(steps <= 0))
+
+
+def _periods(days, granularity):
+    """
+    把 datetime64[D] 转换为整数期号（相邻两期相差 1）
+    """
+    if granularity == "day":
+        return days.astype(np.int64)
+    if granularity == "week":
+        # 1970-01-01 为周四，按周一开始分周
+        return (days.astype(np.int64) + 3) // 7
+    months = days.astype('datetime64[M]').astype(np.int64)
+    if granularity == "month":
+        return months
+    if granularity == "quarter":
+        return months // 3
+    return months // 12
+
+
+def _period_start(period, granularity):
+    if granularity == "day":
+        return np.datetime64(int(period), 'D')
+    if granularity == "week":
+        return np.datetime64(int(period) * 7 - 3, 'D')
+    months = {"month": 1, "quarter": 3, "year": 12}[granularity] * int(period)
+    return np.datetime64(months, 'M').astype('datetime64[D]')
+
+
+def _period_label(period, granularity, has_year):
+    start = _period_start(period, granularity).astype(object)
+    if granularity in ("day", "week"):
+        return start.isoformat()
+    if granularity == "month":
+        return f"{start.year}-{start.month:02d}" if has_year else f"{start.month}月"
+    if granularity == "quarter":
+        quarter = (start.month - 1) // 3 + 1
+        return f"{start.year}Q{quarter}" if has_year else f"第{quarter}季度"
+    return str(start.year)
+
+
+def _phase_labels(periods, granularity, lag):
+    """
+    季节周期内每期所处的位置及其名称（星期几、几月、第几季度）
+    """
+    if granularity == "day" and lag == 7:
+        return (periods + 3) % 7, _WEEKDAYS
+    if granularity == "quarter":
+        return periods % 4, tuple(f"第{i + 1}季度" for i in range(4))
+    if granularity == "month":
+        return periods % 12, tuple(f"{i + 1}月" for i in range(12))
+    # 日/周数据的年度季节性按月份汇总
+    days = periods.astype(np.int64) if granularity == "day" else periods.astype(np.int64) * 7 - 3
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12, tuple(f"{i + 1}月" for i in range(12))
+
+
+def _theil_sen(x, y):
+    """
+    Theil-Sen 稳健斜率：两两配对斜率的中位数（点数过多时等间距抽样）
+    """
+    if x.size > MAX_THEIL_SEN_POINTS:
+        keep = np.linspace(0, x.size - 1, MAX_THEIL_SEN_POINTS).astype(np.int64)
+        x, y = x[keep], y[keep]
+    i, j = np.triu_indices(x.size, k=1)
+    dx = x[j] - x[i]
+    slopes = (y[j] - y[i])[dx != 0] / dx[dx != 0]
+    slope = float(np.median(slopes)) if slopes.size else 0.0
+    return slope, float(np.median(y - slope * x))
+
+
+def _autocorrelation(values):
+    """
+    用 FFT 一次算出所有滞后期的自相关系数
+    """
+    centered = values - values.mean()
+    n = centered.size
+    spectrum = np.fft.rfft(centered, 2 * n)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    return acf / acf[0] if acf[0] > 0 else np.zeros(n)
+
+
+def _best_split(values, min_size):
+    """
+    把一段序列分成两段（每段至少 min_size 期）时平方误差减少最多的位置和减少量，用累积和一次算出所有分割点
+    """
+    n = values.size
+    cumsum = np.cumsum(values)
+    left_n = np.arange(min_size, n - min_size + 1)
+    left = cumsum[left_n - 1]
+    right = cumsum[-1] - left
+    gains = left ** 2 / left_n + right ** 2 / (n - left_n) - cumsum[-1] ** 2 / n
+    k = int(np.argmax(gains))
+    return int(left_n[k]), float(gains[k])
+
+
+def _segment(residuals, min_size, noise):
+    """
+    二分分割：每次在所有段中选平方误差减少最多的分割点，减少量超过 3 * 噪声方差 * log(n) 才分割
+    """
+    n = residuals.size
+    penalty = 3 * noise ** 2 * np.log(n)
+    segments = [(0, n)]
+    points = []
+    while len(points) < MAX_CHANGEPOINTS:
+        best = None
+        for start, end in segments:
+            if end - start < 2 * min_size:
+                continue
+            split, gain = _best_split(residuals[start:end], min_size)
+            if gain > penalty and (best is None or gain > best[2]):
+                best = (start, end, gain, start + split)
+        if best is None:
+            break
+        start, end, _, split = best
+        segments.remove((start, end))
+        segments += [(start, split), (split, end)]
+        points.append(split)
+    return sorted(points)
+
+
+def _changepoints(values, min_size, rounds=3):
+    """
+    水平变化点：趋势和各段的水平一起用最小二乘拟合（避免水平变化把趋势斜率带偏），
+    在去掉趋势后的序列上二分分割，重复到变化点不再改变；返回 [(位置, 水平变化量), ...]
+    """
+    n = values.size
+    x = np.arange(n, dtype=float)
+
+    def fit(points):
+        design = np.column_stack([np.ones(n), x] + [(x >= p).astype(float) for p in points])
+        coef = np.linalg.lstsq(design, values, rcond=None)[0]
+        return coef, float(np.std(values - design @ coef))
+
+    points = []
+    for _ in range(rounds):
+        coef, noise = fit(points)
+        if noise == 0:
+            break
+        found = _segment(values - coef[0] - coef[1] * x, min_size, noise)
+        if found == points:
+            break
+        points = found
+    if not points:
+        return []
+    coef, _ = fit(points)
+    return [(point, float(step)) for point, step in zip(points, coef[2:])]
+
+
+def _pct(new, old):
+    return (new - old) / abs(old) * 100 if old else None
+
+
+def _analyze(frame, time_col_idx, value_col_idx):
+    time_column = frame.columns[time_col_idx]
+    value_column = frame.columns[value_col_idx]
+    if value_column.kind != KIND_NUMBER:
+        return None
+    days, has_year = time_index(time_column)
+    rows = np.flatnonzero(value_column.valid & ~np.isnat(days))
+    if rows.size < 3:
+        return None
+    days = days[rows]
+    values = value_column.values[rows]
+    unique_days = np.unique(days)
+    if unique_days.size < 3:
+        return None
+
+    gaps = np.median(np.diff(unique_days.astype(np.int64)))
+    for granularity, label, unit, max_gap in GRANULARITIES:
+        if max_gap is None or gaps <= max_gap:
+            break
+    periods_of_rows = _periods(days, granularity)
+    periods, first, inverse = np.unique(periods_of_rows, return_index=True, return_inverse=True)
+    if periods.size < 3:
+        return None
+    sums = np.bincount(inverse.reshape(-1), weights=values, minlength=periods.size)
+
+    # 规则网格（缺失的期线性插值），用于季节性和变化点
+    grid = np.arange(periods[0], periods[-1] + 1)
+    filled = np.interp(grid, periods, sums)
+
+    x = (periods - periods[0]).astype(float)
+    slope, intercept = np.polyfit(x, sums, 1) if periods.size > 1 else (0.0, sums[0])
+    fitted = slope * x + intercept
+    total = ((sums - sums.mean()) ** 2).sum()
+    r2 = 1 - ((sums - fitted) ** 2).sum() / total if total > 0 else 1.0
+    robust_slope, robust_intercept = _theil_sen(x, sums)
+    span = float(x[-1])
+    change = robust_slope * span
+    # 累计变化率相对于拟合线在第一期的值（起点不为正时变化率没有意义，不计算）
+    change_pct = change / robust_intercept * 100 if robust_intercept > 0 else None
+    if change_pct is not None and abs(change_pct) < FLAT_RATIO * 100:
+        direction = "平稳"
+    else:
+        direction = "上升" if change > 0 else "下降"
+
+    labels = [_period_label(p, granularity, has_year) for p in periods]
+    value_name = value_column.name
+    trend = {
+        "time_column": time_column.name,
+        "value_column": value_name,
+        "granularity": granularity,
+        "periods": int(periods.size),
+        "start": labels[0],
+        "end": labels[-1],
+        "slope": float(slope),
+        "robust_slope": robust_slope,
+        "r2": float(r2),
+        "direction": direction,
+        "change_pct": change_pct,
+        "season": None,
+        "mom": None,
+        "yoy": None,
+        "changepoints": [],
+        "series": list(zip(time_column.texts(rows[first]), sums.tolist())),
+        "messages": []
+    }
+    messages = trend["messages"]
+    summary = (f"按{label}汇总的'{value_name}'从{labels[0]}到{labels[-1]}共{periods.size}期，整体呈{direction}趋势，"
+               f"平均每{unit}变化{robust_slope:+.2f}（稳健估计）")
+    if change_pct is not None:
+        summary += f"，累计变化{change_pct:+.1f}%"
+    messages.append(summary + f"（线性拟合R²={r2:.2f}）。")
+
+    # 季节性：去掉趋势后在候选周期上的自相关系数；所有显著的周期成分都从序列中扣除，供变化点检测使用
+    detrended = filled - (robust_slope * (grid - grid[0]) + robust_intercept)
+    acf = _autocorrelation(detrended)
+    candidates = [lag for lag in SEASON_LAGS[granularity] if grid.size >= 2 * lag + 1 and acf[lag] >= SEASON_MIN_ACF]
+    seasonal = np.zeros(grid.size)
+    for lag in sorted(candidates, key=lambda lag: -acf[lag]):
+        phases, names = _phase_labels(grid, granularity, lag)
+        counts = np.maximum(np.bincount(phases, minlength=len(names)), 1)
+        effect = np.bincount(phases, weights=detrended - seasonal, minlength=len(names)) / counts
+        seasonal += (effect - effect[phases].mean())[phases]
+    if candidates:
+        lag = max(candidates, key=lambda lag: acf[lag])
+        phases, names = _phase_labels(grid, granularity, lag)
+        counts = np.bincount(phases, minlength=len(names))
+        phase_means = np.bincount(phases, weights=filled, minlength=len(names)) / np.maximum(counts, 1)
+        observed = np.flatnonzero(counts)
+        peak = observed[np.argmax(phase_means[observed])]
+        trough = observed[np.argmin(phase_means[observed])]
+        overall = filled.mean()
+        trend["season"] = {
+            "period": lag,
+            "strength": float(acf[lag]),
+            "peak": names[peak],
+            "trough": names[trough]
+        }
+        message = f"'{value_name}'存在以{lag}{unit}为周期的季节性（自相关系数{acf[lag]:.2f}），{names[peak]}最高、{names[trough]}最低"
+        if overall:
+            message += f"，最高时比平均水平高{(phase_means[peak] - overall) / abs(overall) * 100:.1f}%"
+        messages.append(message + "。")
+
+    # 环比/同比：按月汇总
+    if has_year and granularity in ("day", "week", "month"):
+        months_of_rows = days.astype('datetime64[M]').astype(np.int64)
+        months, month_inverse = np.unique(months_of_rows, return_inverse=True)
+        month_sums = np.bincount(month_inverse.reshape(-1), weights=values, minlength=months.size)
+        if granularity != "month":
+            # 日/周数据的首尾两个月可能只覆盖了部分日期：按相邻一次观测是否仍在同一个月判断，不完整的月份不参与比较
+            step = np.timedelta64(int(np.ceil(gaps)), 'D')
+            complete = np.ones(months.size, dtype=bool)
+            complete[0] = (unique_days[0] - step).astype('datetime64[M]') != unique_days[0].astype('datetime64[M]')
+            complete[-1] &= (unique_days[-1] + step).astype('datetime64[M]') != unique_days[-1].astype('datetime64[M]')
+            months, month_sums = months[complete], month_sums[complete]
+        consecutive = np.flatnonzero(np.diff(months) == 1)
+        if consecutive.size:
+            previous = month_sums[consecutive]
+            nonzero = previous != 0
+            growth = (month_sums[consecutive + 1][nonzero] - previous[nonzero]) / np.abs(previous[nonzero]) * 100
+            last = _pct(month_sums[-1], month_sums[-2]) if months[-1] - months[-2] == 1 else None
+            trend["mom"] = {"last": last, "average": float(growth.mean()) if growth.size else None}
+            last_label = _period_label(months[-1], "month", True)
+            parts = []
+            if last is not None:
+                parts.append(f"最近一个月（{last_label}）环比{last:+.1f}%")
+            if growth.size:
+                parts.append(f"月均环比{growth.mean():+.1f}%")
+            year_ago = np.flatnonzero(months == months[-1] - 12)
+            if year_ago.size:
+                trend["yoy"] = _pct(month_sums[-1], month_sums[year_ago[0]])
+                if trend["yoy"] is not None:
+                    parts.append(f"同比{trend['yoy']:+.1f}%")
+            if parts:
+                messages.append(f"'{value_name}'" + "，".join(parts) + "。")
+
+    # 水平变化点：在扣除季节成分后的序列上检测
+    if grid.size >= 8:
+        changepoints = _changepoints(filled - seasonal, max(3, grid.size // 20))
+        bounds = [0] + [point for point, _ in changepoints] + [grid.size]
+        for i, (point, step) in enumerate(changepoints, start=1):
+            before = float(filled[bounds[i - 1]:point].mean())
+            after = float(filled[point:bounds[i + 1]].mean())
+            when = _period_label(grid[point], granularity, has_year)
+            trend["changepoints"].append({"time": when, "step": step, "before": before, "after": after})
+            messages.append(f"'{value_name}'在{when}前后出现明显的水平变化（扣除趋势后约{step:+.2f}），"
+                            f"前后两段的均值分别为{before:.2f}和{after:.2f}。")
+    return trend
+
+
+def analyze_trend(frame, time_col_idx, value_col_idx):
+    """
+    时间序列分析：按时间列把数值列汇总为有序序列（同一期的多行求和），一次性计算
+    线性/稳健趋势、季节周期、环比/同比增长和水平变化点
+    时间列可以是日期，也可以是 '2024年3月'、'Q1'、'3月' 这类标签；有效期数少于 3 时返回 None，结果缓存在 frame 上
+    返回的 series 为 [(标签, 值), ...]（按时间排序），messages 为可直接放入报告 trends 的中文描述
+    """
+    return frame.cached_result(("trend", time_col_idx, value_col_idx),
+                               lambda: _analyze(frame, time_col_idx, value_col_idx))
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import os
+
+# 每次从上传流读取并写入磁盘的块大小，每个上传在内存中只保留一个块
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# multipart 表单中除文件内容外的字段、边界等开销的上限，用于按 Content-Length 提前判断
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# 各文件类型的文件头（magic bytes）：xlsx 为 zip 包
+# 旧版 xls（OLE2 复合文档）openpyxl 无法读取，不在其中，上传时直接拒绝
+FILE_SIGNATURES = {
+    "xlsx": (b"PK\x03\x04",),
+}
+
+
+class UploadRejectedError(Exception):
+    """
+    上传的文件不被接受；status_code 为对应的HTTP状态码（413 文件过大，415 类型不支持，400 空文件）
+    """
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def detect_file_type(head):
+    """
+    根据文件头判断文件类型，无法识别时返回 None
+    """
+    for file_type, signatures in FILE_SIGNATURES.items():
+        if any(head.startswith(signature) for signature in signatures):
+            return file_type
+    return None
+
+
+def declared_size_exceeds(headers, max_bytes):
+    """
+    请求头中声明的 Content-Length 是否已超过上传上限（含表单开销），用于在读取请求体之前拒绝
+    """
+    length = headers.get("content-length")
+    return bool(length and length.isdigit() and int(length) > max_bytes + FORM_OVERHEAD_BYTES)
+
+
+def _write_chunk(out, digest, chunk):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def save_upload(file, dest_path, max_bytes, allowed_types, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    分块把上传文件写入 dest_path，边写边计算 SHA-256，返回 (字节数, 十六进制摘要)
+    文件读写和哈希计算在线程池中进行，不阻塞事件循环；扩展名或文件头不属于 allowed_types、
+    或累计大小超过 max_bytes 时立即停止，删除已写入的部分并抛出 UploadRejectedError
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower().lstrip(".")
+    if extension not in allowed_types:
+        hint = "，请在Excel中另存为 .xlsx 后上传" if extension == "xls" else ""
+        raise UploadRejectedError(415, f"不支持的文件类型: {extension or '未知'}，仅支持 {', '.join(allowed_types)}{hint}")
+    limit_mb = max_bytes / 1024 / 1024
+    if getattr(file, "size", None) and file.size > max_bytes:
+        raise UploadRejectedError(413, f"文件大小超过上限 {limit_mb:g}MB")
+
+    digest = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, dest_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            if size == 0 and detect_file_type(chunk) not in allowed_types:
+                raise UploadRejectedError(415, "文件内容不是有效的Excel文件")
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejectedError(413, f"文件大小超过上限 {limit_mb:g}MB")
+            await asyncio.to_thread(_write_chunk, out, digest, chunk)
+        if size == 0:
+            raise UploadRejectedError(400, "上传的文件为空")
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    await asyncio.to_thread(out.close)
+    return size, digest.hexdigest()
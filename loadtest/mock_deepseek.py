@@ -0,0 +1,258 @@
+"""
+本地 DeepSeek / OpenAI 兼容的 chat/completions 模拟服务，用于离线压测
+
+与 use_mock 不同，应用仍走完整的 请求 -> 解析 -> 写Excel 链路，只是上游换成了本服务。
+启动后把应用的 DEEPSEEK_API_BASE 指向它，并设置任意非占位的 DEEPSEEK_API_KEY：
+
+    python -m loadtest.mock_deepseek --port 9000 --latency lognormal --latency-mean 3 --error-rate 0.02
+    DEEPSEEK_API_BASE=http://127.0.0.1:9000 DEEPSEEK_API_KEY=sk-local uvicorn backend.main:app --port 8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class MockSettings:
+    """
+    模拟服务的行为参数（命令行参数覆盖默认值）
+    """
+
+    def __init__(self):
+        self.latency = "lognormal"       # fixed, uniform, exponential, lognormal
+        self.latency_mean = 2.0          # 秒
+        self.latency_sigma = 0.6         # lognormal 的形状参数；uniform 时为 [mean-sigma, mean+sigma]
+        self.tail_rate = 0.0             # 额外的长尾请求比例
+        self.tail_latency = 30.0         # 长尾请求的耗时（秒）
+        self.error_rate = 0.0            # 返回错误状态码的比例
+        self.error_status = 500
+        self.hang_rate = 0.0             # 永不返回（直到客户端超时）的比例
+        self.malformed_rate = 0.0        # 返回无法解析为JSON的内容的比例
+        self.rows = 20                   # 生成表格的数据行数
+        self.tokens_per_second = 200.0   # 流式输出速度
+        self.cache_hit_ratio = 0.0       # usage 中报告为缓存命中的prompt比例
+        self.seed = None
+
+
+settings = MockSettings()
+app = FastAPI(title="Mock DeepSeek", description="本地压测用的 chat/completions 模拟服务")
+stats = {"requests": 0, "streams": 0, "errors": 0, "hangs": 0, "malformed": 0}
+
+
+def sample_latency():
+    """
+    按配置的分布采样一次响应耗时
+    """
+    mean = settings.latency_mean
+    if random.random() < settings.tail_rate:
+        return settings.tail_latency
+    if settings.latency == "fixed":
+        return mean
+    if settings.latency == "uniform":
+        return max(0.0, random.uniform(mean - settings.latency_sigma, mean + settings.latency_sigma))
+    if settings.latency == "exponential":
+        return random.expovariate(1.0 / mean) if mean > 0 else 0.0
+    # lognormal：保持期望值为 mean
+    sigma = settings.latency_sigma
+    mu = math.log(max(mean, 1e-6)) - sigma * sigma / 2
+    return random.lognormvariate(mu, sigma)
+
+
+def count_tokens(text):
+    """
+    与应用侧估算口径一致：中文等宽字符约0.6个token，其余约0.3个token
+    """
+    wide = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return int(math.ceil(wide * 0.6 + (len(text) - wide) * 0.3))
+
+
+def build_table(rows):
+    data = [["编号", "日期", "部门", "销售额", "数量", "达成率"]]
+    departments = ["华东", "华南", "华北", "西南", "东北"]
+    for i in range(rows):
+        data.append([
+            f"R{i + 1:05d}",
+            f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            departments[i % len(departments)],
+            round(random.uniform(5000, 200000), 2),
+            random.randint(1, 500),
+            f"{random.randint(60, 140)}%"
+        ])
+    return {"sheet_name": "压测数据", "data": data}
+
+
+def build_content(messages):
+    """
+    根据系统提示词判断调用方（生成/编辑/分析），返回对应格式的JSON文本
+    """
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    if "编辑" in system:
+        content = [
+            {"type": "add_row", "index": 1, "data": ["压测插入行", 1, 2, 3]},
+            {"type": "update_cell", "row": 2, "col": 2, "value": "已修改"}
+        ]
+    elif "分析" in system:
+        content = {
+            "status": "success",
+            "sheet_name": "压测数据",
+            "summary": "模拟分析：数据整体平稳。",
+            "insights": ["华东区域销售额最高", "数量与销售额正相关"],
+            "trends": ["销售额逐月小幅上升"],
+            "anomalies": ["第17行销售额明显偏高"],
+            "visualization_data": [
+                {"type": "bar_chart", "title": "各区域销售额",
+                 "data": {"labels": ["华东", "华南", "华北"], "values": [320000, 280000, 250000]}}
+            ]
+        }
+    else:
+        content = build_table(settings.rows)
+    return json.dumps(content, ensure_ascii=False)
+
+
+def build_usage(messages, content):
+    prompt_tokens = count_tokens(json.dumps(messages, ensure_ascii=False))
+    completion_tokens = count_tokens(content)
+    cached = int(prompt_tokens * settings.cache_hit_ratio)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": cached,
+        "prompt_cache_miss_tokens": prompt_tokens - cached
+    }
+
+
+async def inject_faults():
+    """
+    按比例注入故障，返回需要直接返回的错误响应（或 None）
+    """
+    roll = random.random()
+    if roll < settings.hang_rate:
+        stats["hangs"] += 1
+        await asyncio.sleep(3600)
+    roll -= settings.hang_rate
+    if roll < settings.error_rate:
+        stats["errors"] += 1
+        await asyncio.sleep(sample_latency() / 4)
+        return JSONResponse(
+            status_code=settings.error_status,
+            content={"error": {"message": "injected error", "type": "server_error"}}
+        )
+    return None
+
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    messages = payload.get("messages", [])
+    stats["requests"] += 1
+
+    error_response = await inject_faults()
+    if error_response is not None:
+        return error_response
+
+    content = build_content(messages)
+    if random.random() < settings.malformed_rate:
+        stats["malformed"] += 1
+        content = content[: len(content) // 2]
+    usage = build_usage(messages, content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = payload.get("model", "deepseek-chat")
+
+    if payload.get("stream"):
+        stats["streams"] += 1
+        return StreamingResponse(
+            stream_chunks(completion_id, model, content, usage, payload),
+            media_type="text/event-stream"
+        )
+
+    await asyncio.sleep(sample_latency())
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+async def stream_chunks(completion_id, model, content, usage, payload):
+    """
+    按 tokens_per_second 的速度把内容切块推送；首块之前的等待使用采样的延迟
+    """
+    def chunk(delta, finish_reason=None, **extra):
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            **extra
+        }
+        return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(sample_latency())
+    yield chunk({"role": "assistant", "content": ""})
+    piece_chars = 16
+    delay = piece_chars * 0.3 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+    for start in range(0, len(content), piece_chars):
+        yield chunk({"content": content[start:start + piece_chars]})
+        if delay:
+            await asyncio.sleep(delay)
+    yield chunk({}, finish_reason="stop")
+    if (payload.get("stream_options") or {}).get("include_usage"):
+        yield chunk(None, usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/stats")
+async def get_stats():
+    """
+    返回模拟服务收到的请求数和注入的故障数
+    """
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 DeepSeek 模拟服务（压测用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "exponential", "lognormal"], default=settings.latency)
+    parser.add_argument("--latency-mean", type=float, default=settings.latency_mean)
+    parser.add_argument("--latency-sigma", type=float, default=settings.latency_sigma)
+    parser.add_argument("--tail-rate", type=float, default=settings.tail_rate)
+    parser.add_argument("--tail-latency", type=float, default=settings.tail_latency)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--error-status", type=int, default=settings.error_status)
+    parser.add_argument("--hang-rate", type=float, default=settings.hang_rate)
+    parser.add_argument("--malformed-rate", type=float, default=settings.malformed_rate)
+    parser.add_argument("--rows", type=int, default=settings.rows)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--cache-hit-ratio", type=float, default=settings.cache_hit_ratio)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for key, value in vars(args).items():
+        if hasattr(settings, key):
+            setattr(settings, key, value)
+    if settings.seed is not None:
+        random.seed(settings.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
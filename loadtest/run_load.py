@@ -0,0 +1,228 @@
+"""
+端到端压测：并发驱动 /generate_excel、/edit_excel、/analyze_excel 和 /ws/excel/{instance_id}，
+输出各场景的 p50/p95/p99 延迟和吞吐量
+
+    python -m loadtest.run_load --base-url http://127.0.0.1:8000 --concurrency 20 --duration 60
+    python -m loadtest.run_load --app api --mix generate=3,analyze=1,ws=1 --requests 500 --json report.json
+
+配合 loadtest/mock_deepseek.py 使用即可在不调用付费API的情况下压测完整链路。
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import time
+import uuid
+
+import httpx
+from openpyxl import Workbook
+
+# WebSocket 场景需要 websockets 库，未安装时跳过该场景
+try:
+    import websockets
+    HAS_WEBSOCKETS = True
+except ImportError:
+    HAS_WEBSOCKETS = False
+
+# backend/ 与 api/ 两个入口的生成接口路径不同
+ENDPOINTS = {
+    "backend": {"generate": "/generate_excel", "edit": "/edit_excel", "analyze": "/analyze_excel"},
+    "api": {"generate": "/api/generate_excel", "edit": "/edit_excel", "analyze": "/analyze_excel", "ws": "/ws/excel/{instance_id}"},
+}
+
+DESCRIPTIONS = [
+    "创建一个包含月份、销售额、目标和达成率的销售业绩表",
+    "生成员工信息表，包括员工ID、姓名、部门、职位、入职日期和薪资",
+    "生成产品库存表，包括产品ID、名称、类别、单价、库存数量和供应商",
+]
+
+
+def build_workbook(rows):
+    """
+    生成用于上传的测试Excel（内存中）
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "压测数据"
+    ws.append(["编号", "日期", "部门", "销售额", "数量"])
+    departments = ["华东", "华南", "华北", "西南"]
+    for i in range(rows):
+        ws.append([f"R{i + 1:05d}", f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                   departments[i % len(departments)], round(random.uniform(5000, 200000), 2),
+                   random.randint(1, 500)])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values, q):
+    """
+    最近秩法计算分位数
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadRunner:
+    def __init__(self, args):
+        self.args = args
+        self.paths = ENDPOINTS[args.app]
+        self.mix = self._parse_mix(args.mix)
+        self.workbook = build_workbook(args.rows)
+        self.results = []
+        self.counter = 0
+
+    def _parse_mix(self, mix):
+        weights = {}
+        for item in mix.split(","):
+            name, _, weight = item.strip().partition("=")
+            if not name:
+                continue
+            if name not in ("generate", "edit", "analyze", "ws"):
+                raise SystemExit(f"未知场景: {name}")
+            if name == "ws" and "ws" not in self.paths:
+                print("提示：backend 入口没有 WebSocket 接口，已跳过 ws 场景（使用 --app api）")
+                continue
+            if name == "ws" and not HAS_WEBSOCKETS:
+                print("提示：未安装 websockets，已跳过 ws 场景")
+                continue
+            weights[name] = float(weight or 1)
+        if not weights:
+            raise SystemExit("没有可执行的压测场景")
+        return weights
+
+    def _headers(self):
+        return {"X-Cache-Bypass": "1"} if self.args.bypass_cache else {}
+
+    def _suffix(self):
+        # 默认每个请求带上唯一后缀，避免被LLM缓存和请求合并掩盖上游开销
+        return f"（压测 {uuid.uuid4().hex[:8]}）" if self.args.unique else ""
+
+    async def run_generate(self, client):
+        payload = {"description": random.choice(DESCRIPTIONS) + self._suffix()}
+        response = await client.post(self.paths["generate"], json=payload, headers=self._headers())
+        return response.status_code
+
+    async def run_edit(self, client):
+        files = {"file": ("loadtest.xlsx", self.workbook)}
+        data = {"instructions": "在第二行插入一行合计，并把B2改为已修改" + self._suffix()}
+        response = await client.post(self.paths["edit"], files=files, data=data, headers=self._headers())
+        return response.status_code
+
+    async def run_analyze(self, client):
+        # 分析的提示词只取决于表格内容，需要绕过缓存时请使用 --bypass-cache
+        files = {"file": (f"loadtest_{uuid.uuid4().hex[:8]}.xlsx", self.workbook)}
+        response = await client.post(self.paths["analyze"], files=files, headers=self._headers())
+        return response.status_code
+
+    async def run_ws(self, client):
+        """
+        建立一个协同编辑会话并发送 ws_ops 次编辑操作；服务端不逐条应答，因此记录整个会话的耗时
+        """
+        url = self.args.base_url.replace("http", "ws", 1) + self.paths["ws"].format(instance_id=f"load-{uuid.uuid4().hex[:8]}")
+        async with websockets.connect(url, open_timeout=self.args.timeout) as ws:
+            for i in range(self.args.ws_ops):
+                await ws.send(json.dumps({"type": "edit_cell", "data": {"row": i % 50, "col": i % 5, "value": i}}))
+        return 101
+
+    async def worker(self, client, deadline):
+        scenarios = list(self.mix)
+        weights = [self.mix[name] for name in scenarios]
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if deadline is None and self.counter >= self.args.requests:
+                return
+            self.counter += 1
+            scenario = random.choices(scenarios, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = await getattr(self, f"run_{scenario}")(client)
+                ok = status < 400
+            except Exception as e:
+                status, ok = type(e).__name__, False
+            self.results.append((scenario, time.perf_counter() - start, ok, status))
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.args.base_url, timeout=self.args.timeout, limits=limits) as client:
+            deadline = time.perf_counter() + self.args.duration if self.args.duration else None
+            started = time.perf_counter()
+            await asyncio.gather(*(self.worker(client, deadline) for _ in range(self.args.concurrency)))
+            return time.perf_counter() - started
+
+    def report(self, elapsed):
+        """
+        汇总各场景（以及全部请求）的延迟分位数和吞吐量
+        """
+        groups = {}
+        for scenario, latency, ok, status in self.results:
+            groups.setdefault(scenario, []).append((latency, ok, status))
+        groups["all"] = [(latency, ok, status) for _, latency, ok, status in self.results]
+
+        summary = {"elapsed_seconds": round(elapsed, 2), "concurrency": self.args.concurrency, "scenarios": {}}
+        for name, items in groups.items():
+            latencies = sorted(latency for latency, _, _ in items)
+            errors = [status for _, ok, status in items if not ok]
+            status_counts = {}
+            for _, _, status in items:
+                status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+            summary["scenarios"][name] = {
+                "requests": len(items),
+                "errors": len(errors),
+                "throughput_rps": round(len(items) / elapsed, 2) if elapsed else None,
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else None,
+                "status_counts": status_counts
+            }
+        return summary
+
+
+def print_summary(summary):
+    def fmt(value):
+        return "-" if value is None else f"{value * 1000:.0f}ms"
+
+    print(f"\n总耗时 {summary['elapsed_seconds']}s，并发 {summary['concurrency']}")
+    print(f"{'场景':<10}{'请求数':>8}{'错误':>6}{'吞吐(req/s)':>13}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, s in summary["scenarios"].items():
+        print(f"{name:<10}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps'] or 0:>13}"
+              f"{fmt(s['p50']):>10}{fmt(s['p95']):>10}{fmt(s['p99']):>10}{fmt(s['max']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExcelGenius 端到端压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--app", choices=list(ENDPOINTS), default="backend", help="被压测的入口：backend 或 api")
+    parser.add_argument("--mix", default="generate=1,edit=1,analyze=1", help="场景及权重，如 generate=3,edit=1,analyze=1,ws=1")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=None, help="压测时长（秒），不指定时按 --requests 计数")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=200, help="编辑/分析场景上传的Excel行数")
+    parser.add_argument("--ws-ops", type=int, default=20, help="每个WebSocket会话发送的编辑操作数")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-unique", dest="unique", action="store_false", help="不给请求加唯一后缀（允许命中LLM缓存）")
+    parser.add_argument("--bypass-cache", action="store_true", help="发送 X-Cache-Bypass: 1")
+    parser.add_argument("--json", default=None, help="把汇总结果写入JSON文件")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    runner = LoadRunner(args)
+    elapsed = asyncio.run(runner.run())
+    summary = runner.report(elapsed)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
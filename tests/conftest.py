@@ -0,0 +1,17 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# backend/ 与 api/ 以包的形式导入（模块内使用相对导入）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DEEPSEEK_API_KEY", "placeholder-api-key")
+
+
+@pytest.fixture(params=["backend", "api"])
+def package(request):
+    """
+    两个部署包中同名模块的导入函数：package("sketches") 依次返回 backend.sketches 和 api.sketches
+    """
+    return lambda module: importlib.import_module(f"{request.param}.{module}")
@@ -0,0 +1,75 @@
+import pytest
+
+
+def test_sales_report_excludes_total_row(package):
+    excel_utils = package("excel_utils")
+    report = excel_utils.generate_analysis_report(excel_utils.generate_mock_response("销售"))
+    text = " ".join(report["insights"])
+    assert "852000.00" in text
+    assert "1704000" not in text
+    assert "6条数据记录" in report["summary"]
+    assert "1行合计行" in report["summary"]
+    trend = next(c for c in report["visualization_data"] if c["type"] == "line_chart")
+    assert [point["time"] for point in trend["data"]] == [f"{m}月" for m in range(1, 7)]
+
+
+def test_unsorted_date_column_is_not_a_time_axis(package):
+    excel_utils = package("excel_utils")
+    report = excel_utils.generate_analysis_report(excel_utils.generate_mock_response("员工"))
+    assert not any(c["type"] == "line_chart" for c in report["visualization_data"])
+    assert not any("入职日期" in t for t in report["trends"])
+
+
+def test_summary_rows_are_detected_by_label(package):
+    sheet_frame = package("sheet_frame")
+    frame = sheet_frame.SheetFrame.from_rows([
+        ["地区", "金额"], ["华东", 10], ["华南", 20], [" Total ", 30], ["小计", 30], ["华北", 5],
+    ])
+    assert frame.summary_rows().nonzero()[0].tolist() == [2, 3]
+    data = frame.without_summary_rows()
+    assert data.n_rows == 3
+    assert data.columns[1].values[data.columns[1].valid].tolist() == [10, 20, 5]
+
+
+def test_sketch_profile_with_other_kind_is_skipped():
+    from api import excel_utils
+    from api.sheet_frame import SheetFrame
+    from api.sketches import SheetSketch
+
+    # 已读入的前几行是数值，全表大多是文本：概要的类型以全表为准，不应再按数值生成洞察
+    rows = [["月份", "销售额"]] + [[f"{i}月", 100 + i] for i in range(1, 6)] + [[f"{i}月", "未知"] for i in range(6, 60)]
+    frame = SheetFrame.from_rows(rows[:6])
+    sketch = SheetSketch.from_rows(rows, seed=0)
+    content = {"sheet_name": "Sheet1", "headers": rows[0], "data": rows[1:6]}
+    report = excel_utils.generate_analysis_report(content, frame, sketch)
+    assert report["status"] == "success"
+    assert not any("合计" in insight for insight in report["insights"])
+
+
+def test_large_sheet_trend_covers_whole_sheet(package, tmp_path):
+    from datetime import date, timedelta
+
+    from openpyxl import Workbook
+
+    excel_utils = package("excel_utils")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["月份", "部门", "销售额"])
+    start = date(2020, 1, 1)
+    for i in range(3000):
+        ws.append([start + timedelta(days=i // 10), "ABC"[i % 3], 10])
+    ws.append(["合计", None, 30000])
+    path = tmp_path / "book.xlsx"
+    wb.save(path)
+
+    utils = excel_utils.ExcelUtils(max_rows=500, max_cols=10)
+    content, frame, sketch = utils.scan_sheet(str(path), approx_rows=1000)
+    grouped = sketch.group_frame(0, 2)
+    # 全表 300 天，每天 10 行；合计行不计入
+    assert grouped.n_rows == 300
+    assert grouped.columns[1].numbers().sum() == 30000
+
+    report = excel_utils.generate_analysis_report(content, frame, sketch)
+    trend = report["trend_details"]
+    assert (trend["start"], trend["end"]) == ("2020-01-01", "2020-10-26")
+    assert "异常检测基于前499行数据" in report["summary"]
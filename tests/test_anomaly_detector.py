@@ -0,0 +1,65 @@
+def _frame(package, rows):
+    return package("sheet_frame").SheetFrame.from_rows(rows)
+
+
+def test_total_row_in_small_sales_sheet(package):
+    excel_utils = package("excel_utils")
+    anomaly_detector = package("anomaly_detector")
+    frame = package("sheet_frame").SheetFrame.from_excel_content(excel_utils.generate_mock_response("销售"))
+    assert frame.n_rows == 7
+    findings = anomaly_detector.detect_anomalies(frame)
+    assert [finding["type"] for finding in findings] == ["summary_row"]
+    assert findings[0]["cells"][0]["value"] == "总计"
+    assert findings[0]["cells"][0]["row"] == 8
+
+
+def test_small_sheet_outlier_needs_iqr_and_mad(package):
+    anomaly_detector = package("anomaly_detector")
+    rows = [["地区", "金额"]] + [[f"区{i}", v] for i, v in enumerate([100, 104, 98, 101, 990, 97])]
+    findings = anomaly_detector.detect_anomalies(_frame(package, rows))
+    assert findings[0]["type"] == "outlier"
+    assert findings[0]["cells"][0]["cell"] == "B6"
+    assert set(findings[0]["methods"]) == {"iqr", "mad"}
+
+
+def test_small_sheet_without_outlier(package):
+    anomaly_detector = package("anomaly_detector")
+    rows = [["地区", "金额"]] + [[f"区{i}", v] for i, v in enumerate([100, 120, 90, 130, 110])]
+    assert anomaly_detector.detect_anomalies(_frame(package, rows)) == []
+
+
+def test_outlier_on_larger_sheet(package):
+    anomaly_detector = package("anomaly_detector")
+    values = [50 + (i % 5) for i in range(30)]
+    values[17] = 500
+    rows = [["编号", "数量"]] + [[f"N{i}", v] for i, v in enumerate(values)]
+    finding = anomaly_detector.detect_anomalies(_frame(package, rows))[0]
+    assert finding["type"] == "outlier" and finding["count"] == 1
+    assert finding["cells"][0]["row"] == 19
+    assert "zscore" in finding["cells"][0]["methods"]
+
+
+def test_jump_in_time_series(package):
+    from datetime import date, timedelta
+
+    anomaly_detector = package("anomaly_detector")
+    values = [100 + i for i in range(20)]
+    values[12] += 400
+    rows = [["日期", "销量"]] + [[date(2024, 1, 1) + timedelta(days=i), v] for i, v in enumerate(values)]
+    findings = anomaly_detector.detect_anomalies(_frame(package, rows))
+    jump = next(finding for finding in findings if finding["type"] == "jump")
+    assert jump["cells"][0]["cell"] == "B14" and jump["cells"][0]["previous_cell"] == "B13"
+
+
+def test_type_mismatch_and_duplicate_rows(package):
+    anomaly_detector = package("anomaly_detector")
+    rows = [["名称", "数量", "到货日期"]] + [[f"商品{i}", i, f"2024-01-{i + 1:02d}"] for i in range(10)]
+    rows[4][1] = "缺货"
+    rows[6][2] = "下周"
+    rows.append(list(rows[3]))
+    findings = anomaly_detector.detect_anomalies(_frame(package, rows))
+    mismatches = [finding for finding in findings if finding["type"] == "type_mismatch"]
+    assert [(m["column"], m["cells"][0]["cell"]) for m in mismatches] == [("数量", "B5"), ("到货日期", "C7")]
+    assert findings[-1]["type"] == "duplicate_row"
+    assert findings[-1]["cells"] == [{"cell": "A12:C12", "row": 12, "duplicate_of": 4}]
+    assert anomaly_detector.anomaly_rows(mismatches) == [3, 5]
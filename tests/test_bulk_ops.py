@@ -0,0 +1,184 @@
+import pytest
+from openpyxl import Workbook
+
+
+def _sheet():
+    wb = Workbook()
+    ws = wb.active
+    for row in [["部门", "单价", "数量", "备注"],
+                ["华东", 10, 3, "a"],
+                ["华南", 5, None, "b"],
+                ["华东", 8, 2, "c"],
+                [None, 1, 9, "d"],
+                ["华北", 7, 0, "e"]]:
+        ws.append(row)
+    return ws
+
+
+def _rows(ws):
+    return [list(row) for row in ws.iter_rows(values_only=True)]
+
+
+def _run(package, ws, op):
+    bulk_ops = package("bulk_ops")
+    style_registry = package("style_registry")
+    bulk_ops.run_bulk_op(ws, bulk_ops.validate_bulk_op(op), style_registry.StyleRegistry(ws.parent))
+
+
+def test_fill_column_with_expression_and_where(package):
+    ws = _sheet()
+    _run(package, ws, {"type": "fill_column", "column": "金额", "expression": "单价 * 数量", "where": "数量 > 0"})
+    assert [row[4] for row in _rows(ws)] == ["金额", 30, None, 16, 9, None]
+    # 列字母引用，未满足条件的空值写为空单元格
+    _run(package, ws, {"type": "fill_column", "column": "B", "expression": "B * 2"})
+    assert [row[1] for row in _rows(ws)[1:]] == [20, 10, 16, 2, 14]
+
+
+def test_sort_keeps_header_and_puts_nulls_last(package):
+    ws = _sheet()
+    _run(package, ws, {"type": "sort", "by": ["部门", "单价"], "ascending": [True, False]})
+    rows = _rows(ws)
+    assert rows[0] == ["部门", "单价", "数量", "备注"]
+    assert [row[3] for row in rows[1:]] == ["a", "c", "e", "b", "d"]
+
+
+def test_delete_rows_by_condition_rows_and_range(package):
+    ws = _sheet()
+    _run(package, ws, {"type": "delete_rows", "where": "部门 == '华东'"})
+    assert [row[3] for row in _rows(ws)[1:]] == ["b", "d", "e"]
+    ws = _sheet()
+    _run(package, ws, {"type": "delete_rows", "rows": [2, 6]})
+    assert [row[3] for row in _rows(ws)[1:]] == ["b", "c", "d"]
+    ws = _sheet()
+    _run(package, ws, {"type": "delete_rows", "range": "3:4"})
+    assert [row[3] for row in _rows(ws)[1:]] == ["a", "d", "e"]
+
+
+def test_filter_hides_or_removes_rows(package):
+    ws = _sheet()
+    _run(package, ws, {"type": "filter", "where": "单价 >= 7"})
+    assert [ws.row_dimensions[r].hidden for r in range(2, 7)] == [False, True, False, True, False]
+    assert ws.auto_filter.ref == "A1:D6"
+    ws = _sheet()
+    _run(package, ws, {"type": "filter", "where": "单价 >= 7", "mode": "remove"})
+    assert [row[3] for row in _rows(ws)[1:]] == ["a", "c", "e"]
+
+
+def test_update_range_values_and_fill(package):
+    ws = _sheet()
+    _run(package, ws, {"type": "update_range", "range": "B2:C3", "values": [[1, 2, 99], [3, 4], [5, 6]]})
+    assert [row[1:3] for row in _rows(ws)[1:4]] == [[1, 2], [3, 4], [8, 2]]
+    _run(package, ws, {"type": "update_range", "range": "D2:D3", "value": "x"})
+    assert [row[3] for row in _rows(ws)[1:4]] == ["x", "x", "c"]
+
+
+def test_invalid_operations(package):
+    bulk_ops = package("bulk_ops")
+    for op in ({"type": "fill_column", "column": "金额", "expression": "import os"},
+               {"type": "sort", "by": ["A", "B"], "ascending": [True]},
+               {"type": "update_range", "range": "not a range", "value": 1},
+               {"type": "delete_rows"}):
+        with pytest.raises(bulk_ops.BulkOpError):
+            bulk_ops.validate_bulk_op(op)
+    ws = _sheet()
+    with pytest.raises(bulk_ops.BulkOpError):
+        _run(package, ws, {"type": "fill_column", "column": "金额", "expression": "不存在的列 * 2"})
+    # 表达式出错时不改动工作表
+    assert ws.max_column == 4
+
+
+def test_conditions_on_text_and_null_columns(package):
+    ws = _sheet()
+    ws["D3"] = None
+    ws["D4"] = 5
+    # 文本与数值比较大小、空值参与比较都视为不满足条件
+    _run(package, ws, {"type": "delete_rows", "where": "部门 > 5"})
+    assert len(_rows(ws)) == 6
+    _run(package, ws, {"type": "filter", "where": "备注 > 1"})
+    assert [ws.row_dimensions[r].hidden for r in range(2, 7)] == [True, True, False, True, True]
+
+
+def test_runtime_errors_become_bulk_op_errors(package):
+    bulk_ops = package("bulk_ops")
+    ws = _sheet()
+    with pytest.raises(bulk_ops.BulkOpError):
+        _run(package, ws, {"type": "fill_column", "column": "金额", "expression": "单价 * '2'"})
+    with pytest.raises(bulk_ops.BulkOpError):
+        _run(package, ws, {"type": "fill_column", "column": "金额", "expression": "round(部门)"})
+    assert ws.max_column == 4
+
+
+def test_failed_bulk_op_keeps_other_operations(package):
+    edit_planner = package("edit_planner")
+    ws = _sheet()
+    ops = [{"type": "fill_column", "column": "金额", "expression": "单价 * '2'"},
+           {"type": "update_cell", "row": 2, "col": 4, "value": "ok"},
+           {"type": "fill_column", "column": "金额", "expression": "单价 * 2"}]
+    programs, problems = edit_planner.compile_operations(ops, [ws.title], default_sheet=ws.title)
+    assert problems == []
+    problems = edit_planner.apply_program(ws, programs[ws.title])
+    assert len(problems) == 1 and problems[0].startswith("fill_column")
+    assert _rows(ws)[1][3:] == ["ok", 20]
+
+
+def test_fill_column_creates_short_header_names(package):
+    ws = _sheet()
+    # 超出现有列范围的 "X"、"SKU" 是新表头，而不是列字母
+    _run(package, ws, {"type": "fill_column", "column": "X", "expression": "单价 + 1"})
+    _run(package, ws, {"type": "fill_column", "column": "SKU", "expression": "concat(部门, 数量)"})
+    assert _rows(ws)[0] == ["部门", "单价", "数量", "备注", "X", "SKU"]
+    assert [row[4] for row in _rows(ws)[1:]] == [11, 6, 9, 2, 8]
+    # 现有范围内的列字母仍然按列字母解析
+    _run(package, ws, {"type": "fill_column", "column": "D", "expression": "单价"})
+    assert ws.max_column == 6 and _rows(ws)[1][3] == 10
+
+
+def _formula_sheet():
+    ws = _sheet()
+    for row in range(2, 7):
+        ws.cell(row=row, column=5, value=f"=B{row}*C{row}+$B$1")
+    ws.row_dimensions[2].height = 30
+    return ws
+
+
+def test_sort_moves_row_formulas_and_heights(package):
+    ws = _formula_sheet()
+    ws["G1"] = "=SUM(E2:E6)"
+    _run(package, ws, {"type": "sort", "by": "单价"})
+    rows = _rows(ws)
+    assert [row[3] for row in rows[1:]] == ["d", "b", "e", "c", "a"]
+    assert [row[4] for row in rows[1:]] == [f"=B{r}*C{r}+$B$1" for r in range(2, 7)]
+    # 原第2行（备注 a）排到了最后，行高随行移动
+    assert ws.row_dimensions[6].height == 30 and ws.row_dimensions[2].height is None
+    assert ws["G1"].value == "=SUM(E2:E6)"
+
+
+def test_reorder_refuses_cross_row_formulas_and_merges(package):
+    bulk_ops = package("bulk_ops")
+    ws = _formula_sheet()
+    ws["F3"] = "=F2+B3"
+    before = _rows(ws)
+    with pytest.raises(bulk_ops.BulkOpError, match="F3"):
+        _run(package, ws, {"type": "sort", "by": "单价"})
+    assert _rows(ws) == before
+    ws = _formula_sheet()
+    ws["G1"] = "=SUM(E2:E6)"
+    # 删除行后合计的区域会错位
+    with pytest.raises(bulk_ops.BulkOpError, match="G1"):
+        _run(package, ws, {"type": "delete_rows", "rows": [3]})
+    ws = _sheet()
+    ws.merge_cells("A3:A4")
+    with pytest.raises(bulk_ops.BulkOpError, match="合并单元格"):
+        _run(package, ws, {"type": "filter", "where": "单价 > 5", "mode": "remove"})
+
+
+def test_range_cell_limit(package, monkeypatch):
+    bulk_ops = package("bulk_ops")
+    monkeypatch.setattr(bulk_ops, "MAX_RANGE_CELLS", 100)
+    ws = _sheet()
+    with pytest.raises(bulk_ops.BulkOpError, match="上限"):
+        _run(package, ws, {"type": "update_range", "range": "A1:Z10", "value": 0})
+    with pytest.raises(bulk_ops.BulkOpError, match="上限"):
+        _run(package, ws, {"type": "format_range", "range": "A:ZZ", "format": {"font": {"bold": True}}})
+    _run(package, ws, {"type": "update_range", "range": "A:D", "value": 0})
+    assert ws.max_row == 6 and ws["D6"].value == 0
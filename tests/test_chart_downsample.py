@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+
+def _reference_lttb(y, threshold):
+    # 逐点计算桶均值的朴素实现，用来核对前缀和版本
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if i == threshold - 3:
+            avg_x, avg_y = n - 1.0, y[-1]
+        else:
+            avg_x, avg_y = np.mean(np.arange(end, next_end)), np.mean(y[end:next_end])
+        end = n - 1 if i == threshold - 3 else end
+        areas = [abs((a - avg_x) * (y[j] - y[a]) - (a - j) * (avg_y - y[a])) for j in range(start, end)]
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 50), (1001, 3), (10_000, 500), (37, 36)])
+def test_lttb_keeps_endpoints_and_budget(package, n, threshold):
+    chart_downsample = package("chart_downsample")
+    y = np.random.default_rng(n).normal(size=n).cumsum()
+    keep = chart_downsample.lttb(y, threshold)
+    assert keep.size == threshold
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert np.all(np.diff(keep) > 0)
+    assert keep.tolist() == _reference_lttb(y, threshold)
+
+
+def test_lttb_short_series_unchanged(package):
+    chart_downsample = package("chart_downsample")
+    assert chart_downsample.lttb([3.0, 1.0, 2.0], 10).tolist() == [0, 1, 2]
+    assert chart_downsample.lttb(np.arange(100.0), 2).tolist() == list(range(100))
+
+
+def test_lttb_keeps_spikes(package):
+    chart_downsample = package("chart_downsample")
+    y = np.zeros(5000)
+    y[[1234, 4321]] = [100.0, -80.0]
+    keep = chart_downsample.lttb(y, 100)
+    assert {1234, 4321} <= set(keep.tolist())
+
+
+def test_downsample_visualization_lines(package):
+    chart_downsample = package("chart_downsample")
+    rows = [{"月份": f"P{i}", "销售额": float(i % 50), "成本": str(i % 7)} for i in range(3000)]
+    report = {"visualization_data": [
+        {"type": "line_chart", "x_axis": "月份", "y_axis": "销售额", "data": [dict(row) for row in rows]},
+        {"type": "multi_line_chart", "data": [dict(row) for row in rows]},
+        {"type": "line_chart", "data": rows[:10]},
+    ]}
+    line, multi, short = chart_downsample.downsample_visualization(report, max_points=200)["visualization_data"]
+    assert len(line["data"]) == 200 and line["original_points"] == 3000
+    assert line["data"][0]["月份"] == "P0" and line["data"][-1]["月份"] == "P2999"
+    assert len(multi["data"]) <= 200 and multi["original_points"] == 3000
+    assert "original_points" not in short and len(short["data"]) == 10
+
+
+def test_fold_categories(package):
+    chart_downsample = package("chart_downsample")
+    rows = [{"name": f"C{i}", "value": float(i)} for i in range(30)] + [{"name": "其他", "value": 1000.0}]
+    report = {"visualization_data": [{"type": "pie_chart", "data": rows}]}
+    chart = chart_downsample.downsample_visualization(report, max_categories=5)["visualization_data"][0]
+    assert [row["name"] for row in chart["data"]] == ["C26", "C27", "C28", "C29", "其他"]
+    assert chart["data"][-1]["value"] == sum(range(26)) + 1000.0
+    assert chart["original_points"] == 31
+
+
+def test_downsample_visualization_ignores_malformed(package):
+    chart_downsample = package("chart_downsample")
+    report = {"visualization_data": [None, {"type": "line_chart", "data": "x"}, {"type": "bar_chart", "data": [1, 2]}]}
+    assert chart_downsample.downsample_visualization(report, max_points=1, max_categories=1) == report
+    assert chart_downsample.downsample_visualization("text") == "text"
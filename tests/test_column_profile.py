@@ -0,0 +1,39 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+
+def test_numeric_profile_matches_numpy(package):
+    sheet_frame = package("sheet_frame")
+    column_profile = package("column_profile")
+    rng = random.Random(3)
+    values = [rng.choice([rng.randint(0, 50), rng.random() * 100]) for _ in range(997)]
+    cells = values + [None, "", "暂无"]
+    column = sheet_frame.Column.from_cells("金额", cells)
+    profile = column_profile.profile_column(column, top_k=3)
+    numbers = np.array(values, dtype=float)
+    assert profile["kind"] == sheet_frame.KIND_NUMBER
+    assert (profile["non_null"], profile["nulls"]) == (998, 2)
+    assert profile["sum"] == pytest.approx(numbers.sum())
+    assert profile["std"] == pytest.approx(numbers.std())
+    assert [profile["p25"], profile["p50"], profile["p75"]] == pytest.approx(np.quantile(numbers, [0.25, 0.5, 0.75]).tolist())
+    assert (profile["min"], profile["max"]) == (numbers.min(), numbers.max())
+    uniques, counts = np.unique(numbers, return_counts=True)
+    assert profile["distinct"] == uniques.size + 1
+    assert sum(count for _, count in profile["top"]) + profile["other"] == 998
+    assert profile["top"][0][1] == counts.max()
+
+
+def test_text_and_date_profiles(package):
+    sheet_frame = package("sheet_frame")
+    column_profile = package("column_profile")
+    frame = sheet_frame.SheetFrame.from_rows(
+        [["部门", "日期"]] + [["ABCA"[i % 4], datetime(2024, 1, 1 + i % 3)] for i in range(12)] + [[None, None]])
+    department, day = column_profile.profile_frame(frame, top_k=1)
+    assert department["top"] == [["A", 6]] and department["other"] == 6 and department["distinct"] == 3
+    assert department["nulls"] == 1 and department["type"] == "文本"
+    assert (day["min"], day["max"], day["distinct"]) == ("2024-01-01T00:00:00", "2024-01-03T00:00:00", 3)
+    # 结果缓存在 frame 上
+    assert column_profile.profile_frame(frame, top_k=1)[0] is department
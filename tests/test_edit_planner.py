@@ -0,0 +1,121 @@
+import random
+
+from openpyxl import Workbook, load_workbook
+
+
+def _sheet(n_rows=6, n_cols=3):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "数据"
+    for r in range(1, n_rows + 1):
+        for c in range(1, n_cols + 1):
+            ws.cell(row=r, column=c, value=f"r{r}c{c}")
+    return ws
+
+
+def _values(ws):
+    return {(cell.row, cell.column): cell.value for row in ws.iter_rows() for cell in row if cell.value is not None}
+
+
+def _apply_one_by_one(ws, ops):
+    # 参照实现：逐个操作直接调用 openpyxl
+    for op in ops:
+        if op["type"] == "add_row":
+            index = op.get("index")
+            if index is None:
+                index = ws.max_row + 1
+            else:
+                ws.insert_rows(index)
+            for col, value in enumerate(op["data"], 1):
+                ws.cell(row=index, column=col, value=value)
+        else:
+            ws.cell(row=op["row"], column=op["col"], value=op["value"])
+
+
+def test_plan_matches_sequential_openpyxl_edits(package):
+    edit_planner = package("edit_planner")
+    rng = random.Random(7)
+    for trial in range(30):
+        ops = []
+        for i in range(rng.randint(1, 25)):
+            if rng.random() < 0.5:
+                index = rng.choice([None, rng.randint(1, 12)])
+                ops.append({"type": "add_row", "index": index, "data": [f"new{trial}-{i}", i]})
+            else:
+                ops.append({"type": "update_cell", "row": rng.randint(1, 14), "col": rng.randint(1, 4),
+                            "value": f"set{trial}-{i}"})
+        expected, actual = _sheet(), _sheet()
+        _apply_one_by_one(expected, ops)
+        programs, problems = edit_planner.compile_operations(ops, ["数据"], default_sheet="数据")
+        assert problems == []
+        assert edit_planner.apply_program(actual, programs["数据"]) == []
+        assert _values(actual) == _values(expected), ops
+
+
+def test_invalid_operations_are_reported(package):
+    edit_planner = package("edit_planner")
+    ops = [
+        {"type": "update_cell", "row": 0, "col": 1, "value": 1},
+        {"type": "drop_table"},
+        "not an op",
+        {"type": "add_row", "index": "abc", "data": []},
+        {"type": "update_cell", "row": "2", "col": 1.0, "value": "ok", "sheet": 0},
+        {"type": "update_cell", "row": 1, "col": 1, "value": 1, "sheet": "不存在"},
+    ]
+    programs, problems = edit_planner.compile_operations(
+        ops, ["数据"], default_sheet="数据", resolve=lambda s: "数据" if s == 0 else s)
+    assert len(problems) == 5
+    assert programs == {"数据": [(edit_planner.STEP_CELLS, [{"type": "update_cell", "row": 2, "col": 1, "value": "ok"}])]}
+
+
+def test_cell_and_bulk_steps_keep_their_order(package):
+    edit_planner = package("edit_planner")
+    ops = [
+        {"type": "update_cell", "row": 2, "col": 1, "value": "x"},
+        {"type": "add_row", "data": ["y"]},
+        {"type": "sort", "by": ["A"]},
+        {"type": "update_cell", "row": 2, "col": 2, "value": "z"},
+    ]
+    programs, problems = edit_planner.compile_operations(ops, ["数据"], default_sheet="数据")
+    assert problems == []
+    assert [kind for kind, _ in programs["数据"]] == [edit_planner.STEP_CELLS, edit_planner.STEP_BULK,
+                                                     edit_planner.STEP_CELLS]
+    assert len(programs["数据"][0][1]) == 2
+
+
+def test_row_layout_merges_consecutive_inserts(package):
+    edit_planner = package("edit_planner")
+    layout = edit_planner.RowLayout(100)
+    # 在同一位置依次往下插入多行（如逐行插入一段数据）只产生一个新行分段
+    for i in range(50):
+        layout.insert(10 + i)
+    assert len(layout.segments) == 3
+    orig_shifts, new_row_position = layout.final_positions()
+    assert orig_shifts == [(1, 9, 0), (10, 91, 50)]
+    assert new_row_position(1) == 10 and new_row_position(50) == 59
+    assert layout.locate(60) == (edit_planner.ORIG, 10)
+
+
+def test_bad_formats_and_values_are_skipped_one_at_a_time(package, tmp_path):
+    edit_planner = package("edit_planner")
+    excel_utils = package("excel_utils")
+    ws = _sheet()
+    path = tmp_path / "in.xlsx"
+    ws.parent.save(path)
+    ops = [
+        {"type": "format_cell", "row": 1, "col": 1, "format": {"font": {"color": "red", "bold": True}}},
+        {"type": "format_cell", "row": 1, "col": 2, "format": {"font": {"color": "reddish"}}},
+        {"type": "format_cell", "row": 1, "col": 3, "format": "bold"},
+        {"type": "update_cell", "row": 2, "col": 1, "value": {"a": 1}},
+        {"type": "update_cell", "row": 2, "col": 2, "value": "ok\x01"},
+        {"type": "format_range", "range": "A2:C2", "format": {"border": "fat"}},
+    ]
+    programs, problems = edit_planner.compile_operations(ops, ["数据"], default_sheet="数据")
+    assert len(problems) == 4
+    assert programs["数据"][0][1][0]["format"] == {"font": {"color": "FF0000", "bold": True}}
+
+    out = tmp_path / "out.xlsx"
+    assert excel_utils.ExcelUtils().edit_excel(str(path), str(out), ops)
+    result = load_workbook(out)["数据"]
+    assert result["A1"].font.bold and result["A1"].font.color.rgb == "00FF0000"
+    assert result["B2"].value == "ok" and result["A2"].value == "r2c1"
@@ -0,0 +1,62 @@
+import io
+import re
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+
+def _workbook_bytes(n_rows, keep_dimension=True):
+    wb = Workbook()
+    ws = wb.active
+    for i in range(n_rows):
+        ws.append([i, "x", i * 2] + (["wide"] if i == n_rows - 1 else []))
+    buf = io.BytesIO()
+    wb.save(buf)
+    if keep_dimension:
+        return buf.getvalue()
+    # 去掉工作表XML中的 <dimension>，模拟不记录尺寸的第三方导出文件
+    source, out = zipfile.ZipFile(io.BytesIO(buf.getvalue())), io.BytesIO()
+    with zipfile.ZipFile(out, "w") as target:
+        for item in source.infolist():
+            content = source.read(item)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                content = re.sub(rb"<dimension[^>]*/>", b"", content)
+            target.writestr(item, content)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("keep_dimension", [True, False])
+@pytest.mark.parametrize("max_rows", [None, 10, 1000])
+def test_dimensions_without_rescan(package, tmp_path, keep_dimension, max_rows):
+    excel_utils = package("excel_utils")
+    path = tmp_path / "book.xlsx"
+    path.write_bytes(_workbook_bytes(100, keep_dimension))
+    with excel_utils.ExcelRowReader(str(path), max_rows=max_rows) as reader:
+        rows = list(reader.iter_rows())
+        assert len(rows) == min(100, max_rows or 100)
+        assert reader.truncated == (max_rows == 10)
+        assert reader.dimensions == (100, 4)
+    # 未读取任何行时也能得到尺寸
+    with excel_utils.ExcelRowReader(str(path), max_rows=max_rows) as reader:
+        assert reader.dimensions == (100, 4)
+
+
+@pytest.mark.parametrize("keep_dimension", [True, False])
+def test_scan_sheet_reads_large_sheet_once(package, tmp_path, monkeypatch, keep_dimension):
+    excel_utils = package("excel_utils")
+    path = tmp_path / "book.xlsx"
+    path.write_bytes(_workbook_bytes(3000, keep_dimension))
+    opened = []
+    original = excel_utils.load_workbook
+    monkeypatch.setattr(excel_utils, "load_workbook", lambda *a, **kw: opened.append(a) or original(*a, **kw))
+    utils = excel_utils.ExcelUtils(max_rows=500, max_cols=10)
+    content, frame, sketch = utils.scan_sheet(str(path), approx_rows=1000)
+    assert len(opened) == 1
+    assert frame.n_rows == 499 and content["truncated"]
+    # 摘要覆盖全表（表头之后的 2999 行），尺寸来自同一次读取
+    assert sketch.n_rows == 2999
+    assert (content["total_rows"], content["total_cols"]) == (3000, 4)
+    if keep_dimension:
+        # 文件记录的行数未超过阈值时不构建摘要
+        assert utils.scan_sheet(str(path), approx_rows=5000)[2] is None
@@ -0,0 +1,34 @@
+import pytest
+from openpyxl import load_workbook
+
+
+@pytest.mark.parametrize("row_count, backend, expected", [
+    (10, "auto", "openpyxl"),
+    (None, "auto", "write_only"),
+    (None, "pyexcelerate", "write_only"),
+    (5000, "write_only", "write_only"),
+])
+def test_choose_writer_backend(package, row_count, backend, expected):
+    excel_utils = package("excel_utils")
+    assert excel_utils.choose_writer_backend(row_count, backend, threshold=1000) == expected
+
+
+def test_large_writes_do_not_use_pyexcelerate(package, monkeypatch):
+    excel_utils = package("excel_utils")
+    monkeypatch.setattr(excel_utils, "HAS_PYEXCEL", True)
+    limit = excel_utils.PYEXCELERATE_MAX_ROWS
+    assert excel_utils.choose_writer_backend(limit, "auto") == "pyexcelerate"
+    assert excel_utils.choose_writer_backend(limit + 1, "auto") == "write_only"
+    assert excel_utils.choose_writer_backend(limit + 1, "pyexcelerate") == "write_only"
+
+
+@pytest.mark.parametrize("backend", ["openpyxl", "write_only", "pyexcelerate"])
+def test_write_rows_round_trip(package, tmp_path, backend):
+    excel_utils = package("excel_utils")
+    if backend == "pyexcelerate" and not excel_utils.HAS_PYEXCEL:
+        pytest.skip("pyexcelerate 未安装")
+    rows = [("名称", "数量")] + [(f"项{i}", i) for i in range(50)]
+    path = tmp_path / "out.xlsx"
+    assert excel_utils.write_rows(str(path), "数据", rows, backend=backend) == (backend, 51)
+    ws = load_workbook(path, read_only=True)["数据"]
+    assert [tuple(row) for row in ws.iter_rows(values_only=True)] == rows
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+
+def _eval(package, expr, namespace=None, length=3):
+    expr_eval = package("expr_eval")
+    tree, _ = expr_eval.compile_expression(expr)
+    return expr_eval.evaluate(tree, namespace or {}, length)
+
+
+def test_power_does_not_wrap_around(package):
+    result = _eval(package, "9 ** 9 ** 9")
+    assert np.all(np.isposinf(result))
+    assert _eval(package, "2 ** 62 * 4")[0] == pytest.approx(2.0 ** 64)
+
+
+def test_power_on_columns(package):
+    result = _eval(package, "单价 ** 2 + 2 ** -1", {"单价": np.array([1.0, 2.0, 3.0])})
+    assert result.tolist() == [1.5, 4.5, 9.5]
+
+
+def test_overflow_written_as_empty_cell(package):
+    bulk_ops = package("bulk_ops")
+    assert bulk_ops._to_cells(_eval(package, "10 ** 400", length=2)) == [None, None]
+
+
+def test_rejects_disallowed_syntax(package):
+    expr_eval = package("expr_eval")
+    for expr in ("__import__('os')", "a.b", "[1, 2]", "lambda: 1"):
+        with pytest.raises(expr_eval.ExpressionError):
+            expr_eval.compile_expression(expr)
+
+
+def test_comparisons_with_nulls_and_mixed_types(package):
+    mixed = np.array([100, None, "暂无"], dtype=object)
+    numbers = np.array([1.0, np.nan, 3.0])
+    assert _eval(package, "销售额 > 50", {"销售额": mixed}).tolist() == [True, False, False]
+    assert _eval(package, "销售额 > '5'", {"销售额": numbers}).tolist() == [False, False, False]
+    assert _eval(package, "销售额 == None", {"销售额": mixed}).tolist() == [False, True, False]
+    assert _eval(package, "销售额 != None", {"销售额": numbers}).tolist() == [True, False, True]
+    dates = np.array(["2024-01-02", "NaT", "2023-05-01"], dtype="datetime64[D]")
+    assert _eval(package, "日期 >= '2024-01-01'", {"日期": dates}).tolist() == [True, False, False]
+
+
+def test_arithmetic_on_text_columns(package):
+    expr_eval = package("expr_eval")
+    mixed = np.array([100, None, 4], dtype=object)
+    assert _eval(package, "a * 2 - 1", {"a": mixed}).tolist() == [199, None, 7]
+    assert _eval(package, "a / 0", {"a": mixed}).tolist() == [None, None, None]
+    assert _eval(package, "'ab' * 2", length=1).tolist() == ["abab"]
+    for expr in ("a * '2'", "round(b)", "'ab' * 999999999"):
+        with pytest.raises(expr_eval.ExpressionError):
+            _eval(package, expr, {"a": np.array([1.0, 2.0, 3.0]), "b": mixed})
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+
+def test_hedge_wins_and_slow_primary_is_cancelled(package):
+    hedging = package("hedging")
+    started = []
+    cancelled = []
+
+    async def call():
+        index = len(started)
+        started.append(index)
+        try:
+            # 首个请求卡住，对冲请求很快返回
+            await asyncio.sleep(10 if index == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return f"result-{index}"
+
+    async def run():
+        outcome = await hedging.hedged_call(call, hedge_delay=0.02)
+        await asyncio.sleep(0)
+        return outcome
+
+    assert asyncio.run(run()) == ("result-1", "hedge")
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+
+def test_fast_primary_does_not_hedge(package):
+    hedging = package("hedging")
+    started = []
+
+    async def call():
+        started.append(1)
+        return "ok"
+
+    assert asyncio.run(hedging.hedged_call(call, hedge_delay=0.5)) == ("ok", "primary")
+    assert asyncio.run(hedging.hedged_call(call, hedge_delay=None)) == ("ok", "primary")
+    assert started == [1, 1]
+
+
+def test_failed_primary_falls_back_to_hedge(package):
+    hedging = package("hedging")
+    started = []
+
+    async def call():
+        index = len(started)
+        started.append(index)
+        if index == 0:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("primary failed")
+        await asyncio.sleep(0.1)
+        return "hedged"
+
+    assert asyncio.run(hedging.hedged_call(call, hedge_delay=0.01)) == ("hedged", "hedge")
+
+
+def test_all_failures_raise_primary_error(package):
+    hedging = package("hedging")
+    started = []
+
+    async def call():
+        index = len(started)
+        started.append(index)
+        await asyncio.sleep(0.03 if index == 0 else 0.01)
+        raise RuntimeError(f"failed-{index}")
+
+    with pytest.raises(RuntimeError, match="failed-0"):
+        asyncio.run(hedging.hedged_call(call, hedge_delay=0.01))
+    assert started == [0, 1]
+
+
+def test_latency_tracker_quantile(package):
+    hedging = package("hedging")
+    tracker = hedging.LatencyTracker(window_size=10, min_samples=5)
+    for seconds in range(4):
+        tracker.record("analyze", seconds)
+    assert tracker.quantile("analyze", 0.95) is None
+    assert tracker.quantile("other", 0.95) is None
+
+    for seconds in range(4, 20):
+        tracker.record("analyze", seconds)
+    # 只保留最近 10 个样本：10..19
+    assert tracker.quantile("analyze", 0.0) == 10
+    assert tracker.quantile("analyze", 0.95) == 19
+    assert tracker.quantile("analyze", 0.5) == 15
+
+
+def test_run_with_deadline_cancels_slow_call(package):
+    hedging = package("hedging")
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        with pytest.raises(hedging.DeadlineExceededError):
+            await hedging.run_with_deadline(slow(), deadline=0.02)
+        await asyncio.sleep(0)
+        assert await hedging.run_with_deadline(asyncio.sleep(0, result="done"), deadline=1) == "done"
+
+    asyncio.run(run())
+    assert cancelled == [True]
+    assert issubclass(hedging.DeadlineExceededError, package("llm_client").LLMError)
+
+
+def test_run_with_deadline_stops_on_client_disconnect(package):
+    hedging = package("hedging")
+    cancelled = []
+
+    class _Request:
+        def __init__(self):
+            self.polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls >= 2
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        request = _Request()
+        with pytest.raises(hedging.ClientDisconnectedError):
+            await hedging.run_with_deadline(slow(), deadline=None, http_request=request, poll_interval=0.01)
+        await asyncio.sleep(0)
+        return request.polls
+
+    assert asyncio.run(run()) == 2
+    assert cancelled == [True]
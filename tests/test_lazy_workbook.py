@@ -0,0 +1,106 @@
+import pytest
+from openpyxl import Workbook
+
+
+def _multi_sheet_book(path):
+    wb = Workbook()
+    first = wb.active
+    first.title = "汇总"
+    first.append(["区域", "销售额"])
+    first.append(["华东", 100])
+    second = wb.create_sheet("明细")
+    for i in range(30):
+        second.append([i, f"item-{i}", i * 1.5])
+    third = wb.create_sheet("2024")
+    third.append(["月份"])
+    # 活动工作表为第二个
+    wb.active = 1
+    wb.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("selector, expected", [
+    (None, "明细"),
+    ("", "明细"),
+    ("汇总", "汇总"),
+    (" 汇总 ", "汇总"),
+    (0, "汇总"),
+    ("2", "2024"),
+    (-1, "2024"),
+    ("-3", "汇总"),
+    # 名称优先于序号
+    ("2024", "2024"),
+])
+def test_resolve_sheet(package, selector, expected):
+    excel_utils = package("excel_utils")
+    assert excel_utils.resolve_sheet(["汇总", "明细", "2024"], selector, "明细") == expected
+
+
+@pytest.mark.parametrize("selector", ["不存在", 3, -4, True, 1.0])
+def test_resolve_sheet_rejects_unknown(package, selector):
+    excel_utils = package("excel_utils")
+    with pytest.raises(excel_utils.SheetNotFoundError, match="可选: 汇总, 明细"):
+        excel_utils.resolve_sheet(["汇总", "明细"], selector)
+    assert issubclass(excel_utils.SheetNotFoundError, ValueError)
+
+
+def test_index_does_not_parse_cells(package, tmp_path, monkeypatch):
+    excel_utils = package("excel_utils")
+    path = _multi_sheet_book(tmp_path / "book.xlsx")
+    opened = []
+    original = excel_utils.ExcelRowReader
+
+    def spy(*args, **kwargs):
+        opened.append(kwargs.get("sheet_name"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(excel_utils, "ExcelRowReader", spy)
+    with excel_utils.LazyWorkbook(path) as book:
+        assert book.sheet_names == ["汇总", "明细", "2024"]
+        assert book.active_sheet == "明细"
+        assert book.index() == [
+            {"index": 0, "name": "汇总", "rows": 2, "cols": 2, "active": False},
+            {"index": 1, "name": "明细", "rows": 30, "cols": 3, "active": True},
+            {"index": 2, "name": "2024", "rows": 1, "cols": 1, "active": False},
+        ]
+        assert opened == []
+
+        # 首次访问时才解析，之后使用缓存
+        content = book.sheet()
+        assert content["sheet_name"] == "明细"
+        assert content["data"][1] == [1, "item-1", 1.5]
+        assert (content["total_rows"], content["total_cols"], content["truncated"]) == (30, 3, False)
+        assert book.sheet("明细") is content
+        assert book.sheet(1) is content
+        assert opened == ["明细"]
+
+        assert book.sheet("0")["data"] == [["区域", "销售额"], ["华东", 100]]
+        assert opened == ["明细", "汇总"]
+
+        # 不同的读取上限分别缓存
+        limited = book.sheet("明细", max_rows=5)
+        assert len(limited["data"]) == 5 and limited["truncated"]
+        assert limited["total_rows"] == 30
+        assert opened == ["明细", "汇总", "明细"]
+
+        with pytest.raises(excel_utils.SheetNotFoundError):
+            book.sheet("不存在")
+
+
+def test_read_excel_selects_sheet(package, tmp_path):
+    excel_utils = package("excel_utils")
+    path = _multi_sheet_book(tmp_path / "book.xlsx")
+    utils = excel_utils.ExcelUtils(max_rows=10, max_cols=2)
+
+    content = utils.read_excel(path)
+    assert content["sheet_name"] == "明细"
+    assert len(content["data"]) == 10 and all(len(row) == 2 for row in content["data"])
+    assert content["truncated"]
+    assert (content["total_rows"], content["total_cols"]) == (30, 3)
+    assert [sheet["name"] for sheet in content["sheets"]] == ["汇总", "明细", "2024"]
+
+    assert utils.read_excel(path, sheet_name="汇总")["data"] == [["区域", "销售额"], ["华东", 100]]
+    assert utils.read_excel(path, sheet_name=2)["sheet_name"] == "2024"
+    assert "工作表不存在" in utils.read_excel(path, sheet_name="不存在")["error"]
+
+    assert [sheet["name"] for sheet in utils.list_sheets(path)] == ["汇总", "明细", "2024"]
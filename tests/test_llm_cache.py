@@ -0,0 +1,106 @@
+import asyncio
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeRedis:
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key, (None,))[0]
+
+    async def ttl(self, key):
+        return self.data[key][1]
+
+    async def setex(self, key, ttl, value):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = (value, ttl)
+
+
+def test_cache_key_ignores_unrelated_fields(package):
+    llm_cache = package("llm_cache")
+    payload = {"model": "m", "messages": [{"role": "user", "content": "你好"}], "temperature": 0.1, "max_tokens": 10}
+    reordered = dict(reversed(list(payload.items())), stream=True)
+    assert llm_cache.make_cache_key(payload) == llm_cache.make_cache_key(reordered)
+    assert llm_cache.make_cache_key(payload) != llm_cache.make_cache_key(dict(payload, temperature=0.2))
+
+
+def test_memory_ttl_and_lru(package, monkeypatch):
+    llm_cache = package("llm_cache")
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    evictions = []
+    cache = llm_cache.LLMResponseCache(ttl=60, max_entries=2, on_evict=evictions.append)
+
+    async def run():
+        await cache.set("a", {"v": 1})
+        await cache.set("b", {"v": 2})
+        assert await cache.get("a") == ({"v": 1}, "memory")
+        # a 刚被访问过，容量不足时淘汰最久未使用的 b
+        await cache.set("c", {"v": 3})
+        assert await cache.get("b") == (None, None)
+        clock.now += 61
+        assert await cache.get("a") == (None, None)
+
+    asyncio.run(run())
+    assert evictions == ["capacity", "expired"]
+    assert len(cache) == 1
+
+
+def test_disabled_cache_never_stores(package):
+    llm_cache = package("llm_cache")
+    cache = llm_cache.LLMResponseCache(enabled=False)
+
+    async def run():
+        await cache.set("a", 1)
+        return await cache.get("a")
+
+    assert asyncio.run(run()) == (None, None)
+    assert len(cache) == 0
+
+
+def test_redis_tier_backfills_memory(package):
+    llm_cache = package("llm_cache")
+    writer = llm_cache.LLMResponseCache(ttl=60)
+    reader = llm_cache.LLMResponseCache(ttl=60)
+    writer._redis = reader._redis = _FakeRedis()
+
+    async def run():
+        await writer.set("k", {"answer": "好"})
+        assert await reader.get("k") == ({"answer": "好"}, "redis")
+        assert await reader.get("k") == ({"answer": "好"}, "memory")
+
+    asyncio.run(run())
+
+
+def test_redis_failure_is_skipped_for_a_while(package, monkeypatch):
+    llm_cache = package("llm_cache")
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    cache = llm_cache.LLMResponseCache(ttl=60)
+    cache._redis = redis = _FakeRedis(fail=True)
+
+    async def run():
+        assert await cache.get("x") == (None, None)
+        await cache.set("x", 1)
+        assert redis.calls == 1
+        assert await cache.get("x") == (1, "memory")
+        clock.now += cache.REDIS_RETRY_INTERVAL
+        assert await cache.get("y") == (None, None)
+
+    asyncio.run(run())
+    assert redis.calls == 2
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+def _client(package, handler, guard=None):
+    llm_client = package("llm_client")
+    client = llm_client.DeepSeekClient("key", "https://llm.test", "model", 100, 0.1, guard=guard)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+
+async def _collect(client):
+    return [chunk async for chunk in client.stream({"messages": []})]
+
+
+def test_stream_parses_sse_chunks(package):
+    body = 'data: {"choices": [{"delta": {"content": "a"}}]}\n\n: keep-alive\n\ndata: {"usage": {}}\n\ndata: [DONE]\n\n'
+    client = _client(package, lambda request: httpx.Response(200, text=body))
+    chunks = asyncio.run(_collect(client))
+    assert [package("llm_client").get_delta_content(chunk) for chunk in chunks] == ["a", ""]
+
+
+def test_malformed_responses_raise_llm_error_and_count_as_failures(package):
+    llm_client = package("llm_client")
+    resilience = package("resilience")
+    breaker = resilience.CircuitBreaker(window_size=2, min_calls=2, failure_rate_threshold=0.5)
+    guard = resilience.UpstreamGuard(breaker, resilience.AdaptiveConcurrencyLimiter())
+    stream = _client(package, lambda request: httpx.Response(200, text='data: {"choices": [\n\n'), guard)
+    complete = _client(package, lambda request: httpx.Response(200, text="<html>bad gateway</html>"), guard)
+
+    async def run():
+        with pytest.raises(llm_client.LLMError):
+            await _collect(stream)
+        with pytest.raises(llm_client.LLMError):
+            await complete.complete({"messages": []})
+
+    asyncio.run(run())
+    assert breaker.state == breaker.OPEN
@@ -0,0 +1,74 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from api import main
+from api.excel_utils import apply_luckysheet_edit
+
+
+def _sheet():
+    return {
+        "sheet_name": "Sheet1",
+        "data": [{"r": 0, "cell": {"0": "名称", "1": "数量"}}, {"r": 3, "cell": {"0": "A", "1": 1}}],
+        "formulas": {"4_1": "=SUM(B1:B4)"},
+        "styles": {},
+        "cell_styles": {"3_0": 5},
+        "merges": [{"r": 2, "c": 0, "rs": 2, "cs": 1}],
+    }
+
+
+def test_edit_cell_updates_existing_and_inserts_sparse_rows():
+    data = _sheet()
+    apply_luckysheet_edit(data, {"type": "edit_cell", "data": {"row": 3, "col": 2, "value": "x"}})
+    apply_luckysheet_edit(data, {"type": "edit_cell", "data": {"row": 1, "col": 0, "value": "B"}})
+    apply_luckysheet_edit(data, {"type": "edit_cell", "data": {"row": 4, "col": 1, "value": 9}})
+    assert [row["r"] for row in data["data"]] == [0, 1, 3, 4]
+    assert data["data"][2]["cell"] == {"0": "A", "1": 1, "2": "x"}
+    # 直接输入的值覆盖原有公式
+    assert "4_1" not in data["formulas"]
+
+
+def test_insert_row_shifts_rows_and_side_tables():
+    data = apply_luckysheet_edit(_sheet(), {"type": "insert_row", "data": {"row": 3, "count": 2}})
+    assert [row["r"] for row in data["data"]] == [0, 5]
+    assert data["formulas"] == {"6_1": "=SUM(B1:B4)"}
+    assert data["cell_styles"] == {"5_0": 5}
+    # 跨越插入位置的合并单元格变高
+    assert data["merges"] == [{"r": 2, "c": 0, "rs": 4, "cs": 1}]
+
+
+def test_legacy_row_list_is_converted():
+    data = apply_luckysheet_edit([{"cell": {"0": "a"}}, {"cell": {}}],
+                                 {"type": "edit_cell", "data": {"row": 2, "col": 0, "value": "b"}})
+    assert data["data"] == [{"r": 0, "cell": {"0": "a"}}, {"r": 2, "cell": {"0": "b"}}]
+
+
+class _MemoryRedis:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = str(value)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = str(value)
+
+
+def test_websocket_edits_after_load_excel(monkeypatch):
+    redis = _MemoryRedis()
+    monkeypatch.setattr(main, "redis_client", redis)
+    # load_excel 写入的稀疏格式
+    redis.setex("excel:ws1", 7200, json.dumps(_sheet()))
+    with TestClient(main.app).websocket_connect("/ws/excel/ws1") as ws:
+        assert json.loads(ws.receive_text())["type"] == "load_history"
+        ws.send_text(json.dumps({"type": "edit_cell", "data": {"row": 3, "col": 1, "value": 7}}))
+        assert json.loads(ws.receive_text())["type"] == "auto_save_success"
+        ws.send_text(json.dumps({"type": "insert_row", "data": {"row": 1}}))
+        ws.send_text(json.dumps({"type": "edit_cell", "data": {"row": 0, "col": 2, "value": "备注"}}))
+    saved = json.loads(redis.get("excel:ws1"))
+    assert [row["r"] for row in saved["data"]] == [0, 4]
+    assert saved["data"][0]["cell"]["2"] == "备注"
+    assert saved["data"][1]["cell"]["1"] == 7
@@ -0,0 +1,63 @@
+import os
+import pickle
+import stat
+
+import numpy as np
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_spill_dir_is_private(package, tmp_path):
+    parse_cache = package("parse_cache")
+    spill_dir = tmp_path / "new"
+    parse_cache.ParsedWorkbookCache(spill_dir=str(spill_dir))
+    assert _mode(spill_dir) == 0o700
+
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    cache = parse_cache.ParsedWorkbookCache(spill_dir=str(shared))
+    assert cache.spill_dir == str(shared) and _mode(shared) == 0o700
+
+
+def test_symlinked_spill_dir_is_not_used(package, tmp_path):
+    parse_cache = package("parse_cache")
+    target = tmp_path / "target"
+    target.mkdir()
+    link = tmp_path / "link"
+    link.symlink_to(target)
+    assert parse_cache.ParsedWorkbookCache(spill_dir=str(link)).spill_dir == ""
+
+
+def test_spilled_entries_round_trip(package, tmp_path):
+    parse_cache = package("parse_cache")
+    spill_dir = tmp_path / "spill"
+    cache = parse_cache.ParsedWorkbookCache(max_bytes=100_000, spill_dir=str(spill_dir))
+    first = np.arange(10_000, dtype=np.float64)
+    cache.set("a", first)
+    cache.set("b", np.zeros(10_000))
+    assert len(cache) == 1
+    files = os.listdir(spill_dir)
+    assert len(files) == 1 and _mode(spill_dir / files[0]) == 0o600
+    value, tier = cache.get("a")
+    assert tier == "disk" and np.array_equal(value, first)
+
+
+def test_set_sizes_entries_without_pickling(package, monkeypatch):
+    parse_cache = package("parse_cache")
+    sheet_frame = package("sheet_frame")
+    frame = sheet_frame.SheetFrame.from_rows([["部门", "金额"]] + [["ABC"[i % 3], i * 1.5] for i in range(20_000)])
+    content = {"data": [["部门", "金额"]] + [["ABC"[i % 3], i * 1.5] for i in range(1000)]}
+    expected = len(pickle.dumps((content, frame)))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("set() should not serialize the value")
+
+    monkeypatch.setattr(parse_cache.pickle, "dumps", fail)
+    cache = parse_cache.ParsedWorkbookCache()
+    cache.set("k", (content, frame))
+    # 估算值与序列化后的大小在同一数量级（数组按 nbytes 计算）
+    assert frame.columns[1].values.nbytes < cache.nbytes < 10 * expected
+    assert cache.get("k") == ((content, frame), "memory")
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+
+
+def _content(n_rows, outlier_at=None):
+    rng = np.random.default_rng(0)
+    rows = [["订单号", "地区", "销售额"]]
+    for i in range(n_rows):
+        amount = round(float(rng.normal(1000, 50)), 2)
+        rows.append([f"SO{i:05d}", ["华东", "华南", "华北", "西部"][i % 4], amount])
+    if outlier_at is not None:
+        rows[outlier_at + 1][2] = 99999.0
+    return {"sheet_name": "销售", "data": rows}
+
+
+def test_small_table_is_sent_whole(package):
+    prompt_builder = package("prompt_builder")
+    content = _content(5)
+    text, stats = prompt_builder.build_analysis_prompt(content, token_budget=6000)
+    assert json.loads(text)["data"] == content["data"]
+    assert stats["compression_ratio"] == 1.0 and stats["sampled_rows"] == 5
+
+
+def test_large_table_fits_budget_with_profiles_samples_and_outliers(package):
+    prompt_builder = package("prompt_builder")
+    token_estimator = package("token_estimator")
+    content = _content(3000, outlier_at=1234)
+    text, stats = prompt_builder.build_analysis_prompt(content, token_budget=2500, sample_rows=40, outlier_rows=5)
+    payload = json.loads(text)
+    assert token_estimator.estimate_tokens(text) <= 2500
+    assert stats["prompt_tokens"] <= 2500 and stats["compression_ratio"] > 10
+    assert payload["total_rows"] == 3000 and payload["headers"] == ["订单号", "地区", "销售额"]
+    amount = payload["column_profiles"][2]
+    assert amount["type"] == "数值" and amount["max"] == 99999.0
+    # 每行第一个值为Excel行号，与该行内容一致
+    for row in payload["sample_rows"] + payload["outlier_rows"]:
+        assert row[1:] == content["data"][row[0] - 1]
+    assert [1236] == [row[0] for row in payload["outlier_rows"] if row[3] == 99999.0]
+    assert {row[2] for row in payload["sample_rows"]} == {"华东", "华南", "华北", "西部"}
+
+
+def test_stratified_sample_covers_every_category(package):
+    prompt_builder = package("prompt_builder")
+    sheet_frame = package("sheet_frame")
+    rows = [["类别", "值"]] + [["大类", i] for i in range(990)] + [["小类", i] for i in range(10)]
+    frame = sheet_frame.SheetFrame.from_rows(rows)
+    profiles = prompt_builder.profile_columns(frame)
+    picked = prompt_builder.stratified_sample(frame, profiles, 20)
+    assert len(picked) == 20 and picked == sorted(picked)
+    assert any(idx >= 990 for idx in picked)
+
+
+def test_detected_anomalies_and_truncated_size(package):
+    prompt_builder = package("prompt_builder")
+    content = dict(_content(200, outlier_at=50), truncated=True, total_rows=50001, total_cols=3)
+    text, _ = prompt_builder.build_analysis_prompt(content, token_budget=1500, anomalies=True)
+    payload = json.loads(text)
+    assert payload["total_rows"] == 50000
+    assert any("C52" in json.dumps(item, ensure_ascii=False) for item in payload["detected_anomalies"])
+    assert 52 in [row[0] for row in payload["outlier_rows"]]
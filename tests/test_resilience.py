@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+
+class _Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(package, monkeypatch):
+    resilience = package("resilience")
+    fake = _Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+def test_breaker_opens_half_opens_and_closes(package, clock):
+    resilience = package("resilience")
+    breaker = resilience.CircuitBreaker(window_size=4, min_calls=4, failure_rate_threshold=0.5, open_seconds=30)
+    for success in (True, False, True):
+        breaker.record(success, 0.1)
+    assert breaker.state == breaker.CLOSED
+    breaker.record(False, 0.1)
+    assert breaker.state == breaker.OPEN and not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.state == breaker.HALF_OPEN
+    # 只放行一个探测请求
+    assert breaker.allow_request() and not breaker.allow_request()
+    breaker.record(False, 0.1)
+    assert breaker.state == breaker.OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record(True, 0.1)
+    assert breaker.state == breaker.CLOSED and breaker.state_value == 0
+
+
+def test_breaker_opens_on_slow_calls_and_returns_cancelled_probes(package, clock):
+    resilience = package("resilience")
+    breaker = resilience.CircuitBreaker(window_size=4, min_calls=4, slow_call_seconds=5, slow_call_rate_threshold=0.75,
+                                        open_seconds=10)
+    for latency in (6, 6, 1, 6):
+        breaker.record(True, latency)
+    assert breaker.state == breaker.OPEN
+    clock.now += 10
+    assert breaker.allow_request()
+    breaker.cancel()
+    assert breaker.allow_request()
+    # 半开状态下的慢调用重新打开
+    breaker.record(True, 6)
+    assert breaker.state == breaker.OPEN
+
+
+def test_aimd_limit_grows_additively_and_backs_off(package):
+    resilience = package("resilience")
+    limiter = resilience.AdaptiveConcurrencyLimiter(initial_limit=4, min_limit=1, max_limit=5, latency_target=1.0)
+
+    async def run():
+        for _ in range(8):
+            assert await limiter.acquire()
+            await limiter.release(True, 0.1)
+        grown = limiter.limit
+        assert await limiter.acquire()
+        await limiter.release(False, 0.1)
+        failed = limiter.limit
+        assert await limiter.acquire()
+        await limiter.release(True, 2.0)
+        return grown, failed, limiter.limit
+
+    grown, failed, slow = asyncio.run(run())
+    # 每次成功加 1/limit，不超过 max_limit；失败或超出目标耗时减半
+    assert grown == 5.0
+    assert failed == pytest.approx(2.5)
+    assert slow == pytest.approx(1.25) and limiter.current_limit == 1
+    assert limiter.in_flight == 0
+
+
+def test_limiter_queues_then_rejects(package):
+    resilience = package("resilience")
+    limiter = resilience.AdaptiveConcurrencyLimiter(initial_limit=1, queue_timeout=0.05)
+
+    async def run():
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        await limiter.release(True, 0.1, adjust=False)
+        return await waiter
+
+    assert asyncio.run(run()) is True
+    assert limiter.in_flight == 1
+
+
+def test_guard_records_failures_and_ignores_cancellation(package, clock):
+    resilience = package("resilience")
+    llm_client = package("llm_client")
+    breaker = resilience.CircuitBreaker(window_size=2, min_calls=2, failure_rate_threshold=0.5)
+    limiter = resilience.AdaptiveConcurrencyLimiter(initial_limit=4)
+    guard = resilience.UpstreamGuard(breaker, limiter)
+
+    async def failing():
+        async with guard.call():
+            raise llm_client.LLMError("boom")
+
+    async def cancelled():
+        async with guard.call():
+            raise asyncio.CancelledError()
+
+    async def run():
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled()
+        assert len(breaker._window) == 0 and limiter.limit == 4
+        for _ in range(2):
+            with pytest.raises(llm_client.LLMError):
+                await failing()
+        with pytest.raises(resilience.CircuitOpenError):
+            await failing()
+
+    asyncio.run(run())
+    assert breaker.state == breaker.OPEN and limiter.in_flight == 0
+    assert issubclass(resilience.CircuitOpenError, llm_client.LLMError)
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+import numpy as np
+
+
+def test_column_kinds_and_original_labels(package):
+    sheet_frame = package("sheet_frame")
+    frame = sheet_frame.SheetFrame.from_rows([
+        ["日期", "部门", "销售额", "完成率", "员工ID"],
+        [datetime(2024, 1, 5), "技术部", "￥1,200", "104%", "E1"],
+        ["2024-02-01", "市场部", 980.5, "96%", "E2"],
+        [date(2024, 3, 1), "技术部", None, "暂无", "E3"],
+        [datetime(2024, 4, 1), "", 1500, "100%", "E4"],
+        [datetime(2024, 5, 1), "市场部", 1700, "98%", "E5"],
+    ])
+    kinds = [column.kind for column in frame.columns]
+    assert kinds == [sheet_frame.KIND_DATE, sheet_frame.KIND_TEXT, sheet_frame.KIND_NUMBER,
+                     sheet_frame.KIND_NUMBER, sheet_frame.KIND_TEXT]
+    roles = [column.role for column in frame.columns]
+    assert roles == [sheet_frame.ROLE_TIME, sheet_frame.ROLE_CATEGORY, sheet_frame.ROLE_MEASURE,
+                     sheet_frame.ROLE_MEASURE, sheet_frame.ROLE_ID]
+
+    sales, rate = frame.columns[2], frame.columns[3]
+    assert sales.numbers().tolist() == [1200.0, 980.5, 1500.0, 1700.0]
+    # 解析自字符串的值保留原始文本，无法解析的值保留原值
+    assert sales.value(0) == "￥1,200" and sales.value(2) is None
+    assert rate.values[0] == 104 and rate.value(2) == "暂无" and not rate.valid[2]
+    assert frame.columns[1].mask.tolist() == [False, False, False, True, False]
+    assert frame.columns[0].value(1) == "2024-02-01"
+
+
+def test_rows_round_trip_and_ragged_rows(package):
+    sheet_frame = package("sheet_frame")
+    rows = [["名称", "数量"], ["a", 1], ["b"], ["c", 2.5, "多出的列"]]
+    frame = sheet_frame.SheetFrame.from_rows(rows)
+    assert frame.headers == ["名称", "数量", "列3"]
+    assert frame.to_rows() == [["名称", "数量", "列3"], ["a", 1, None], ["b", None, None], ["c", 2.5, "多出的列"]]
+
+
+def test_truncated_content_keeps_real_dimensions(package):
+    sheet_frame = package("sheet_frame")
+    content = {"sheet_name": "S", "data": [["x"], [1], [2]], "truncated": True, "total_rows": 1001, "total_cols": 7}
+    frame = sheet_frame.SheetFrame.from_excel_content(content)
+    assert (frame.n_rows, frame.total_rows, frame.total_cols, frame.truncated) == (2, 1000, 7, True)
+
+
+def test_take_reencodes_text_columns(package):
+    sheet_frame = package("sheet_frame")
+    frame = sheet_frame.SheetFrame.from_rows([["部门"], ["A"], ["B"], ["C"], ["B"]])
+    part = frame.take(np.array([1, 3]))
+    codes, categories = part.columns[0].factorize()
+    assert categories == ["B"] and codes.tolist() == [0, 0]
+    assert part.row(1) == ["B"]
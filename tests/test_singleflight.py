@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+
+def test_concurrent_calls_share_one_execution(package):
+    singleflight = package("singleflight")
+    group = singleflight.SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": 42}
+
+    async def run():
+        results = await asyncio.gather(*[group.do("k", work) for _ in range(5)])
+        assert len(group) == 0
+        # 完成后再次调用会重新执行
+        again = await group.do("k", work)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert calls == [1, 1]
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert again == ({"answer": 42}, False)
+
+
+def test_errors_propagate_to_every_caller(package):
+    singleflight = package("singleflight")
+    group = singleflight.SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*[group.do("k", fail) for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert [type(e) for e in errors] == [ValueError] * 3
+    assert len(group) == 0
+
+
+def test_cancelled_caller_does_not_cancel_others(package):
+    singleflight = package("singleflight")
+    group = singleflight.SingleFlight()
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(group.do("k", work))
+        second = asyncio.ensure_future(group.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("done", True)
+    assert started == [1]
+
+
+def test_work_is_cancelled_when_every_caller_leaves(package):
+    singleflight = package("singleflight")
+    group = singleflight.SingleFlight()
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        callers = [asyncio.ensure_future(group.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return len(group)
+
+    assert asyncio.run(run()) == 0
+    assert cancelled == [1]
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+
+def test_tdigest_quantile_rank_error(package):
+    sketches = package("sketches")
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(8, 1, 200_000)
+    digest = sketches.TDigest()
+    for chunk in np.array_split(values, 20):
+        digest.update(chunk)
+    assert digest.count == values.size
+    qs = np.array([0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999])
+    estimates = digest.quantile(qs)
+    # 用排名误差衡量：估计值在真实分布中的分位数与目标分位数之差
+    ranks = np.searchsorted(np.sort(values), estimates) / values.size
+    assert np.all(np.abs(ranks - qs) <= 0.005)
+    # 尾部更精确
+    assert np.all(np.abs(ranks[[0, -1]] - qs[[0, -1]]) <= 0.0005)
+    assert digest.quantile([0.0, 1.0]).tolist() == [values.min(), values.max()]
+    assert digest.weights.size <= digest.compression
+
+
+def test_tdigest_merge_and_rank(package):
+    sketches = package("sketches")
+    rng = np.random.default_rng(1)
+    a, b = rng.normal(0, 1, 50_000), rng.normal(3, 1, 50_000)
+    merged = sketches.TDigest().update(a).merge(sketches.TDigest().update(b))
+    both = np.concatenate([a, b])
+    assert abs(merged.quantile(0.5) - np.quantile(both, 0.5)) < 0.05
+    assert merged.rank(1.5) / both.size == pytest.approx(np.mean(both <= 1.5), abs=0.005)
+    assert merged.rank(both.min() - 1) == 0 and merged.rank(both.max()) == both.size
+
+
+def test_tdigest_small_input_is_exact(package):
+    sketches = package("sketches")
+    values = np.array([5.0, 1.0, 3.0, 2.0, 4.0])
+    digest = sketches.TDigest().update(values)
+    assert digest.quantile([0.25, 0.5, 0.9]).tolist() == pytest.approx(np.quantile(values, [0.25, 0.5, 0.9]).tolist())
+
+
+@pytest.mark.parametrize("n", [10, 1000, 5000, 100_000, 1_000_000])
+def test_hyperloglog_error_bound(package, n):
+    sketches = package("sketches")
+    hll = sketches.HyperLogLog()
+    values = np.arange(n, dtype=float)
+    for chunk in np.array_split(values, 4):
+        # 重复输入不影响计数
+        hll.update(sketches.hash_numbers(chunk)).update(sketches.hash_numbers(chunk[: len(chunk) // 2]))
+    if n <= sketches.HLL_EXACT_LIMIT:
+        assert hll.count() == n
+    else:
+        # 相对标准误差约 1.04 / sqrt(2 ** 14) ≈ 0.8%，取 4 倍
+        assert abs(hll.count() - n) / n < 4 * 1.04 / np.sqrt(2 ** sketches.HLL_PRECISION)
+
+
+def test_hyperloglog_merge_is_union(package):
+    sketches = package("sketches")
+    left = sketches.HyperLogLog().update(sketches.hash_texts([f"a{i}" for i in range(30_000)]))
+    right = sketches.HyperLogLog().update(sketches.hash_texts([f"a{i}" for i in range(20_000, 50_000)]))
+    assert abs(left.merge(right).count() - 50_000) / 50_000 < 0.03
+
+
+def test_topk_keeps_heavy_hitters(package):
+    sketches = package("sketches")
+    rng = np.random.default_rng(2)
+    keys = np.concatenate([np.repeat(["A", "B", "C"], [30_000, 20_000, 10_000]), rng.integers(0, 50_000, 40_000).astype(str)])
+    rng.shuffle(keys)
+    top = sketches.TopK(capacity=16)
+    for chunk in np.array_split(keys, 10):
+        uniques, counts = np.unique(chunk, return_counts=True)
+        top.update(uniques.tolist(), counts)
+    result = dict(top.top(3))
+    assert list(result) == ["A", "B", "C"]
+    for key, true_count in (("A", 30_000), ("B", 20_000), ("C", 10_000)):
+        assert true_count - top.error <= result[key] <= true_count
+
+
+def _rows(n, start=0):
+    return [[f"2024-{(i % 12) + 1:02d}-01", "ABCD"[i % 4], float(i % 97), f"ID{i}"] for i in range(start, start + n)]
+
+
+def test_sheet_sketch_matches_exact_profile(package):
+    sketches = package("sketches")
+    sheet_frame = package("sheet_frame")
+    column_profile = package("column_profile")
+    header = ["日期", "部门", "金额", "编号"]
+    rows = _rows(20_000) + [["合计", None, 1e9, None]]
+    sketch = sketches.SheetSketch.from_rows([header] + rows, chunk_rows=3000, seed=0)
+    exact = column_profile.profile_frame(sheet_frame.SheetFrame.from_rows([header] + rows).without_summary_rows())
+    approx = sketch.profiles()
+    assert (sketch.n_rows, sketch.summary_rows) == (20_001, 1)
+    assert approx[2]["sum"] == pytest.approx(exact[2]["sum"])
+    assert approx[2]["std"] == pytest.approx(exact[2]["std"])
+    assert approx[2]["p50"] == pytest.approx(exact[2]["p50"], abs=1)
+    assert approx[1]["top"] == exact[1]["top"] and approx[1]["distinct"] == 4
+    assert abs(approx[3]["distinct"] - 20_000) / 20_000 < 0.03
+    assert len(sketch.sample.rows) == sketches.SAMPLE_ROWS
+
+
+def test_sheet_sketch_merge_and_group_sums(package):
+    sketches = package("sketches")
+    header = ["日期", "部门", "金额", "编号"]
+    whole = sketches.SheetSketch.from_rows([header] + _rows(6000), chunk_rows=1000, groups=[(1, 2)])
+    left = sketches.SheetSketch.from_rows([header] + _rows(2500), groups=[(1, 2)])
+    right = sketches.SheetSketch.from_rows([header] + _rows(3500, start=2500), groups=[(1, 2)])
+    left.merge(right)
+    assert left.n_rows == whole.n_rows == 6000
+    assert left.profiles()[2]["sum"] == pytest.approx(whole.profiles()[2]["sum"])
+    grouped = left.group_frame(1, 2)
+    assert grouped.headers == ["部门", "金额"]
+    expected = {dept: sum(float(i % 97) for i in range(6000) if "ABCD"[i % 4] == dept) for dept in "ABCD"}
+    assert dict(zip(grouped.columns[0].texts(range(4)), grouped.columns[1].values.tolist())) == pytest.approx(expected)
+    assert left.group_frame(0, 2) is None
+
+
+def test_group_sums_overflow(package):
+    sketches = package("sketches")
+    sheet_frame = package("sheet_frame")
+    frame = sheet_frame.SheetFrame.from_rows([["编号", "金额"]] + [[f"K{i}", 1] for i in range(500)])
+    sums = sketches.GroupSums(0, 1, capacity=100)
+    sums.update(*frame.columns)
+    assert sums.overflow and sums.sums == {}
+    small = sketches.GroupSums(0, 1, capacity=100)
+    small.merge(sums)
+    assert small.overflow
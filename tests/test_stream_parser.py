@@ -0,0 +1,40 @@
+import json
+
+
+def _feed_all(parser, text, size):
+    rows = []
+    for i in range(0, len(text), size):
+        rows.extend(parser.feed(text[i:i + size]))
+    return rows
+
+
+def test_rows_are_emitted_as_they_complete(package):
+    stream_parser = package("stream_parser")
+    parser = stream_parser.IncrementalTableParser()
+    assert parser.feed('```json\n{"sheet_name": "销售", "data": [["月份", "销售额"], ["1月", 10') == [["月份", "销售额"]]
+    assert parser.sheet_name == "销售"
+    assert parser.feed('0]') == [["1月", 100]]
+    assert parser.feed(', ["2月", 120]]}\n```') == [["2月", 120]]
+    assert parser.rows_parsed == 3
+
+
+def test_any_chunking_gives_the_same_rows(package):
+    stream_parser = package("stream_parser")
+    payload = {
+        "note": "[not] {data}",
+        "data": [["名称", "备注"], ["a\"b", "含 ] 和 [ 的文本"], ["c\\d", "行\n尾"], [1, None, True]],
+        "sheet_name": "表\"1",
+    }
+    text = json.dumps(payload, ensure_ascii=False)
+    for size in (1, 2, 7, len(text)):
+        parser = stream_parser.IncrementalTableParser()
+        assert _feed_all(parser, text, size) == payload["data"]
+        assert parser.sheet_name == payload["sheet_name"]
+        assert parser.text == text
+
+
+def test_nested_arrays_outside_data_are_ignored(package):
+    stream_parser = package("stream_parser")
+    parser = stream_parser.IncrementalTableParser()
+    text = '{"meta": {"data": [[1, 2]]}, "columns": [["x"]], "data": [[3]]}'
+    assert parser.feed(text) == [[3]]
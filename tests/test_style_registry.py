@@ -0,0 +1,80 @@
+import pytest
+from openpyxl import Workbook, load_workbook
+
+
+def _sheet():
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, 4):
+        ws.append([f"r{row}c{col}" for col in range(1, 4)])
+    return ws
+
+
+def test_color_names_and_short_hex_are_normalised(package):
+    style_registry = package("style_registry")
+    style = style_registry.normalize_style({"font": {"color": "red"}, "fill": "#ff0", "border": {"style": "thin", "color": "Gray"}})
+    assert style["font"]["color"] == "FF0000"
+    assert style["fill"]["color"] == "FFFF00"
+    assert style["border"]["left"] == {"style": "thin", "color": "808080"}
+
+
+@pytest.mark.parametrize("spec", [
+    {"font": {"color": "reddish"}},
+    {"font": {"size": "big"}},
+    {"border": "fat"},
+    {"alignment": {"horizontal": "middle"}},
+])
+def test_invalid_styles_raise_the_same_error_for_cells_and_ranges(package, spec):
+    style_registry = package("style_registry")
+    ws = _sheet()
+    styles = style_registry.StyleRegistry(ws.parent)
+    with pytest.raises(style_registry.StyleError):
+        style_registry.check_style(spec)
+    with pytest.raises(style_registry.StyleError):
+        styles.apply(ws["A1"], spec)
+    with pytest.raises(style_registry.StyleError):
+        styles.apply_range(ws, "A1:C3", spec)
+    assert styles.applied == 0 and not ws["A1"].has_style
+
+
+def test_same_spec_is_registered_once(package):
+    style_registry = package("style_registry")
+    ws = _sheet()
+    styles = style_registry.StyleRegistry(ws.parent)
+    header = {"font": {"bold": True, "color": "red"}, "fill": "#ff0"}
+    assert styles.apply_range(ws, "A1:C1", header) == 3
+    # 同义写法（键顺序不同、颜色名与十六进制）得到同一个命名样式
+    styles.apply(ws["A2"], {"fill": "FFFF00", "font": {"color": "#FF0000", "bold": True}})
+    assert styles.style_count == 1
+    assert styles.applied == 4
+    assert ws["A1"].style == ws["A2"].style == styles.named_style(header).name
+    assert ws["B1"].font.bold and ws["B1"].fill.fgColor.rgb.endswith("FFFF00")
+
+
+def test_style_names_stable_across_re_edits(package, tmp_path):
+    style_registry = package("style_registry")
+    header = {"font": {"bold": True}, "fill": "yellow", "border": "thin"}
+    ws = _sheet()
+    styles = style_registry.StyleRegistry(ws.parent)
+    styles.apply_range(ws, "A1:C1", header)
+    name = ws["A1"].style
+    assert name.startswith("style_")
+    path = tmp_path / "styled.xlsx"
+    ws.parent.save(path)
+
+    # 再次打开同一文件编辑：新的登记表复用已有的同名样式，不重复添加
+    for _ in range(2):
+        wb = load_workbook(path)
+        ws = wb.active
+        count = len(wb.named_styles)
+        styles = style_registry.StyleRegistry(wb)
+        assert styles.named_style(header).name == name
+        styles.apply(ws["A3"], header)
+        styles.apply_range(ws, "A1:C1", header)
+        assert len(wb.named_styles) == count
+        assert ws["A3"].style == name
+        wb.save(path)
+
+    wb = load_workbook(path)
+    assert wb.named_styles.count(name) == 1
+    assert wb.active["C1"].style == name and wb.active["C1"].font.bold
@@ -0,0 +1,111 @@
+import datetime
+
+import pytest
+
+
+SPEC = {
+    "sheet_name": "销售数据",
+    "row_count": 50,
+    "seed": 7,
+    "columns": [
+        {"name": "订单号", "type": "id", "prefix": "SO", "width": 4},
+        {"name": "日期", "type": "date", "start": "2024-01-01", "end": "2024-01-10", "mode": "sequential"},
+        {"name": "区域", "type": "enum", "values": ["华东", "华南"], "weights": [3, 1]},
+        {"name": "单价", "type": "number", "distribution": "normal", "mean": 100, "std": 20, "min": 1, "decimals": 2},
+        {"name": "数量", "type": "int", "min": 1, "max": 5},
+        {"name": "销售额", "type": "formula", "expr": "round(单价 * 数量, 2)"},
+        {"name": "备注", "type": "constant", "value": "无", "null_rate": 0.5}
+    ]
+}
+
+
+def test_detect_row_count(package):
+    table_synth = package("table_synth")
+    assert table_synth.detect_row_count("生成 10,000 rows 的订单") == 10000
+    assert table_synth.detect_row_count("1万行销售数据") == 10000
+    assert table_synth.detect_row_count("2.5k records") == 2500
+    assert table_synth.detect_row_count("5000条") == 5000
+    assert table_synth.detect_row_count("一份销售表") is None
+    assert table_synth.detect_row_count(None) is None
+
+
+def test_validate_spec_normalizes(package):
+    table_synth = package("table_synth")
+    spec = table_synth.validate_spec(SPEC, max_rows=20)
+    assert spec["row_count"] == 20
+    assert spec["seed"] == 7
+    assert [column["type"] for column in spec["columns"]] == [
+        "sequence", "date", "category", "number", "integer", "formula", "constant"
+    ]
+    assert spec["columns"][2]["weights"] == [0.75, 0.25]
+    assert spec["columns"][4]["distribution"] == "uniform"
+    # 参数中的 row_count 优先于规格中的值
+    assert table_synth.validate_spec(SPEC, max_rows=1000, row_count=3)["row_count"] == 3
+    assert table_synth.validate_spec(dict(SPEC, seed=None), max_rows=10)["seed"] >= 0
+
+
+@pytest.mark.parametrize("spec, message", [
+    ([], "JSON对象"),
+    ({"columns": []}, "columns"),
+    ({"columns": [{"type": "integer"}]}, "name"),
+    ({"columns": [{"name": "a", "type": "integer"}, {"name": "a", "type": "integer"}]}, "列名重复"),
+    ({"columns": [{"name": "a", "type": "matrix"}]}, "类型不支持"),
+    ({"columns": [{"name": "a", "type": "category"}]}, "values"),
+    ({"columns": [{"name": "a", "type": "category", "values": [1, 2], "weights": [1]}]}, "weights"),
+    ({"columns": [{"name": "a", "type": "integer", "min": 5, "max": 1}]}, "min 不能大于 max"),
+    ({"columns": [{"name": "a", "type": "number", "distribution": "zipf"}]}, "分布不支持"),
+    ({"columns": [{"name": "a", "type": "date", "start": "2024-13-01"}]}, "有效日期"),
+    ({"columns": [{"name": "a", "type": "date", "start": "2024-02-01", "end": "2024-01-01"}]}, "end 不能早于 start"),
+    ({"columns": [{"name": "a", "type": "formula", "expr": "b + 1"}, {"name": "b", "type": "integer"}]}, "b"),
+    ({"columns": [{"name": "a", "type": "formula", "expr": "__import__('os')"}]}, "公式不合法"),
+    ({"columns": [{"name": "a", "type": "integer", "null_rate": 1}]}, "null_rate"),
+    ({"row_count": "many", "columns": [{"name": "a", "type": "integer"}]}, "row_count"),
+    ({"columns": [{"name": "d", "type": "date"}, {"name": "x", "type": "formula", "expr": "d * 2"}]}, "生成数据失败"),
+])
+def test_validate_spec_rejects_invalid(package, spec, message):
+    table_synth = package("table_synth")
+    with pytest.raises(table_synth.TableSpecError, match=message):
+        table_synth.validate_spec(spec, max_rows=100)
+    assert issubclass(table_synth.TableSpecError, ValueError)
+
+
+def test_same_seed_gives_same_rows(package):
+    table_synth = package("table_synth")
+    spec = table_synth.validate_spec(SPEC, max_rows=100)
+    first = list(table_synth.synthesize_rows(spec, chunk_rows=16))
+    second = list(table_synth.synthesize_rows(spec, chunk_rows=16))
+    assert first == second
+    other = list(table_synth.synthesize_rows(dict(spec, seed=8), chunk_rows=16))
+    assert other[1:] != first[1:]
+
+
+def test_generated_rows_follow_spec(package):
+    table_synth = package("table_synth")
+    spec = table_synth.validate_spec(SPEC, max_rows=100)
+    chunks = list(table_synth.synthesize_chunks(spec, chunk_rows=16))
+    assert [len(chunk) for chunk in chunks] == [16, 16, 16, 2]
+
+    rows = [row for chunk in chunks for row in chunk]
+    assert [row[0] for row in rows[:3]] == ["SO0001", "SO0002", "SO0003"]
+    # sequential 日期按天递增并在区间内循环
+    assert rows[0][1] == datetime.date(2024, 1, 1)
+    assert rows[10][1] == datetime.date(2024, 1, 1)
+    assert {row[2] for row in rows} <= {"华东", "华南"}
+    for _, _, _, price, quantity, amount, note in rows:
+        assert price >= 1
+        assert 1 <= quantity <= 5 and isinstance(quantity, int)
+        assert amount == round(price * quantity, 2)
+        assert note in ("无", None)
+    assert any(row[6] is None for row in rows) and any(row[6] == "无" for row in rows)
+
+    header = next(table_synth.synthesize_rows(spec))
+    assert header == ["订单号", "日期", "区域", "单价", "数量", "销售额", "备注"]
+
+
+def test_mock_specs_are_valid(package):
+    table_synth = package("table_synth")
+    for description in ("员工信息表", "产品库存清单", "2000条销售记录"):
+        spec = table_synth.validate_spec(table_synth.generate_mock_table_spec(description), max_rows=5000)
+        rows = list(table_synth.synthesize_rows(spec))
+        assert len(rows) == spec["row_count"] + 1
+    assert table_synth.generate_mock_table_spec("2000条销售记录")["row_count"] == 2000
@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture
+def estimator(package, monkeypatch):
+    module = package("token_estimator")
+    # 固定使用启发式估算，结果不依赖是否安装了 tiktoken
+    monkeypatch.setattr(module, "_encoding", None)
+    return module
+
+
+def test_heuristic_weights_wide_characters(estimator):
+    assert estimator.estimate_tokens("") == 0
+    assert estimator.estimate_tokens(None) == 0
+    assert estimator.heuristic_tokens("abcdefghij") == 3
+    assert estimator.heuristic_tokens("销售额") == 2
+    assert estimator.heuristic_tokens("销售额abc") == 3
+    assert estimator.estimate_tokens("销售额abc") == 3
+
+
+def test_messages_include_overhead(estimator):
+    messages = [
+        {"role": "system", "content": "abcdefghij"},
+        {"role": "user", "content": {"sheet": "Sheet1"}},
+        {"role": "assistant"}
+    ]
+    expected = estimator.REPLY_PRIMING_TOKENS + 3 * estimator.MESSAGE_OVERHEAD_TOKENS
+    expected += estimator.heuristic_tokens("system") + 3
+    expected += estimator.heuristic_tokens("user") + estimator.heuristic_tokens('{"sheet": "Sheet1"}')
+    expected += estimator.heuristic_tokens("assistant")
+    assert estimator.estimate_messages_tokens(messages) == expected
+    assert estimator.estimate_messages_tokens([]) == estimator.REPLY_PRIMING_TOKENS
+
+
+def test_clamp_max_tokens(estimator, package):
+    assert estimator.clamp_max_tokens(1000, 8000, 4000) == 4000
+    assert estimator.clamp_max_tokens(6000, 8000, 4000) == 2000
+    assert estimator.clamp_max_tokens(7744, 8000, 4000) == 256
+
+    with pytest.raises(estimator.PromptTooLargeError) as info:
+        estimator.clamp_max_tokens(7800, 8000, 4000)
+    assert isinstance(info.value, package("llm_client").LLMError)
+    assert "7800" in str(info.value)
+
+
+def test_estimate_usage_totals(estimator):
+    messages = [{"role": "user", "content": "分析这张表"}]
+    usage = estimator.estimate_usage(messages, {"summary": "ok"})
+    assert usage["prompt_tokens"] == estimator.estimate_messages_tokens(messages)
+    assert usage["completion_tokens"] == estimator.heuristic_tokens('{"summary": "ok"}')
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+def test_set_encoding_without_name_falls_back(estimator):
+    assert estimator.set_encoding("") is False
+    assert estimator.set_encoding(None) is False
+    assert estimator._encoding is None
+    assert estimator.estimate_tokens("abcdefghij") == 3
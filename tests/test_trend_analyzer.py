@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def _frame(package, rows):
+    sheet_frame = package("sheet_frame")
+    return sheet_frame.SheetFrame.from_rows([["日期", "销售额"]] + rows)
+
+
+def test_change_pct_is_relative_to_fitted_start(package):
+    trend_analyzer = package("trend_analyzer")
+    months = [f"2024年{m}月" for m in range(1, 7)]
+    values = [20000, 17600, 15200, 12800, 10400, 8000]
+    trend = trend_analyzer.analyze_trend(_frame(package, [list(r) for r in zip(months, values)]), 0, 1)
+    assert trend["direction"] == "下降"
+    assert trend["change_pct"] == pytest.approx(-60.0)
+    assert "累计变化-60.0%" in trend["messages"][0]
+
+
+def test_change_pct_skipped_without_positive_start(package):
+    trend_analyzer = package("trend_analyzer")
+    rows = [[f"2024年{m}月", v] for m, v in zip(range(1, 7), [-50, -20, 10, 40, 70, 100])]
+    trend = trend_analyzer.analyze_trend(_frame(package, rows), 0, 1)
+    assert trend["change_pct"] is None
+    assert trend["direction"] == "上升"
+
+
+def test_partial_trailing_month_not_compared(package):
+    trend_analyzer = package("trend_analyzer")
+    start = date(2024, 1, 1)
+    # 1月、2月完整，3月只有前 3 天：3月汇总值只有 2月的约十分之一，不应得到约 -90% 的环比
+    rows = [[start + timedelta(days=i), 100] for i in range((date(2024, 3, 3) - start).days + 1)]
+    trend = trend_analyzer.analyze_trend(_frame(package, rows), 0, 1)
+    assert trend["mom"]["last"] == pytest.approx((2900 - 3100) / 3100 * 100)
+    assert not any("2024-03" in message for message in trend["messages"][1:])
+
+
+def test_complete_months_are_compared(package):
+    trend_analyzer = package("trend_analyzer")
+    start = date(2024, 1, 1)
+    rows = [[start + timedelta(days=i), 100] for i in range((date(2024, 3, 31) - start).days + 1)]
+    trend = trend_analyzer.analyze_trend(_frame(package, rows), 0, 1)
+    assert trend["mom"]["last"] == pytest.approx((3100 - 2900) / 2900 * 100)
+
+
+@pytest.mark.parametrize("label, expected, has_year", [
+    ("2024年3月", "2024-03-01", True),
+    ("2024/3/5", "2024-03-05", True),
+    ("2024.03", "2024-03-01", True),
+    ("2024Q2", "2024-04-01", True),
+    ("2024年第三季度", "2024-07-01", True),
+    ("Q4", "2000-10-01", False),
+    ("三月", "2000-03-01", False),
+    ("Mar", "2000-03-01", False),
+    ("2024年", "2024-01-01", True),
+])
+def test_parse_period_label(package, label, expected, has_year):
+    trend_analyzer = package("trend_analyzer")
+    day, with_year = trend_analyzer.parse_period_label(label)
+    assert str(day) == expected and with_year == has_year
+
+
+def test_unparseable_labels(package):
+    trend_analyzer = package("trend_analyzer")
+    for label in ("十三月", "华东", "2024-13", ""):
+        assert trend_analyzer.parse_period_label(label) == (None, False)
+
+
+def test_monthly_seasonality_and_yoy(package):
+    trend_analyzer = package("trend_analyzer")
+    rows = []
+    for year in (2021, 2022, 2023):
+        for month in range(1, 13):
+            rows.append([f"{year}年{month}月", 1000 + (year - 2021) * 120 + (500 if month == 12 else 0)])
+    trend = trend_analyzer.analyze_trend(_frame(package, rows), 0, 1)
+    assert trend["granularity"] == "month" and trend["periods"] == 36
+    assert trend["season"]["period"] == 12 and trend["season"]["peak"] == "12月"
+    assert trend["yoy"] == pytest.approx((1740 - 1620) / 1620 * 100)
+    assert trend["series"][0] == ("2021年1月", 1000.0)
+
+
+def test_level_shift_is_a_changepoint(package):
+    trend_analyzer = package("trend_analyzer")
+    rows = [[date(2024, 1, 1) + timedelta(days=i), 100 if i < 30 else 300] for i in range(60)]
+    trend = trend_analyzer.analyze_trend(_frame(package, rows), 0, 1)
+    assert [point["time"] for point in trend["changepoints"]] == ["2024-01-31"]
+    assert trend["changepoints"][0]["before"] == pytest.approx(100)
+
+
+def test_too_few_periods(package):
+    trend_analyzer = package("trend_analyzer")
+    assert trend_analyzer.analyze_trend(_frame(package, [["1月", 1], ["2月", 2], ["2月", 3]]), 0, 1) is None
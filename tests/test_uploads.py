@@ -0,0 +1,49 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+XLSX_HEAD = b"PK\x03\x04"
+OLE_HEAD = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+def _save(package, tmp_path, name, data, max_bytes=1024, chunk_size=16):
+    uploads = package("uploads")
+    dest = tmp_path / "upload.bin"
+    upload = UploadFile(io.BytesIO(data), filename=name)
+    result = asyncio.run(uploads.save_upload(upload, str(dest), max_bytes, ["xlsx"], chunk_size=chunk_size))
+    return result, dest
+
+
+def test_saves_xlsx_and_returns_digest(package, tmp_path):
+    data = XLSX_HEAD + bytes(range(200))
+    (size, digest), dest = _save(package, tmp_path, "报表.XLSX", data)
+    assert size == len(data) and digest == hashlib.sha256(data).hexdigest()
+    assert dest.read_bytes() == data
+
+
+@pytest.mark.parametrize("name, data, status", [
+    ("a.xls", OLE_HEAD + b"\0" * 100, 415),
+    ("a.xlsx", OLE_HEAD + b"\0" * 100, 415),
+    ("a.xlsx", b"hello,world\n1,2", 415),
+    ("a.csv", XLSX_HEAD + b"\0" * 10, 415),
+    ("a.xlsx", b"", 400),
+    ("a.xlsx", XLSX_HEAD + b"\0" * 2000, 413),
+])
+def test_rejects_bad_uploads_and_removes_partial_file(package, tmp_path, name, data, status):
+    uploads = package("uploads")
+    with pytest.raises(uploads.UploadRejectedError) as info:
+        _save(package, tmp_path, name, data)
+    assert info.value.status_code == status
+    assert not (tmp_path / "upload.bin").exists()
+
+
+def test_declared_size(package):
+    uploads = package("uploads")
+    limit = 1024 * 1024
+    assert uploads.declared_size_exceeds({"content-length": str(limit + uploads.FORM_OVERHEAD_BYTES + 1)}, limit)
+    assert not uploads.declared_size_exceeds({"content-length": str(limit)}, limit)
+    assert not uploads.declared_size_exceeds({}, limit)
+    assert uploads.detect_file_type(OLE_HEAD) is None